@@ -0,0 +1,329 @@
+"""
+Background batch ingestion for activity report documents.
+
+A batch (several uploaded files, zip archives expanded) is written to
+data/jobs/<job_id>/inputs and described by a job.json record; the HTTP
+request returns as soon as the files are on disk. Documents then run through
+the normal extraction/analysis pipeline in a background task, at most
+BATCH_CONCURRENCY at a time, and each finished document is appended to
+results.ndjson. Progress lives on disk, so any server worker can answer a
+poll or stream results for a job started by another worker. A job that was
+running when its process exited is reported as "interrupted". Finished jobs
+are deleted BATCH_RETENTION_HOURS after their last update.
+"""
+
+import asyncio
+import json
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import uuid
+import zipfile
+from datetime import datetime
+from pathlib import Path
+
+try:
+    import psutil
+except Exception:
+    psutil = None
+
+JOBS_DIR = Path(os.getenv("BATCH_JOBS_DIR", Path(__file__).resolve().parent / "data" / "jobs"))
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", "4"))
+BATCH_MAX_FILES = int(os.getenv("BATCH_MAX_FILES", "500"))
+BATCH_MAX_BYTES = int(float(os.getenv("BATCH_MAX_MB", "500")) * 1024 * 1024)
+ACCEPTED_EXTENSIONS = (".pdf", ".jpg", ".jpeg", ".png", ".tif", ".tiff", ".txt", ".md")
+FOLLOW_POLL_SECONDS = 0.5
+BATCH_RETENTION_SECONDS = float(os.getenv("BATCH_RETENTION_HOURS", "72")) * 3600
+# Retention is checked when a batch is created, at most this often
+SWEEP_INTERVAL_SECONDS = 600
+
+
+class BatchError(Exception):
+    """Invalid batch input (too many files, oversized archive, nothing usable)."""
+
+
+def _safe_name(name: str) -> str:
+    base = os.path.basename(name.replace("\\", "/")) or "document"
+    return "".join(ch if ch.isalnum() or ch in "._- " else "_" for ch in base)
+
+
+class BatchJobs:
+    def __init__(self, root: Path = JOBS_DIR, concurrency: int = BATCH_CONCURRENCY):
+        self.root = Path(root)
+        self.concurrency = concurrency
+        self._lock = threading.Lock()
+        self._running = {}  # job_id -> asyncio.Task, for jobs owned by this process
+        self._last_sweep = 0.0
+
+    # --- records -------------------------------------------------------------
+    def _job_dir(self, job_id: str) -> Path:
+        if not job_id or not all(ch.isalnum() or ch == "-" for ch in job_id):
+            raise KeyError(job_id)
+        return self.root / job_id
+
+    def _write_record(self, job_id: str, record: dict):
+        path = self._job_dir(job_id) / "job.json"
+        fd, tmp = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(record, f, ensure_ascii=False, indent=2)
+        os.replace(tmp, path)
+
+    def _read_record(self, job_id: str) -> dict:
+        path = self._job_dir(job_id) / "job.json"
+        try:
+            return json.loads(path.read_text(encoding="utf-8"))
+        except FileNotFoundError:
+            raise KeyError(job_id)
+
+    def get(self, job_id: str) -> dict:
+        record = self._read_record(job_id)
+        if record["status"] in ("queued", "running") and not self._owner_alive(job_id, record):
+            record["status"] = "interrupted"
+        return record
+
+    def _owner_alive(self, job_id: str, record: dict) -> bool:
+        if record.get("pid") == os.getpid():
+            return job_id in self._running
+        return _pid_alive(record.get("pid"))
+
+    def _update(self, job_id: str, **changes):
+        with self._lock:
+            record = self._read_record(job_id)
+            documents = changes.pop("document", None)
+            if documents is not None:
+                index, fields = documents
+                record["documents"][index].update(fields)
+            record.update(changes)
+            record["updated_at"] = datetime.now().isoformat()
+            self._write_record(job_id, record)
+            return record
+
+    def sweep(self, max_age: float = BATCH_RETENTION_SECONDS) -> int:
+        """Delete jobs that finished (or were abandoned) more than `max_age` seconds ago."""
+        if not self.root.is_dir():
+            return 0
+        cutoff = time.time() - max_age
+        removed = 0
+        for job_dir in self.root.iterdir():
+            if not job_dir.is_dir() or job_dir.name in self._running:
+                continue
+            record_path = job_dir / "job.json"
+            try:
+                # job.json is rewritten on every update, so its mtime is the last activity
+                if (record_path if record_path.exists() else job_dir).stat().st_mtime > cutoff:
+                    continue
+                if record_path.exists() and self.get(job_dir.name)["status"] in ("queued", "running"):
+                    continue
+            except (OSError, ValueError, KeyError):
+                continue
+            shutil.rmtree(job_dir, ignore_errors=True)
+            removed += 1
+        return removed
+
+    def _maybe_sweep(self):
+        now = time.monotonic()
+        if now - self._last_sweep < SWEEP_INTERVAL_SECONDS:
+            return
+        self._last_sweep = now
+        removed = self.sweep()
+        if removed:
+            print(f"[BATCH] removed {removed} expired job(s)")
+
+    # --- intake --------------------------------------------------------------
+    def create(self, uploads) -> dict:
+        """Store uploaded files (name, file object) and create a queued job.
+
+        Zip archives are expanded; members with unsupported extensions are skipped.
+        Runs blocking file I/O, so call it from a worker thread.
+        """
+        self._maybe_sweep()
+        job_id = uuid.uuid4().hex[:12]
+        inputs = self._job_dir(job_id) / "inputs"
+        inputs.mkdir(parents=True)
+        documents = []
+        total_bytes = 0
+
+        def add(name, stream, size_hint=None):
+            nonlocal total_bytes
+            if len(documents) >= BATCH_MAX_FILES:
+                raise BatchError(f"A batch can contain at most {BATCH_MAX_FILES} documents")
+            if not name.lower().endswith(ACCEPTED_EXTENSIONS):
+                return
+            index = len(documents)
+            target = inputs / f"{index:04d}_{_safe_name(name)}"
+            with open(target, "wb") as out:
+                shutil.copyfileobj(stream, out, 1024 * 1024)
+            total_bytes += target.stat().st_size
+            if total_bytes > BATCH_MAX_BYTES:
+                raise BatchError(f"Batch exceeds the {BATCH_MAX_BYTES // (1024 * 1024)} MB limit")
+            documents.append({"index": index, "name": name, "file": target.name, "status": "pending"})
+
+        try:
+            for name, fileobj in uploads:
+                fileobj.seek(0)
+                if name.lower().endswith(".zip"):
+                    try:
+                        archive = zipfile.ZipFile(fileobj)
+                    except zipfile.BadZipFile:
+                        raise BatchError(f"{name} is not a valid zip archive")
+                    with archive:
+                        members = [m for m in archive.infolist()
+                                   if not m.is_dir() and not m.filename.startswith("__MACOSX/")]
+                        # Check declared sizes first so a zip bomb is refused before extraction
+                        if sum(m.file_size for m in members) + total_bytes > BATCH_MAX_BYTES:
+                            raise BatchError(f"Batch exceeds the {BATCH_MAX_BYTES // (1024 * 1024)} MB limit")
+                        for member in members:
+                            with archive.open(member) as stream:
+                                add(member.filename, stream)
+                else:
+                    add(name, fileobj)
+            if not documents:
+                raise BatchError("No supported documents in the upload")
+        except BaseException:
+            shutil.rmtree(self._job_dir(job_id), ignore_errors=True)
+            raise
+
+        now = datetime.now().isoformat()
+        record = {
+            "job_id": job_id,
+            "status": "queued",
+            "created_at": now,
+            "updated_at": now,
+            "pid": os.getpid(),
+            "total": len(documents),
+            "completed": 0,
+            "failed": 0,
+            "documents": documents,
+        }
+        self._write_record(job_id, record)
+        return record
+
+    # --- processing ----------------------------------------------------------
+    def start(self, job_id: str, analyze):
+        """Schedule a job on the running event loop.
+
+        `analyze(source, filename)` is the async single-document pipeline; it
+        raises on unusable documents (HTTPException detail is recorded).
+        """
+        task = asyncio.get_running_loop().create_task(self._run(job_id, analyze))
+        self._running[job_id] = task
+        task.add_done_callback(lambda _: self._running.pop(job_id, None))
+        return task
+
+    def _append_result(self, job_id: str, line: dict):
+        with open(self._job_dir(job_id) / "results.ndjson", "a", encoding="utf-8") as out:
+            out.write(json.dumps(line, ensure_ascii=False) + "\n")
+
+    async def _run(self, job_id: str, analyze):
+        # Record writes are blocking file I/O; keep them off the event loop
+        record = await asyncio.to_thread(self._update, job_id, status="running", started_at=datetime.now().isoformat())
+        job_dir = self._job_dir(job_id)
+        slots = asyncio.Semaphore(self.concurrency)
+        results_lock = asyncio.Lock()
+        counts = {"completed": 0, "failed": 0}
+
+        async def process(document):
+            async with slots:
+                started = time.perf_counter()
+                await asyncio.to_thread(self._update, job_id, document=(document["index"], {"status": "running"}))
+                line = {"index": document["index"], "name": document["name"]}
+                try:
+                    with open(job_dir / "inputs" / document["file"], "rb") as source:
+                        result = await analyze(source, document["name"])
+                    line.update(status="ok", result=result)
+                    counts["completed"] += 1
+                except Exception as e:
+                    line.update(status="error", error=str(getattr(e, "detail", None) or e))
+                    counts["failed"] += 1
+                line["seconds"] = round(time.perf_counter() - started, 3)
+                async with results_lock:
+                    await asyncio.to_thread(self._append_result, job_id, line)
+                await asyncio.to_thread(
+                    self._update,
+                    job_id,
+                    completed=counts["completed"],
+                    failed=counts["failed"],
+                    document=(document["index"], {"status": line["status"], "error": line.get("error"), "seconds": line["seconds"]}),
+                )
+
+        try:
+            await asyncio.gather(*(process(d) for d in record["documents"]))
+            await asyncio.to_thread(self._update, job_id, status="done", finished_at=datetime.now().isoformat())
+        except asyncio.CancelledError:
+            self._update(job_id, status="interrupted")
+            raise
+        except Exception as e:
+            print(f"[BATCH] job {job_id} failed: {e}")
+            self._update(job_id, status="failed", error=str(e))
+
+    # --- results -------------------------------------------------------------
+    async def stream_results(self, job_id: str, follow: bool = False):
+        """Yield NDJSON lines; with follow=True keep tailing until the job finishes."""
+        path = self._job_dir(job_id) / "results.ndjson"
+        offset = 0
+        while True:
+            finished = (await asyncio.to_thread(self.get, job_id))["status"] not in ("queued", "running")
+            chunk = await asyncio.to_thread(_read_from, path, offset)
+            if chunk:
+                # Only hand out complete lines; a partial one is picked up next round
+                end = chunk.rfind(b"\n") + 1
+                if end:
+                    offset += end
+                    yield chunk[:end]
+            if finished or not follow:
+                return
+            await asyncio.sleep(FOLLOW_POLL_SECONDS)
+
+
+def _read_from(path: Path, offset: int) -> bytes:
+    try:
+        with open(path, "rb") as f:
+            f.seek(offset)
+            return f.read()
+    except FileNotFoundError:
+        return b""
+
+
+def _pid_alive(pid) -> bool:
+    """Whether process `pid` exists, without signalling it.
+
+    On Windows os.kill(pid, 0) terminates the process, so it is only used on POSIX.
+    """
+    if not pid:
+        return False
+    if pid == os.getpid():
+        return True
+    if psutil is not None:
+        return psutil.pid_exists(pid)
+    if sys.platform == "win32":
+        return _windows_pid_alive(pid)
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def _windows_pid_alive(pid: int) -> bool:
+    import ctypes
+
+    PROCESS_QUERY_LIMITED_INFORMATION = 0x1000
+    ERROR_ACCESS_DENIED = 5
+    STILL_ACTIVE = 259
+    kernel32 = ctypes.WinDLL("kernel32", use_last_error=True)
+    handle = kernel32.OpenProcess(PROCESS_QUERY_LIMITED_INFORMATION, False, pid)
+    if not handle:
+        # Access denied still means the process exists
+        return ctypes.get_last_error() == ERROR_ACCESS_DENIED
+    try:
+        code = ctypes.c_ulong()
+        if not kernel32.GetExitCodeProcess(handle, ctypes.byref(code)):
+            return True
+        return code.value == STILL_ACTIVE
+    finally:
+        kernel32.CloseHandle(handle)
@@ -0,0 +1,415 @@
+"""
+Bulk certificate rendering: one template, many recipients, one ZIP stream.
+
+The template has the shape /ai/certificate/generate returns: layout
+(background, border, text_styles), color_scheme (primary, secondary, accent)
+and suggested_elements (title, subtitle, detail prefix, date label,
+signature label). Recipients come as CSV (with a header row) or JSON (a
+list of objects, or {"recipients": [...]}). Each recipient needs a name.
+The optional detail (achievement/course/event) and date fields fill the
+variable lines.
+
+Rendering runs in a spawn process pool (CERT_RENDER_WORKERS). Recipients
+are sent in chunks, so the template is pickled once per chunk rather than
+once per certificate. Each worker caches its fonts and one background layer
+per template: the fill, border and every static text line are drawn once.
+A certificate is then a copy of that layer plus the name, detail and date.
+Finished chunks are written, in order, into a ZIP that is streamed as it
+grows, with at most two chunks per worker in flight, so memory stays flat
+for batches of thousands. PNG and PDF are already compressed, so entries
+are stored uncompressed.
+
+stream_zip renders the first chunk before it returns. A template that
+cannot be drawn therefore raises RenderError while the route can still
+answer 400, instead of cutting off a ZIP that has already started with a
+200. Later failures for one recipient (or a whole chunk) do not stop the
+batch; they are listed in an errors.txt entry at the end of the archive.
+"""
+
+import csv
+import hashlib
+import io
+import json
+import multiprocessing as mp
+import os
+import re
+import threading
+import unicodedata
+import zipfile
+from collections import OrderedDict, deque
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date
+from functools import lru_cache
+
+try:
+    from PIL import Image, ImageDraw, ImageFont
+except Exception:
+    Image = None
+
+CERT_RENDER_WORKERS = int(os.getenv("CERT_RENDER_WORKERS", min(4, os.cpu_count() or 1)))
+CERT_BATCH_MAX = int(os.getenv("CERT_BATCH_MAX", "10000"))
+CERT_FONT_DIR = os.getenv("CERT_FONT_DIR", "")
+CHUNK_SIZE = 25
+FORMATS = ("png", "pdf")
+DEFAULT_SIZE = (2480, 1754)  # A4 landscape at 300 dpi, as in the certificate editor
+MAX_SIDE = 4000
+BACKGROUND_CACHE_ENTRIES = 8
+
+FONT_DIRS = [d for d in (CERT_FONT_DIR, "/usr/share/fonts/truetype/dejavu", "/usr/share/fonts/truetype/liberation",
+                         "/usr/share/fonts/TTF", "/Library/Fonts", "C:/Windows/Fonts") if d]
+FONT_FILES = {
+    "serif-bold": ["DejaVuSerif-Bold.ttf", "LiberationSerif-Bold.ttf", "timesbd.ttf"],
+    "serif-regular": ["DejaVuSerif.ttf", "LiberationSerif-Regular.ttf", "times.ttf"],
+    "sans-bold": ["DejaVuSans-Bold.ttf", "LiberationSans-Bold.ttf", "arialbd.ttf"],
+    "sans-regular": ["DejaVuSans.ttf", "LiberationSans-Regular.ttf", "arial.ttf"],
+    "script-bold": ["DejaVuSerif-BoldItalic.ttf", "LiberationSerif-BoldItalic.ttf", "timesbi.ttf"],
+}
+NAME_COLUMNS = ("name", "recipient", "recipient_name", "full_name", "fullname", "participant")
+DETAIL_COLUMNS = ("achievement", "course", "event", "program", "reason", "detail")
+DEFAULT_ELEMENTS = ["Certificate of Achievement", "Awarded to", "For", "Date", "Signature"]
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+class RenderError(Exception):
+    """Invalid batch input (unreadable recipients, missing names, too many rows)."""
+
+
+def available() -> bool:
+    return Image is not None
+
+
+def _get_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(max_workers=CERT_RENDER_WORKERS, mp_context=mp.get_context("spawn"))
+        return _pool
+
+
+def shutdown_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(cancel_futures=True)
+            _pool = None
+
+
+# --- input ----------------------------------------------------------------------
+def _column(name: str) -> str:
+    return re.sub(r"[^a-z0-9]+", "_", (name or "").strip().lower()).strip("_")
+
+
+def parse_recipients(data: bytes, filename: str = ""):
+    """Recipient dicts (keys normalized to snake_case) from CSV or JSON bytes."""
+    text = data.decode("utf-8-sig", errors="replace").strip()
+    if not text:
+        raise RenderError("No recipients provided")
+    if filename.lower().endswith(".json") or text[0] in "[{":
+        try:
+            rows = json.loads(text)
+        except ValueError as e:
+            raise RenderError(f"Recipients JSON is invalid: {e}")
+        if isinstance(rows, dict):
+            rows = rows.get("recipients") or []
+        if not isinstance(rows, list):
+            raise RenderError("Recipients JSON must be a list of objects")
+        rows = [r if isinstance(r, dict) else {"name": r} for r in rows]
+    else:
+        rows = list(csv.DictReader(io.StringIO(text)))
+    recipients = []
+    for number, row in enumerate(rows, start=1):
+        row = {_column(k): str(v).strip() for k, v in row.items() if k is not None and v is not None}
+        name = next((row[c] for c in NAME_COLUMNS if row.get(c)), "")
+        if not name:
+            raise RenderError(f"Recipient {number} has no name (expected a column like 'name')")
+        row["name"] = name
+        recipients.append(row)
+    if not recipients:
+        raise RenderError("No recipients provided")
+    if len(recipients) > CERT_BATCH_MAX:
+        raise RenderError(f"Too many recipients ({len(recipients)}); the limit is {CERT_BATCH_MAX}")
+    return recipients
+
+
+def parse_template(raw):
+    """Template dict from JSON text or a dict, unwrapping a {"status", "data"} route reply."""
+    if isinstance(raw, (str, bytes)):
+        try:
+            raw = json.loads(raw or "{}")
+        except ValueError as e:
+            raise RenderError(f"Template JSON is invalid: {e}")
+    if not isinstance(raw, dict):
+        raise RenderError("Template must be a JSON object")
+    if isinstance(raw.get("data"), dict):
+        raw = raw["data"]
+    try:
+        _canvas_size(raw)
+    except (TypeError, ValueError, AttributeError):
+        raise RenderError("Template canvas width and height must be numbers")
+    return raw
+
+
+# --- drawing --------------------------------------------------------------------
+def _rgb(value, default):
+    match = re.fullmatch(r"#?([0-9a-fA-F]{6})", str(value or "").strip())
+    hex_value = match.group(1) if match else default.lstrip("#")
+    return tuple(int(hex_value[i:i + 2], 16) for i in (0, 2, 4))
+
+
+def _mix(color, other, amount: float):
+    return tuple(int(round(c + (o - c) * amount)) for c, o in zip(color, other))
+
+
+@lru_cache(maxsize=64)
+def _font(style: str, size: int):
+    style = style if style in FONT_FILES else ("serif" if "serif" in style else "sans") + ("-bold" if "bold" in style else "-regular")
+    for name in FONT_FILES[style]:
+        for directory in FONT_DIRS:
+            path = os.path.join(directory, name)
+            if os.path.exists(path):
+                return ImageFont.truetype(path, size)
+        try:
+            return ImageFont.truetype(name, size)  # Pillow also searches the system font folders
+        except OSError:
+            continue
+    try:
+        return ImageFont.load_default(size)
+    except TypeError:
+        return ImageFont.load_default()
+
+
+def _fitted_font(draw, text: str, style: str, size: int, max_width: int):
+    """The font of `style` at `size`, shrunk until `text` fits in max_width."""
+    while size > 12:
+        font = _font(style, size)
+        if draw.textlength(text, font=font) <= max_width:
+            return font
+        size = int(size * 0.9)
+    return _font(style, size)
+
+
+def _centered(draw, text: str, xy, font, fill):
+    draw.text(xy, text, font=font, fill=fill, anchor="mm")
+
+
+def _canvas_size(template):
+    canvas = template.get("canvas") or {}
+    width = int(canvas.get("width") or DEFAULT_SIZE[0])
+    height = int(canvas.get("height") or DEFAULT_SIZE[1])
+    return max(200, min(width, MAX_SIDE)), max(200, min(height, MAX_SIDE))
+
+
+def _styles(template):
+    layout = template.get("layout") or {}
+    text_styles = layout.get("text_styles") or {}
+    colors = template.get("color_scheme") or {}
+    elements = [str(e) for e in (template.get("suggested_elements") or [])]
+    return {
+        "background": str(layout.get("background") or "clean-white").lower(),
+        "border": str(layout.get("border") or "minimal-line").lower(),
+        "title_style": str(text_styles.get("title") or "serif-bold").lower(),
+        "body_style": str(text_styles.get("body") or "serif-regular").lower(),
+        "primary": _rgb(colors.get("primary"), "#2C3E50"),
+        "secondary": _rgb(colors.get("secondary"), "#3498DB"),
+        "accent": _rgb(colors.get("accent"), "#000000"),
+        "elements": elements + DEFAULT_ELEMENTS[len(elements):],
+    }
+
+
+def _fill_background(image, styles):
+    width, height = image.size
+    white = (255, 255, 255)
+    if "gradient" in styles["background"]:
+        # Soft vertical gradient between tints of the primary and secondary colors
+        top = _mix(styles["primary"], white, 0.85)
+        bottom = _mix(styles["secondary"], white, 0.85)
+        gradient = Image.linear_gradient("L").resize((width, height))
+        image.paste(Image.composite(Image.new("RGB", image.size, bottom), Image.new("RGB", image.size, top), gradient))
+    elif "white" not in styles["background"]:
+        image.paste(_mix(styles["primary"], white, 0.93), (0, 0, width, height))
+
+
+def _draw_border(draw, size, styles):
+    width, height = size
+    unit = max(2, min(width, height) // 200)
+    margin = unit * 10
+    if "minimal" in styles["border"] or "line" in styles["border"]:
+        draw.rectangle((margin, margin, width - margin, height - margin), outline=styles["primary"], width=unit)
+        return
+    draw.rectangle((margin, margin, width - margin, height - margin), outline=styles["primary"], width=unit * 3)
+    inner = margin + unit * 6
+    draw.rectangle((inner, inner, width - inner, height - inner), outline=styles["secondary"], width=unit)
+    if "decorative" in styles["border"] or "elegant" in styles["border"]:
+        corner = unit * 12
+        for x, y in ((margin, margin), (width - margin - corner, margin), (margin, height - margin - corner),
+                     (width - margin - corner, height - margin - corner)):
+            draw.rectangle((x, y, x + corner, y + corner), fill=styles["accent"])
+
+
+def _render_background(template):
+    """Fill, border and every line that is the same on each certificate."""
+    styles = _styles(template)
+    size = _canvas_size(template)
+    width, height = size
+    image = Image.new("RGB", size, (255, 255, 255))
+    _fill_background(image, styles)
+    draw = ImageDraw.Draw(image)
+    _draw_border(draw, size, styles)
+    title, subtitle, _, date_label, signature_label = styles["elements"][:5]
+    _centered(draw, title, (width // 2, int(height * 0.22)), _fitted_font(draw, title, styles["title_style"], height // 12, int(width * 0.8)), styles["primary"])
+    _centered(draw, subtitle, (width // 2, int(height * 0.36)), _font(styles["body_style"], height // 30), styles["accent"])
+    # Date and signature columns: a rule with the label below it
+    label_font = _font(styles["body_style"], height // 40)
+    for x in (int(width * 0.28), int(width * 0.72)):
+        draw.line((x - width // 8, int(height * 0.80), x + width // 8, int(height * 0.80)), fill=styles["accent"], width=max(2, height // 600))
+    _centered(draw, date_label, (int(width * 0.28), int(height * 0.84)), label_font, styles["accent"])
+    _centered(draw, signature_label, (int(width * 0.72), int(height * 0.84)), label_font, styles["accent"])
+    return image, styles
+
+
+_backgrounds = OrderedDict()
+
+
+def _background(template, key: str):
+    """Per-process cache of rendered background layers, keyed by template hash."""
+    if key not in _backgrounds:
+        _backgrounds[key] = _render_background(template)
+        while len(_backgrounds) > BACKGROUND_CACHE_ENTRIES:
+            _backgrounds.popitem(last=False)
+    _backgrounds.move_to_end(key)
+    return _backgrounds[key]
+
+
+def render_one(template, key: str, recipient, fmt: str = "png") -> bytes:
+    background, styles = _background(template, key)
+    image = background.copy()
+    draw = ImageDraw.Draw(image)
+    width, height = image.size
+    name = recipient["name"]
+    _centered(draw, name, (width // 2, int(height * 0.48)), _fitted_font(draw, name, styles["title_style"], height // 10, int(width * 0.75)), styles["secondary"])
+    detail = next((recipient[c] for c in DETAIL_COLUMNS if recipient.get(c)), "")
+    if detail:
+        line = f"{styles['elements'][2]} {detail}"
+        _centered(draw, line, (width // 2, int(height * 0.60)), _fitted_font(draw, line, styles["body_style"], height // 28, int(width * 0.8)), styles["accent"])
+    issued = recipient.get("date") or template.get("date") or date.today().isoformat()
+    _centered(draw, issued, (int(width * 0.28), int(height * 0.77)), _font(styles["body_style"], height // 36), styles["accent"])
+    out = io.BytesIO()
+    if fmt == "pdf":
+        image.save(out, "PDF", resolution=300.0)
+    else:
+        image.save(out, "PNG", compress_level=1)  # speed over size; the ZIP is streamed
+    return out.getvalue()
+
+
+def render_chunk(template, key: str, items, fmt: str):
+    """Worker entry point: [(filename, recipient)] -> [(filename, bytes, error)].
+
+    Template errors raise; a recipient that fails on its own gets an error
+    message instead of bytes.
+    """
+    _background(template, key)
+    rendered = []
+    for filename, recipient in items:
+        try:
+            rendered.append((filename, render_one(template, key, recipient, fmt), None))
+        except Exception as e:
+            rendered.append((filename, None, f"{type(e).__name__}: {e}"))
+    return rendered
+
+
+# --- batch + ZIP stream ---------------------------------------------------------
+def template_key(template) -> str:
+    return hashlib.sha256(json.dumps(template, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+
+def _filenames(recipients, fmt: str):
+    seen = {}
+    for index, recipient in enumerate(recipients, start=1):
+        # Unicode letters and digits stay ("José", "李雷"); NFC so accents are not split off as marks
+        name = unicodedata.normalize("NFC", recipient["name"])
+        stem = re.sub(r"[^\w.-]+", "_", name).strip("._")[:60] or f"certificate_{index}"
+        count = seen[stem.casefold()] = seen.get(stem.casefold(), 0) + 1
+        yield f"{stem}_{count}.{fmt}" if count > 1 else f"{stem}.{fmt}"
+
+
+class _ZipStream(io.RawIOBase):
+    """Write-only sink that hands zipfile's output to the response as it is produced."""
+
+    def __init__(self):
+        self._buffer = bytearray()
+        self._written = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._buffer.extend(data)
+        self._written += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._written
+
+    def drain(self) -> bytes:
+        data, self._buffer = bytes(self._buffer), bytearray()
+        return data
+
+
+def stream_zip(template, recipients, fmt: str = "png"):
+    """Iterator over the bytes of a ZIP with one certificate per recipient, in input order.
+
+    Blocks until the first chunk is rendered and raises RenderError if it
+    fails, so call it before the response starts.
+    """
+    key = template_key(template)
+    items = list(zip(_filenames(recipients, fmt), recipients))
+    chunks = iter([items[i:i + CHUNK_SIZE] for i in range(0, len(items), CHUNK_SIZE)])
+    pool = _get_pool()
+    pending = deque()
+
+    def submit_next():
+        chunk = next(chunks, None)
+        if chunk is not None:
+            pending.append((chunk, pool.submit(render_chunk, template, key, chunk, fmt)))
+
+    for _ in range(max(1, CERT_RENDER_WORKERS * 2)):
+        submit_next()
+    try:
+        first = pending.popleft()[1].result()
+    except Exception as e:
+        for _, future in pending:
+            future.cancel()
+        raise RenderError(f"Template could not be rendered: {type(e).__name__}: {e}")
+    submit_next()
+    return _zip_chunks(first, pending, submit_next)
+
+
+def _zip_chunks(rendered, pending, submit_next):
+    sink = _ZipStream()
+    errors = []
+    try:
+        with zipfile.ZipFile(sink, "w", compression=zipfile.ZIP_STORED) as archive:
+            while True:
+                for filename, data, error in rendered:
+                    if error is None:
+                        archive.writestr(filename, data)
+                    else:
+                        errors.append(f"{filename}: {error}")
+                yield sink.drain()
+                if not pending:
+                    break
+                chunk, future = pending.popleft()
+                try:
+                    rendered = future.result()
+                except Exception as e:
+                    rendered = [(filename, None, f"{type(e).__name__}: {e}") for filename, _ in chunk]
+                submit_next()
+            if errors:
+                archive.writestr("errors.txt", "\n".join(errors) + "\n")
+        yield sink.drain()
+    finally:
+        # A client that disconnects mid-download should not keep the pool busy
+        for _, future in pending:
+            future.cancel()
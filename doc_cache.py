@@ -0,0 +1,162 @@
+"""
+Content-addressed on-disk cache for uploaded documents.
+
+Uploads are identified by the SHA-256 of their bytes, so re-uploading the
+same PDF or photo under any file name finds the earlier results. Two kinds
+of entries are stored as small JSON files: the extracted text (keyed by hash
+and extractor version) and the analysis JSON (keyed by hash, prompt template
+version and model). Writes are atomic, so several server workers can share
+the directory, and the cache is kept under DOC_CACHE_MB by evicting the
+least recently used entries (access time is tracked via mtime).
+
+Each process keeps a running total of the bytes it has written on top of
+the last directory scan, so a write does not list the whole directory. The
+directory is scanned again only when that total passes the limit, or when
+the last scan is older than DOC_CACHE_RESCAN_SECONDS, because other
+workers' writes are not in this process's total. Eviction then brings the
+cache down to EVICT_TO of the limit, so writes near the cap do not rescan
+every time.
+"""
+
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+import metrics
+
+DOC_CACHE_DIR = Path(os.getenv("DOC_CACHE_DIR", Path(__file__).resolve().parent / "data" / "cache" / "documents"))
+DOC_CACHE_MAX_BYTES = int(float(os.getenv("DOC_CACHE_MB", "200")) * 1024 * 1024)
+HASH_CHUNK = 1024 * 1024
+RESCAN_SECONDS = float(os.getenv("DOC_CACHE_RESCAN_SECONDS", "300"))
+# Fraction of the limit eviction brings the cache down to
+EVICT_TO = 0.9
+
+
+def content_hash(source) -> str:
+    """SHA-256 hex digest of bytes or a seekable file/mmap, read in chunks."""
+    digest = hashlib.sha256()
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        digest.update(source)
+        return digest.hexdigest()
+    source.seek(0)
+    while True:
+        chunk = source.read(HASH_CHUNK)
+        if not chunk:
+            break
+        digest.update(chunk)
+    source.seek(0)
+    return digest.hexdigest()
+
+
+class DiskCache:
+    """JSON values in one file per key, bounded by total size with LRU eviction."""
+
+    def __init__(self, directory: Path, max_bytes: int, name: str = "disk"):
+        self.directory = Path(directory)
+        self.max_bytes = max_bytes
+        self.name = name
+        self._lock = threading.Lock()
+        self._total = None  # bytes on disk as of the last scan, plus our writes since
+        self._scanned_at = 0.0
+
+    def _path(self, key: str) -> Path:
+        digest = hashlib.sha256(key.encode("utf-8")).hexdigest()
+        return self.directory / digest[:2] / f"{digest}.json"
+
+    def get(self, key: str, cache: str | None = None):
+        path = self._path(key)
+        try:
+            value = json.loads(path.read_text(encoding="utf-8"))
+            os.utime(path)  # mark as recently used
+        except (OSError, ValueError):
+            value = None
+        metrics.record_cache(cache or self.name, value is not None)
+        return value
+
+    def set(self, key: str, value):
+        path = self._path(key)
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            fd, tmp = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(value, f, ensure_ascii=False)
+            size = os.path.getsize(tmp)
+            replaced = _size(path)
+            os.replace(tmp, path)
+        except OSError as e:
+            print(f"[CACHE] write failed for {self.name}: {e}")
+            return
+        self._added(size - replaced)
+
+    def delete(self, key: str):
+        path = self._path(key)
+        size = _size(path)
+        try:
+            path.unlink()
+        except OSError:
+            return
+        self._added(-size)
+
+    def _added(self, delta: int):
+        with self._lock:
+            if self._total is not None:
+                self._total += delta
+            stale = time.monotonic() - self._scanned_at > RESCAN_SECONDS
+            if self._total is None or stale or self._total > self.max_bytes:
+                self._evict()
+
+    def _evict(self):
+        """Rescan the directory and drop LRU entries if it is over the limit (caller holds the lock)."""
+        entries = []
+        total = 0
+        for path in self.directory.glob("*/*.json"):
+            try:
+                stat = path.stat()
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+            total += stat.st_size
+        if total > self.max_bytes:
+            entries.sort()
+            for _, size, path in entries:
+                if total <= self.max_bytes * EVICT_TO:
+                    break
+                try:
+                    path.unlink()
+                    total -= size
+                except OSError:
+                    pass
+        self._total = total
+        self._scanned_at = time.monotonic()
+
+
+def _size(path: Path) -> int:
+    try:
+        return path.stat().st_size
+    except OSError:
+        return 0
+
+
+_cache = DiskCache(DOC_CACHE_DIR, DOC_CACHE_MAX_BYTES, name="documents")
+
+
+def get_text(digest: str, extractor: str):
+    value = _cache.get(f"text:{extractor}:{digest}", cache="document_text")
+    return value.get("text") if isinstance(value, dict) else None
+
+
+def set_text(digest: str, extractor: str, text: str):
+    _cache.set(f"text:{extractor}:{digest}", {"text": text})
+
+
+def get_analysis(digest: str, template: str, model: str):
+    value = _cache.get(f"analysis:{template}:{model}:{digest}", cache="document_analysis")
+    return value if isinstance(value, dict) else None
+
+
+def set_analysis(digest: str, template: str, model: str, result: dict):
+    _cache.set(f"analysis:{template}:{model}:{digest}", result)
@@ -0,0 +1,209 @@
+"""
+Split long documents into token-budgeted chunks and merge per-chunk analyses.
+
+analyze_document used to send only the first 4000 characters to the model.
+Documents are now cut on page boundaries (extractors separate pages with a
+form feed) and, inside a page, on heading-like lines, then packed greedily
+into chunks of at most ANALYZE_CHUNK_TOKENS. Each chunk is analysed on its
+own and the results are merged back into one title/layout/sections answer:
+the title comes from the first chunk that has one, layout fields are voted,
+and a section that continues across a chunk boundary is joined back up.
+
+Chunk size is fixed, and so is the route's prompt budget, which is derived
+from it plus the instruction text around a chunk. That way no chunk is
+trimmed on the way to the model. A document that needs more than
+ANALYZE_MAX_CHUNKS chunks raises DocumentTooLarge instead of being cut.
+"""
+
+import os
+import re
+from collections import Counter
+
+import prompt_budget
+
+ANALYZE_CHUNK_TOKENS = int(os.getenv("ANALYZE_CHUNK_TOKENS", "3000"))
+# One upload never fans out to more model calls than this
+ANALYZE_MAX_CHUNKS = int(os.getenv("ANALYZE_MAX_CHUNKS", "16"))
+ANALYZE_OUTPUT_TOKENS = 1200
+# Slack for tokenizer drift between a chunk's measured parts and the joined text
+PROMPT_MARGIN = 64
+PAGE_BREAK = "\f"
+CHARS_PER_TOKEN = prompt_budget.CHARS_PER_TOKEN
+
+_NUMBERED_RE = re.compile(r"^\d+\.")
+_CONTINUED_RE = re.compile(r"^\(?(continued|cont\.?)\)?$", re.IGNORECASE)
+
+
+class DocumentTooLarge(ValueError):
+    """The document needs more than the allowed number of chunks."""
+
+
+def analyze_prompt(text: str, index: int = 0, total: int = 1) -> str:
+    """The analyze_document prompt for one chunk."""
+    part = ""
+    if total > 1:
+        part = f"""
+This is part {index + 1} of {total} of a longer document. Only describe the text below. If it starts in the middle of a section, give that first section the heading "(continued)".
+"""
+    return f"""
+Analyze the following activity report document text. Extract the main title, detect the layout structure (alignment, formatting), and break it down into logical sections with headings and content.
+{part}
+Document Text:
+{text}
+
+Respond in JSON format:
+{{
+  "title": "Main Title",
+  "layout": {{
+    "alignment": "left|center|right",
+    "hasHeader": true|false,
+    "hasFooter": true|false,
+    "fontStyle": "formal|casual|academic"
+  }},
+  "sections": [
+    {{"heading": "Section Heading", "content": "Section content here."}},
+    ...
+  ]
+}}
+"""
+
+
+def prompt_tokens_needed(chunk_tokens: int = ANALYZE_CHUNK_TOKENS) -> int:
+    """Prompt budget that fits a full chunk plus its instructions and chat framing."""
+    instructions = prompt_budget.count_tokens(analyze_prompt("", ANALYZE_MAX_CHUNKS - 1, ANALYZE_MAX_CHUNKS))
+    return chunk_tokens + instructions + prompt_budget.MESSAGE_OVERHEAD + prompt_budget.REPLY_PRIMER + PROMPT_MARGIN
+
+
+# The route's prompt budget follows the chunk size, so chunks are never trimmed
+prompt_budget.ENDPOINT_BUDGETS["/api/ai/analyze_document"] = (prompt_tokens_needed(), ANALYZE_OUTPUT_TOKENS)
+prompt_budget.STRICT_ENDPOINTS.add("/api/ai/analyze_document")
+
+
+def estimate_tokens(text: str) -> int:
+    return prompt_budget.count_tokens(text)
+
+
+def is_heading(line: str) -> bool:
+    """Same heuristic as the local fallback parser: numbered, all caps, or a short line without a full stop."""
+    line = line.strip()
+    if not line:
+        return False
+    return bool(_NUMBERED_RE.match(line)) or line.isupper() or (len(line) < 50 and not line.endswith("."))
+
+
+def _blocks(page: str):
+    """Yield heading-led blocks of a page."""
+    current = []
+    for line in page.split("\n"):
+        if is_heading(line) and any(l.strip() for l in current):
+            yield "\n".join(current)
+            current = []
+        current.append(line)
+    if any(l.strip() for l in current):
+        yield "\n".join(current)
+
+
+def _split_oversized(block: str, budget: int):
+    """Break a block that alone exceeds the budget on lines, then on characters."""
+    max_chars = budget * CHARS_PER_TOKEN
+    piece = []
+    size = 0
+    for line in block.split("\n"):
+        while len(line) > max_chars:
+            if piece:
+                yield "\n".join(piece)
+                piece, size = [], 0
+            yield line[:max_chars]
+            line = line[max_chars:]
+        if size + len(line) + 1 > max_chars and piece:
+            yield "\n".join(piece)
+            piece, size = [], 0
+        piece.append(line)
+        size += len(line) + 1
+    if piece:
+        yield "\n".join(piece)
+
+
+def _fit_tokens(pieces, budget: int):
+    """Re-cut pieces the chars-per-token estimate got wrong (e.g. CJK text) until each fits."""
+    for piece in pieces:
+        tokens = estimate_tokens(piece)
+        while tokens > budget:
+            cut = max(1, len(piece) * budget // tokens)
+            yield piece[:cut]
+            piece = piece[cut:]
+            tokens = estimate_tokens(piece)
+        if piece:
+            yield piece
+
+
+def split_document(text: str, budget: int = ANALYZE_CHUNK_TOKENS, max_chunks: int = ANALYZE_MAX_CHUNKS) -> list[str]:
+    """Pack page/heading blocks into chunks of at most `budget` estimated tokens.
+
+    Raises DocumentTooLarge when the text needs more than `max_chunks` chunks.
+    """
+    total = estimate_tokens(text)
+    if total <= budget:
+        return [text]
+    if total > budget * max_chunks:
+        raise DocumentTooLarge(f"document is about {total} tokens; at most {budget * max_chunks} can be analyzed")
+
+    units = []
+    for page in text.split(PAGE_BREAK):
+        for block in _blocks(page):
+            if estimate_tokens(block) > budget:
+                units.extend(_fit_tokens(_split_oversized(block, budget), budget))
+            else:
+                units.append(block)
+
+    chunks = []
+    current = []
+    used = 0
+    for unit in units:
+        cost = estimate_tokens(unit) + 1
+        if current and used + cost > budget:
+            chunks.append("\n".join(current))
+            current, used = [], 0
+        current.append(unit)
+        used += cost
+    if current:
+        chunks.append("\n".join(current))
+    if len(chunks) > max_chunks:
+        # Page and heading boundaries left too much slack in the chunks
+        raise DocumentTooLarge(f"document needs {len(chunks)} chunks; at most {max_chunks} can be analyzed")
+    return chunks
+
+
+def _vote(values, default):
+    values = [v for v in values if v not in (None, "")]
+    if not values:
+        return default
+    return Counter(values).most_common(1)[0][0]
+
+
+def merge_analyses(results: list[dict], default_title: str = "Activity Report") -> dict:
+    """Merge per-chunk {title, layout, sections} results, given in document order."""
+    title = next((r.get("title") for r in results if isinstance(r.get("title"), str) and r.get("title").strip()), default_title)
+
+    layouts = [r.get("layout") or {} for r in results]
+    layout = {
+        "alignment": _vote([l.get("alignment") for l in layouts], "left"),
+        "fontStyle": _vote([l.get("fontStyle") for l in layouts], "formal"),
+        # A header can only show up in the first chunk, a footer in the last
+        "hasHeader": bool(layouts[0].get("hasHeader")) if layouts else False,
+        "hasFooter": bool(layouts[-1].get("hasFooter")) if layouts else False,
+    }
+
+    sections = []
+    for result in results:
+        for section in result.get("sections") or []:
+            if not isinstance(section, dict):
+                continue
+            heading = str(section.get("heading") or "").strip()
+            content = str(section.get("content") or "").strip()
+            if sections and (not heading or _CONTINUED_RE.match(heading) or heading.lower() == sections[-1]["heading"].lower()):
+                sections[-1]["content"] = (sections[-1]["content"] + " " + content).strip()
+                continue
+            sections.append({"heading": heading or "Content", "content": content})
+
+    return {"title": title, "layout": layout, "sections": sections}
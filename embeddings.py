@@ -0,0 +1,328 @@
+"""
+Shared in-process text embedding service.
+
+One sentence-transformers model (EMBED_MODEL) is loaded once, lazily, for
+every feature that needs embeddings: the summarizer and graph builder, the
+mode classifier, semantic caching and similarity search. The pieces:
+
+- Micro-batching. Concurrent encode() calls from route threads are queued
+  and one worker thread encodes them together. It waits up to
+  EMBED_BATCH_WAIT_MS for more texts, or until EMBED_BATCH_SIZE is reached.
+  One batched forward pass is much cheaper than many small ones.
+- Vector cache. Vectors are cached by SHA-256 of the text in a bounded
+  float16 ring of EMBED_CACHE_ENTRIES rows (about 0.75 KB per 384-d vector).
+  With EMBED_CACHE_DIR set the ring is a memory-mapped file shared by all
+  workers and kept across restarts; writes take a file lock, and the rows of
+  another model are ignored.
+- Collections. Named in-memory collections of (id, vector, payload) support
+  top-k cosine search, using one matrix product and argpartition.
+
+Vectors are float32 and unit length. encode() returns None when the model
+cannot be loaded; callers keep their own fallback (e.g. TF-IDF vectors).
+"""
+
+import hashlib
+import os
+import threading
+import time
+from concurrent.futures import Future
+from contextlib import contextmanager
+from pathlib import Path
+from queue import Empty, Queue
+
+import metrics
+
+try:
+    import numpy as np
+except Exception:
+    np = None
+
+EMBED_MODEL = os.getenv("EMBED_MODEL", os.getenv("MINDMAP_EMBED_MODEL", "all-MiniLM-L6-v2"))
+EMBED_BATCH_SIZE = int(os.getenv("EMBED_BATCH_SIZE", "64"))
+EMBED_BATCH_WAIT = float(os.getenv("EMBED_BATCH_WAIT_MS", "5")) / 1000
+EMBED_CACHE_ENTRIES = int(os.getenv("EMBED_CACHE_ENTRIES", "20000"))
+EMBED_CACHE_DIR = os.getenv("EMBED_CACHE_DIR", "")
+
+
+def text_hash(text: str) -> bytes:
+    return hashlib.sha256((text or "").encode("utf-8")).digest()
+
+
+class VectorCache:
+    """Bounded text-hash -> float16 vector store; the oldest row is overwritten when full.
+
+    With a directory, vectors, keys and the write cursor live in memory-mapped
+    files, so they survive restarts and are shared by every worker process.
+    The files are named after the model, so switching models starts a fresh
+    cache. Writes take an exclusive file lock. Each process keeps its own
+    key -> row index, so a row may have been overwritten by another worker
+    since; reads check the row's key after copying the vector and treat a
+    mismatch as a miss.
+    """
+
+    def __init__(self, dim: int, capacity: int = EMBED_CACHE_ENTRIES, directory: str = EMBED_CACHE_DIR, model: str = EMBED_MODEL):
+        self.dim = dim
+        self.capacity = capacity
+        self._lock = threading.Lock()
+        self._lock_file = None
+        if directory:
+            base = Path(directory)
+            base.mkdir(parents=True, exist_ok=True)
+            stem = hashlib.sha256(f"{model}:{dim}".encode("utf-8")).hexdigest()[:12]
+            self._lock_file = open(base / f"{stem}.lock", "a+b")
+            with self._shared_lock():
+                self.vectors = self._memmap(base / f"{stem}.f16", np.float16, (capacity, dim))
+                self.keys = self._memmap(base / f"{stem}.keys", "S32", (capacity,))
+                new_cursor = not (base / f"{stem}.cursor").exists()
+                self.cursor = self._memmap(base / f"{stem}.cursor", np.int64, (1,))
+                self._rows = {bytes(key): row for row, key in enumerate(self.keys) if any(key)}
+                if new_cursor:
+                    # Caches written before the cursor was persisted
+                    self.cursor[0] = max(self._rows.values(), default=-1) + 1
+        else:
+            self.vectors = np.zeros((capacity, dim), dtype=np.float16)
+            self.keys = np.zeros(capacity, dtype="S32")
+            self.cursor = np.zeros(1, dtype=np.int64)
+            self._rows = {}
+
+    @staticmethod
+    def _memmap(path: Path, dtype, shape):
+        mode = "r+" if path.exists() and path.stat().st_size == np.dtype(dtype).itemsize * int(np.prod(shape)) else "w+"
+        return np.memmap(path, dtype=dtype, mode=mode, shape=shape)
+
+    @staticmethod
+    def _key(key: bytes) -> bytes:
+        # S32 cells drop trailing NUL bytes; compare keys in that form
+        return key.rstrip(b"\0")
+
+    @contextmanager
+    def _shared_lock(self):
+        """Exclusive lock across processes sharing the cache files (no-op in memory)."""
+        if self._lock_file is None:
+            yield
+            return
+        if os.name == "nt":
+            import msvcrt
+            self._lock_file.seek(0)
+            msvcrt.locking(self._lock_file.fileno(), msvcrt.LK_LOCK, 1)
+            try:
+                yield
+            finally:
+                self._lock_file.seek(0)
+                msvcrt.locking(self._lock_file.fileno(), msvcrt.LK_UNLCK, 1)
+        else:
+            import fcntl
+            fcntl.flock(self._lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(self._lock_file, fcntl.LOCK_UN)
+
+    def get(self, key: bytes):
+        key = self._key(key)
+        with self._lock:
+            row = self._rows.get(key)
+            if row is None:
+                return None
+            vector = self.vectors[row].astype(np.float32)
+            if bytes(self.keys[row]) != key:
+                # Another worker reused the row
+                self._rows.pop(key, None)
+                return None
+        # float16 rounding leaves the vector slightly off unit length
+        return vector / max(float(np.linalg.norm(vector)), 1e-12)
+
+    def put(self, key: bytes, vector):
+        key = self._key(key)
+        with self._lock, self._shared_lock():
+            row = self._rows.get(key)
+            if row is None or bytes(self.keys[row]) != key:
+                row = int(self.cursor[0]) % self.capacity
+                self.cursor[0] += 1
+                self._rows.pop(bytes(self.keys[row]), None)
+                self._rows[key] = row
+            # Clear the key while the vector is written, so readers never pair it with a half-written row
+            self.keys[row] = b""
+            self.vectors[row] = vector
+            self.keys[row] = key
+
+    def __len__(self):
+        return len(self._rows)
+
+
+class Collection:
+    """Named set of unit vectors with ids and payloads, searchable by cosine similarity."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.ids, self.payloads = [], []
+        self.matrix = None
+        self._index = {}
+        self._lock = threading.Lock()
+
+    def add(self, ids, vectors, payloads=None):
+        """Add or replace items; `vectors` are unit vectors (n x dim)."""
+        vectors = np.asarray(vectors, dtype=np.float32)
+        payloads = payloads if payloads is not None else [None] * len(ids)
+        with self._lock:
+            new_rows = []
+            for item_id, vector, payload in zip(ids, vectors, payloads):
+                row = self._index.get(item_id)
+                if row is None:
+                    self._index[item_id] = len(self.ids) + len(new_rows)
+                    new_rows.append((item_id, vector, payload))
+                else:
+                    self.matrix[row] = vector
+                    self.payloads[row] = payload
+            if new_rows:
+                self.ids.extend(r[0] for r in new_rows)
+                self.payloads.extend(r[2] for r in new_rows)
+                block = np.vstack([r[1] for r in new_rows])
+                self.matrix = block if self.matrix is None else np.vstack([self.matrix, block])
+
+    def remove(self, item_id):
+        with self._lock:
+            row = self._index.pop(item_id, None)
+            if row is None:
+                return
+            self.matrix = np.delete(self.matrix, row, axis=0)
+            del self.ids[row], self.payloads[row]
+            self._index = {i: r for r, i in enumerate(self.ids)}
+
+    def search(self, vector, k: int = 5, min_score: float = -1.0):
+        """Top-k (id, score, payload) by cosine similarity, best first."""
+        with self._lock:
+            if self.matrix is None or not len(self.ids):
+                return []
+            scores = self.matrix @ np.asarray(vector, dtype=np.float32)
+            k = min(k, len(scores))
+            top = np.argpartition(-scores, k - 1)[:k]
+            top = top[np.argsort(-scores[top], kind="stable")]
+            return [(self.ids[i], float(scores[i]), self.payloads[i]) for i in top if scores[i] >= min_score]
+
+    def __len__(self):
+        return len(self.ids)
+
+
+class EmbeddingService:
+    def __init__(self, model_name: str = EMBED_MODEL):
+        self.model_name = model_name
+        self.cache = None
+        self._model = None
+        self._model_failed = False
+        self._model_lock = threading.Lock()
+        self._queue = Queue()
+        self._worker = None
+        self._collections = {}
+        self._lock = threading.Lock()
+
+    def model(self):
+        """The sentence-transformers model, loaded once; None if it cannot be loaded."""
+        if self._model is not None or self._model_failed:
+            return self._model
+        with self._model_lock:
+            if self._model is None and not self._model_failed:
+                try:
+                    from sentence_transformers import SentenceTransformer
+                    model = SentenceTransformer(self.model_name)
+                    self.cache = VectorCache(model.get_sentence_embedding_dimension())
+                    self._model = model
+                except Exception as e:
+                    print(f"[EMBED] model {self.model_name} unavailable: {e}")
+                    self._model_failed = True
+        return self._model
+
+    def available(self) -> bool:
+        return np is not None and self.model() is not None
+
+    # --- micro-batching ---------------------------------------------------------
+    def _start_worker(self):
+        with self._lock:
+            if self._worker is None:
+                self._worker = threading.Thread(target=self._run, name="embedding-batcher", daemon=True)
+                self._worker.start()
+
+    def _run(self):
+        while True:
+            jobs = [self._queue.get()]
+            size = len(jobs[0][0])
+            deadline = time.monotonic() + EMBED_BATCH_WAIT
+            while size < EMBED_BATCH_SIZE:
+                try:
+                    job = self._queue.get(timeout=max(deadline - time.monotonic(), 0))
+                except Empty:
+                    break
+                jobs.append(job)
+                size += len(job[0])
+            texts = [text for batch, _ in jobs for text in batch]
+            try:
+                with metrics.MODEL_INFERENCE.labels("embed").time():
+                    vectors = self._model.encode(texts, batch_size=EMBED_BATCH_SIZE, normalize_embeddings=True, convert_to_numpy=True)
+                vectors = np.asarray(vectors, dtype=np.float32)
+            except Exception as e:
+                for _, future in jobs:
+                    future.set_exception(e)
+                continue
+            start = 0
+            for batch, future in jobs:
+                future.set_result(vectors[start:start + len(batch)])
+                start += len(batch)
+
+    # --- public API -------------------------------------------------------------
+    def encode(self, texts):
+        """Unit float32 vectors (n x dim) for `texts`, or None if no model is available."""
+        texts = list(texts)
+        if not self.available():
+            return None
+        if not texts:
+            return np.zeros((0, self.cache.dim), dtype=np.float32)
+        keys = [text_hash(t) for t in texts]
+        out = np.zeros((len(texts), self.cache.dim), dtype=np.float32)
+        missing = {}
+        for i, key in enumerate(keys):
+            vector = self.cache.get(key)
+            metrics.record_cache("embeddings", vector is not None)
+            if vector is None:
+                missing.setdefault(key, []).append(i)
+            else:
+                out[i] = vector
+        if missing:
+            self._start_worker()
+            future = Future()
+            self._queue.put(([texts[rows[0]] for rows in missing.values()], future))
+            for (key, rows), vector in zip(missing.items(), future.result()):
+                self.cache.put(key, vector)
+                out[rows] = vector
+        return out
+
+    def collection(self, name: str) -> Collection:
+        with self._lock:
+            if name not in self._collections:
+                self._collections[name] = Collection(name)
+            return self._collections[name]
+
+    def search(self, name: str, text: str, k: int = 5, min_score: float = -1.0):
+        """Top-k items of collection `name` most similar to `text`; [] without a model."""
+        vectors = self.encode([text])
+        if vectors is None:
+            return []
+        return self.collection(name).search(vectors[0], k, min_score)
+
+
+SERVICE = EmbeddingService()
+
+
+def available() -> bool:
+    return SERVICE.available()
+
+
+def encode(texts):
+    return SERVICE.encode(texts)
+
+
+def collection(name: str) -> Collection:
+    return SERVICE.collection(name)
+
+
+def search(name: str, text: str, k: int = 5, min_score: float = -1.0):
+    return SERVICE.search(name, text, k, min_score)
@@ -14,8 +14,22 @@ from datetime import datetime
 import uuid
 import tempfile
 from shutil import move
+import sys
 import time
 import random
+
+# Shared helpers (metrics, ...) live next to the unified server.py at the
+# workspace root; make them importable when this backend runs standalone too.
+_WORKSPACE_ROOT = Path(__file__).resolve().parents[2]
+if str(_WORKSPACE_ROOT) not in sys.path:
+    sys.path.insert(0, str(_WORKSPACE_ROOT))
+
+import json_extract
+import keywords
+import llm_schemas
+import metrics
+import prompt_budget
+
 try:
     # Load .env if present
     from dotenv import load_dotenv
@@ -36,27 +50,45 @@ if OPENAI_KEY:
         print('OpenAI library not available or failed to initialize:', _e)
 
 # Retry wrapper for OpenAI chat completions (handles 429 and transient errors)
-def _chat_completion_retry_ep(model, messages, max_tokens=None, temperature=0.2, retries=3):
+def _chat_completion_retry_ep(model, messages, max_tokens=None, temperature=0.2, retries=3, schema=None):
     if not openai_client:
         return None
+    endpoint = metrics.current_route()
+    messages, prompt_tokens = prompt_budget.fit_messages(messages, model, endpoint)
+    max_tokens = prompt_budget.output_tokens(prompt_tokens, model, endpoint, max_tokens)
+    started = time.perf_counter()
     delay = 1.0
     last_exc = None
-    for _ in range(retries):
-        try:
-            return openai_client.chat.completions.create(
-                model=model,
-                messages=messages,
-                temperature=temperature,
-                max_tokens=max_tokens
-            )
-        except Exception as e:
-            s = str(e).lower()
-            if ('rate limit' in s) or ('429' in s) or ('temporarily unavailable' in s) or ('timeout' in s) or ('overloaded' in s):
-                last_exc = e
-                time.sleep(delay + random.random() * 0.5)
-                delay = min(delay * 2, 8.0)
-                continue
-            raise
+    try:
+        for attempt in range(retries):
+            if attempt:
+                metrics.LLM_RETRIES.labels(endpoint, model).inc()
+            try:
+                response = openai_client.chat.completions.create(
+                    model=model,
+                    messages=messages,
+                    temperature=temperature,
+                    max_tokens=max_tokens,
+                    **llm_schemas.request_options(schema, model)
+                )
+            except Exception as e:
+                if schema and llm_schemas.rejected(e, model):
+                    last_exc = e
+                    continue
+                s = str(e).lower()
+                if ('rate limit' in s) or ('429' in s) or ('temporarily unavailable' in s) or ('timeout' in s) or ('overloaded' in s):
+                    last_exc = e
+                    time.sleep(delay + random.random() * 0.5)
+                    delay = min(delay * 2, 8.0)
+                    continue
+                metrics.LLM_REQUESTS.labels(endpoint, model, "error").inc()
+                raise
+            metrics.LLM_REQUESTS.labels(endpoint, model, "ok").inc()
+            metrics.record_llm_usage(endpoint, model, response, prompt_tokens)
+            return response
+    finally:
+        metrics.LLM_LATENCY.labels(endpoint, model).observe(time.perf_counter() - started)
+    metrics.LLM_REQUESTS.labels(endpoint, model, "error").inc()
     if last_exc:
         # give up; caller will handle None
         print('OpenAI retries exhausted:', last_exc)
@@ -203,20 +235,8 @@ if not EVENTS_FILE.exists():
     save_events({})
 
 # --- OpenAI helper: attempt to call and parse JSON output, otherwise return None ---
-def _clean_assistant_json(text: str) -> str:
-    t = text.strip()
-    # remove triple backticks if present
-    if t.startswith("```") and t.endswith("```"):
-        # remove surrounding fences
-        parts = t.split('\n', 1)
-        if len(parts) > 1 and parts[0].startswith('```'):
-            t = parts[1]
-            if t.endswith('```'):
-                t = t[:-3]
-    # strip stray backticks
-    return t.strip('`\n ')
-
-def try_openai_json(messages, model=OPENAI_MODEL, max_tokens=2000):
+def try_openai_json(messages, model=OPENAI_MODEL, max_tokens=2000, schema=llm_schemas.JSON_MODE):
+    """`schema` names an llm_schemas reply shape; open-ended replies use plain JSON mode."""
     if not openai_client:
         return None
     try:
@@ -224,13 +244,21 @@ def try_openai_json(messages, model=OPENAI_MODEL, max_tokens=2000):
             model=model,
             messages=messages,
             temperature=0.2,
-            max_tokens=max_tokens
+            max_tokens=max_tokens,
+            schema=schema
         )
         if response is None:
             return None
         content = response.choices[0].message.content
-        content_clean = _clean_assistant_json(content)
-        return json.loads(content_clean)
+        if schema in llm_schemas.SCHEMAS:
+            parsed = llm_schemas.parse(schema, content)
+            if parsed is None:
+                print(f'OpenAI reply does not match the {schema} schema')
+            return parsed
+        parsed = json_extract.extract_json(content)
+        if parsed is None:
+            print('OpenAI JSON parsing failed: no JSON value in response')
+        return parsed
     except Exception as e:
         print('OpenAI JSON parsing failed:', e)
         return None
@@ -248,7 +276,7 @@ Enhance and expand the following event plan using the provided basic event infor
 
 Basics: {basics.dict()}
 
-TemplateExample: {json.dumps(template_preview, ensure_ascii=False)}
+TemplateExample: {prompt_budget.fit_json(template_preview, 1500, OPENAI_MODEL)}
 
 Instructions:
 - Return a JSON object with the same keys as the TemplateExample.
@@ -257,11 +285,14 @@ Instructions:
     }
     return try_openai_json([system, user])
 
+# Components with a fixed reply shape; others are open-ended JSON
+COMPONENT_SCHEMAS = {'budget': 'budget_plan', 'schedule': 'schedule'}
+
 def openai_generate_component(component: str, basics: EventBasics, current_data: Optional[Dict[str, Any]] = None) -> Optional[Dict[str, Any]]:
     system = {'role': 'system', 'content': 'You are an expert event planner. Return ONLY valid JSON for the requested component. Do not include any extra text, explanations, or markdown.'}
     user_content = f"Generate a {component} for the following event basics: {basics.dict()}."
     if current_data:
-        user_content += f" Use the current data as context: {json.dumps(current_data, ensure_ascii=False)}"
+        user_content += f" Use the current data as context: {prompt_budget.fit_json(current_data, 1500, OPENAI_MODEL)}"
     if component == 'budget':
         user_content += f""" The event budget range is: {basics.budget or 'Not specified'}.
 
@@ -303,7 +334,7 @@ CRITICAL INSTRUCTIONS FOR SCHEDULE GENERATION:
 
 Return JSON with schedule_items (array of objects with title, start_time, end_time, description)."""
     user = {'role': 'user', 'content': user_content}
-    return try_openai_json([system, user])
+    return try_openai_json([system, user], schema=COMPONENT_SCHEMAS.get(component, llm_schemas.JSON_MODE))
 
 def extract_info_from_text(text: str) -> Dict[str, Any]:
     """Extract event information from natural language text"""
@@ -1115,17 +1146,12 @@ async def mindmap_classify(req: MindmapClassifyRequest):
                 {"role": "system", "content": "Extract concise topics from the user text. Return JSON: {\"topics\": [..]}"},
                 {"role": "user", "content": req.text}
             ]
-            result = try_openai_json(messages) or {"topics": []}
+            result = try_openai_json(messages, schema="topics") or {"topics": []}
             return {"success": True, "data": result}
         except Exception as e:
             raise HTTPException(status_code=500, detail=f"OpenAI classify failed: {e}")
-    # Fallback simple token-based keywords
-    tokens = [t.strip('.,;:!?').lower() for t in req.text.split() if len(t) > 4]
-    freq: Dict[str, int] = {}
-    for t in tokens:
-        freq[t] = freq.get(t, 0) + 1
-    topics = sorted(freq.keys(), key=lambda k: freq[k], reverse=True)[:10]
-    return {"success": True, "data": {"topics": topics}}
+    # Fallback: TF-IDF keyphrases from the shared keyword engine
+    return {"success": True, "data": {"topics": keywords.extract_keywords(req.text, 10)}}
 
 app.include_router(mindmap_api, prefix='/api/mindmap')
 
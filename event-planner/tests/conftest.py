@@ -0,0 +1,10 @@
+import sys
+from pathlib import Path
+
+# The shared server modules (json_extract, doc_chunking, ...) live at the repository root
+ROOT = Path(__file__).resolve().parents[2]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+# integration_test.py is a script run against a live server, not a pytest module
+collect_ignore = ["integration_test.py"]
@@ -0,0 +1,101 @@
+import asyncio
+import io
+import json
+import os
+import subprocess
+import sys
+import time
+import zipfile
+
+import pytest
+
+import batch_jobs
+
+
+@pytest.fixture
+def jobs(tmp_path):
+    return batch_jobs.BatchJobs(root=tmp_path, concurrency=2)
+
+
+def zip_bytes(members):
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w") as archive:
+        for name, data in members.items():
+            archive.writestr(name, data)
+    buffer.seek(0)
+    return buffer
+
+
+def test_create_expands_archives_and_skips_unsupported(jobs):
+    archive = zip_bytes({"a.txt": "one", "b.exe": "skip", "__MACOSX/c.txt": "skip", "sub/d.md": "two"})
+    record = jobs.create([("report.txt", io.BytesIO(b"hello")), ("bundle.zip", archive)])
+    assert record["status"] == "queued"
+    assert [d["name"] for d in record["documents"]] == ["report.txt", "a.txt", "sub/d.md"]
+    assert jobs.get(record["job_id"])["total"] == 3
+
+
+def test_create_rejects_empty_and_bad_archives(jobs, tmp_path):
+    with pytest.raises(batch_jobs.BatchError):
+        jobs.create([("notes.exe", io.BytesIO(b"x"))])
+    with pytest.raises(batch_jobs.BatchError):
+        jobs.create([("broken.zip", io.BytesIO(b"not a zip"))])
+    # Failed intake leaves nothing behind
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_unknown_and_malformed_job_ids(jobs):
+    with pytest.raises(KeyError):
+        jobs.get("missing")
+    with pytest.raises(KeyError):
+        jobs.get("../etc")
+
+
+def test_run_records_results_and_errors(jobs):
+    record = jobs.create([("good.txt", io.BytesIO(b"fine")), ("bad.txt", io.BytesIO(b"broken"))])
+    job_id = record["job_id"]
+
+    async def analyze(source, filename):
+        text = source.read().decode()
+        if text == "broken":
+            raise ValueError("unreadable")
+        return {"title": text}
+
+    async def run():
+        await jobs.start(job_id, analyze)
+        return [line async for line in jobs.stream_results(job_id)]
+
+    chunks = asyncio.run(run())
+    lines = [json.loads(line) for chunk in chunks for line in chunk.splitlines()]
+    by_name = {line["name"]: line for line in lines}
+    assert by_name["good.txt"]["result"] == {"title": "fine"}
+    assert by_name["bad.txt"]["error"] == "unreadable"
+    final = jobs.get(job_id)
+    assert (final["status"], final["completed"], final["failed"]) == ("done", 1, 1)
+
+
+def test_own_queued_job_without_a_task_is_interrupted(jobs):
+    record = jobs.create([("a.txt", io.BytesIO(b"x"))])
+    assert jobs.get(record["job_id"])["status"] == "interrupted"
+
+
+def test_pid_alive_never_signals_the_current_process():
+    assert batch_jobs._pid_alive(os.getpid()) is True
+    assert batch_jobs._pid_alive(None) is False
+
+
+def test_pid_alive_detects_exited_process():
+    child = subprocess.Popen([sys.executable, "-c", "pass"])
+    child.wait()
+    assert batch_jobs._pid_alive(child.pid) is False
+
+
+def test_sweep_removes_only_expired_finished_jobs(jobs):
+    old = jobs.create([("a.txt", io.BytesIO(b"x"))])["job_id"]
+    recent = jobs.create([("b.txt", io.BytesIO(b"y"))])["job_id"]
+    jobs._update(old, status="done")
+    jobs._update(recent, status="done")
+    stale = time.time() - 10 * 3600
+    os.utime(jobs.root / old / "job.json", (stale, stale))
+    assert jobs.sweep(max_age=3600) == 1
+    assert not (jobs.root / old).exists()
+    assert jobs.get(recent)["status"] == "done"
@@ -0,0 +1,86 @@
+import io
+import json
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+import certificate_render
+from certificate_render import RenderError, parse_recipients
+
+TEMPLATE = {"canvas": {"width": 400, "height": 300}, "suggested_elements": ["Certificate", "Awarded to"]}
+
+
+def test_csv_recipients_normalize_columns():
+    rows = parse_recipients("﻿Full Name,Course\nAda Lovelace,Math\n".encode("utf-8"), "people.csv")
+    assert rows == [{"full_name": "Ada Lovelace", "course": "Math", "name": "Ada Lovelace"}]
+
+
+def test_json_recipients():
+    assert [r["name"] for r in parse_recipients(json.dumps([{"Name": "A"}, "B"]).encode())] == ["A", "B"]
+    assert [r["name"] for r in parse_recipients(json.dumps({"recipients": [{"recipient": "C"}]}).encode())] == ["C"]
+
+
+@pytest.mark.parametrize("data, message", [
+    (b"", "No recipients"),
+    (b"name,course\n", "No recipients"),
+    (b"course\nMath\n", "Recipient 1 has no name"),
+    (b"[1,", "invalid"),
+    (b'{"recipients": 5}', "list of objects"),
+])
+def test_invalid_recipients(data, message):
+    with pytest.raises(RenderError, match=message):
+        parse_recipients(data)
+
+
+def test_recipient_limit(monkeypatch):
+    monkeypatch.setattr(certificate_render, "CERT_BATCH_MAX", 2)
+    with pytest.raises(RenderError, match="Too many"):
+        parse_recipients(b"name\na\nb\nc\n")
+
+
+def test_filenames_keep_unicode_and_deduplicate():
+    names = ["José", "José", "李雷", "Ann Lee", "ann lee", "../..", "!!!"]
+    assert list(certificate_render._filenames([{"name": n} for n in names], "png")) == [
+        "José.png", "José_2.png", "李雷.png", "Ann_Lee.png", "ann_lee_2.png", "certificate_6.png", "certificate_7.png",
+    ]
+
+
+@pytest.fixture
+def thread_pool(monkeypatch):
+    if not certificate_render.available():
+        pytest.skip("needs Pillow")
+    pool = ThreadPoolExecutor(max_workers=2)
+    monkeypatch.setattr(certificate_render, "_get_pool", lambda: pool)
+    monkeypatch.setattr(certificate_render, "CHUNK_SIZE", 2)
+    yield pool
+    pool.shutdown()
+
+
+def archive(stream):
+    return zipfile.ZipFile(io.BytesIO(b"".join(stream)))
+
+
+def test_stream_zip_renders_every_recipient(thread_pool):
+    recipients = [{"name": f"Person {i}"} for i in range(5)]
+    names = archive(certificate_render.stream_zip(TEMPLATE, recipients)).namelist()
+    assert names == [f"Person_{i}.png" for i in range(5)]
+
+
+def test_broken_template_raises_before_streaming(thread_pool):
+    with pytest.raises(RenderError, match="Template could not be rendered"):
+        certificate_render.stream_zip({**TEMPLATE, "layout": "fancy"}, [{"name": "A"}])
+
+
+def test_recipient_failures_are_listed_in_errors_txt(thread_pool, monkeypatch):
+    real_render_one = certificate_render.render_one
+
+    def render_one(template, key, recipient, fmt="png"):
+        if recipient["name"] == "Bad":
+            raise ValueError("cannot draw")
+        return real_render_one(template, key, recipient, fmt)
+
+    monkeypatch.setattr(certificate_render, "render_one", render_one)
+    zipped = archive(certificate_render.stream_zip(TEMPLATE, [{"name": n} for n in ("A", "B", "Bad", "C")]))
+    assert zipped.namelist() == ["A.png", "B.png", "C.png", "errors.txt"]
+    assert zipped.read("errors.txt").decode() == "Bad.png: ValueError: cannot draw\n"
@@ -0,0 +1,63 @@
+import doc_cache
+
+
+def make_cache(tmp_path, max_bytes):
+    return doc_cache.DiskCache(tmp_path, max_bytes, name="test")
+
+
+def test_round_trip(tmp_path):
+    cache = make_cache(tmp_path, 1 << 20)
+    cache.set("a", {"text": "hello"})
+    assert cache.get("a") == {"text": "hello"}
+    cache.delete("a")
+    assert cache.get("a") is None
+
+
+def test_content_hash_matches_for_bytes_and_files(tmp_path):
+    path = tmp_path / "doc.bin"
+    path.write_bytes(b"x" * (doc_cache.HASH_CHUNK + 5))
+    with open(path, "rb") as f:
+        assert doc_cache.content_hash(f) == doc_cache.content_hash(path.read_bytes())
+        assert f.tell() == 0
+
+
+def test_writes_do_not_rescan_below_the_limit(tmp_path, monkeypatch):
+    cache = make_cache(tmp_path, 1 << 20)
+    scans = []
+    real_evict = cache._evict
+    monkeypatch.setattr(cache, "_evict", lambda: (scans.append(1), real_evict()))
+    for i in range(50):
+        cache.set(f"k{i}", {"text": "x" * 100})
+    assert len(scans) == 1  # the first write establishes the total
+
+
+def test_total_tracks_overwrites_and_deletes(tmp_path):
+    cache = make_cache(tmp_path, 1 << 20)
+    cache.set("a", {"text": "x" * 100})
+    cache.set("a", {"text": "x" * 10})
+    cache.set("b", {"text": "y" * 10})
+    cache.delete("b")
+    assert cache._total == sum(p.stat().st_size for p in tmp_path.glob("*/*.json"))
+
+
+def test_evicts_least_recently_used_below_the_limit(tmp_path):
+    entry = len('{"text": ""}') + 1000
+    cache = make_cache(tmp_path, entry * 10)
+    for i in range(12):
+        cache.set(f"k{i}", {"text": "x" * 1000})
+    sizes = [p.stat().st_size for p in tmp_path.glob("*/*.json")]
+    assert sum(sizes) <= cache.max_bytes
+    assert len(sizes) < 12
+    assert cache.get("k11") is not None
+    assert cache.get("k0") is None
+
+
+def test_rescans_after_the_interval(tmp_path, monkeypatch):
+    cache = make_cache(tmp_path, 1 << 20)
+    cache.set("a", {"text": "x"})
+    # Another worker's write is invisible until the periodic rescan
+    other = make_cache(tmp_path, 1 << 20)
+    other.set("b", {"text": "y" * 1000})
+    monkeypatch.setattr(doc_cache, "RESCAN_SECONDS", 0)
+    cache.set("c", {"text": "z"})
+    assert cache._total == sum(p.stat().st_size for p in tmp_path.glob("*/*.json"))
@@ -0,0 +1,70 @@
+import pytest
+
+import doc_chunking
+
+PARAGRAPH = "Lorem ipsum dolor sit amet consectetur adipiscing elit sed do eiusmod tempor. " * 12
+
+
+def make_document(pages: int) -> str:
+    page = "\n".join(f"SECTION {i}\n{PARAGRAPH}\n{PARAGRAPH}" for i in range(3))
+    return doc_chunking.PAGE_BREAK.join([page] * pages)
+
+
+def test_short_document_is_one_chunk():
+    assert doc_chunking.split_document("TITLE\nA short report.") == ["TITLE\nA short report."]
+
+
+def test_chunks_never_exceed_the_fixed_budget():
+    text = make_document(30)
+    chunks = doc_chunking.split_document(text, budget=3000, max_chunks=16)
+    assert 1 < len(chunks) <= 16
+    assert max(doc_chunking.estimate_tokens(c) for c in chunks) <= 3000
+
+
+def test_chunk_size_does_not_grow_with_the_document():
+    small = doc_chunking.split_document(make_document(10), budget=1000, max_chunks=100)
+    large = doc_chunking.split_document(make_document(40), budget=1000, max_chunks=100)
+    assert len(large) > len(small)
+    assert max(doc_chunking.estimate_tokens(c) for c in large) <= 1000
+
+
+def test_document_over_the_token_limit_is_rejected():
+    with pytest.raises(doc_chunking.DocumentTooLarge):
+        doc_chunking.split_document(make_document(40), budget=1000, max_chunks=4)
+
+
+def test_chunk_count_limit_is_enforced_after_packing():
+    # Just under budget * max_chunks tokens, but blocks cannot be packed that tightly
+    text = "\f".join(["HEADING\n" + "x" * 2200] * 10)
+    with pytest.raises(doc_chunking.DocumentTooLarge):
+        doc_chunking.split_document(text, budget=1000, max_chunks=6)
+
+
+def test_oversized_lines_are_split():
+    chunks = doc_chunking.split_document("y" * 50000, budget=1000, max_chunks=20)
+    assert "".join(chunks) == "y" * 50000
+    assert max(doc_chunking.estimate_tokens(c) for c in chunks) <= 1000
+
+
+def test_no_text_is_lost():
+    text = make_document(12)
+    chunks = doc_chunking.split_document(text, budget=1500, max_chunks=50)
+    assert sorted("".join(chunks).split()) == sorted(text.split())
+
+
+def test_merge_joins_continued_sections_and_votes_layout():
+    merged = doc_chunking.merge_analyses([
+        {"title": "Annual Day", "layout": {"alignment": "center", "hasHeader": True},
+         "sections": [{"heading": "Events", "content": "Dance and"}]},
+        {"title": "", "layout": {"alignment": "center", "hasFooter": True},
+         "sections": [{"heading": "(continued)", "content": "music."}, {"heading": "Prizes", "content": "Cups."}]},
+        {"layout": {"alignment": "left", "hasFooter": False}, "sections": []},
+    ])
+    assert merged["title"] == "Annual Day"
+    assert merged["layout"]["alignment"] == "center"
+    assert merged["layout"]["hasHeader"] is True
+    assert merged["layout"]["hasFooter"] is False
+    assert merged["sections"] == [
+        {"heading": "Events", "content": "Dance and music."},
+        {"heading": "Prizes", "content": "Cups."},
+    ]
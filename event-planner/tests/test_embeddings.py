@@ -0,0 +1,65 @@
+import numpy as np
+import pytest
+
+import embeddings
+
+
+def unit(seed, dim=8):
+    vector = np.random.default_rng(seed).normal(size=dim).astype(np.float32)
+    return vector / np.linalg.norm(vector)
+
+
+def key(text):
+    return embeddings.text_hash(text)
+
+
+def test_ring_overwrites_oldest_row():
+    cache = embeddings.VectorCache(dim=8, capacity=2, directory="")
+    for i, text in enumerate(["a", "b", "c"]):
+        cache.put(key(text), unit(i))
+    assert cache.get(key("a")) is None
+    assert np.allclose(cache.get(key("c")), unit(2), atol=1e-3)
+    assert len(cache) == 2
+
+
+def test_caches_sharing_a_directory_never_return_another_texts_vector(tmp_path):
+    a = embeddings.VectorCache(dim=8, capacity=1, directory=str(tmp_path), model="m")
+    b = embeddings.VectorCache(dim=8, capacity=1, directory=str(tmp_path), model="m")
+    a.put(key("alpha"), unit(1))
+    b.put(key("beta"), unit(2))
+    # b reused the only row; a must miss rather than serve beta's vector
+    assert a.get(key("alpha")) is None
+    assert np.allclose(b.get(key("beta")), unit(2), atol=1e-3)
+
+
+def test_shared_cursor_spreads_writes_across_workers(tmp_path):
+    a = embeddings.VectorCache(dim=8, capacity=4, directory=str(tmp_path), model="m")
+    b = embeddings.VectorCache(dim=8, capacity=4, directory=str(tmp_path), model="m")
+    a.put(key("alpha"), unit(1))
+    b.put(key("beta"), unit(2))
+    assert np.allclose(a.get(key("alpha")), unit(1), atol=1e-3)
+    assert np.allclose(b.get(key("beta")), unit(2), atol=1e-3)
+
+
+def test_restart_resumes_at_the_persisted_cursor(tmp_path):
+    first = embeddings.VectorCache(dim=8, capacity=3, directory=str(tmp_path), model="m")
+    for i, text in enumerate(["a", "b", "c", "d"]):  # "d" wraps onto row 0
+        first.put(key(text), unit(i))
+    del first
+    restarted = embeddings.VectorCache(dim=8, capacity=3, directory=str(tmp_path), model="m")
+    restarted.put(key("e"), unit(4))
+    # The next write replaces the oldest row ("b"), not the newest ("d")
+    assert restarted.get(key("b")) is None
+    assert np.allclose(restarted.get(key("d")), unit(3), atol=1e-3)
+    assert np.allclose(restarted.get(key("c")), unit(2), atol=1e-3)
+
+
+def test_collection_search_ranks_by_cosine():
+    collection = embeddings.Collection("test")
+    collection.add(["x", "y", "z"], np.vstack([unit(1), unit(2), unit(3)]), [1, 2, 3])
+    top = collection.search(unit(2), k=2)
+    assert top[0][0] == "y" and top[0][1] == pytest.approx(1.0, abs=1e-5)
+    assert len(top) == 2
+    collection.remove("y")
+    assert "y" not in [item for item, _, _ in collection.search(unit(2), k=3)]
+    assert collection.search(unit(2), k=3, min_score=1.1) == []
@@ -0,0 +1,94 @@
+import pytest
+
+import graph_layout
+import summarizer
+
+needs_numpy = pytest.mark.skipif(not summarizer.available(), reason="needs NumPy")
+
+
+def star(branches, leaves):
+    nodes = [{"id": "root", "label": "Root", "level": 0}]
+    edges = []
+    for b in range(branches):
+        nodes.append({"id": f"b{b}", "label": f"B{b}", "level": 1})
+        edges.append({"from": "root", "to": f"b{b}"})
+        for leaf in range(leaves):
+            nodes.append({"id": f"b{b}l{leaf}", "label": "leaf", "level": 2})
+            edges.append({"from": f"b{b}", "to": f"b{b}l{leaf}"})
+    return {"type": "mindgraph", "nodes": nodes, "edges": edges}
+
+
+def test_depths_ignore_direction_and_attach_islands():
+    graph = {"nodes": [{"id": "root", "level": 0}, {"id": "a"}, {"id": "b"}, {"id": "island"}],
+             "edges": [{"from": "a", "to": "root"}, {"from": "a", "to": "b"}, {"from": "a", "to": "a"}]}
+    depth, parent = graph_layout.depths(graph)
+    assert depth == [0, 1, 2, 1]
+    assert parent == [None, 0, 1, None]
+
+
+def test_truncate_keeps_shallowest_and_valid_edges():
+    graph = star(3, 4)
+    cut = graph_layout.truncate(graph, 7)
+    ids = [n["id"] for n in cut["nodes"]]
+    assert {"root", "b0", "b1", "b2"} <= set(ids)
+    # Round-robin: each branch shows a child before any shows two
+    assert sorted(i[:2] for i in ids if "l" in i) == ["b0", "b1", "b2"]
+    assert all(e["from"] in ids and e["to"] in ids for e in cut["edges"])
+    assert graph_layout.truncate(graph, 100) is graph
+
+
+def test_level_of_detail_hints():
+    result = graph_layout.layout(star(3, 4), max_visible=4)
+    hidden = [n for n in result["nodes"] if n.get("hidden")]
+    assert len(hidden) == 12
+    assert all(n["anchor"] == n["id"][:2] for n in hidden)
+    assert {n["id"]: n.get("collapsed") for n in result["nodes"] if n["id"] in ("b0", "b1", "b2")} == {
+        "b0": 4, "b1": 4, "b2": 4}
+    assert result["layout"] == {"algorithm": "force", "visible": 4, "total": 16}
+
+
+def test_node_cap(monkeypatch):
+    monkeypatch.setattr(graph_layout, "MAX_NODES", 5)
+    assert len(graph_layout.layout(star(3, 4))["nodes"]) == 5
+
+
+def test_layout_does_not_mutate_input():
+    graph = star(2, 2)
+    graph_layout.layout(graph)
+    assert "x" not in graph["nodes"][0] and "layout" not in graph
+
+
+@needs_numpy
+def test_every_node_gets_a_position_and_root_is_pinned():
+    result = graph_layout.layout(star(4, 5), max_visible=5)
+    assert all("x" in n and "y" in n for n in result["nodes"])
+    assert (result["nodes"][0]["x"], result["nodes"][0]["y"]) == (0.0, 0.0)
+    positions = {(n["x"], n["y"]) for n in result["nodes"]}
+    assert len(positions) == len(result["nodes"])
+
+
+@needs_numpy
+def test_force_layout_is_deterministic():
+    assert graph_layout.layout(star(3, 3)) == graph_layout.layout(star(3, 3))
+
+
+@needs_numpy
+def test_flowchart_layers_and_fewer_crossings():
+    # Second layer listed in the opposite order of its parents: a naive layout crosses every edge
+    nodes = [{"id": "start", "level": 0}]
+    nodes += [{"id": f"p{i}", "level": 1} for i in range(3)]
+    nodes += [{"id": f"c{i}", "level": 2} for i in reversed(range(3))]
+    edges = [{"from": "start", "to": f"p{i}"} for i in range(3)] + [{"from": f"p{i}", "to": f"c{i}"} for i in range(3)]
+    result = graph_layout.layout({"type": "flowchart", "nodes": nodes, "edges": edges})
+    assert result["layout"]["algorithm"] == "hierarchical"
+    by_id = {n["id"]: n for n in result["nodes"]}
+    assert [by_id[f"p{i}"]["y"] for i in range(3)] == [graph_layout.LEVEL_SPACING] * 3
+    parents = sorted(range(3), key=lambda i: by_id[f"p{i}"]["x"])
+    children = sorted(range(3), key=lambda i: by_id[f"c{i}"]["x"])
+    assert parents == children
+
+
+def test_graph_key_ignores_key_order_and_extra_fields():
+    a = {"type": "mindgraph", "nodes": [{"id": "x", "label": "X"}], "edges": [], "layout": {"visible": 1}}
+    b = {"edges": [], "nodes": [{"label": "X", "id": "x"}], "type": "mindgraph"}
+    assert graph_layout.graph_key(a) == graph_layout.graph_key(b)
@@ -0,0 +1,72 @@
+import json
+import time
+
+import pytest
+
+from json_extract import extract_json
+
+PLAN = {"tasks": [{"title": f"Task {i}", "notes": "uses {braces} and [brackets]"} for i in range(50)]}
+BODY = json.dumps(PLAN, indent=2)
+
+
+@pytest.mark.parametrize("text", [
+    BODY,
+    f"```json\n{BODY}\n```",
+    f"Sure! Here is the plan:\n\n{BODY}\n\nLet me know if {{anything}} else is needed.",
+    f"{BODY}\n\nAlternative:\n{json.dumps({'tasks': []})}",
+])
+def test_wrapped_values(text):
+    assert extract_json(text) == PLAN
+
+
+def test_repairs_trailing_commas_and_raw_newlines():
+    assert extract_json('{"a": [1, 2,], "b": "line one\nline two",}') == {"a": [1, 2], "b": "line one\nline two"}
+
+
+def test_closes_truncated_values():
+    assert extract_json('{"a": 1, "b": [1, 2') == {"a": 1, "b": [1, 2]}
+    assert extract_json('{"a": 1, "b": "unfinished') == {"a": 1, "b": "unfinished"}
+    assert extract_json('{"a": 1, "b":') == {"a": 1, "b": None}
+
+
+def test_expect_skips_values_of_the_wrong_type():
+    assert extract_json(f"See [1] and [2].\n{BODY}", dict) == PLAN
+    assert extract_json('{"a": 1} then [1, 2]', list) == [1, 2]
+    assert extract_json("[1, 2]", dict) is None
+
+
+def test_no_json():
+    assert extract_json("") is None
+    assert extract_json("plain prose") is None
+    assert extract_json("[" * 100000) is None
+
+
+# Noisy replies where every opener fails. A failed decode from an offset
+# computes its line number from the start of the text, so retrying the C
+# decoder at each opener was quadratic (2.3s for "[1,}" * 40000).
+PATHOLOGICAL = {
+    "mismatched closers": "[1,}" * 40000,
+    "unclosed keys": '{"a":' * 40000,
+    "unclosed nesting": "[{" * 40000,
+    "escaped quotes": '{"a": "b\\" ' * 40000,
+}
+
+
+@pytest.mark.parametrize("name", sorted(PATHOLOGICAL))
+def test_pathological_inputs_finish_quickly(name):
+    started = time.perf_counter()
+    extract_json(PATHOLOGICAL[name])
+    assert time.perf_counter() - started < 1.0
+
+
+def test_time_grows_linearly_with_noise():
+    def timed(n):
+        started = time.perf_counter()
+        extract_json("[1,}" * n)
+        return time.perf_counter() - started
+
+    timed(1000)  # warm up
+    small = min(timed(10000) for _ in range(3))
+    large = min(timed(40000) for _ in range(3))
+    # 4x the input; quadratic behaviour would be ~16x
+    assert large < small * 8
@@ -0,0 +1,70 @@
+from collections import Counter
+
+import keywords
+from keywords import KeywordEngine, terms, tokenize
+
+TEXT = ("Photosynthesis happens in the chloroplast. Light reactions in the chloroplast make ATP, "
+        "and light reactions also split water. The Calvin cycle then fixes carbon.")
+
+
+def test_tokenize_drops_stopwords_and_short_words():
+    assert tokenize("The sun heats 42 ox-carts, then rain falls.") == [
+        [None, "sun", "heats", None, "ox-carts"], [None, "rain", "falls"]]
+
+
+def test_bigrams_do_not_cross_stopwords_or_punctuation():
+    counts = terms("Solar power, wind power and solar power.")
+    assert counts["solar power"] == 2
+    assert "power wind" not in counts
+    assert "wind power" in counts
+    assert "power solar" not in counts
+
+
+def test_weighted_terms_accumulate():
+    counts = Counter()
+    terms("solar power", 0.5, counts)
+    terms("solar power", 2.0, counts)
+    assert counts["solar"] == 2.5
+
+
+def test_repeated_bigram_covers_its_unigrams():
+    ranked = KeywordEngine().extract(TEXT, limit=5)
+    assert "light reactions" in ranked
+    assert "light" not in ranked and "reactions" not in ranked
+
+
+def test_single_bigram_does_not_count():
+    ranked = KeywordEngine().extract("Calvin cycle fixes carbon.", limit=10)
+    assert "calvin cycle" not in ranked
+    assert "calvin" in ranked
+
+
+def test_idf_sinks_common_terms():
+    engine = KeywordEngine()
+    for topic in ("rivers", "mountains", "deserts", "forests"):
+        engine.extract(f"Geography notes about {topic}. Geography matters.")
+    assert engine.extract("Geography notes about glaciers and glaciers melting.", limit=1) == ["glaciers"]
+
+
+def test_learn_false_leaves_statistics_alone():
+    engine = KeywordEngine()
+    engine.extract(TEXT, learn=False)
+    assert engine.documents == 0 and not engine.df
+
+
+def test_document_frequencies_stay_bounded():
+    engine = KeywordEngine(max_terms=10)
+    for i in range(20):
+        engine.extract(f"term{i}a term{i}b term{i}c")
+    assert len(engine.df) <= 10
+
+
+def test_extract_weighted_favours_heavy_passages():
+    engine = KeywordEngine()
+    ranked = engine.extract_weighted(["volcanoes erupt", "glaciers move"], [0.9, 0.1], limit=1, learn=False)
+    assert ranked[0] in ("volcanoes", "erupt")
+
+
+def test_empty_text():
+    assert keywords.extract_keywords("") == []
+    assert KeywordEngine().extract_weighted([], [], learn=False) == []
@@ -0,0 +1,118 @@
+import json
+
+import pytest
+
+import llm_schemas
+
+VALID = {
+    "plan": {"items": [{"title": "Book venue", "text": "Call three venues"}]},
+    "budget_estimate": {"items": [{"category": "Venue", "estimate": 1200}]},
+    "budget_plan": {"total_budget": 5000, "budget_items": [
+        {"category": "Food", "name": "Catering", "amount": 2000, "percentage": 40, "notes": ""}]},
+    "schedule": {"schedule_items": [
+        {"title": "Welcome", "start_time": "09:00", "end_time": "09:30", "description": "Opening"}]},
+    "tasks": {"tasks": [{"title": "Send invites", "category": "Guests", "priority": "high"}]},
+    "report": {"html": "<p>Done</p>", "sections": [{"title": "Summary", "content": "Done"}], "summary": "Done"},
+    "mindmap_mode": {"mode": "flowchart"},
+    "mindmap_graph": {"type": "mindgraph", "nodes": [
+        {"id": "a", "label": "A", "level": 0, "parent": None, "shape": None},
+        {"id": "b", "label": "B", "level": 1, "parent": "a", "shape": "box"}],
+        "edges": [{"from": "a", "to": "b", "label": None}]},
+    "summary": {"title": "T", "summary_short": "s", "summary_medium": "m", "summary_detailed": "d",
+                "key_points": ["p"], "keywords": ["k"]},
+    "topics": {"topics": ["Venue", "Food"]},
+    "magazine": {"summary_thick": "a", "summary_thin": "b", "main_body": "c", "pull_quote": "d",
+                 "caption1": "e", "caption2": "f"},
+    "document_analysis": {"title": "Memo", "layout": {
+        "alignment": "left", "hasHeader": True, "hasFooter": False, "fontStyle": "formal"},
+        "sections": [{"heading": "Intro", "content": "Hello"}]},
+}
+
+INVALID = {
+    "plan": {"items": [{"title": "Book venue"}]},
+    "budget_estimate": {"items": [{"category": "Venue", "estimate": "a lot"}]},
+    "budget_plan": {"total_budget": 5000},
+    "schedule": {"schedule_items": "09:00 welcome"},
+    "tasks": {"tasks": [{"title": "Send invites", "category": "Guests", "priority": "urgent"}]},
+    "report": {"html": "<p>Done</p>", "sections": []},
+    "mindmap_mode": {"mode": "timeline"},
+    "mindmap_graph": {"type": "mindgraph", "nodes": [{"id": "a"}], "edges": []},
+    "summary": {"title": "T", "key_points": "p"},
+    "topics": {"topics": "Venue"},
+    "magazine": {"summary_thick": "a"},
+    "document_analysis": {"title": "Memo", "layout": {"alignment": "justified"}, "sections": []},
+}
+
+
+def test_samples_cover_every_schema():
+    assert set(VALID) == set(INVALID) == set(llm_schemas.SCHEMAS)
+
+
+def strict_objects(node):
+    if isinstance(node, dict):
+        if node.get("type") == "object" and "properties" in node:
+            yield node
+        for key, value in node.items():
+            yield from strict_objects(value.values() if key == "properties" else value)
+    elif isinstance(node, (list, type({}.values()))):
+        for item in node:
+            yield from strict_objects(item)
+
+
+@pytest.mark.parametrize("name", sorted(llm_schemas.SCHEMAS))
+def test_strict_schema(name):
+    response_format = llm_schemas.response_format(name)
+    assert response_format["type"] == "json_schema"
+    assert response_format["json_schema"]["name"] == name
+    assert response_format["json_schema"]["strict"] is True
+    schema = response_format["json_schema"]["schema"]
+    objects = list(strict_objects(schema))
+    assert objects
+    for node in objects:
+        assert node["additionalProperties"] is False
+        assert node["required"] == list(node["properties"])
+    assert '"default"' not in json.dumps(schema)
+    # The root is always an object, even for list replies
+    assert schema["type"] == "object"
+    assert llm_schemas.response_format(name) is response_format
+
+
+def test_graph_edge_uses_the_from_alias():
+    schema = llm_schemas.response_format("mindmap_graph")["json_schema"]["schema"]
+    assert "from" in json.dumps(schema)
+    assert '"source"' not in json.dumps(schema)
+
+
+def expected(name):
+    return VALID[name]["items"] if name in llm_schemas._WRAPPED_LISTS else VALID[name]
+
+
+@pytest.mark.parametrize("name", sorted(llm_schemas.SCHEMAS))
+def test_parse_valid_reply(name):
+    assert llm_schemas.parse(name, json.dumps(VALID[name])) == expected(name)
+
+
+@pytest.mark.parametrize("name", sorted(llm_schemas.SCHEMAS))
+def test_parse_wrapped_reply(name):
+    reply = VALID[name]["items"] if name in llm_schemas._WRAPPED_LISTS else VALID[name]
+    raw = f"Here you go:\n```json\n{json.dumps(reply, indent=2)}\n```"
+    assert llm_schemas.parse(name, raw) == expected(name)
+
+
+@pytest.mark.parametrize("name", sorted(llm_schemas.SCHEMAS))
+def test_parse_invalid_reply(name):
+    assert llm_schemas.parse(name, json.dumps(INVALID[name])) is None
+
+
+@pytest.mark.parametrize("raw", ["", None, "no json here", "[1, 2]"])
+def test_parse_non_json(raw):
+    assert llm_schemas.parse("summary", raw) is None
+
+
+def test_request_options(monkeypatch):
+    assert llm_schemas.request_options(None, "m") == {}
+    assert llm_schemas.request_options("tasks", "m") == {"response_format": llm_schemas.response_format("tasks")}
+    monkeypatch.setattr(llm_schemas, "_unsupported_models", set())
+    assert llm_schemas.rejected(ValueError("response_format json_schema is not supported"), "m")
+    assert llm_schemas.request_options("tasks", "m") == {}
+    assert not llm_schemas.rejected(ValueError("rate limited"), "other")
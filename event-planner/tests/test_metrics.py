@@ -0,0 +1,55 @@
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+import metrics
+
+
+def make_app():
+    app = FastAPI()
+    seen = []
+
+    @app.middleware("http")
+    async def track(request, call_next):
+        token = metrics.current_scope.set(request.scope)
+        try:
+            response = await call_next(request)
+        finally:
+            metrics.current_scope.reset(token)
+        seen.append(metrics.route_label(request.scope))
+        return response
+
+    @app.get("/items/{item_id}")
+    def read_item(item_id: str):
+        # Sync routes run in the threadpool with a copy of the request context
+        return {"route": metrics.current_route()}
+
+    return app, seen
+
+
+def test_labels_use_the_route_template():
+    app, seen = make_app()
+    client = TestClient(app)
+    assert client.get("/items/42").json() == {"route": "/items/{item_id}"}
+    assert client.get("/items/43").status_code == 200
+    assert seen == ["/items/{item_id}", "/items/{item_id}"]
+
+
+def test_unmatched_paths_share_one_label():
+    app, seen = make_app()
+    client = TestClient(app)
+    for path in ("/nope", "/random/a/b", "/x" * 20):
+        assert client.get(path).status_code == 404
+    assert set(seen) == {metrics.UNMATCHED}
+
+
+def test_current_route_outside_a_request():
+    assert metrics.current_route() == "unknown"
+
+
+def test_counters_render_in_prometheus_format():
+    registry = metrics.Registry()
+    counter = registry.counter("demo_total", "Demo counter.", ("route",))
+    counter.labels('/a"b').inc(2)
+    text = registry.render()
+    assert "# TYPE demo_total counter" in text
+    assert 'demo_total{route="/a\\"b"} 2' in text
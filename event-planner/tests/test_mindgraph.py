@@ -0,0 +1,142 @@
+import pytest
+
+import embeddings
+import mindgraph
+import summarizer
+
+TEA = """Making Tea
+First, boil the water. Then warm the pot.
+If the tea is loose, use a strainer.
+Otherwise, drop in a tea bag.
+Pour the water, then steep for three minutes.
+Finally, serve the tea.
+"""
+
+SOLAR = """Solar Energy Basics
+
+Solar panels convert sunlight into electricity using photovoltaic cells.
+The photovoltaic cells in solar panels are made of silicon layers. Sunlight frees electrons in the silicon, which creates a current.
+Inverters turn the direct current from solar panels into alternating current for the home.
+Batteries store electricity from solar panels for use at night. Net metering lets homes sell extra solar electricity to the grid.
+- Solar electricity costs have fallen sharply over the last decade.
+- Rooftop solar panels suit most sunny regions.
+"""
+
+needs_numpy = pytest.mark.skipif(not summarizer.available(), reason="needs NumPy")
+
+
+@pytest.fixture(autouse=True)
+def tfidf(monkeypatch):
+    monkeypatch.setattr(embeddings, "encode", lambda sentences: None)
+    monkeypatch.setattr(embeddings, "available", lambda: False)
+
+
+def by_id(graph):
+    return {node["id"]: node for node in graph["nodes"]}
+
+
+def edges_from(graph, source):
+    return {edge["to"]: edge.get("label") for edge in graph["edges"] if edge["from"] == source}
+
+
+def test_flowchart_strips_sequence_markers_and_skips_the_heading():
+    graph = mindgraph.build_flowchart(TEA)
+    labels = [node["label"] for node in graph["nodes"]]
+    assert labels[:3] == ["Start", "Boil the water", "Warm the pot"]
+    assert labels[-2:] == ["Serve the tea", "End"]
+    assert "Making Tea" not in labels
+    # "X, then Y" is two steps
+    assert "Pour the water" in labels and "Steep for three minutes" in labels
+
+
+def test_flowchart_conditional_with_otherwise_branch():
+    graph = mindgraph.build_flowchart(TEA)
+    nodes = by_id(graph)
+    ids = {node["label"]: node["id"] for node in graph["nodes"]}
+    decision = ids["The tea is loose?"]
+    assert nodes[decision]["shape"] == "diamond"
+    assert edges_from(graph, decision) == {ids["Use a strainer"]: "Yes", ids["Drop in a tea bag"]: "No"}
+    # Both branches rejoin at the next step, one level below the deeper branch
+    pour = ids["Pour the water"]
+    assert edges_from(graph, ids["Use a strainer"]) == {pour: None}
+    assert edges_from(graph, ids["Drop in a tea bag"]) == {pour: None}
+    assert nodes[pour]["level"] == nodes[ids["Use a strainer"]]["level"] + 1
+
+
+def test_flowchart_unless_negates_and_no_branch_skips_ahead():
+    graph = mindgraph.build_flowchart("Open the door unless it is locked. Walk in.")
+    ids = {node["label"]: node["id"] for node in graph["nodes"]}
+    decision = ids["It is locked?"]
+    assert edges_from(graph, decision) == {ids["Open the door"]: "No", ids["Walk in"]: "Yes"}
+    assert edges_from(graph, ids["Walk in"]) == {"end": None}
+
+
+def test_flowchart_shape():
+    graph = mindgraph.build_flowchart(TEA)
+    assert graph["type"] == "flowchart"
+    nodes = by_id(graph)
+    assert nodes["start"]["shape"] == nodes["end"]["shape"] == "ellipse"
+    for edge in graph["edges"]:
+        assert edge["from"] in nodes and edge["to"] in nodes
+        assert nodes[edge["to"]]["level"] > nodes[edge["from"]]["level"]
+    assert mindgraph.build_flowchart("") is None
+
+
+def test_flowchart_step_limit():
+    text = " ".join(f"Do task {i}." for i in range(50))
+    graph = mindgraph.build_flowchart(text)
+    assert len(graph["nodes"]) == mindgraph.MAX_STEPS + 2  # plus Start and End
+
+
+@needs_numpy
+def test_kmeans_separates_obvious_clusters():
+    np = summarizer.np
+    vectors = np.array([[1.0, 0.0], [0.99, 0.14], [0.0, 1.0], [0.14, 0.99], [0.98, 0.2]])
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    labels = list(mindgraph.kmeans(vectors, 2))
+    assert labels[0] == labels[1] == labels[4]
+    assert labels[2] == labels[3] != labels[0]
+
+
+@needs_numpy
+def test_mindgraph_cluster_and_parent_structure():
+    graph = mindgraph.build_mindgraph(SOLAR)
+    assert graph["type"] == "mindgraph"
+    nodes = by_id(graph)
+    assert nodes["root"] == {"id": "root", "label": "Solar Energy Basics", "level": 0}
+
+    categories = [node for node in graph["nodes"] if node["level"] == 1]
+    assert mindgraph.MIN_CATEGORIES <= len(categories) <= mindgraph.MAX_CATEGORIES
+    assert all(node["parent"] == "root" for node in categories)
+    for category in categories:
+        children = [node for node in graph["nodes"] if node.get("parent") == category["id"]]
+        assert len(children) <= mindgraph.MAX_SUBNODES
+        assert all(node["level"] == 2 for node in children)
+
+    # One edge per non-root node, from its parent
+    assert sorted((e["from"], e["to"]) for e in graph["edges"]) == sorted(
+        (node["parent"], node["id"]) for node in graph["nodes"] if node["id"] != "root"
+    )
+    # The title is not repeated as a category or subnode
+    labels = [node["label"].lower() for node in graph["nodes"][1:]]
+    assert "solar energy basics" not in labels
+    assert len(labels) == len(set(labels))
+
+
+@needs_numpy
+def test_mindgraph_few_phrases_and_empty_text():
+    assert mindgraph.build_mindgraph("Photosynthesis") == {
+        "type": "mindgraph",
+        "nodes": [{"id": "root", "label": "Photosynthesis", "level": 0}],
+        "edges": [],
+    }
+    assert mindgraph.build_mindgraph("") is None
+
+
+@needs_numpy
+def test_build_dispatch():
+    assert mindgraph.build(TEA, "flowchart")["type"] == "flowchart"
+    assert mindgraph.build(SOLAR, "keywords")["type"] == "keywords"
+    # Unknown modes get a mindgraph under their own type
+    assert mindgraph.build(SOLAR, "outline")["type"] == "outline"
+    assert mindgraph.build("", "mindgraph") is None
@@ -0,0 +1,112 @@
+from collections import OrderedDict
+
+import pytest
+
+import mindmap_cache
+
+
+@pytest.fixture
+def caches(monkeypatch, tmp_path):
+    """Fresh in-memory state for every route cache, with the disk directory under tmp_path."""
+    monkeypatch.setattr(mindmap_cache, "MINDMAP_CACHE_DIR", tmp_path / "mindmap")
+    monkeypatch.setattr(mindmap_cache, "MINDMAP_CACHE_DISK", False)
+    for cache in mindmap_cache.CACHES.values():
+        monkeypatch.setattr(cache, "_entries", OrderedDict())
+        monkeypatch.setattr(cache, "version", None)
+        monkeypatch.setattr(cache, "disk", None)
+    return mindmap_cache.CACHES
+
+
+@pytest.fixture
+def disk(caches, monkeypatch):
+    monkeypatch.setattr(mindmap_cache, "MINDMAP_CACHE_DISK", True)
+    return mindmap_cache.MINDMAP_CACHE_DIR
+
+
+def test_key_normalizes_unicode_and_whitespace():
+    assert mindmap_cache.normalize("  Ｃｅｌｌｓ and\n\n\tthe ﬁle  ") == "Cells and the file"
+    assert mindmap_cache.text_hash("Cells  and\nthe file") == mindmap_cache.text_hash(" Ｃｅｌｌｓ and the ﬁle\n")
+    assert mindmap_cache.text_hash("Cells") != mindmap_cache.text_hash("cells")
+
+
+def test_hit_ignores_formatting_but_not_mode_or_model(caches):
+    mindmap_cache.configure("v1")
+    mindmap_cache.store("analyze", "Cells and\n the file", "mindgraph", "m", {"n": 1})
+    assert mindmap_cache.lookup("analyze", "  Cells and the file ", "mindgraph", "m") == {"n": 1}
+    assert mindmap_cache.lookup("analyze", "Cells and the file", "flowchart", "m") is None
+    assert mindmap_cache.lookup("analyze", "Cells and the file", "mindgraph", "other") is None
+    assert mindmap_cache.lookup("classify", "Cells and the file", "mindgraph", "m") is None
+
+
+def test_lru_evicts_least_recently_used():
+    cache = mindmap_cache.ResultCache("test", max_entries=2)
+    cache.set("a", "m", "x", {"v": "a"})
+    cache.set("b", "m", "x", {"v": "b"})
+    assert cache.get("a", "m", "x") == {"v": "a"}  # "b" is now the oldest
+    cache.set("c", "m", "x", {"v": "c"})
+    assert cache.get("b", "m", "x") is None
+    assert cache.get("a", "m", "x") == {"v": "a"}
+    assert cache.get("c", "m", "x") == {"v": "c"}
+
+
+def test_prompt_version_tracks_the_prompt():
+    assert mindmap_cache.prompt_version("prompt", "t1") == mindmap_cache.prompt_version("prompt", "t1")
+    assert mindmap_cache.prompt_version("prompt", "t1") != mindmap_cache.prompt_version("prompt!", "t1")
+    assert mindmap_cache.prompt_version("prompt", "t1").startswith("t1-")
+
+
+def test_version_change_clears_memory(caches):
+    mindmap_cache.configure("v1")
+    mindmap_cache.store("analyze", "text", "mindgraph", "m", {"n": 1})
+    mindmap_cache.configure("v1")
+    assert mindmap_cache.lookup("analyze", "text", "mindgraph", "m") == {"n": 1}
+    mindmap_cache.configure("v2")
+    assert mindmap_cache.lookup("analyze", "text", "mindgraph", "m") is None
+    assert all(cache.version == "v2" for cache in caches.values())
+
+
+def test_disk_round_trip(disk, caches):
+    mindmap_cache.configure("v1")
+    mindmap_cache.store("summarize", "text", "summary", "m", {"title": "T"})
+    assert list((disk / "v1").rglob("*.json"))
+    caches["summarize"].clear()  # as after a restart
+    assert mindmap_cache.lookup("summarize", "text", "summary", "m") == {"title": "T"}
+    # The disk hit is promoted back into memory
+    assert len(caches["summarize"]._entries) == 1
+
+
+def test_version_change_removes_stale_disk_dirs(disk):
+    mindmap_cache.configure("v1")
+    mindmap_cache.store("analyze", "text", "mindgraph", "m", {"n": 1})
+    (disk / "stray.json").write_text("{}")
+    mindmap_cache.configure("v2")
+    assert not (disk / "v1").exists()
+    assert (disk / "stray.json").exists()  # only version directories are removed
+    assert mindmap_cache.lookup("analyze", "text", "mindgraph", "m") is None
+
+
+def test_invalidate_clears_memory_and_disk(disk, caches):
+    mindmap_cache.configure("v1")
+    mindmap_cache.store("analyze", "text", "mindgraph", "m", {"n": 1})
+    old = caches["analyze"].disk
+    assert old._total > 0
+
+    mindmap_cache.invalidate()
+    assert not disk.exists()
+    assert mindmap_cache.lookup("analyze", "text", "mindgraph", "m") is None
+    # A fresh DiskCache, so the size total does not count the deleted files
+    new = caches["analyze"].disk
+    assert new is not old and new._total is None
+    assert all(cache.disk is new for cache in caches.values())
+
+    mindmap_cache.store("analyze", "text", "mindgraph", "m", {"n": 2})
+    caches["analyze"].clear()
+    assert mindmap_cache.lookup("analyze", "text", "mindgraph", "m") == {"n": 2}
+    assert new._total == sum(p.stat().st_size for p in (disk / "v1").rglob("*.json"))
+
+
+def test_without_disk_nothing_is_written(caches):
+    mindmap_cache.configure("v1")
+    mindmap_cache.store("analyze", "text", "mindgraph", "m", {"n": 1})
+    assert not mindmap_cache.MINDMAP_CACHE_DIR.exists()
+    assert caches["analyze"].disk is None
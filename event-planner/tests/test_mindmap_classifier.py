@@ -0,0 +1,59 @@
+import threading
+
+import pytest
+
+import embeddings
+import mindmap_classifier
+import summarizer
+
+pytestmark = pytest.mark.skipif(not summarizer.available(), reason="needs NumPy")
+
+
+@pytest.fixture
+def tfidf(monkeypatch):
+    monkeypatch.setattr(embeddings, "available", lambda: False)
+
+
+def test_unrelated_text_is_not_confident(tfidf):
+    mode, confidence, confident = mindmap_classifier.classify("Hello world")
+    assert not confident
+    assert confidence < mindmap_classifier.CONFIDENCE
+
+
+def test_text_without_shared_vocabulary_has_no_mode(tfidf):
+    assert mindmap_classifier.classify("apples, pears, plums, cherries") == (None, 0.0, False)
+
+
+def test_close_text_is_confident(tfidf):
+    mode, confidence, confident = mindmap_classifier.classify(
+        "Photosynthesis and the carbon cycle in plants, chlorophyll and light reactions")
+    assert (mode, confident) == ("mindgraph", True)
+
+
+def test_confidence_scales_with_top_similarity(tfidf, monkeypatch):
+    text = "Photosynthesis and the carbon cycle in plants"
+    _, full = mindmap_classifier.CLASSIFIER.predict(text)
+    monkeypatch.setattr(mindmap_classifier, "FULL_SIMILARITY", 1.0)
+    _, scaled = mindmap_classifier.CLASSIFIER.predict(text)
+    assert 0 < scaled < full
+
+
+def test_seed_vectors_are_embedded_once(monkeypatch):
+    monkeypatch.setattr(embeddings, "available", lambda: True)
+    calls = []
+
+    def embed(texts):
+        calls.append(len(texts))
+        vectors = summarizer.np.ones((len(texts), 4))
+        return vectors / summarizer.np.linalg.norm(vectors, axis=1, keepdims=True)
+
+    monkeypatch.setattr(summarizer, "embed", embed)
+    classifier = mindmap_classifier.ModeClassifier()
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(classifier.predict("Step 1: mix."))) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(results) == 8
+    assert calls.count(len(classifier.texts)) == 1
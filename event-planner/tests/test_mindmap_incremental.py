@@ -0,0 +1,147 @@
+import contextvars
+import threading
+import time
+
+import mindmap_incremental
+
+LONG = "This paragraph is long enough to stand on its own as a unit of analysis. " * 3
+
+
+def fragment(paragraph):
+    words = paragraph.split()
+    return {
+        "type": "mindgraph",
+        "nodes": [{"id": "n0", "label": words[0], "level": 0},
+                  {"id": "n1", "label": f"{words[0]} detail", "level": 1, "parent": "n0"}],
+        "edges": [{"from": "n0", "to": "n1"}],
+    }
+
+
+def test_split_paragraphs_joins_short_blocks_forward():
+    text = f"HEADING\n\n{LONG}\n\nSecond heading\n\n{LONG}\n\ntail"
+    paragraphs = mindmap_incremental.split_paragraphs(text)
+    assert len(paragraphs) == 2
+    assert paragraphs[0].startswith("HEADING\n")
+    assert paragraphs[1].startswith("Second heading\n") and paragraphs[1].endswith("tail")
+
+
+def test_split_paragraphs_of_empty_text():
+    assert mindmap_incremental.split_paragraphs("") == []
+    assert mindmap_incremental.split_paragraphs("short") == ["short"]
+
+
+def test_mindgraph_merge_shares_root_and_dedupes_labels():
+    graph = mindmap_incremental.merge([
+        ("pa", {"nodes": [{"id": "r", "label": "Topic", "level": 0}, {"id": "x", "label": "Energy", "parent": "r"}],
+                "edges": [{"from": "r", "to": "x"}]}),
+        ("pb", {"nodes": [{"id": "r", "label": "Other", "level": 0}, {"id": "y", "label": "energy", "parent": "r"},
+                          {"id": "z", "label": "Light", "parent": "y"}],
+                "edges": [{"from": "r", "to": "y"}, {"from": "y", "to": "z"}]}),
+    ], "mindgraph")
+    labels = [n["label"] for n in graph["nodes"]]
+    assert labels.count("Energy") + labels.count("energy") == 1
+    light = next(n for n in graph["nodes"] if n["label"] == "Light")
+    assert light["id"] == "pb_z" and light["parent"] == "pa_x"
+    assert {"from": "root", "to": "pa_x"} in graph["edges"]
+    # The title is the first fragment's topic; the document text is not re-read
+    assert graph["nodes"][0] == {"id": "root", "label": "Topic", "level": 0}
+
+
+def test_flowchart_merge_chains_fragments_between_one_start_and_end():
+    step = lambda label: {"nodes": [{"id": "start", "label": "Start"}, {"id": "s", "label": label, "level": 1},
+                                    {"id": "end", "label": "End"}],
+                          "edges": [{"from": "start", "to": "s"}, {"from": "s", "to": "end"}]}
+    graph = mindmap_incremental.merge([("pa", step("Mix")), ("pb", step("Bake"))], "flowchart")
+    ids = [n["id"] for n in graph["nodes"]]
+    assert ids == ["start", "pa_s", "pb_s", "end"]
+    assert graph["edges"] == [{"from": "start", "to": "pa_s"}, {"from": "pa_s", "to": "pb_s"}, {"from": "pb_s", "to": "end"}]
+
+
+def recording(calls):
+    def analyze(text):
+        calls.append(text)
+        return fragment(text)
+    return analyze
+
+
+def test_first_generation_is_one_call_for_a_short_document():
+    calls = []
+    paragraphs = [f"Alpha {LONG}", f"Beta {LONG}", f"Gamma {LONG}"]
+    graph = mindmap_incremental.IncrementalGraphs().regenerate(
+        "doc", "\n\n".join(paragraphs), "mindgraph", recording(calls))
+    assert calls == ["\n\n".join(p.strip() for p in paragraphs)]
+    assert graph["incremental"] == {"paragraphs": 3, "reanalyzed": 3, "reused": 0, "calls": 1}
+
+
+def test_edit_reanalyzes_only_its_segment(monkeypatch):
+    paragraphs = [f"{word} {LONG}".strip() for word in ("Alpha", "Beta", "Gamma", "Delta", "Epsilon", "Zeta")]
+    # Two paragraphs per segment
+    monkeypatch.setattr(mindmap_incremental, "SEGMENT_CHARS", len(paragraphs[0]) * 2 + 10)
+    graphs = mindmap_incremental.IncrementalGraphs()
+    calls = []
+    first = graphs.regenerate("doc", "\n\n".join(paragraphs), "mindgraph", recording(calls))
+    assert len(calls) == 3
+    calls.clear()
+    edited = list(paragraphs)
+    edited[2] = f"Theta {LONG}".strip()
+    graph = graphs.regenerate("doc", "\n\n".join(edited), "mindgraph", recording(calls))
+    assert calls == [f"{edited[2]}\n\n{edited[3]}"]
+    assert graph["incremental"] == {"paragraphs": 6, "reanalyzed": 2, "reused": 4, "calls": 1}
+    # Nodes of untouched segments keep their ids
+    kept = {n["id"] for n in first["nodes"]} & {n["id"] for n in graph["nodes"]}
+    assert len([i for i in kept if i != "root"]) == 2
+
+
+def test_moved_segments_are_reused(monkeypatch):
+    paragraphs = [f"{word} {LONG}".strip() for word in ("Alpha", "Beta", "Gamma")]
+    monkeypatch.setattr(mindmap_incremental, "SEGMENT_CHARS", len(paragraphs[0]))
+    graphs = mindmap_incremental.IncrementalGraphs()
+    calls = []
+    graphs.regenerate("doc", "\n\n".join(paragraphs), "mindgraph", recording(calls))
+    calls.clear()
+    graph = graphs.regenerate("doc", "\n\n".join(reversed(paragraphs)), "mindgraph", recording(calls))
+    assert calls == []
+    assert graph["incremental"]["reused"] == 3
+    assert [n["label"] for n in graph["nodes"][1:]] == ["Gamma detail", "Beta detail", "Alpha detail"]
+
+
+def test_failed_segments_are_retried():
+    graphs = mindmap_incremental.IncrementalGraphs()
+    graphs.regenerate("doc", f"Alpha {LONG}", "mindgraph", lambda text: {"error": "model down"})
+    calls = []
+    graph = graphs.regenerate("doc", f"Alpha {LONG}", "mindgraph", recording(calls))
+    assert len(calls) == 1 and graph["incremental"]["reused"] == 0
+
+
+def test_request_fan_out_is_bounded(monkeypatch):
+    paragraphs = [f"Para{i} {LONG}".strip() for i in range(8)]
+    monkeypatch.setattr(mindmap_incremental, "SEGMENT_CHARS", len(paragraphs[0]))
+    monkeypatch.setattr(mindmap_incremental, "REQUEST_FANOUT", 2)
+    running, peak, lock = [0], [0], threading.Lock()
+
+    def analyze(text):
+        with lock:
+            running[0] += 1
+            peak[0] = max(peak[0], running[0])
+        time.sleep(0.02)
+        with lock:
+            running[0] -= 1
+        return fragment(text)
+
+    graph = mindmap_incremental.IncrementalGraphs().regenerate("doc", "\n\n".join(paragraphs), "mindgraph", analyze)
+    assert graph["incremental"]["calls"] == 8
+    assert peak[0] == 2
+
+
+def test_segment_analysis_keeps_the_request_context(monkeypatch):
+    monkeypatch.setattr(mindmap_incremental, "SEGMENT_CHARS", len(LONG))
+    route = contextvars.ContextVar("route", default="unknown")
+    seen = []
+
+    def analyze(paragraph):
+        seen.append(route.get())
+        return fragment(paragraph)
+
+    route.set("/api/mindmap/analyze")
+    mindmap_incremental.IncrementalGraphs().regenerate("doc", f"One {LONG}\n\nTwo {LONG}", "mindgraph", analyze)
+    assert seen == ["/api/mindmap/analyze"] * 2
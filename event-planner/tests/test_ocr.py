@@ -0,0 +1,119 @@
+import io
+from concurrent.futures import Future, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import pytest
+
+import ocr
+
+pytestmark = pytest.mark.skipif(ocr.Image is None or ocr.np is None, reason="needs Pillow and NumPy")
+
+if ocr.Image is not None:
+    from PIL import Image, ImageDraw
+
+
+def page(width=800, height=600, lines=8, angle=0.0):
+    """White page with thick black text-like bars, optionally rotated."""
+    image = Image.new("L", (width, height), 255)
+    draw = ImageDraw.Draw(image)
+    for i in range(lines):
+        y = 60 + i * (height - 120) // lines
+        draw.rectangle((80, y, width - 80, y + 12), fill=0)
+    if angle:
+        image = image.rotate(angle, resample=Image.BICUBIC, fillcolor=255)
+    return image
+
+
+@pytest.mark.parametrize("angle", [-3.0, 0.0, 2.0, 4.0])
+def test_estimate_skew_undoes_rotation(angle):
+    assert ocr.estimate_skew(page(angle=angle)) == pytest.approx(-angle, abs=ocr.SKEW_STEP)
+
+
+def test_estimate_skew_of_blank_page():
+    assert ocr.estimate_skew(Image.new("L", (400, 300), 255)) == 0.0
+
+
+def test_preprocess_grayscales_downscales_and_deskews(monkeypatch):
+    monkeypatch.setattr(ocr, "OCR_MAX_SIDE", 400)
+    result = ocr.preprocess(page(angle=3.0).convert("RGB"))
+    assert result.mode == "L"
+    # Downscaled to 400 wide, then expanded a little by the deskew rotation
+    assert 400 <= max(result.size) < 440
+    assert ocr.estimate_skew(result) == 0.0
+
+
+def test_split_rows_cuts_between_lines():
+    tall = page(width=400, height=3000, lines=60)
+    tiles = ocr.split_rows(tall, tile_height=500)
+    assert len(tiles) > 4
+    assert sum(t.height for t in tiles) == tall.height
+    profile = ocr._ink_profile(tall)
+    top = 0
+    for tile in tiles[:-1]:
+        top += tile.height
+        assert profile[top] == 0  # no text line is split
+    assert len(ocr.split_rows(page(height=600), tile_height=500)) == 1
+
+
+class FakeTesseract:
+    @staticmethod
+    def image_to_string(tile, lang, timeout):
+        return f"tile {tile.size[1]}"
+
+
+@pytest.fixture
+def local_pool(monkeypatch):
+    pool = ThreadPoolExecutor(max_workers=2)
+    monkeypatch.setattr(ocr, "pytesseract", FakeTesseract)
+    monkeypatch.setattr(ocr, "_get_pool", lambda: pool)
+    yield pool
+    pool.shutdown()
+
+
+def tiff(frames):
+    out = io.BytesIO()
+    first, *rest = [page(width=300, height=200, lines=3) for _ in range(frames)]
+    first.save(out, "TIFF", save_all=True, append_images=rest)
+    out.seek(0)
+    return out
+
+
+def test_frames_are_joined_in_order_and_capped(local_pool, monkeypatch):
+    monkeypatch.setattr(ocr, "MAX_FRAMES", 3)
+    text = ocr.ocr_image(tiff(5))
+    assert text.count("\f") == 2
+    assert text.startswith("tile ")
+
+
+def test_expired_deadline_is_a_timeout(local_pool):
+    with pytest.raises(ocr.OCRTimeout):
+        ocr.ocr_image(tiff(1), timeout=0)
+
+
+def test_slow_tile_is_a_timeout(local_pool, monkeypatch):
+    never = Future()
+    monkeypatch.setattr(local_pool, "submit", lambda *args, **kwargs: never)
+    with pytest.raises(ocr.OCRTimeout):
+        ocr.ocr_image(tiff(1), timeout=0.2)
+
+
+def test_crashed_worker_replaces_the_pool(monkeypatch):
+    monkeypatch.setattr(ocr, "pytesseract", FakeTesseract)
+
+    class BrokenPool:
+        shut_down = False
+
+        def submit(self, *args, **kwargs):
+            future = Future()
+            future.set_exception(BrokenProcessPool("worker died"))
+            return future
+
+        def shutdown(self, wait=True, cancel_futures=False):
+            self.shut_down = True
+
+    broken = BrokenPool()
+    monkeypatch.setattr(ocr, "_pool", broken)
+    with pytest.raises(ocr.OCRFailed):
+        ocr.ocr_image(tiff(1))
+    assert ocr._pool is None
+    assert broken.shut_down
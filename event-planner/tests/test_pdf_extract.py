@@ -0,0 +1,28 @@
+import io
+import os
+
+import pdf_extract
+
+
+def test_as_path_uses_files_already_on_disk(tmp_path):
+    document = tmp_path / "report.pdf"
+    document.write_bytes(b"%PDF-1.4")
+    with pdf_extract.as_path(str(document)) as path:
+        assert path == str(document)
+    with open(document, "rb") as f, pdf_extract.as_path(f) as path:
+        assert path == str(document)
+
+
+def test_as_path_copies_in_memory_sources_once_and_cleans_up():
+    for source in (b"%PDF-1.4 bytes", io.BytesIO(b"%PDF-1.4 stream")):
+        with pdf_extract.as_path(source) as path:
+            with open(path, "rb") as f:
+                assert f.read().startswith(b"%PDF-1.4")
+        assert not os.path.exists(path)
+
+
+def test_batches_cover_every_page_once():
+    batches = list(pdf_extract._batches(101, 4))
+    pages = [i for start, stop in batches for i in range(start, stop)]
+    assert pages == list(range(101))
+    assert len(batches) > 4
@@ -0,0 +1,158 @@
+import pytest
+
+import pdf_layout
+
+pytestmark = pytest.mark.skipif(pdf_layout.np is None, reason="needs NumPy")
+
+WIDTH, HEIGHT = 600.0, 800.0
+
+
+def chars(text, x, top, size=10.0, font="ABCDEF+Helvetica", space_glyphs=True, gap=0.0):
+    """pdfplumber-style char dicts; without space glyphs words are positioned apart by `gap`."""
+    out = []
+    for ch in text:
+        if ch == " " and not space_glyphs:
+            x += gap
+            continue
+        width = 0.5 * size
+        out.append({"text": ch, "x0": x, "x1": x + width, "top": top, "bottom": top + size,
+                    "size": size, "fontname": font})
+        x += width
+    return out
+
+
+def centered(text, top, size=10.0, **kwargs):
+    return chars(text, (WIDTH - 0.5 * size * len(text)) / 2, top, size, **kwargs)
+
+
+class FakePage:
+    def __init__(self, chars_):
+        self.chars = chars_
+        self.width, self.height = WIDTH, HEIGHT
+
+    def flush_cache(self):
+        pass
+
+
+class FakePDF:
+    def __init__(self, pages):
+        self.pages = pages
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+@pytest.fixture
+def fake_pdfplumber(monkeypatch):
+    documents = {}
+
+    class FakePlumber:
+        @staticmethod
+        def open(source):
+            return FakePDF([FakePage(c) for c in documents[source]])
+
+    monkeypatch.setattr(pdf_layout, "pdfplumber", FakePlumber)
+    return documents
+
+
+BODY = "The committee met to review the annual plan and agreed on next steps"
+
+
+def test_lines_are_grouped_and_ordered():
+    # Characters arrive shuffled, with sub-glyph jitter in the baseline
+    line_two = chars("second line", 50, 120.6)
+    line_one = chars("first line", 50, 100) + chars("tail", 200, 100.8)
+    page = FakePage(list(reversed(line_two)) + line_one[::2] + line_one[1::2])
+    lines = pdf_layout._page_lines(page)
+    assert [l["text"] for l in lines] == ["first line tail", "second line"]
+    assert lines[0]["x0"] == 50 and lines[0]["x1"] == 200 + 4 * 5
+
+
+def test_spaces_are_inserted_between_positioned_words():
+    page = FakePage(chars("words set apart", 50, 100, space_glyphs=False, gap=4.0)
+                    + chars("tight kerning", 50, 130, space_glyphs=False, gap=0.5))
+    assert [l["text"] for l in pdf_layout._page_lines(page)] == ["words set apart", "tightkerning"]
+
+
+def test_line_size_font_and_boldness():
+    page = FakePage(chars("Bold Heading", 50, 100, size=14.2, font="XYZABC+Arial-BoldMT") + chars(" ", 200, 100, size=40))
+    (line,) = pdf_layout._page_lines(page)
+    assert line["size"] == 14.0
+    assert line["bold"] and line["font"] == "Arial-BoldMT"
+    assert line["chars"] == len("BoldHeading")
+
+
+def test_empty_page():
+    assert pdf_layout._page_lines(FakePage([])) == []
+
+
+def report_page(number, extra=()):
+    page = chars("Northwind Activity Report", 50, 20, size=8)
+    page += chars(f"Page {number}", 280, 770, size=8)
+    top = 100
+    for line in extra:
+        page += line(top)
+        top += 30
+    for i in range(6):
+        page += chars(f"{BODY} {i}.", 50, top + i * 14)
+    return page
+
+
+def test_headers_footers_headings_and_title(fake_pdfplumber):
+    fake_pdfplumber["doc.pdf"] = [
+        report_page(1, [lambda t: chars("Annual Planning", 50, t, size=24),
+                        lambda t: chars("Meeting Summary", 50, t, size=24),
+                        lambda t: chars("Budget Review", 50, t, size=18),
+                        lambda t: chars("Travel costs", 50, t, size=14)]),
+        report_page(2, [lambda t: chars("Key Decisions", 50, t, size=18, font="Helvetica-Bold"),
+                        lambda t: chars("Action items", 50, t, font="Helvetica-Bold")]),
+    ]
+    result = pdf_layout.analyze_layout("doc.pdf")
+    assert result["title"] == "Annual Planning Meeting Summary"
+    layout = result["layout"]
+    assert layout["hasHeader"] and layout["hasFooter"]
+    assert layout["bodyFontSize"] == 10.0
+    assert layout["headingLevels"] == [{"level": 1, "size": 24.0}, {"level": 2, "size": 18.0}, {"level": 3, "size": 14.0}]
+    headings = [(s["heading"], s["level"]) for s in result["sections"]]
+    assert headings == [("Budget Review", 2), ("Travel costs", 3), ("Key Decisions", 2), ("Action items", 4)]
+    text = " ".join(s["content"] for s in result["sections"])
+    assert "Northwind" not in text and "Page" not in text
+    assert result["sections"][1]["content"].startswith(BODY)
+
+
+def test_wrapped_heading_stays_one_section(fake_pdfplumber):
+    fake_pdfplumber["doc.pdf"] = [
+        chars("Report", 50, 60, size=24)
+        + chars("A long section heading that", 50, 100, size=16)
+        + chars("wraps onto a second line", 50, 120, size=16)
+        + chars(BODY, 50, 150)
+    ]
+    result = pdf_layout.analyze_layout("doc.pdf")
+    assert result["sections"][0]["heading"] == "A long section heading that wraps onto a second line"
+
+
+def test_single_page_footer_and_page_number(fake_pdfplumber):
+    fake_pdfplumber["doc.pdf"] = [chars(BODY, 50, 100) + chars("3", 300, 775)]
+    result = pdf_layout.analyze_layout("doc.pdf")
+    assert result["layout"]["hasFooter"] and not result["layout"]["hasHeader"]
+    assert result["title"] == "Content"
+    assert result["sections"] == [{"heading": "Content", "content": BODY, "level": 1}]
+
+
+def test_centered_alignment_and_font_class(fake_pdfplumber):
+    words = BODY.split()
+    page = []
+    for i in range(8):
+        page += centered(" ".join(words[:4 + i % 5]), 100 + i * 14, font="GHIJKL+TimesNewRomanPSMT")
+    fake_pdfplumber["doc.pdf"] = [page]
+    layout = pdf_layout.analyze_layout("doc.pdf")["layout"]
+    assert layout["alignment"] == "center"
+    assert layout["fontStyle"] == "academic"
+
+
+def test_blank_document(fake_pdfplumber):
+    fake_pdfplumber["doc.pdf"] = [chars("   ", 50, 100)]
+    assert pdf_layout.analyze_layout("doc.pdf") is None
@@ -0,0 +1,109 @@
+import asyncio
+import time
+
+import httpx
+from fastapi import FastAPI
+
+import profiling
+
+
+def profiled_work():
+    time.sleep(0.3)
+
+
+def other_work():
+    time.sleep(0.3)
+
+
+def make_app(output_dir):
+    app = FastAPI()
+
+    @app.middleware("http")
+    async def profile(request, call_next):
+        if request.headers.get("x-profile") != "secret":
+            return await call_next(request)
+        return await profiling.profile_request(request, call_next, output_dir, interval=0.005)
+
+    @app.get("/work")
+    def work(mine: bool = False):
+        (profiled_work if mine else other_work)()
+        return {"ok": True}
+
+    @app.get("/async-work")
+    async def async_work():
+        await asyncio.sleep(0.05)
+        return {"ok": True}
+
+    return app
+
+
+async def run_requests(app, requests):
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+        return await asyncio.gather(*(client.get(path, headers=headers) for path, headers in requests))
+
+
+def test_samples_only_the_profiled_request(tmp_path):
+    app = make_app(tmp_path)
+    responses = asyncio.run(run_requests(app, [("/work?mine=true", {"x-profile": "secret"})] + [("/work", {})] * 3))
+    assert all(r.status_code == 200 for r in responses)
+    folded = (tmp_path / responses[0].headers["x-profile-file"]).read_text()
+    assert int(responses[0].headers["x-profile-samples"]) > 0
+    assert "profiled_work" in folded
+    assert "other_work" not in folded
+
+
+def test_async_endpoints_keep_working(tmp_path):
+    app = make_app(tmp_path)
+    (response,) = asyncio.run(run_requests(app, [("/async-work", {"x-profile": "secret"})]))
+    assert response.status_code == 200
+    assert "x-profile-file" in response.headers
+
+
+def test_instrument_is_idempotent():
+    app = FastAPI()
+
+    @app.get("/x")
+    def x():
+        return 1
+
+    route = app.routes[-1]
+    profiling.instrument(app)
+    wrapped = route.dependant.call
+    profiling.instrument(app)
+    assert route.dependant.call is wrapped
+    assert wrapped.__wrapped__ is x
+
+
+def test_instrument_walks_mounted_apps(tmp_path):
+    app = make_app(tmp_path)
+    sub = FastAPI()
+
+    @sub.get("/nested")
+    def nested():
+        profiled_work()
+        return {"ok": True}
+
+    app.mount("/api/sub", sub)
+    (response,) = asyncio.run(run_requests(app, [("/api/sub/nested", {"x-profile": "secret"})]))
+    assert response.status_code == 200
+    assert getattr(sub.routes[-1].dependant.call, "_records_thread", False)
+    assert "profiled_work" in (tmp_path / response.headers["x-profile-file"]).read_text()
+
+
+def test_instrument_marks_wrapped_calls_not_routes():
+    app = FastAPI()
+
+    @app.get("/x")
+    def x():
+        return 1
+
+    profiling.instrument(app)
+    # The mark lives on the call, so a new route is wrapped whatever its id
+    app.router.routes.clear()
+
+    @app.get("/y")
+    def y():
+        return 2
+
+    profiling.instrument(app)
+    assert app.routes[-1].dependant.call.__wrapped__ is y
@@ -0,0 +1,83 @@
+import json
+
+import pytest
+
+import doc_chunking
+import prompt_budget
+
+ANALYZE = "/api/ai/analyze_document"
+
+
+def test_analyze_budget_fits_a_full_chunk():
+    prompt_tokens, output_tokens = prompt_budget.endpoint_budget(ANALYZE)
+    assert prompt_tokens > doc_chunking.ANALYZE_CHUNK_TOKENS
+    assert output_tokens == doc_chunking.ANALYZE_OUTPUT_TOKENS
+
+
+def test_no_analyze_chunk_is_trimmed(capsys):
+    page = "\n".join(f"SECTION {i}\n" + "Words of the activity report go here. " * 60 for i in range(4))
+    text = doc_chunking.PAGE_BREAK.join([page] * 15)
+    chunks = doc_chunking.split_document(text)
+    assert len(chunks) > 1
+    for index, chunk in enumerate(chunks):
+        messages = [{"role": "user", "content": doc_chunking.analyze_prompt(chunk, index, len(chunks))}]
+        fitted, _ = prompt_budget.fit_messages(messages, "gpt-4o-mini", ANALYZE)
+        assert fitted is messages
+    assert "[BUDGET]" not in capsys.readouterr().out
+
+
+def test_strict_endpoint_raises_instead_of_trimming():
+    prompt_tokens, _ = prompt_budget.endpoint_budget(ANALYZE)
+    messages = [{"role": "user", "content": "word " * (prompt_tokens * 2)}]
+    with pytest.raises(prompt_budget.PromptTooLarge):
+        prompt_budget.fit_messages(messages, "gpt-4o-mini", ANALYZE)
+
+
+def test_other_endpoints_are_trimmed_to_budget():
+    prompt_tokens, _ = prompt_budget.endpoint_budget("/ai/plan")
+    messages = [{"role": "system", "content": "Plan."}, {"role": "user", "content": "word " * (prompt_tokens * 2)}]
+    fitted, used = prompt_budget.fit_messages(messages, "gpt-4o-mini", "/ai/plan")
+    assert used <= prompt_tokens
+    assert fitted[0] == messages[0]
+    assert fitted[1]["content"].endswith(prompt_budget.TRUNCATION_MARK)
+
+
+def test_fit_json_stays_valid_json():
+    value = {"items": [{"name": f"item {i}", "notes": "x" * 500} for i in range(200)]}
+    text = prompt_budget.fit_json(value, 500)
+    assert prompt_budget.count_tokens(text) <= 500
+    assert "more items omitted" in json.loads(text)["items"][-1]
+
+
+def test_output_tokens_respect_the_context_window():
+    assert prompt_budget.output_tokens(100, "gpt-4o-mini", "/ai/plan") == 1200
+    assert prompt_budget.output_tokens(8000, "gpt-4", "/ai/report") == 192
+    assert prompt_budget.context_window("gpt-4o-2024-08-06") == 128000
+
+
+def test_offline_tiktoken_falls_back_to_the_estimate(monkeypatch):
+    calls = []
+
+    class OfflineTiktoken:
+        @staticmethod
+        def encoding_for_model(model):
+            calls.append(model)
+            raise ConnectionError("cannot download o200k_base.tiktoken")
+
+        @staticmethod
+        def get_encoding(name):
+            calls.append(name)
+            raise ConnectionError("cannot download " + name)
+
+    monkeypatch.setattr(prompt_budget, "tiktoken", OfflineTiktoken)
+    monkeypatch.setattr(prompt_budget, "_encoding_failed", False)
+    prompt_budget.get_encoding.cache_clear()
+    try:
+        assert prompt_budget.count_tokens("x" * 40) == 10
+        assert prompt_budget.count_tokens("x" * 40, "gpt-4o") == 10
+        assert prompt_budget.truncate_text("x" * 400, 10).endswith(prompt_budget.TRUNCATION_MARK)
+        # Module-level budgets are computed the same way at import time
+        assert doc_chunking.prompt_tokens_needed() > doc_chunking.ANALYZE_CHUNK_TOKENS
+        assert calls == ["gpt-4o-mini"]
+    finally:
+        prompt_budget.get_encoding.cache_clear()
@@ -0,0 +1,53 @@
+import socket
+import threading
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+import pytest
+
+from run_both_servers import connect_host, wait_for_http_ready
+
+
+@pytest.mark.parametrize("host, expected", [
+    ("0.0.0.0", "127.0.0.1"),
+    ("", "127.0.0.1"),
+    ("::", "[::1]"),
+    ("10.0.0.5", "10.0.0.5"),
+    ("fe80::1", "[fe80::1]"),
+    ("app.internal", "app.internal"),
+])
+def test_connect_host(host, expected):
+    assert connect_host(host) == expected
+
+
+class Health(BaseHTTPRequestHandler):
+    def do_GET(self):
+        self.send_response(200)
+        self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+
+def test_polls_the_bound_host():
+    # Bound to a specific address, not the wildcard: 127.0.0.1 would not answer
+    try:
+        server = HTTPServer(("127.0.0.2", 0), Health)
+    except OSError:
+        pytest.skip("127.0.0.2 is not routable here")
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        host, port = server.server_address
+        elapsed, attempts = wait_for_http_ready(f"http://{connect_host(host)}:{port}/health", timeout=5)
+        assert elapsed is not None and attempts == 1
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def test_gives_up_after_timeout():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+    elapsed, attempts = wait_for_http_ready(f"http://127.0.0.1:{port}/health", timeout=0.3, initial_delay=0.05)
+    assert elapsed is None and attempts >= 2
+
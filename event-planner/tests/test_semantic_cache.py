@@ -0,0 +1,89 @@
+import numpy as np
+import pytest
+
+import embeddings
+import semantic_cache
+
+
+class FakeService:
+    """Bag-of-words vectors over a fixed vocabulary, standing in for the model."""
+
+    def __init__(self):
+        self.collections = {}
+
+    def encode(self, texts):
+        rows = []
+        for text in texts:
+            vector = np.zeros(64, dtype=np.float32)
+            for word in text.lower().split():
+                vector[hash(word) % 64] += 1.0
+            rows.append(vector / max(np.linalg.norm(vector), 1e-12))
+        return np.vstack(rows)
+
+    def collection(self, name):
+        return self.collections.setdefault(name, embeddings.Collection(name))
+
+
+@pytest.fixture
+def cache(monkeypatch):
+    fake = FakeService()
+    monkeypatch.setattr(embeddings, "available", lambda: True)
+    monkeypatch.setattr(embeddings, "encode", fake.encode)
+    monkeypatch.setattr(embeddings, "collection", fake.collection)
+    monkeypatch.setattr(semantic_cache, "SEMANTIC_CACHE", "on")
+    monkeypatch.setattr(semantic_cache, "OVERRIDES", {})
+    return semantic_cache.SemanticCache()
+
+
+def test_route_config_defaults_and_overrides(monkeypatch):
+    monkeypatch.setattr(semantic_cache, "SEMANTIC_CACHE", "shadow")
+    monkeypatch.setattr(semantic_cache, "OVERRIDES", {"/api/mindmap/summarize": {"mode": "on", "ttl": 60},
+                                                      "/custom": {"mode": "bogus"}})
+    summarize = semantic_cache.route_config("/api/mindmap/summarize")
+    assert (summarize["mode"], summarize["ttl"], summarize["threshold"]) == ("on", 60, 0.97)
+    assert semantic_cache.route_config("/ai/certificate/suggest")["mode"] == "shadow"
+    assert semantic_cache.route_config("/unlisted")["mode"] == "off"
+    assert semantic_cache.route_config("/custom")["mode"] == "off"
+
+
+def test_off_mode_neither_stores_nor_serves(cache, monkeypatch):
+    monkeypatch.setattr(semantic_cache, "SEMANTIC_CACHE", "off")
+    cache.store("/todo/analyze:rewrite", "buy milk", "Buy milk today")
+    assert cache.lookup("/todo/analyze:rewrite", "buy milk") is None
+
+
+def test_near_duplicate_is_served(cache):
+    cache.store("/todo/analyze:rewrite", "call the plumber about the kitchen sink", "Call plumber")
+    assert cache.lookup("/todo/analyze:rewrite", "call the plumber about the kitchen sink") == "Call plumber"
+    assert cache.lookup("/todo/analyze:rewrite", "book flights for the conference") is None
+
+
+def test_shadow_mode_never_serves(cache, monkeypatch):
+    cache.store("/todo/analyze:rewrite", "water the plants", "Water plants")
+    monkeypatch.setattr(semantic_cache, "SEMANTIC_CACHE", "shadow")
+    assert cache.lookup("/todo/analyze:rewrite", "water the plants") is None
+
+
+def test_long_documents_with_the_same_opening_do_not_match(cache):
+    opening = " ".join(f"intro{i}" for i in range(200))
+    first = opening + " " + " ".join(f"alpha{i}" for i in range(600))
+    second = opening + " " + " ".join(f"beta{i}" for i in range(600))
+    assert len(first[:semantic_cache.WINDOW_CHARS]) == semantic_cache.WINDOW_CHARS
+    assert first[:semantic_cache.WINDOW_CHARS] == second[:semantic_cache.WINDOW_CHARS]
+    cache.store("/api/mindmap/summarize", first, {"title": "first"})
+    assert cache.lookup("/api/mindmap/summarize", second) is None
+    assert cache.lookup("/api/mindmap/summarize", first) == {"title": "first"}
+
+
+def test_length_mismatch_is_rejected():
+    config = semantic_cache.route_config("/api/mindmap/summarize")
+    assert semantic_cache.acceptable(config, "a" * 1000, "a" * 1050)
+    assert not semantic_cache.acceptable(config, "a" * 1000, "a" * 1300)
+
+
+def test_certificate_names_must_match():
+    config = semantic_cache.route_config("/ai/certificate/suggest")
+    template = "This certifies that {} completed the course on 12/05/2025 with distinction."
+    assert semantic_cache.acceptable(config, template.format("Maria Lopez"), template.format("Maria Lopez"))
+    assert not semantic_cache.acceptable(config, template.format("Maria Lopez"), template.format("Mario Lopez"))
+    assert semantic_cache.name_tokens("José met them on 3/4") == ["3/4", "José"]
@@ -0,0 +1,153 @@
+import json
+import os
+import re
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from static_assets import (
+    IMMUTABLE_CACHE_CONTROL,
+    AssetManifest,
+    FingerprintedStaticFiles,
+    file_digest,
+    fingerprint_url,
+    split_fingerprint,
+)
+
+SW_TEMPLATE = """const CACHE_NAME = 'creative-studio-v1';
+const urlsToCache = [
+  '/',
+  '/css/old.css'
+];
+const ASSET_MANIFEST = {};
+self.addEventListener('install', () => {});
+"""
+
+
+@pytest.fixture
+def site(tmp_path):
+    (tmp_path / "css").mkdir()
+    (tmp_path / "css" / "style.css").write_text("body { color: red; }")
+    (tmp_path / "js").mkdir()
+    (tmp_path / "js" / "app.js").write_text("console.log('hi');")
+    (tmp_path / "data.json").write_text("{}")
+    (tmp_path / "index.html").write_text("<html></html>")
+    (tmp_path / "backend").mkdir()
+    (tmp_path / "backend" / "secret.js").write_text("x")
+    return tmp_path
+
+
+@pytest.fixture
+def manifest(site):
+    manifest = AssetManifest()
+    manifest.register("/site/", site)
+    return manifest
+
+
+@pytest.fixture
+def client(site, manifest):
+    app = FastAPI()
+    app.mount("/site", FingerprintedStaticFiles(directory=str(site), manifest=manifest, url_prefix="/site"))
+    return TestClient(app)
+
+
+def test_fingerprint_naming():
+    assert fingerprint_url("/css/a.css", "0123456789") == "/css/a.0123456789.css"
+    assert fingerprint_url("/css/a.min.css", "0123456789") == "/css/a.min.0123456789.css"
+    assert fingerprint_url("/LICENSE", "0123456789") == "/LICENSE.0123456789"
+    assert split_fingerprint("css/a.min.0123456789.css") == ("css/a.min.css", "0123456789")
+    assert split_fingerprint("css/a.css") == ("css/a.css", None)
+    assert split_fingerprint("css/a.abc.css") == ("css/a.abc.css", None)
+
+
+def test_register_hashes_cacheable_files_only(site, manifest):
+    digest = file_digest(site / "css" / "style.css")
+    assert manifest.assets["/site/css/style.css"] == f"/site/css/style.{digest}.css"
+    assert set(manifest.assets) == {"/site/css/style.css", "/site/js/app.js"}
+
+
+def test_hashed_url_is_immutable(client, manifest):
+    hashed = manifest.assets["/site/css/style.css"]
+    response = client.get(hashed)
+    assert response.status_code == 200
+    assert response.text == "body { color: red; }"
+    assert response.headers["cache-control"] == IMMUTABLE_CACHE_CONTROL
+
+    plain = client.get("/site/css/style.css")
+    assert plain.status_code == 200
+    assert "cache-control" not in plain.headers
+
+
+def test_unknown_digest_falls_through(client, site):
+    assert client.get("/site/css/other.0123456789.css").status_code == 404
+    # A real file that only looks fingerprinted is served as-is
+    (site / "css" / "vendor.0123456789.css").write_text("a {}")
+    response = client.get("/site/css/vendor.0123456789.css")
+    assert response.status_code == 200
+    assert "cache-control" not in response.headers
+
+
+def test_edited_file_is_rehashed(client, site, manifest):
+    old = manifest.assets["/site/css/style.css"]
+    version = manifest.version
+    path = site / "css" / "style.css"
+    path.write_text("body { color: blue; }")
+    os.utime(path, ns=(path.stat().st_atime_ns, path.stat().st_mtime_ns + 1_000_000_000))
+
+    # The old URL no longer claims to be immutable
+    stale = client.get(old)
+    assert stale.status_code == 200
+    assert stale.text == "body { color: blue; }"
+    assert stale.headers["cache-control"] == "no-cache"
+
+    new = manifest.assets["/site/css/style.css"]
+    assert new != old and new == f"/site/css/style.{file_digest(path)}.css"
+    assert manifest.version != version
+    assert client.get(new).headers["cache-control"] == IMMUTABLE_CACHE_CONTROL
+
+
+def test_deleted_file_leaves_the_manifest(site, manifest):
+    (site / "js" / "app.js").unlink()
+    html = '<script src="/site/js/app.js"></script>'
+    assert manifest.rewrite_html(html) == html
+    assert "/site/js/app.js" not in manifest.assets
+
+
+def test_rewrite_html(site, manifest):
+    css = manifest.assets["/site/css/style.css"]
+    js = manifest.assets["/site/js/app.js"]
+    html = (
+        '<link href="/site/css/style.css" rel="stylesheet">'
+        "<script src='../js/app.js'></script>"
+        '<a href="/site/css/style.css#top">x</a>'
+        '<script src="https://cdn.example.com/site/js/app.js"></script>'
+        '<img src="/site/missing.png">'
+    )
+    rewritten = manifest.rewrite_html(html, base_url="/site/pages/index.html")
+    assert f'href="{css}"' in rewritten
+    assert "src='../js/app.js'" in rewritten  # ".." is not resolved, so it is left alone
+    assert '<a href="/site/css/style.css#top">' in rewritten
+    assert 'src="https://cdn.example.com/site/js/app.js"' in rewritten
+    assert 'src="/site/missing.png"' in rewritten
+    assert manifest.rewrite_html('<script src="app.js"></script>', base_url="/site/js/") == f'<script src="{js}"></script>'
+
+
+def test_service_worker_template(manifest):
+    rendered = manifest.render_service_worker(SW_TEMPLATE)
+    assert f"const CACHE_NAME = 'creative-studio-{manifest.version}';" in rendered
+    urls = json.loads(re.search(r"const urlsToCache = (\[[\s\S]*?\]);", rendered).group(1))
+    assert urls == ["/", "/index.html"]  # /site/ is not a precache prefix
+    assets = json.loads(re.search(r"const ASSET_MANIFEST = (\{.*\});", rendered).group(1))
+    assert assets == manifest.assets
+    assert rendered.endswith("self.addEventListener('install', () => {});\n")
+    assert manifest.render_service_worker(SW_TEMPLATE) is rendered
+
+
+def test_service_worker_precache_list(tmp_path):
+    (tmp_path / "css").mkdir()
+    (tmp_path / "css" / "a.css").write_text("a {}")
+    (tmp_path / "css" / "logo.png").write_bytes(b"png")
+    manifest = AssetManifest()
+    manifest.register("/", tmp_path)
+    assert manifest.precache_urls() == ["/", "/index.html", manifest.assets["/css/a.css"]]
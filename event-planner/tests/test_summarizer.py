@@ -0,0 +1,89 @@
+import pytest
+
+import embeddings
+import summarizer
+
+pytestmark = pytest.mark.skipif(not summarizer.available(), reason="needs NumPy")
+
+TEXT = """Solar Energy Basics
+
+Solar panels convert sunlight into electricity using photovoltaic cells.
+The photovoltaic cells in solar panels are made of silicon layers. Sunlight frees electrons in the silicon, which creates a current.
+Inverters turn the direct current from solar panels into alternating current for the home.
+My neighbour painted his fence green last weekend.
+Batteries store electricity from solar panels for use at night. Net metering lets homes sell extra solar electricity to the grid.
+- Solar electricity costs have fallen sharply over the last decade.
+- Rooftop solar panels suit most sunny regions.
+"""
+
+
+@pytest.fixture(autouse=True)
+def tfidf(monkeypatch):
+    monkeypatch.setattr(embeddings, "encode", lambda sentences: None)
+
+
+def test_split_sentences_keeps_lines_and_strips_bullets():
+    sentences = summarizer.split_sentences(TEXT)
+    assert sentences[0] == "Solar Energy Basics"
+    assert "The photovoltaic cells in solar panels are made of silicon layers." in sentences
+    assert sentences[-1] == "Rooftop solar panels suit most sunny regions."
+    assert summarizer.split_sentences("Dr. smith arrived. Then he left.") == ["Dr. smith arrived.", "Then he left."]
+
+
+def test_textrank_favours_central_sentences():
+    sentences = summarizer.split_sentences(TEXT)[1:]
+    scores = summarizer.textrank(summarizer.embed(sentences))
+    assert scores.sum() == pytest.approx(1.0)
+    assert scores.argmin() == sentences.index("My neighbour painted his fence green last weekend.")
+
+
+def test_textrank_of_one_sentence():
+    assert summarizer.textrank(summarizer.embed(["Only one sentence here."])).tolist() == [1.0]
+
+
+def test_summary_lengths_respect_their_budgets():
+    result = summarizer.summarize(TEXT)
+    assert len(result["summary_short"]) <= summarizer.SHORT_CHARS
+    assert len(result["summary_medium"]) <= summarizer.MEDIUM_CHARS
+    assert len(result["summary_detailed"]) <= summarizer.DETAILED_CHARS
+    assert len(result["summary_short"]) < len(result["summary_medium"]) <= len(result["summary_detailed"])
+
+
+def test_summary_sentences_stay_in_document_order():
+    result = summarizer.summarize(TEXT)
+    sentences = summarizer.split_sentences(TEXT)
+    picked = [s for s in sentences if s in result["summary_detailed"]]
+    positions = [result["summary_detailed"].index(s) for s in picked]
+    assert len(picked) > 2 and positions == sorted(positions)
+
+
+def test_summary_shape_title_and_keywords():
+    result = summarizer.summarize(TEXT)
+    assert set(result) == {"title", "summary_short", "summary_medium", "summary_detailed", "key_points", "keywords"}
+    assert result["title"] == "Solar Energy Basics"
+    assert len(result["key_points"]) == summarizer.KEY_POINTS
+    # Headings are kept out of the ranking when there is prose
+    assert "Solar Energy Basics" not in result["key_points"]
+    assert any("solar" in k for k in result["keywords"])
+
+
+def test_one_sentence_text():
+    result = summarizer.summarize("Photosynthesis turns light into chemical energy.")
+    assert result["summary_short"] == result["summary_detailed"] == "Photosynthesis turns light into chemical energy."
+    assert result["key_points"] == ["Photosynthesis turns light into chemical energy."]
+
+
+def test_a_sentence_longer_than_the_budget_is_still_returned():
+    long_sentence = "Energy " + "and more energy " * 30 + "is everywhere."
+    assert summarizer.summarize(long_sentence)["summary_short"] == long_sentence
+
+
+@pytest.mark.parametrize("text", ["", "   \n\n", None])
+def test_empty_text(text):
+    assert summarizer.summarize(text) is None
+
+
+def test_title_prefers_a_heading_line():
+    assert summarizer.title("# Unit 3: Cells\nCells are small.", ["cells"]) == "Unit 3: Cells"
+    assert summarizer.title("Cells are the units of life.", ["cell biology"]) == "Cell Biology"
+    assert summarizer.title("", []) == "Summary"
@@ -0,0 +1,110 @@
+import asyncio
+import mmap
+import tempfile
+
+import httpx
+from fastapi import FastAPI, File, UploadFile
+from starlette.datastructures import UploadFile as StarletteUpload
+
+import uploads
+
+LIMIT = 1000
+
+
+def make_app():
+    app = FastAPI()
+    app.state.calls = 0
+
+    @app.post("/upload")
+    async def upload(file: UploadFile = File(...)):
+        app.state.calls += 1
+        return {"size": len(await file.read())}
+
+    @app.post("/echo")
+    async def echo(payload: dict):
+        return {"keys": len(payload)}
+
+    app.add_middleware(uploads.UploadLimitMiddleware, paths=["/upload"], max_bytes=LIMIT)
+    return app
+
+
+def request(app, path, **kwargs):
+    async def run():
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+            return await client.post(path, **kwargs)
+    return asyncio.run(run())
+
+
+def test_small_upload_passes():
+    app = make_app()
+    response = request(app, "/upload", files={"file": ("a.txt", b"x" * 100)})
+    assert response.status_code == 200
+    assert response.json() == {"size": 100}
+
+
+def test_declared_length_over_limit_is_refused_before_the_app():
+    app = make_app()
+    response = request(app, "/upload", files={"file": ("a.txt", b"x" * (LIMIT * 2))})
+    assert response.status_code == 413
+    assert response.json() == {"detail": "Upload exceeds the 1 KB limit"}
+    assert app.state.calls == 0
+
+
+def test_streamed_body_is_cut_off_at_the_limit():
+    app = make_app()
+    sent = []
+
+    payload = (b'--boundary\r\nContent-Disposition: form-data; name="file"; filename="a.txt"\r\n\r\n'
+               + b"x" * 3000 + b"\r\n--boundary--\r\n")
+
+    async def body():
+        # No Content-Length: the middleware has to count the chunks
+        for start in range(0, len(payload), 300):
+            sent.append(1)
+            yield payload[start:start + 300]
+
+    response = request(app, "/upload", content=body(),
+                       headers={"content-type": "multipart/form-data; boundary=boundary"})
+    assert response.status_code == 413
+    assert app.state.calls == 0
+    assert len(sent) < len(payload) // 300
+
+
+def test_other_paths_are_not_limited():
+    response = request(make_app(), "/echo", json={f"k{i}": "x" * 100 for i in range(50)})
+    assert response.status_code == 200
+
+
+def spooled(data, max_size):
+    f = tempfile.SpooledTemporaryFile(max_size=max_size)
+    f.write(data)
+    return StarletteUpload(file=f, filename="doc.pdf")
+
+
+def test_upload_source_maps_spooled_files():
+    upload = spooled(b"%PDF" + b"x" * 5000, max_size=1024)
+    assert uploads.upload_size(upload) == 5004
+    with uploads.upload_source(upload) as source:
+        assert isinstance(source, mmap.mmap)
+        assert source[:4] == b"%PDF"
+    assert source.closed
+
+
+def test_upload_source_keeps_small_files_in_memory():
+    upload = spooled(b"%PDF small", max_size=1024)
+    with uploads.upload_source(upload) as source:
+        assert source is upload.file
+        assert source.read() == b"%PDF small"
+    assert not upload.file._rolled
+
+
+def test_empty_spooled_file_is_not_mapped():
+    upload = spooled(b"", max_size=1024)
+    upload.file.rollover()
+    with uploads.upload_source(upload) as source:
+        assert source is upload.file
+
+
+def test_limit_text():
+    assert uploads._limit_text(50 * 1024 * 1024) == "50 MB"
+    assert uploads._limit_text(1000) == "1 KB"
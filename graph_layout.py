@@ -0,0 +1,237 @@
+"""
+Server-side layout and level of detail for /api/mindmap/analyze graphs.
+
+vis-network lays out a few dozen nodes comfortably, but hundreds of nodes
+freeze low-end clients while the physics settles, which is why graphs used
+to be cut to 24 nodes. Positions are now computed here with NumPy:
+
+- flowcharts use a Sugiyama-style layered layout. The layer is the node's
+  `level` (else its BFS depth from Start). Nodes within a layer are ordered
+  by barycenter sweeps to reduce edge crossings.
+- other graphs use a vectorized Fruchterman-Reingold force-directed layout.
+  Every node starts at an angle derived from its id, so stable ids (see
+  mindmap_incremental) keep roughly the same place across regenerations.
+
+Level of detail keeps the `max_visible` nodes nearest the root by BFS depth.
+Deeper nodes are returned with `hidden: true` and an `anchor` (their nearest
+visible ancestor), and visible nodes carry a `collapsed` count, so the client
+draws the overview and expands a branch on demand. Positions are computed
+for every node, so expanding never moves what is already drawn.
+"""
+
+import hashlib
+import json
+import math
+import os
+from collections import deque
+
+import summarizer
+
+np = summarizer.np
+
+LAYOUT_VERSION = "layout-v1"
+MAX_NODES = int(os.getenv("MINDMAP_MAX_NODES", "400"))
+DEFAULT_VISIBLE = int(os.getenv("MINDMAP_VISIBLE_NODES", "60"))
+# Clients that do not ask for a layout get the old readable size
+UNLAID_NODES = 24
+# Same spacing as the frontend's hierarchical flowchart options
+NODE_SPACING, LEVEL_SPACING = 180.0, 150.0
+FORCE_ITERATIONS = 150
+SWEEPS = 8
+
+
+def _index(graph):
+    """Node ids and de-duplicated (source, target) index pairs of a graph."""
+    ids = [str(n.get("id")) for n in graph.get("nodes") or []]
+    position = {node_id: i for i, node_id in enumerate(ids)}
+    pairs, seen = [], set()
+    for edge in graph.get("edges") or []:
+        source, target = position.get(str(edge.get("from"))), position.get(str(edge.get("to")))
+        if source is None or target is None or source == target or (source, target) in seen:
+            continue
+        seen.add((source, target))
+        pairs.append((source, target))
+    return ids, pairs
+
+
+def _roots(graph, ids):
+    nodes = graph.get("nodes") or []
+    roots = [i for i, n in enumerate(nodes) if n.get("level") == 0 or n.get("id") in ("root", "start")]
+    return roots or ([0] if ids else [])
+
+
+def depths(graph):
+    """BFS depth and BFS parent (index, or None) of every node, ignoring edge direction.
+
+    Components not reachable from the root hang one level below it.
+    """
+    ids, pairs = _index(graph)
+    neighbours = [[] for _ in ids]
+    for source, target in pairs:
+        neighbours[source].append(target)
+        neighbours[target].append(source)
+    depth = [None] * len(ids)
+    parent = [None] * len(ids)
+    roots = _roots(graph, ids)
+    for start in roots + list(range(len(ids))):
+        if depth[start] is not None:
+            continue
+        depth[start] = 0 if start in roots else 1
+        queue = deque([start])
+        while queue:
+            current = queue.popleft()
+            for neighbour in neighbours[current]:
+                if depth[neighbour] is None:
+                    depth[neighbour] = depth[current] + 1
+                    parent[neighbour] = current
+                    queue.append(neighbour)
+    return depth, parent
+
+
+def _visible(depth, parent, max_visible: int):
+    """Indices of the max_visible shallowest nodes, a prefix by depth, so BFS parents are always in.
+
+    Within a depth, siblings are taken round-robin across parents, so every
+    branch shows its first children before any branch shows all of them.
+    """
+    sibling_rank, seen = [], {}
+    for i in range(len(depth)):
+        sibling_rank.append(seen.get(parent[i], 0))
+        seen[parent[i]] = sibling_rank[-1] + 1
+    order = sorted(range(len(depth)), key=lambda i: (depth[i], sibling_rank[i], i))
+    return set(order[:max(1, max_visible)])
+
+
+def truncate(graph, limit: int):
+    """The graph cut to its `limit` shallowest nodes, dropping edges to removed nodes."""
+    nodes = graph.get("nodes") or []
+    if len(nodes) <= limit:
+        return graph
+    depth, parent = depths(graph)
+    keep = _visible(depth, parent, limit)
+    kept_nodes = [n for i, n in enumerate(nodes) if i in keep]
+    valid = {str(n.get("id")) for n in kept_nodes}
+    edges = [e for e in graph.get("edges") or [] if str(e.get("from")) in valid and str(e.get("to")) in valid]
+    return dict(graph, nodes=kept_nodes, edges=edges)
+
+
+# --- positions ------------------------------------------------------------------
+def _seed_positions(ids, depth):
+    """Deterministic start positions: angle from the id hash, radius from the depth."""
+    angles = np.array([int(hashlib.sha256(i.encode("utf-8")).hexdigest()[:8], 16) / 0xFFFFFFFF * 2 * math.pi for i in ids])
+    radius = np.array(depth, dtype=float) * NODE_SPACING
+    return np.column_stack([radius * np.cos(angles), radius * np.sin(angles)])
+
+
+def force_directed(ids, pairs, depth, roots, iterations: int = FORCE_ITERATIONS):
+    """Fruchterman-Reingold positions (n x 2); the roots stay pinned at their seed."""
+    pos = _seed_positions(ids, depth)
+    n = len(ids)
+    if n < 2:
+        return pos
+    k = NODE_SPACING
+    src = np.array([s for s, _ in pairs], dtype=int)
+    dst = np.array([t for _, t in pairs], dtype=int)
+    pinned = np.zeros(n, dtype=bool)
+    pinned[roots] = True
+    temperature = 2 * k
+    for _ in range(iterations):
+        squared = (pos ** 2).sum(axis=1)
+        dist2 = np.maximum(squared[:, None] + squared[None, :] - 2 * pos @ pos.T, 1e-2)
+        np.fill_diagonal(dist2, np.inf)
+        # Repulsion k^2/d along the unit vector sums to pos_i * sum_j w_ij - (w @ pos)_i, w = k^2 / d^2
+        weights = k * k / dist2
+        disp = pos * weights.sum(axis=1, keepdims=True) - weights @ pos
+        if len(src):
+            pull = pos[src] - pos[dst]
+            pull *= np.linalg.norm(pull, axis=1, keepdims=True) / k
+            np.add.at(disp, src, -pull)
+            np.add.at(disp, dst, pull)
+        disp[pinned] = 0.0
+        length = np.maximum(np.linalg.norm(disp, axis=1, keepdims=True), 1e-9)
+        pos += disp / length * np.minimum(length, temperature)
+        temperature = max(temperature * 0.95, k * 0.02)
+    return pos
+
+
+def hierarchical(graph, ids, pairs, depth, sweeps: int = SWEEPS):
+    """Layered positions (n x 2): layers top-down, barycenter ordering within each layer."""
+    nodes = graph.get("nodes") or []
+    levels = [n.get("level") for n in nodes]
+    if all(isinstance(level, int) for level in levels):
+        layer = np.array(levels)
+    else:
+        layer = np.array(depth)
+    n = len(ids)
+    adjacency = np.zeros((n, n))
+    for source, target in pairs:
+        adjacency[source, target] = adjacency[target, source] = 1.0
+    order = np.zeros(n)
+    members = {}
+    for i in range(n):
+        members.setdefault(int(layer[i]), []).append(i)
+    for group in members.values():
+        order[group] = np.arange(len(group))
+    layers = sorted(members)
+    # Layers differ in width, so barycenters are taken over centred positions
+    half = np.array([(len(members[int(layer[i])]) - 1) / 2 for i in range(n)])
+    for sweep in range(sweeps):
+        downward = sweep % 2 == 0
+        for current in (layers if downward else layers[::-1]):
+            group = np.array(members[current])
+            reference = (layer < current) if downward else (layer > current)
+            weights = adjacency[np.ix_(group, np.flatnonzero(reference))]
+            counts = weights.sum(axis=1)
+            centred = order - half
+            bary = np.where(counts > 0, weights @ centred[reference] / np.maximum(counts, 1), centred[group])
+            # Ties keep the current order, so the layout settles
+            ranked = group[np.lexsort((order[group], bary))]
+            order[ranked] = np.arange(len(ranked))
+            members[current] = list(ranked)
+    return np.column_stack([(order - half) * NODE_SPACING, layer * LEVEL_SPACING])
+
+
+# --- entry point ----------------------------------------------------------------
+def algorithm_for(graph) -> str:
+    return "hierarchical" if graph.get("type") == "flowchart" else "force"
+
+
+def layout(graph, max_visible: int = DEFAULT_VISIBLE, algorithm: str = None):
+    """A copy of `graph` with x/y on every node and level-of-detail hints.
+
+    Positions need NumPy; without it only the level of detail is applied.
+    """
+    algorithm = algorithm or algorithm_for(graph)
+    nodes = [dict(n) for n in (graph.get("nodes") or [])[:MAX_NODES]]
+    graph = dict(graph, nodes=nodes)
+    ids, pairs = _index(graph)
+    depth, parent = depths(graph)
+    if np is not None and nodes:
+        if algorithm == "hierarchical":
+            pos = hierarchical(graph, ids, pairs, depth)
+        else:
+            pos = force_directed(ids, pairs, depth, _roots(graph, ids))
+        for node, (x, y) in zip(nodes, pos.tolist()):
+            node["x"], node["y"] = round(x, 1), round(y, 1)
+
+    visible = _visible(depth, parent, max_visible)
+    collapsed = {}
+    for i, node in enumerate(nodes):
+        if i in visible:
+            continue
+        anchor = parent[i]
+        while anchor is not None and anchor not in visible:
+            anchor = parent[anchor]
+        node["hidden"] = True
+        if anchor is not None:
+            node["anchor"] = ids[anchor]
+            collapsed[anchor] = collapsed.get(anchor, 0) + 1
+    for i, count in collapsed.items():
+        nodes[i]["collapsed"] = count
+    graph["layout"] = {"algorithm": algorithm, "visible": len(visible), "total": len(nodes)}
+    return graph
+
+
+def graph_key(graph) -> str:
+    """Canonical text of a graph's structure, used as the layout cache key."""
+    return json.dumps({k: graph.get(k) for k in ("type", "nodes", "edges")}, sort_keys=True, ensure_ascii=False)
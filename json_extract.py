@@ -0,0 +1,148 @@
+"""
+Single-pass extraction of JSON values from model output.
+
+Models wrap JSON in code fences or prose, leave trailing commas, put raw
+newlines inside strings, or stop mid-value when they hit max_tokens. The old
+approach ran several regex passes over the whole reply and only looked for
+objects, so top-level arrays (as /ai/plan and /ai/budget expect) and replies
+containing more than one object failed. Here each object or array in the
+reply is tried in order, in one forward pass: a well-formed leading value
+is decoded by the C decoder straight from its opening bracket, and after
+that each value is delimited (and if needed repaired) by a string-aware
+bracket scanner before it is decoded. The first value that parses is
+returned. Used by force_json in server.py and by the
+event-planner backend.
+"""
+
+import json
+import re
+
+_CLOSERS = {"{": "}", "[": "]"}
+_OPEN_RE = re.compile(r"[{\[]")
+# Only string literals, brackets and commas matter to the scanner; numbers,
+# literals, colons and whitespace between them are never visited.
+_STRUCTURE_RE = re.compile(r'"[^"\\]*(?:\\.[^"\\]*)*(?:(?P<closed>")|\\?\Z)|[{}\[\],]')
+_RAW_CONTROL = re.compile(r"[\n\r\t]")
+_STRING_ESCAPES = str.maketrans({"\n": "\\n", "\r": "\\r", "\t": "\\t"})
+_WHITESPACE = " \t\r\n"
+_decoder = json.JSONDecoder()
+
+
+def _apply(text, start, stop, edits):
+    """text[start:stop] with (position, end, replacement) edits applied; edits are in order."""
+    out = []
+    pos = start
+    for edit_start, edit_end, replacement in edits:
+        if edit_start >= stop:
+            break
+        out.append(text[pos:edit_start])
+        out.append(replacement)
+        pos = edit_end
+    out.append(text[pos:stop])
+    return "".join(out)
+
+
+def repair_candidates(text: str, start: int):
+    """Repaired versions of the JSON value opening at text[start]; returns (candidates, end).
+
+    Repairs: trailing commas before a closer are dropped, raw newlines and
+    tabs inside strings are escaped, and a value truncated at the end of the
+    text is closed (first as is, then without its unfinished last member).
+    A mismatched closer abandons the value. `end` is where scanning stopped,
+    so callers resume there and every character is scanned at most once.
+    """
+    stack = []
+    commas = []  # per open container: text index of its last comma
+    edits = []
+    unterminated = None
+    for match in _STRUCTURE_RE.finditer(text, start):
+        token = match.group()
+        first = token[0]
+        if first == '"':
+            if match.group("closed") is None:
+                unterminated = match
+                break
+            if _RAW_CONTROL.search(token):
+                edits.append((match.start(), match.end(), token.translate(_STRING_ESCAPES)))
+        elif first in _CLOSERS:
+            stack.append(_CLOSERS[first])
+            commas.append(None)
+        elif first == ",":
+            commas[-1] = match.start()
+        else:
+            if first != stack[-1]:
+                return [], match.end()
+            comma = commas.pop()
+            if comma is not None and not text[comma + 1:match.start()].strip(_WHITESPACE):
+                edits.append((comma, comma + 1, ""))
+            stack.pop()
+            if not stack:
+                return [_apply(text, start, match.end(), edits)], match.end()
+
+    # Ran off the end of the text with containers still open
+    closers = "".join(reversed(stack))
+    if unterminated is not None:
+        token = unterminated.group()
+        if (len(token) - len(token.rstrip("\\"))) % 2:
+            token = token[:-1]  # dangling escape
+        if _RAW_CONTROL.search(token):
+            token = token.translate(_STRING_ESCAPES)
+        body = _apply(text, start, unterminated.start(), edits) + token + '"'
+    else:
+        body = _apply(text, start, len(text), edits)
+    body = body.rstrip(_WHITESPACE)
+    if body.endswith(","):
+        body = body[:-1]
+    if body.endswith(":"):
+        body += " null"
+    candidates = [body + closers]
+    if commas and commas[-1] is not None:
+        candidates.append(_apply(text, start, commas[-1], edits) + closers)
+    return candidates, len(text)
+
+
+def _decoded(candidate, expect):
+    try:
+        value = json.loads(candidate)
+    except (ValueError, RecursionError):
+        return None
+    return value if expect is None or isinstance(value, expect) else None
+
+
+def extract_json(text, expect=None):
+    """Return the first JSON object or array in `text` (optionally of type `expect`), or None.
+
+    The first opening bracket is handed to the C decoder, which stops at the
+    end of the value, so fences, prose and further values after it are
+    ignored. That is the common case and costs one decode. Otherwise each
+    opener is scanned first (bracket balance and string state in one pass),
+    and only the span the scanner closed is decoded, with repairs applied.
+    Scanning resumes after that span, so every character is scanned at most
+    once. Decoding from an arbitrary offset is avoided: a failed decode
+    computes its line number from the start of the text, and doing that at
+    every opener would make noisy replies quadratic.
+    """
+    if not text:
+        return None
+    opener = _OPEN_RE.search(text)
+    if opener is None:
+        return None
+    try:
+        value, _ = _decoder.raw_decode(text, opener.start())
+        if expect is None or isinstance(value, expect):
+            return value
+    except (ValueError, RecursionError):
+        pass
+    pos = opener.start()
+    while True:
+        opener = _OPEN_RE.search(text, pos)
+        if opener is None:
+            return None
+        start = opener.start()
+        candidates, pos = repair_candidates(text, start)
+        for candidate in candidates:
+            value = _decoded(candidate, expect)
+            if value is not None:
+                return value
+        if pos <= start:
+            pos = start + 1
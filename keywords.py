@@ -0,0 +1,161 @@
+"""
+Shared TF-IDF keyword engine for the mindmap routes.
+
+One precompiled tokenizer, one stopword list and one set of corpus
+statistics serve every caller: the local summarizer and graph builder, the
+graph normalizer in /api/mindmap/analyze and the topic fallbacks of
+/api/mindmap/classify. Candidate terms are unigrams and bigrams that do not
+cross punctuation or stopwords. A term scores tf * idf, where document
+frequencies come from the texts processed so far (updated incrementally,
+bounded to MAX_TERMS), so words every student's notes share sink and
+distinctive ones rise. Bigrams must repeat to count. The top terms are
+taken with a heap, and unigrams already covered by a stronger bigram are
+dropped.
+"""
+
+import heapq
+import math
+import os
+import re
+import threading
+from collections import Counter
+
+MAX_TERMS = int(os.getenv("KEYWORD_MAX_TERMS", "50000"))
+BIGRAM_BOOST = 1.5
+# A bigram seen once is usually a verb phrase ("sun heats"), not a concept
+MIN_BIGRAM_OCCURRENCES = 2
+
+# Bare numbers are tokens too, so they break n-grams like stopwords do
+TOKEN_RE = re.compile(r"[A-Za-z][A-Za-z0-9'\-]*[A-Za-z0-9]|[A-Za-z]|\d+")
+CLAUSE_RE = re.compile(r"[.!?,;:()\[\]{}\"“”]|\s[-–—]\s|\n")
+STOPWORDS = frozenset("""
+a able about above according across actually after afterwards again against all almost alone along already
+also although always am among amongst an and another any anybody anyhow anyone anything anyway anywhere
+are around as aside at away back be became because become becomes becoming been before beforehand behind
+being below beside besides best better between beyond both brief but by came can cannot cant certain
+certainly clearly come comes could did different do does doing done down during each eg eight either else
+elsewhere enough especially etc even ever every everybody everyone everything everywhere ex exactly example
+except far few fifth first five followed following follows for former formerly forth four from further
+furthermore get gets getting given gives go goes going gone got gotten had happens hardly has have having
+he hello help hence her here hereafter hereby herein hereupon hers herself hi him himself his hither
+hopefully how however i ie if ignored immediate in inasmuch inc indeed indicate indicated indicates inner
+insofar instead into inward is it its itself just keep keeps kept know known knows last lately later latter
+latterly least less lest let like liked likely little look looking looks ltd made mainly make makes many
+may maybe me mean meanwhile merely might more moreover most mostly much must my myself name namely near
+nearly necessary need needs neither never nevertheless new next nine no nobody non none noone nor normally
+not nothing novel now nowhere obviously of off often oh ok okay old on once one ones only onto or other
+others otherwise ought our ours ourselves out outside over overall own particular particularly per perhaps
+placed please plus possible presumably probably provides put quite rather really reasonably regarding
+regardless regards relatively respectively right said same saw say saying says second secondly see seeing
+seem seemed seeming seems seen self selves sensible sent serious seriously seven several shall she should
+since six so some somebody somehow someone something sometime sometimes somewhat somewhere soon sorry
+specified specify specifying still sub such sup sure take taken tell tends than thank thanks thanx that
+thats the their theirs them themselves then thence there thereafter thereby therefore therein theres
+thereupon these they think third this thorough thoroughly those though three through throughout thru thus
+to together too took toward towards tried tries truly try trying twice two un under unfortunately unless
+unlikely until unto up upon us use used useful uses using usually value various very via viz vs want wants
+was way we welcome well went were what whatever when whence whenever where whereafter whereas whereby
+wherein whereupon wherever whether which while whither who whoever whole whom whose why will willing wish
+with within without wonder would yes yet you your yours yourself yourselves zero
+""".split())
+
+
+def tokenize(text: str):
+    """Lowercased candidate words per clause; stopwords become None so n-grams never span them."""
+    clauses = []
+    for clause in CLAUSE_RE.split(text or ""):
+        words = [w.lower() for w in TOKEN_RE.findall(clause)]
+        if words:
+            clauses.append([None if (w in STOPWORDS or len(w) < 3 or w.isdigit()) else w for w in words])
+    return clauses
+
+
+def terms(text: str, weight: float = 1.0, counts: Counter = None) -> Counter:
+    """Weighted unigram and bigram counts of `text`."""
+    counts = Counter() if counts is None else counts
+    for words in tokenize(text):
+        previous = None
+        for word in words:
+            if word is not None:
+                counts[word] += weight
+                if previous is not None:
+                    counts[previous + " " + word] += weight
+            previous = word
+    return counts
+
+
+class KeywordEngine:
+    def __init__(self, max_terms: int = MAX_TERMS):
+        self.max_terms = max_terms
+        self.documents = 0
+        self.df = Counter()
+        self._lock = threading.Lock()
+
+    def update(self, counts):
+        """Add one processed document's terms to the corpus statistics."""
+        with self._lock:
+            self.documents += 1
+            self.df.update(counts.keys())
+            if len(self.df) > self.max_terms:
+                # Forget the rarest half; they carry the least evidence
+                keep = heapq.nlargest(self.max_terms // 2, self.df.items(), key=lambda item: item[1])
+                self.df = Counter(dict(keep))
+
+    def idf(self, term: str) -> float:
+        return math.log((1 + self.documents) / (1 + self.df.get(term, 0))) + 1.0
+
+    def rank(self, counts: Counter, limit: int, occurrences: Counter = None):
+        """Top `limit` terms of a count table by tf-idf, bigrams covering their unigrams.
+
+        `occurrences` are the unweighted counts when `counts` is weighted.
+        """
+        occurrences = counts if occurrences is None else occurrences
+
+        def score(term):
+            if " " not in term:
+                return math.log1p(counts[term]) * self.idf(term)
+            if occurrences[term] < MIN_BIGRAM_OCCURRENCES:
+                return 0.0
+            return math.log1p(counts[term]) * self.idf(term) * BIGRAM_BOOST
+
+        picked, covered = [], set()
+        for term in heapq.nlargest(limit * 3, counts, key=lambda t: (score(t), t)):
+            if not score(term):
+                break
+            if term in covered:
+                continue
+            if " " in term:
+                covered.update(term.split())
+            picked.append(term)
+            if len(picked) >= limit:
+                break
+        return picked
+
+    def extract(self, text: str, limit: int = 12, learn: bool = True):
+        """Ranked keyphrases of `text`; with learn=True the text also joins the corpus statistics."""
+        counts = terms(text)
+        if not counts:
+            return []
+        if learn:
+            self.update(counts)
+        return self.rank(counts, limit)
+
+    def extract_weighted(self, passages, weights, limit: int = 12, learn: bool = True):
+        """Like extract, with each passage's term counts scaled by its weight (e.g. sentence rank)."""
+        counts, occurrences = Counter(), Counter()
+        scale = len(weights) / max(float(sum(weights)), 1e-12)
+        for passage, weight in zip(passages, weights):
+            terms(passage, float(weight) * scale, counts)
+            terms(passage, 1.0, occurrences)
+        if not counts:
+            return []
+        if learn:
+            self.update(counts)
+        return self.rank(counts, limit, occurrences)
+
+
+ENGINE = KeywordEngine()
+
+
+def extract_keywords(text: str, limit: int = 12):
+    return ENGINE.extract(text, limit)
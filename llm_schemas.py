@@ -0,0 +1,261 @@
+"""
+Structured-output schemas for AI routes.
+
+Each route's reply shape is a pydantic model. The model's JSON schema,
+tightened to what strict structured outputs accept (every property required,
+no additional properties), is sent as `response_format`, so the provider can
+only produce conforming JSON. The reply is then validated once by the model's
+compiled validator (`model_validate_json`). Providers or models that reject
+`response_format` are remembered and get plain prompts; their replies go
+through json_extract before validation. Open-ended replies (certificate
+analysis, autofill) use JSON mode, which guarantees syntax but no shape.
+
+Top-level arrays are not allowed as a schema root, so list replies
+(/ai/plan, /ai/budget) are wrapped in {"items": [...]} and unwrapped by parse().
+"""
+
+import copy
+import os
+import threading
+from typing import List, Literal, Optional
+
+from pydantic import BaseModel, ConfigDict, Field, ValidationError
+
+import json_extract
+
+STRUCTURED_OUTPUTS = os.getenv("STRUCTURED_OUTPUTS", "1").lower() not in ("0", "false", "no")
+JSON_MODE = "json_object"
+
+_unsupported_models = set()
+_lock = threading.Lock()
+
+
+# --- Reply shapes -----------------------------------------------------------
+class PlanItem(BaseModel):
+    title: str
+    text: str
+
+
+class PlanReply(BaseModel):
+    items: List[PlanItem]
+
+
+class BudgetEstimate(BaseModel):
+    category: str
+    estimate: float
+
+
+class BudgetEstimateReply(BaseModel):
+    items: List[BudgetEstimate]
+
+
+class BudgetItem(BaseModel):
+    category: str
+    name: str
+    amount: float
+    percentage: float
+    notes: str
+
+
+class BudgetPlanReply(BaseModel):
+    total_budget: float
+    budget_items: List[BudgetItem]
+
+
+class ScheduleItem(BaseModel):
+    title: str
+    start_time: str
+    end_time: str
+    description: str
+
+
+class ScheduleReply(BaseModel):
+    schedule_items: List[ScheduleItem]
+
+
+class TaskItem(BaseModel):
+    title: str
+    category: str
+    priority: Literal["high", "medium", "low"]
+
+
+class TasksReply(BaseModel):
+    tasks: List[TaskItem]
+
+
+class ReportSection(BaseModel):
+    title: str
+    content: str
+
+
+class ReportReply(BaseModel):
+    html: str
+    sections: List[ReportSection]
+    summary: str
+
+
+class MindmapModeReply(BaseModel):
+    mode: Literal["mindgraph", "flowchart", "summary", "keywords"]
+
+
+class GraphNode(BaseModel):
+    id: str
+    label: str
+    # Layout hints the frontend understands: 0 central / 1 category / 2 subnode
+    level: Optional[int] = None
+    parent: Optional[str] = None
+    shape: Optional[str] = None
+
+
+class GraphEdge(BaseModel):
+    model_config = ConfigDict(populate_by_name=True)
+
+    source: str = Field(alias="from")
+    to: str
+    label: Optional[str] = None
+
+
+class MindmapGraphReply(BaseModel):
+    type: str
+    nodes: List[GraphNode]
+    edges: List[GraphEdge]
+
+
+class SummaryReply(BaseModel):
+    title: str
+    summary_short: str
+    summary_medium: str
+    summary_detailed: str
+    key_points: List[str]
+    keywords: List[str]
+
+
+class TopicsReply(BaseModel):
+    topics: List[str]
+
+
+class MagazineReply(BaseModel):
+    summary_thick: str
+    summary_thin: str
+    main_body: str
+    pull_quote: str
+    caption1: str
+    caption2: str
+
+
+class DocumentLayout(BaseModel):
+    alignment: Literal["left", "center", "right"]
+    hasHeader: bool
+    hasFooter: bool
+    fontStyle: Literal["formal", "casual", "academic"]
+
+
+class DocumentSection(BaseModel):
+    heading: str
+    content: str
+
+
+class DocumentAnalysisReply(BaseModel):
+    title: str
+    layout: DocumentLayout
+    sections: List[DocumentSection]
+
+
+SCHEMAS = {
+    "plan": PlanReply,
+    "budget_estimate": BudgetEstimateReply,
+    "budget_plan": BudgetPlanReply,
+    "schedule": ScheduleReply,
+    "tasks": TasksReply,
+    "report": ReportReply,
+    "mindmap_mode": MindmapModeReply,
+    "mindmap_graph": MindmapGraphReply,
+    "summary": SummaryReply,
+    "topics": TopicsReply,
+    "magazine": MagazineReply,
+    "document_analysis": DocumentAnalysisReply,
+}
+# Replies whose root is really a list; parse() returns the list
+_WRAPPED_LISTS = {"plan", "budget_estimate"}
+
+
+# --- Schemas for the provider ----------------------------------------------
+def _strict(node):
+    """Make a pydantic JSON schema acceptable to strict structured outputs, in place."""
+    if isinstance(node, dict):
+        node.pop("default", None)
+        node.pop("title", None)
+        if node.get("type") == "object" and "properties" in node:
+            node["additionalProperties"] = False
+            node["required"] = list(node["properties"])
+        for key, value in node.items():
+            # "properties" maps names to schemas; don't treat a property called "title" as metadata
+            if key == "properties":
+                for prop in value.values():
+                    _strict(prop)
+            else:
+                _strict(value)
+    elif isinstance(node, list):
+        for item in node:
+            _strict(item)
+    return node
+
+
+_response_formats = {}
+
+
+def response_format(name: str):
+    """`response_format` argument for a schema name (or JSON_MODE); cached per name."""
+    if name == JSON_MODE:
+        return {"type": "json_object"}
+    cached = _response_formats.get(name)
+    if cached is None:
+        schema = _strict(copy.deepcopy(SCHEMAS[name].model_json_schema(by_alias=True)))
+        cached = {"type": "json_schema", "json_schema": {"name": name, "schema": schema, "strict": True}}
+        _response_formats[name] = cached
+    return cached
+
+
+def request_options(name, model: str) -> dict:
+    """Extra chat.completions.create kwargs for `name` (None -> nothing)."""
+    if not name or not STRUCTURED_OUTPUTS or model in _unsupported_models:
+        return {}
+    return {"response_format": response_format(name)}
+
+
+def rejected(exc: Exception, model: str) -> bool:
+    """True (and remember the model) when a call failed because response_format is unsupported."""
+    text = str(exc).lower()
+    if "response_format" in text or "json_schema" in text or "structured output" in text:
+        with _lock:
+            _unsupported_models.add(model)
+        print(f"[LLM] {model} rejected structured outputs; falling back to prompt-only JSON")
+        return True
+    return False
+
+
+# --- Validation ---------------------------------------------------------------
+def parse(name: str, raw):
+    """Validate a reply against its schema; returns plain data, or None if it does not conform.
+
+    Constrained replies validate straight from the raw text in one pass.
+    Unconstrained replies (fallback providers, the deterministic fallback)
+    are located with json_extract first.
+    """
+    if not raw:
+        return None
+    model = SCHEMAS[name]
+    try:
+        value = model.model_validate_json(raw)
+    except ValidationError:
+        extracted = json_extract.extract_json(raw)
+        if name in _WRAPPED_LISTS and isinstance(extracted, list):
+            extracted = {"items": extracted}
+        if not isinstance(extracted, dict):
+            return None
+        try:
+            value = model.model_validate(extracted)
+        except ValidationError:
+            return None
+    data = value.model_dump(by_alias=True)
+    return data["items"] if name in _WRAPPED_LISTS else data
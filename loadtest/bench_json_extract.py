@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmark: json_extract.extract_json vs the old regex-based force_json.
+
+Builds large model-style replies (code-fenced, wrapped in prose, with
+trailing commas, with raw newlines in strings, truncated by max_tokens, and
+top-level arrays), plus pathological noise where every bracket fails, and
+reports per-call time and whether each parser recovered the value.
+
+    python loadtest/bench_json_extract.py --items 500 --repeat 20
+"""
+
+import argparse
+import json
+import re
+import statistics
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from json_extract import extract_json  # noqa: E402
+
+
+def legacy_force_json(text: str):
+    """force_json as it was before json_extract."""
+    if not text:
+        return None
+    text = text.replace("```json", "").replace("```", "").strip()
+    try:
+        return json.loads(text)
+    except Exception:
+        pass
+    match = re.search(r"\{[\s\S]*\}", text)
+    if not match:
+        return None
+    json_text = match.group(0)
+    json_text = re.sub(r",\s*}", "}", json_text)
+    json_text = re.sub(r",\s*]", "]", json_text)
+    try:
+        return json.loads(json_text)
+    except Exception:
+        return None
+
+
+def build_cases(items: int):
+    tasks = [{"title": f"Task {i}", "category": "Setup", "priority": "high",
+              "notes": "Confirm vendors, {braces} and [brackets] in strings"} for i in range(items)]
+    body = json.dumps({"tasks": tasks}, indent=2)
+    array = json.dumps(tasks, indent=2)
+    trailing = body.replace('strings"\n', 'strings",\n')
+    newlines = json.dumps({"summary": "x"}).replace('"x"', '"' + "line one\nline two\n" * items + '"')
+    return {
+        "clean object": body,
+        "fenced": f"```json\n{body}\n```",
+        "prose wrapped": f"Sure! Here is the plan:\n\n{body}\n\nLet me know if {{anything}} else is needed.",
+        "trailing commas": trailing,
+        "raw newlines in strings": newlines,
+        "top-level array in prose": f"Here you go:\n{array}\nHope this helps.",
+        "two objects": f"{body}\n\nAlternative:\n{body}",
+        "truncated": body[: int(len(body) * 0.8)],
+    }
+
+
+def build_pathological(items: int):
+    """Noisy replies where every opener fails; extraction must stay linear."""
+    n = items * 80
+    return {
+        "mismatched closers": "[1,}" * n,
+        "unclosed keys": '{"a":' * n,
+        "unclosed nesting": "[{" * n,
+        "bad literals": "[tru] " * n,
+        "escaped quotes": '{"a": "b\\" ' * n,
+    }
+
+
+def bench(fn, text, repeat):
+    timings = []
+    result = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = fn(text)
+        timings.append(time.perf_counter() - started)
+    return statistics.median(timings), result is not None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--items", type=int, default=500, help="list items per generated reply")
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args(argv)
+
+    print(f"{'case':<26}{'size':>10}  {'legacy ms':>10} {'ok':>3}  {'extract ms':>10} {'ok':>3}")
+    for name, text in build_cases(args.items).items():
+        legacy_t, legacy_ok = bench(legacy_force_json, text, args.repeat)
+        new_t, new_ok = bench(extract_json, text, args.repeat)
+        print(f"{name:<26}{len(text):>10}  {legacy_t * 1000:>10.2f} {'y' if legacy_ok else 'n':>3}"
+              f"  {new_t * 1000:>10.2f} {'y' if new_ok else 'n':>3}")
+    # The legacy greedy regex backtracks quadratically on these, so only the new parser runs
+    for name, text in build_pathological(args.items).items():
+        new_t, new_ok = bench(extract_json, text, args.repeat)
+        print(f"{name:<26}{len(text):>10}  {'-':>10} {'-':>3}  {new_t * 1000:>10.2f} {'y' if new_ok else 'n':>3}")
+
+
+if __name__ == "__main__":
+    main()
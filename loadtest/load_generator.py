@@ -0,0 +1,292 @@
+#!/usr/bin/env python3
+"""
+Async load generator for the unified Creative Studio server.
+
+Replays a weighted mix of AI, mindmap, mood, todo and event-planner CRUD
+traffic and reports throughput, latency percentiles and whether the run
+stayed inside its error budget. Pair it with loadtest/stub_llm_server.py to
+benchmark the AI routes without calling OpenAI.
+
+    # closed loop: 32 concurrent users for 60 s
+    python loadtest/load_generator.py --concurrency 32 --duration 60
+    # open loop: 20 requests/s arrival rate (avoids coordinated omission)
+    python loadtest/load_generator.py --rate 20 --duration 60 --slo-p99 2000 --max-error-rate 0.01
+
+Exit status is 1 when the p99 SLO or the error budget is exceeded.
+"""
+
+import argparse
+import asyncio
+import json
+import math
+import random
+import sys
+import time
+from collections import defaultdict
+
+import httpx
+
+SAMPLE_TEXT = (
+    "Machine learning pipelines start with data collection. First, raw data is cleaned and labeled. "
+    "Then features are extracted and the model is trained. If validation accuracy is too low, "
+    "the team tunes hyperparameters and retrains. Finally, the model is deployed and monitored."
+)
+EVENT_BASICS = {"name": "Load Test Summit", "type": "Tech Conference", "date": "2026-12-01",
+                "attendees": 150, "description": "Tech conference with VR demos and workshops"}
+
+
+class Recorder:
+    def __init__(self):
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+        self.statuses = defaultdict(lambda: defaultdict(int))
+
+    def record(self, name, status, latency):
+        self.latencies[name].append(latency)
+        self.statuses[name][status] += 1
+        if status == 0 or status >= 500:
+            self.errors[name] += 1
+
+
+async def _call(client, recorder, name, method, path, **kwargs):
+    started = time.perf_counter()
+    try:
+        resp = await client.request(method, path, **kwargs)
+        status = resp.status_code
+    except httpx.HTTPError:
+        resp, status = None, 0
+    recorder.record(name, status, time.perf_counter() - started)
+    return resp
+
+
+# --- scenarios -------------------------------------------------------------
+# Each scenario issues one or more requests; names are route templates so the
+# report lines up with /metrics.
+
+async def ai_plan(c, r):
+    await _call(c, r, "POST /ai/plan", "POST", "/ai/plan", json={"text": SAMPLE_TEXT})
+
+async def ai_schedule(c, r):
+    await _call(c, r, "POST /ai/schedule", "POST", "/ai/schedule", json={"basics": EVENT_BASICS})
+
+async def ai_tasks(c, r):
+    await _call(c, r, "POST /ai/tasks", "POST", "/ai/tasks", json={"basics": EVENT_BASICS, "schedule": [], "budget": []})
+
+async def ai_report(c, r):
+    event = {"basics": EVENT_BASICS, "budget": [{"category": "Venue", "amount": 10000}],
+             "schedule": [{"title": "Opening", "start_time": "09:00", "end_time": "10:00"}],
+             "checklist": [{"title": "Book venue", "completed": True, "priority": "high"}], "vendors": []}
+    await _call(c, r, "POST /ai/report", "POST", "/ai/report", json={"eventData": event, "options": {}})
+
+async def mindmap_analyze(c, r):
+    mode = random.choice(["mindgraph", "flowchart"])
+    await _call(c, r, "POST /api/mindmap/analyze", "POST", "/api/mindmap/analyze", json={"text": SAMPLE_TEXT, "mode": mode})
+
+async def mindmap_classify(c, r):
+    await _call(c, r, "POST /api/mindmap/classify", "POST", "/api/mindmap/classify", json={"text": SAMPLE_TEXT})
+
+async def mindmap_summarize(c, r):
+    await _call(c, r, "POST /api/mindmap/summarize", "POST", "/api/mindmap/summarize", json={"text": SAMPLE_TEXT})
+
+async def mood_analyze(c, r):
+    await _call(c, r, "POST /mood/analyze", "POST", "/mood/analyze", json={"text": "I feel stressed about exams"})
+
+async def mood_chat(c, r):
+    await _call(c, r, "POST /mood/chat", "POST", "/mood/chat", json={"message": "Rough day at work"})
+
+async def todo_analyze(c, r):
+    await _call(c, r, "POST /todo/analyze", "POST", "/todo/analyze", json={"action": "rewrite", "text": "finish report"})
+
+async def todo_suggest(c, r):
+    await _call(c, r, "POST /todo/suggest", "POST", "/todo/suggest", json={"action": "duration", "text": "finish report"})
+
+async def event_crud(c, r):
+    base = "/api/event-planner/events"
+    resp = await _call(c, r, "POST /api/event-planner/events", "POST", base, json={"basics": EVENT_BASICS})
+    if resp is None or resp.status_code != 200:
+        return
+    event_id = resp.json().get("id")
+    await _call(c, r, "GET /api/event-planner/events/{id}", "GET", f"{base}/{event_id}")
+    await _call(c, r, "PUT /api/event-planner/events/{id}", "PUT", f"{base}/{event_id}",
+                json={"basics": dict(EVENT_BASICS, attendees=200)})
+    component = random.choice(["budget", "schedule", "tasks", "vendors"])
+    await _call(c, r, "POST /api/event-planner/events/{id}/generate/{component}", "POST",
+                f"{base}/{event_id}/generate/{component}", json={})
+    await _call(c, r, "GET /api/event-planner/events", "GET", base)
+
+# Default mix, weighted roughly like dashboard traffic
+SCENARIOS = {
+    "ai_plan": (ai_plan, 3),
+    "ai_schedule": (ai_schedule, 3),
+    "ai_tasks": (ai_tasks, 2),
+    "ai_report": (ai_report, 1),
+    "mindmap_analyze": (mindmap_analyze, 6),
+    "mindmap_classify": (mindmap_classify, 3),
+    "mindmap_summarize": (mindmap_summarize, 4),
+    "mood_analyze": (mood_analyze, 3),
+    "mood_chat": (mood_chat, 3),
+    "todo_analyze": (todo_analyze, 4),
+    "todo_suggest": (todo_suggest, 4),
+    "event_crud": (event_crud, 2),
+}
+
+
+def build_mix(spec):
+    """'mindmap_analyze=5,event_crud=1' -> weighted scenario list (default: SCENARIOS)"""
+    weights = {name: w for name, (_, w) in SCENARIOS.items()}
+    if spec:
+        weights = {}
+        for part in spec.split(","):
+            name, _, weight = part.partition("=")
+            if name not in SCENARIOS:
+                raise SystemExit(f"Unknown scenario '{name}'. Choose from: {', '.join(SCENARIOS)}")
+            weights[name] = float(weight or 1)
+    names = list(weights)
+    return [SCENARIOS[n][0] for n in names], [weights[n] for n in names]
+
+
+# --- drivers ---------------------------------------------------------------
+
+async def closed_loop(client, recorder, mix, concurrency, deadline):
+    funcs, weights = mix
+
+    async def user():
+        while time.monotonic() < deadline:
+            await random.choices(funcs, weights)[0](client, recorder)
+
+    await asyncio.gather(*(user() for _ in range(concurrency)))
+
+
+async def open_loop(client, recorder, mix, rate, deadline, max_in_flight):
+    """Poisson arrivals at `rate`/s, independent of how fast responses come back"""
+    funcs, weights = mix
+    in_flight = set()
+    dropped = 0
+    while time.monotonic() < deadline:
+        await asyncio.sleep(random.expovariate(rate))
+        if len(in_flight) >= max_in_flight:
+            dropped += 1
+            continue
+        task = asyncio.create_task(random.choices(funcs, weights)[0](client, recorder))
+        in_flight.add(task)
+        task.add_done_callback(in_flight.discard)
+    if in_flight:
+        await asyncio.gather(*in_flight)
+    return dropped
+
+
+def percentile(sorted_values, q):
+    """Nearest-rank percentile of an ascending list."""
+    if not sorted_values:
+        return 0.0
+    idx = min(len(sorted_values) - 1, max(0, math.ceil(q / 100 * len(sorted_values)) - 1))
+    return sorted_values[idx]
+
+
+def summarize(recorder, elapsed, dropped=0):
+    rows = []
+    all_latencies = []
+    total_errors = 0
+    for name in sorted(recorder.latencies):
+        values = sorted(recorder.latencies[name])
+        all_latencies.extend(values)
+        total_errors += recorder.errors[name]
+        rows.append({
+            "route": name,
+            "count": len(values),
+            "errors": recorder.errors[name],
+            "statuses": dict(recorder.statuses[name]),
+            "p50_ms": percentile(values, 50) * 1000,
+            "p90_ms": percentile(values, 90) * 1000,
+            "p99_ms": percentile(values, 99) * 1000,
+            "max_ms": values[-1] * 1000,
+        })
+    all_latencies.sort()
+    total = len(all_latencies)
+    return {
+        "elapsed_s": elapsed,
+        "requests": total,
+        "throughput_rps": total / elapsed if elapsed else 0.0,
+        "errors": total_errors,
+        "error_rate": total_errors / total if total else 0.0,
+        "dropped_arrivals": dropped,
+        "p50_ms": percentile(all_latencies, 50) * 1000,
+        "p90_ms": percentile(all_latencies, 90) * 1000,
+        "p99_ms": percentile(all_latencies, 99) * 1000,
+        "max_ms": all_latencies[-1] * 1000 if all_latencies else 0.0,
+        "routes": rows,
+    }
+
+
+def print_report(report, slo_p99, max_error_rate):
+    print(f"\nRequests: {report['requests']} in {report['elapsed_s']:.1f}s "
+          f"({report['throughput_rps']:.1f} req/s), errors: {report['errors']} ({report['error_rate']:.2%})")
+    if report["dropped_arrivals"]:
+        print(f"Dropped arrivals (max in-flight reached): {report['dropped_arrivals']}")
+    print(f"Latency ms  p50 {report['p50_ms']:.0f}  p90 {report['p90_ms']:.0f}  "
+          f"p99 {report['p99_ms']:.0f}  max {report['max_ms']:.0f}")
+    print(f"\n{'route':<58}{'count':>7}{'err':>6}{'p50':>8}{'p90':>8}{'p99':>8}{'max':>8}")
+    for row in report["routes"]:
+        print(f"{row['route']:<58}{row['count']:>7}{row['errors']:>6}{row['p50_ms']:>8.0f}"
+              f"{row['p90_ms']:>8.0f}{row['p99_ms']:>8.0f}{row['max_ms']:>8.0f}")
+
+    ok = True
+    if slo_p99 is not None:
+        met = report["p99_ms"] <= slo_p99
+        ok &= met
+        print(f"\np99 SLO {slo_p99:.0f} ms: {'OK' if met else 'VIOLATED'} ({report['p99_ms']:.0f} ms)")
+    if max_error_rate is not None:
+        budget = max_error_rate * report["requests"]
+        met = report["errors"] <= budget
+        ok &= met
+        print(f"Error budget {max_error_rate:.2%} ({budget:.0f} requests): "
+              f"{'OK' if met else 'EXHAUSTED'} ({report['errors']} used)")
+    return ok
+
+
+async def run(args):
+    mix = build_mix(args.mix)
+    recorder = Recorder()
+    limits = httpx.Limits(max_connections=args.max_in_flight, max_keepalive_connections=args.max_in_flight)
+    async with httpx.AsyncClient(base_url=args.base_url, timeout=args.timeout, limits=limits,
+                                 cookies={"session": "true"}) as client:
+        started = time.monotonic()
+        deadline = started + args.duration
+        dropped = 0
+        if args.rate:
+            dropped = await open_loop(client, recorder, mix, args.rate, deadline, args.max_in_flight)
+        else:
+            await closed_loop(client, recorder, mix, args.concurrency, deadline)
+        elapsed = time.monotonic() - started
+    return summarize(recorder, elapsed, dropped)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Creative Studio load generator")
+    parser.add_argument("--base-url", default="http://127.0.0.1:8000")
+    parser.add_argument("--duration", type=float, default=30, help="seconds to generate load")
+    parser.add_argument("--concurrency", type=int, default=16, help="closed-loop virtual users")
+    parser.add_argument("--rate", type=float, help="open-loop arrival rate (scenarios/s); overrides --concurrency")
+    parser.add_argument("--max-in-flight", type=int, default=256)
+    parser.add_argument("--timeout", type=float, default=60)
+    parser.add_argument("--mix", help="comma-separated scenario=weight list, e.g. mindmap_analyze=5,event_crud=1")
+    parser.add_argument("--slo-p99", type=float, help="p99 latency objective in ms")
+    parser.add_argument("--max-error-rate", type=float, help="error budget as a fraction of requests")
+    parser.add_argument("--json", help="also write the report to this file")
+    parser.add_argument("--seed", type=int)
+    args = parser.parse_args()
+
+    if args.seed is not None:
+        random.seed(args.seed)
+    mode = f"open loop {args.rate}/s" if args.rate else f"closed loop x{args.concurrency}"
+    print(f"Load testing {args.base_url} for {args.duration:.0f}s ({mode})...")
+    report = asyncio.run(run(args))
+    ok = print_report(report, args.slo_p99, args.max_error_rate)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,190 @@
+#!/usr/bin/env python3
+"""
+Stub OpenAI-compatible chat-completions server for offline load testing.
+
+Speaks just enough of POST /v1/chat/completions for the openai client used by
+server.py and the event-planner backend. Latency, error rate and 429 rate are
+configurable, and the reply body is picked from canned JSON documents that
+match what each AI route asks for, so the app takes its normal "model
+succeeded" paths.
+
+    python loadtest/stub_llm_server.py --port 9100 --latency lognormal:0.8:0.5 --error-rate 0.01 --rate-limit 0.05
+
+Point the app at it with:
+
+    OPENAI_API_KEY=stub OPENAI_BASE_URL=http://127.0.0.1:9100/v1 python server.py
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import time
+import uuid
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+
+# Canned replies, chosen by the first marker found in the prompt text.
+CANNED_BODIES = [
+    ("schedule_items", {"schedule_items": [
+        {"title": "Venue Setup", "start_time": "08:00", "end_time": "09:00", "description": "Stage, sound and seating"},
+        {"title": "Opening Session", "start_time": "09:00", "end_time": "10:30", "description": "Welcome and keynote"},
+        {"title": "Workshops", "start_time": "10:30", "end_time": "13:00", "description": "Parallel hands-on tracks"},
+        {"title": "Lunch", "start_time": "13:00", "end_time": "14:00", "description": "Catered lunch"},
+        {"title": "Showcase", "start_time": "14:00", "end_time": "17:00", "description": "Project demos"},
+        {"title": "Closing", "start_time": "17:00", "end_time": "18:00", "description": "Awards and wrap-up"},
+    ]}),
+    ("budget_items", {"total_budget": 25000, "budget_items": [
+        {"category": "Venue Rental", "name": "Main hall", "amount": 10000, "percentage": 40, "notes": "Full day"},
+        {"category": "Catering", "name": "Lunch and snacks", "amount": 9000, "percentage": 36, "notes": "150 guests"},
+        {"category": "AV Equipment", "name": "Sound and projectors", "amount": 6000, "percentage": 24, "notes": "Rental"},
+    ]}),
+    ("tasks (array", {"tasks": [
+        {"title": "Confirm venue booking", "category": "Planning", "priority": "high"},
+        {"title": "Order catering", "category": "Logistics", "priority": "medium"},
+        {"title": "Test AV equipment", "category": "Setup", "priority": "high"},
+        {"title": "Print badges", "category": "Setup", "priority": "low"},
+    ]}),
+    ("html:", {"html": "<div class=\"ai-report\"><h5>Event Analysis</h5><p>Planning is on track.</p></div>",
+               "sections": [{"title": "Executive Summary", "content": "Planning is on track."}],
+               "summary": "Planning is on track."}),
+    ("summary_thick", {"summary_thick": "The event brought the campus together.", "summary_thin": "A memorable day.",
+                       "main_body": "Students and faculty gathered for a day of talks and demos.",
+                       "pull_quote": "\"We built this together.\"", "caption1": "Teams presenting.",
+                       "caption2": "Judges at work."}),
+    ('"mode"', {"mode": "mindgraph"}),
+    ('"nodes"', {"type": "mindgraph",
+                 "nodes": [{"id": "n0", "label": "Topic"}, {"id": "n1", "label": "Features"},
+                           {"id": "n2", "label": "Benefits"}, {"id": "n3", "label": "Applications"}],
+                 "edges": [{"from": "n0", "to": "n1"}, {"from": "n0", "to": "n2"}, {"from": "n0", "to": "n3"}]}),
+    ("summary_short", {"title": "Summary", "summary_short": "A short summary.",
+                       "summary_medium": "A somewhat longer summary of the text.",
+                       "summary_detailed": "A detailed summary covering every section of the text.",
+                       "key_points": ["First point", "Second point"], "keywords": ["topic", "method"]}),
+    ('"sections"', {"title": "Activity Report", "layout": {"alignment": "left", "hasHeader": True,
+                                                            "hasFooter": False, "fontStyle": "formal"},
+                    "sections": [{"heading": "Overview", "content": "The activity was completed successfully."}]}),
+    ("topics", {"topics": ["planning", "logistics", "outreach"]}),
+    ("TemplateExample", {"event_name": "Stub Event", "event_type": "Conference",
+                         "objectives": ["Share knowledge", "Build connections"],
+                         "key_considerations": ["Venue capacity", "Speaker lineup"],
+                         "recommended_themes": ["Innovation"], "estimated_budget_range": "$10000-$25000",
+                         "attendee_count": 150, "suggested_duration": "1 day",
+                         "planning_timeline": ["1 month out: book venue", "1 week out: confirm vendors"]}),
+    ("template_name", {"template_name": "Stub Classic", "layout": {"background": "clean-white", "border": "minimal-line",
+                                                                   "text_styles": {"title": "serif-bold"}, "elements": []},
+                       "color_scheme": {"primary": "#2C3E50", "secondary": "#3498DB", "accent": "#E74C3C"},
+                       "suggested_elements": ["Title", "Recipient", "Date"], "description": "Stub template"}),
+    ('"estimate"', [{"category": "venue", "estimate": 20000}, {"category": "food", "estimate": 30000}]),
+    ("JSON array", [{"title": "Plan", "text": "Book the venue, invite speakers, arrange catering."}]),
+]
+DEFAULT_BODY = {"result": "ok"}
+
+
+def parse_latency(spec: str):
+    """Return a sampler for a latency spec.
+
+    fixed:S | uniform:LO:HI | normal:MEAN:STD | lognormal:MEDIAN:SIGMA (seconds)
+    """
+    kind, *params = spec.split(":")
+    values = [float(p) for p in params]
+    if kind == "fixed":
+        return lambda: values[0]
+    if kind == "uniform":
+        return lambda: random.uniform(values[0], values[1])
+    if kind == "normal":
+        return lambda: max(0.0, random.gauss(values[0], values[1]))
+    if kind == "lognormal":
+        import math
+        mu = math.log(values[0])
+        return lambda: random.lognormvariate(mu, values[1])
+    raise ValueError(f"Unknown latency distribution: {spec}")
+
+
+def pick_body(prompt: str, bodies):
+    for marker, body in bodies:
+        if marker in prompt:
+            return body
+    return DEFAULT_BODY
+
+
+def create_app(latency, error_rate=0.0, rate_limit=0.0, bodies=None, fenced_rate=0.0):
+    bodies = bodies or CANNED_BODIES
+    app = FastAPI(title="Stub LLM")
+    stats = {"requests": 0, "errors": 0, "rate_limited": 0}
+
+    @app.get("/stats")
+    async def get_stats():
+        return stats
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        payload = await request.json()
+        stats["requests"] += 1
+        await asyncio.sleep(latency())
+
+        roll = random.random()
+        if roll < rate_limit:
+            stats["rate_limited"] += 1
+            return JSONResponse(
+                {"error": {"message": "Rate limit reached (stub)", "type": "rate_limit_exceeded", "code": "429"}},
+                status_code=429, headers={"retry-after": "1"})
+        if roll < rate_limit + error_rate:
+            stats["errors"] += 1
+            return JSONResponse({"error": {"message": "Stub server error", "type": "server_error"}}, status_code=500)
+
+        messages = payload.get("messages") or []
+        prompt = "\n".join(str(m.get("content", "")) for m in messages)
+        # Match on the user turn first: long system prompts (SYSTEM_MINDENGINE)
+        # mention every output shape and would otherwise win
+        user_prompt = "\n".join(str(m.get("content", "")) for m in messages if m.get("role") == "user")
+        body = pick_body(user_prompt, bodies)
+        if body is DEFAULT_BODY:
+            body = pick_body(prompt, bodies)
+        content = json.dumps(body)
+        # Models often wrap JSON in code fences; exercise the cleanup path too
+        if fenced_rate and random.random() < fenced_rate:
+            content = f"```json\n{content}\n```"
+        prompt_tokens = max(1, len(prompt) // 4)
+        completion_tokens = max(1, len(content) // 4)
+        return {
+            "id": f"chatcmpl-{uuid.uuid4().hex[:24]}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": payload.get("model", "stub"),
+            "choices": [{"index": 0, "finish_reason": "stop",
+                         "message": {"role": "assistant", "content": content}}],
+            "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+                      "total_tokens": prompt_tokens + completion_tokens},
+        }
+
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Stub OpenAI chat-completions server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9100)
+    parser.add_argument("--latency", default="lognormal:0.8:0.5",
+                        help="fixed:S | uniform:LO:HI | normal:MEAN:STD | lognormal:MEDIAN:SIGMA (seconds)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of calls answered with HTTP 500")
+    parser.add_argument("--rate-limit", type=float, default=0.0, help="fraction of calls answered with HTTP 429")
+    parser.add_argument("--fenced-rate", type=float, default=0.2, help="fraction of replies wrapped in ```json fences")
+    parser.add_argument("--bodies", help="JSON file of [[marker, body], ...] overriding the canned replies")
+    args = parser.parse_args()
+
+    bodies = None
+    if args.bodies:
+        with open(args.bodies, "r", encoding="utf-8") as f:
+            bodies = [tuple(item) for item in json.load(f)]
+
+    import uvicorn
+    app = create_app(parse_latency(args.latency), args.error_rate, args.rate_limit, bodies, args.fenced_rate)
+    print(f"Stub LLM listening on http://{args.host}:{args.port}/v1 (latency {args.latency}, "
+          f"errors {args.error_rate:.0%}, 429s {args.rate_limit:.0%})")
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
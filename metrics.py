@@ -0,0 +1,329 @@
+"""
+In-process metrics registry with Prometheus text exposition.
+
+Counters, gauges and histograms are created once at import time and updated
+from request handlers; /metrics renders them in the Prometheus text format
+(version 0.0.4). Everything is guarded by a single lock because sync routes
+run concurrently in the threadpool. Values are per process: when the server
+runs with several workers, each worker reports its own numbers.
+"""
+
+import bisect
+import contextvars
+import threading
+import time
+from contextlib import contextmanager
+
+from starlette.routing import Mount
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+DEFAULT_LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+LLM_LATENCY_BUCKETS = (0.1, 0.25, 0.5, 1.0, 2.0, 4.0, 8.0, 15.0, 30.0, 60.0)
+
+# ASGI scope of the request being handled, set by the HTTP middleware. The
+# router records the matched route in the same scope, so current_route()
+# resolves to the route template once the request has been routed.
+current_scope: contextvars.ContextVar = contextvars.ContextVar("current_scope", default=None)
+# One label for every request no route matched (404s, auth redirects), so
+# random paths cannot create new series
+UNMATCHED = "unmatched"
+
+_lock = threading.Lock()
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names, values, extra=None) -> str:
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children = {}
+        if not self.labelnames:
+            self._children[()] = self._new_child()
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def labels(self, *values):
+        if len(values) != len(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {values}")
+        key = tuple(str(v) for v in values)
+        child = self._children.get(key)
+        if child is None:
+            with _lock:
+                child = self._children.setdefault(key, self._new_child())
+        return child
+
+    def _header(self):
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+
+class _CounterChild:
+    def __init__(self):
+        self.value = 0.0
+
+    def inc(self, amount: float = 1.0):
+        with _lock:
+            self.value += amount
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def _new_child(self):
+        return _CounterChild()
+
+    def inc(self, amount: float = 1.0):
+        self._children[()].inc(amount)
+
+    def collect(self):
+        lines = self._header()
+        for key, child in sorted(self._children.items()):
+            lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(child.value)}")
+        return lines
+
+
+class _GaugeChild:
+    def __init__(self):
+        self.value = 0.0
+
+    def set(self, value: float):
+        with _lock:
+            self.value = value
+
+    def inc(self, amount: float = 1.0):
+        with _lock:
+            self.value += amount
+
+    def dec(self, amount: float = 1.0):
+        self.inc(-amount)
+
+
+class Gauge(_Metric):
+    """A gauge; pass `callback` to compute an unlabelled value at scrape time."""
+
+    kind = "gauge"
+
+    def __init__(self, name, documentation, labelnames=(), callback=None):
+        super().__init__(name, documentation, labelnames)
+        self.callback = callback
+
+    def _new_child(self):
+        return _GaugeChild()
+
+    def set(self, value: float):
+        self._children[()].set(value)
+
+    def inc(self, amount: float = 1.0):
+        self._children[()].inc(amount)
+
+    def dec(self, amount: float = 1.0):
+        self._children[()].dec(amount)
+
+    def collect(self):
+        if self.callback is not None:
+            try:
+                self._children[()].set(float(self.callback()))
+            except Exception:
+                pass
+        lines = self._header()
+        for key, child in sorted(self._children.items()):
+            lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(child.value)}")
+        return lines
+
+
+class _HistogramChild:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        idx = bisect.bisect_left(self.buckets, value)
+        with _lock:
+            self.counts[idx] += 1
+            self.sum += value
+
+    @contextmanager
+    def time(self):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started)
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_LATENCY_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, documentation, labelnames)
+
+    def _new_child(self):
+        return _HistogramChild(self.buckets)
+
+    def observe(self, value: float):
+        self._children[()].observe(value)
+
+    def time(self):
+        return self._children[()].time()
+
+    def collect(self):
+        lines = self._header()
+        for key, child in sorted(self._children.items()):
+            with _lock:
+                counts = list(child.counts)
+                total = child.sum
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = f'le="{_format_value(bound)}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {cumulative}")
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = {}
+
+    def register(self, metric):
+        # Modules loaded twice (the event-planner backend is imported both
+        # explicitly and by auto-discovery) must share one series.
+        return self._metrics.setdefault(metric.name, metric)
+
+    def counter(self, name, documentation, labelnames=()):
+        return self.register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name, documentation, labelnames=(), callback=None):
+        return self.register(Gauge(name, documentation, labelnames, callback))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_LATENCY_BUCKETS):
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def render(self) -> str:
+        lines = []
+        for name in sorted(self._metrics):
+            lines.extend(self._metrics[name].collect())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+# --- HTTP -----------------------------------------------------------------
+HTTP_REQUESTS = REGISTRY.counter(
+    "http_requests_total", "HTTP requests by route template, method and status.", ("route", "method", "status"))
+HTTP_LATENCY = REGISTRY.histogram(
+    "http_request_duration_seconds", "HTTP request latency by route template.", ("route", "method"))
+HTTP_IN_FLIGHT = REGISTRY.gauge("http_requests_in_flight", "HTTP requests currently being handled.")
+
+# --- LLM ------------------------------------------------------------------
+LLM_REQUESTS = REGISTRY.counter(
+    "llm_requests_total", "Chat completion calls by endpoint and outcome (ok/error).", ("endpoint", "model", "outcome"))
+LLM_LATENCY = REGISTRY.histogram(
+    "llm_request_duration_seconds", "Chat completion latency including retries.", ("endpoint", "model"),
+    buckets=LLM_LATENCY_BUCKETS)
+LLM_TOKENS = REGISTRY.counter(
+    "llm_tokens_total", "Tokens per route by kind (prompt/completion); provider-reported, else counted locally.", ("endpoint", "model", "kind"))
+LLM_RETRIES = REGISTRY.counter(
+    "llm_retries_total", "Chat completion retries after rate limits or transient errors.", ("endpoint", "model"))
+LLM_FALLBACKS = REGISTRY.counter(
+    "llm_fallbacks_total", "LLM calls answered by the deterministic fallback (no client or call failed).", ("endpoint",))
+AI_RESPONSES = REGISTRY.counter(
+    "ai_responses_total", "AI route responses by source (llm/local/fallback/cache).", ("endpoint", "source"))
+
+# --- Caches and local models ---------------------------------------------
+CACHE_REQUESTS = REGISTRY.counter(
+    "cache_requests_total", "Cache lookups by cache name and result (hit/miss).", ("cache", "result"))
+MODEL_INFERENCE = REGISTRY.histogram(
+    "model_inference_duration_seconds", "Local model inference time by function.", ("model",))
+
+
+def route_label(scope) -> str:
+    """Route template of a routed request ("/api/ai/analyze_batch/{job_id}"), else UNMATCHED."""
+    route = scope.get("route")
+    if isinstance(route, Mount) or (route is None and "app_root_path" in scope):
+        # A mount (static files) matched: root_path ends with its path. Newer
+        # FastAPI routers do not record mounts as the route, only app_root_path.
+        return scope.get("root_path") or UNMATCHED
+    path = getattr(route, "path", None)
+    if path is None:
+        return UNMATCHED
+    return scope.get("root_path", "") + path
+
+
+def current_route() -> str:
+    """Label of the request being handled, for LLM metrics and prompt budgets ("unknown" outside one)."""
+    scope = current_scope.get()
+    return "unknown" if scope is None else route_label(scope)
+
+
+def record_ai_response(endpoint: str, source: str):
+    AI_RESPONSES.labels(endpoint, source).inc()
+
+
+def record_cache(cache: str, hit: bool):
+    CACHE_REQUESTS.labels(cache, "hit" if hit else "miss").inc()
+
+
+def record_llm_usage(endpoint: str, model: str, response, prompt_tokens: int = 0):
+    """Add token usage from a chat completion response.
+
+    Provider-reported usage wins; `prompt_tokens` (the locally counted prompt)
+    is used when the response carries none, e.g. from proxies or stubs.
+    """
+    usage = getattr(response, "usage", None)
+    prompt = getattr(usage, "prompt_tokens", None) or prompt_tokens
+    completion = getattr(usage, "completion_tokens", None)
+    if completion is None:
+        try:
+            import prompt_budget
+            completion = prompt_budget.count_tokens(response.choices[0].message.content or "", model)
+        except Exception:
+            completion = 0
+    if prompt:
+        LLM_TOKENS.labels(endpoint, model, "prompt").inc(prompt)
+    if completion:
+        LLM_TOKENS.labels(endpoint, model, "completion").inc(completion)
+
+
+def install_threadpool_gauges():
+    """Expose AnyIO's default threadpool (used for sync routes) as gauges.
+
+    The limiter must be read from inside the event loop, which is where
+    /metrics is rendered.
+    """
+    def _limiter():
+        from anyio import to_thread
+        return to_thread.current_default_thread_limiter()
+
+    REGISTRY.gauge("threadpool_workers_busy", "Threadpool tokens in use (running sync handlers).",
+                   callback=lambda: _limiter().borrowed_tokens)
+    REGISTRY.gauge("threadpool_workers_total", "Threadpool size.",
+                   callback=lambda: _limiter().total_tokens)
+    REGISTRY.gauge("threadpool_queue_depth", "Sync handlers waiting for a threadpool worker.",
+                   callback=lambda: _limiter().statistics().tasks_waiting)
@@ -0,0 +1,250 @@
+"""
+Deterministic local graph builder for /api/mindmap/analyze.
+
+Produces the same {type, nodes, edges} shape the model is asked for, in
+tens of milliseconds and without a network call:
+
+- mindgraph: the central topic (a heading line, else the strongest
+  keyphrase) is Level 0. Keyphrases are clustered into 3-6 categories with
+  k-means over their context vectors (the mean embedding of the sentences
+  they occur in, plus the phrase's own embedding when the model is loaded).
+  The strongest phrase of each cluster is the Level 1 category and the rest
+  are its Level 2 subnodes.
+- flowchart: steps follow the text order. Sequence markers ("first",
+  "then", "finally", numbered lists) are stripped from the labels, and
+  conditionals ("if ..., ...", "when ...", "unless ...") become decision
+  nodes with Yes/No edges. A following "otherwise ..." becomes the No branch.
+- keywords: the ranked keyphrases, as a star graph plus a `keywords` list.
+
+Nodes carry the `level`, `parent` and `shape` hints the frontend renderer
+understands.
+"""
+
+import re
+
+import embeddings
+import summarizer
+
+np = summarizer.np
+
+MAX_PHRASES = 30
+MIN_CATEGORIES, MAX_CATEGORIES = 3, 6
+MAX_SUBNODES = 5
+MAX_STEPS = 20
+LABEL_CHARS = 70
+KMEANS_ITERATIONS = 25
+
+_SEQUENCE_RE = re.compile(
+    r"^(?:(?:first(?:ly)?|second(?:ly)?|third(?:ly)?|next|then|after(?:wards| that| this)?|"
+    r"finally|lastly|subsequently|afterward|to begin(?: with)?|to start|in the end|"
+    r"step\s*\d+\s*[:.)-]?)\s*,?\s+)",
+    re.IGNORECASE,
+)
+_CONDITION_RE = re.compile(
+    r"^(?P<kw>if|when|whenever|unless|in case|provided that|as long as)\s+(?P<cond>.+?)\s*,\s*(?:then\s+)?(?P<action>.+)$",
+    re.IGNORECASE,
+)
+# "Check if ..." is not a branch, so only explicit trailing conditions count
+_TRAILING_CONDITION_RE = re.compile(r"^(?P<action>.+?),?\s+(?P<kw>unless|only if)\s+(?P<cond>.+)$", re.IGNORECASE)
+_OTHERWISE_RE = re.compile(r"^(?:otherwise|else|if not|or else)\s*,?\s+", re.IGNORECASE)
+_THEN_SPLIT_RE = re.compile(r"\s*(?:;|,)\s*(?:and\s+)?then\s+", re.IGNORECASE)
+
+
+def _label(text: str) -> str:
+    text = text.strip().rstrip(".;:")
+    if text.endswith("?") and len(text) > LABEL_CHARS:
+        return _label(text[:-1]) + "?"
+    if len(text) > LABEL_CHARS:
+        text = text[:LABEL_CHARS].rsplit(" ", 1)[0] + "…"
+    return text[:1].upper() + text[1:]
+
+
+# --- mindgraph ----------------------------------------------------------------
+def _context_vectors(phrases, sentences, sentence_vectors):
+    """Mean vector of the sentences each phrase occurs in (unit length)."""
+    lowered = [s.lower() for s in sentences]
+    vectors = np.zeros((len(phrases), sentence_vectors.shape[1]))
+    for i, phrase in enumerate(phrases):
+        hits = [j for j, s in enumerate(lowered) if phrase in s]
+        if hits:
+            vectors[i] = sentence_vectors[hits].mean(axis=0)
+    if embeddings.available():
+        vectors += summarizer.embed(phrases)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+
+def kmeans(vectors, k: int, iterations: int = KMEANS_ITERATIONS):
+    """Cosine k-means with farthest-point seeding from row 0; returns cluster labels.
+
+    Rows are expected in rank order, so seeding is deterministic and starts
+    from the strongest phrase.
+    """
+    centers = [0]
+    closest = vectors @ vectors[0]
+    while len(centers) < k:
+        candidate = int(np.argmin(closest))
+        if candidate in centers:
+            break
+        centers.append(candidate)
+        closest = np.maximum(closest, vectors @ vectors[candidate])
+    centroids = vectors[centers].copy()
+    labels = np.zeros(len(vectors), dtype=int)
+    for iteration in range(iterations):
+        updated = np.argmax(vectors @ centroids.T, axis=1)
+        if iteration and np.array_equal(updated, labels):
+            break
+        labels = updated
+        for c in range(len(centroids)):
+            members = vectors[labels == c]
+            if len(members):
+                mean = members.sum(axis=0)
+                centroids[c] = mean / max(np.linalg.norm(mean), 1e-12)
+    return labels
+
+
+def build_mindgraph(text: str):
+    sentences = summarizer.split_sentences(text)[:summarizer.MAX_SENTENCES]
+    if not sentences:
+        return None
+    sentence_vectors = summarizer.embed(sentences)
+    scores = summarizer.textrank(sentence_vectors)
+    phrases = summarizer.keyphrases(sentences, scores, limit=MAX_PHRASES + 1)
+    title = summarizer.title(text, phrases)
+    key = title.lower()
+    phrases = [p for p in phrases if p not in key and key not in p][:MAX_PHRASES]
+
+    nodes = [{"id": "root", "label": _label(title), "level": 0}]
+    edges = []
+    if not phrases:
+        return {"type": "mindgraph", "nodes": nodes, "edges": edges}
+
+    if len(phrases) <= MIN_CATEGORIES:
+        groups = [[p] for p in phrases]
+    else:
+        k = int(np.clip(round(np.sqrt(len(phrases) / 1.5)), MIN_CATEGORIES, MAX_CATEGORIES))
+        labels = kmeans(_context_vectors(phrases, sentences, sentence_vectors), k)
+        # Clusters keep phrase rank order; strongest cluster first
+        groups = {}
+        for phrase, label in zip(phrases, labels):
+            groups.setdefault(int(label), []).append(phrase)
+        groups = list(groups.values())
+
+    for c, group in enumerate(groups):
+        category_id = f"c{c}"
+        nodes.append({"id": category_id, "label": _label(group[0]), "level": 1, "parent": "root"})
+        edges.append({"from": "root", "to": category_id})
+        for s, phrase in enumerate(group[1:1 + MAX_SUBNODES]):
+            node_id = f"c{c}_{s}"
+            nodes.append({"id": node_id, "label": _label(phrase), "level": 2, "parent": category_id})
+            edges.append({"from": category_id, "to": node_id})
+    return {"type": "mindgraph", "nodes": nodes, "edges": edges}
+
+
+# --- flowchart ----------------------------------------------------------------
+def _steps(text: str):
+    """Yield step clauses in order, splitting "X, then Y" into two steps; a heading line is skipped."""
+    sentences = summarizer.split_sentences(text)
+    if len(sentences) > 1 and summarizer.title(text, []) == sentences[0]:
+        sentences = sentences[1:]
+    for sentence in sentences:
+        for clause in _THEN_SPLIT_RE.split(sentence):
+            clause = clause.strip()
+            if clause:
+                yield clause
+
+
+def build_flowchart(text: str):
+    nodes = [{"id": "start", "label": "Start", "level": 0, "shape": "ellipse"}]
+    edges = []
+    # Ends of the flow so far: (node id, edge label) pairs the next step connects from
+    tails = [("start", None)]
+    levels = {"start": 0}
+    pending = None  # (decision id, branch label) an "otherwise" step would hang from
+
+    def add(label, from_tails, shape="box"):
+        """Add a node one level below the deepest node it is reached from, and connect it."""
+        node_id = f"s{len(nodes)}"
+        levels[node_id] = max(levels[source] for source, _ in from_tails) + 1
+        nodes.append({"id": node_id, "label": _label(label), "level": levels[node_id], "shape": shape})
+        connect(node_id, from_tails)
+        return node_id
+
+    def connect(node_id, from_tails):
+        for source, label in from_tails:
+            edge = {"from": source, "to": node_id}
+            if label:
+                edge["label"] = label
+            edges.append(edge)
+
+    for clause in _steps(text):
+        if len(nodes) > MAX_STEPS:
+            break
+        clause = _SEQUENCE_RE.sub("", clause).strip()
+        if not clause:
+            continue
+        otherwise = _OTHERWISE_RE.match(clause)
+        if otherwise and pending is not None:
+            node_id = add(clause[otherwise.end():], [pending])
+            tails = [t for t in tails if t != pending] + [(node_id, None)]
+            pending = None
+            continue
+        pending = None
+        condition = _CONDITION_RE.match(clause) or _TRAILING_CONDITION_RE.match(clause)
+        if condition:
+            cond = condition.group("cond")
+            negated = condition.group("kw").lower() == "unless"
+            decision = add(cond.rstrip(" .?!") + "?", tails, shape="diamond")
+            action = add(condition.group("action"), [(decision, "No" if negated else "Yes")])
+            # Without an "otherwise" step the No branch skips to whatever comes next
+            skip = (decision, "Yes" if negated else "No")
+            tails = [(action, None), skip]
+            pending = skip
+            continue
+        node_id = add(clause, tails)
+        tails = [(node_id, None)]
+
+    if len(nodes) == 1:
+        return None
+    end_id = "end"
+    nodes.append({"id": end_id, "label": "End", "level": max(levels[source] for source, _ in tails) + 1, "shape": "ellipse"})
+    connect(end_id, tails)
+    return {"type": "flowchart", "nodes": nodes, "edges": edges}
+
+
+# --- keywords -------------------------------------------------------------------
+def build_keywords(text: str):
+    sentences = summarizer.split_sentences(text)[:summarizer.MAX_SENTENCES]
+    if not sentences:
+        return None
+    scores = summarizer.textrank(summarizer.embed(sentences))
+    keywords = summarizer.keyphrases(sentences, scores, limit=15)
+    title = summarizer.title(text, keywords)
+    nodes = [{"id": "root", "label": _label(title), "level": 0}]
+    edges = []
+    for i, keyword in enumerate(keywords):
+        if keyword == title.lower():
+            continue
+        nodes.append({"id": f"k{i}", "label": keyword, "level": 1, "parent": "root"})
+        edges.append({"from": "root", "to": f"k{i}"})
+    return {"type": "keywords", "nodes": nodes, "edges": edges, "keywords": keywords}
+
+
+BUILDERS = {
+    "mindgraph": build_mindgraph,
+    "flowchart": build_flowchart,
+    "keywords": build_keywords,
+}
+
+
+def build(text: str, mode: str):
+    """Graph for `mode` (unknown modes get a mindgraph), or None if the text has no content.
+
+    Flowcharts are pure text processing; the other modes need NumPy.
+    """
+    if mode != "flowchart" and not summarizer.available():
+        return None
+    graph = BUILDERS.get(mode, build_mindgraph)(text)
+    if graph is not None and mode not in BUILDERS:
+        graph["type"] = mode
+    return graph
@@ -0,0 +1,140 @@
+"""
+Result cache for the mindmap routes (analyze, classify, summarize) and the
+server-side layouts of analyze graphs.
+
+Students re-submit the same notes and flip between modes, and each flip used
+to be a fresh model call. Model results are kept per route in an in-memory
+LRU, keyed by the SHA-256 of the normalized text (Unicode NFKC, whitespace
+collapsed), the mode, the model and the prompt version. The prompt version
+is a fingerprint of the system prompt plus a route template version, so
+editing SYSTEM_MINDENGINE or a route prompt can never serve stale answers.
+
+With MINDMAP_CACHE_DISK=1 entries are also written to
+data/cache/mindmap/<prompt version>/ (shared by workers and kept across
+restarts). configure() deletes directories left by other prompt versions,
+and invalidate() drops everything explicitly. Only model results and graph
+layouts are cached; the local fallbacks are cheaper to recompute than to
+store.
+"""
+
+import hashlib
+import os
+import re
+import shutil
+import threading
+import unicodedata
+from collections import OrderedDict
+from pathlib import Path
+
+import doc_cache
+import metrics
+
+MINDMAP_CACHE_ENTRIES = int(os.getenv("MINDMAP_CACHE_ENTRIES", "512"))
+MINDMAP_CACHE_DISK = os.getenv("MINDMAP_CACHE_DISK", "0").lower() in ("1", "true", "yes")
+MINDMAP_CACHE_DIR = Path(os.getenv("MINDMAP_CACHE_DIR", Path(__file__).resolve().parent / "data" / "cache" / "mindmap"))
+MINDMAP_CACHE_MAX_BYTES = int(float(os.getenv("MINDMAP_CACHE_MB", "50")) * 1024 * 1024)
+
+_WHITESPACE_RE = re.compile(r"\s+")
+
+
+def normalize(text: str) -> str:
+    return _WHITESPACE_RE.sub(" ", unicodedata.normalize("NFKC", text or "")).strip()
+
+
+def text_hash(text: str) -> str:
+    return hashlib.sha256(normalize(text).encode("utf-8")).hexdigest()
+
+
+def prompt_version(system_prompt: str, template_version: str) -> str:
+    digest = hashlib.sha256(system_prompt.encode("utf-8")).hexdigest()[:12]
+    return f"{template_version}-{digest}"
+
+
+class ResultCache:
+    """LRU of JSON results for one route, optionally backed by a DiskCache."""
+
+    def __init__(self, route: str, max_entries: int = MINDMAP_CACHE_ENTRIES):
+        self.route = route
+        self.max_entries = max_entries
+        self.version = None
+        self.disk = None  # shared by all routes; keys carry the route
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def key(self, text: str, mode: str, model: str) -> str:
+        return f"{self.route}:{self.version}:{model}:{mode}:{text_hash(text)}"
+
+    def get(self, text: str, mode: str, model: str):
+        key = self.key(text, mode, model)
+        with self._lock:
+            value = self._entries.get(key)
+            if value is not None:
+                self._entries.move_to_end(key)
+        if value is None and self.disk is not None:
+            value = self.disk.get(key, cache=f"mindmap_{self.route}_disk")
+            if value is not None:
+                self._remember(key, value)
+        metrics.record_cache(f"mindmap_{self.route}", value is not None)
+        return value
+
+    def set(self, text: str, mode: str, model: str, value: dict):
+        key = self.key(text, mode, model)
+        self._remember(key, value)
+        if self.disk is not None:
+            self.disk.set(key, value)
+
+    def _remember(self, key: str, value: dict):
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+CACHES = {route: ResultCache(route) for route in ("analyze", "classify", "summarize", "layout")}
+
+
+def configure(version: str):
+    """Set the prompt version for every route; stale on-disk versions are removed."""
+    for cache in CACHES.values():
+        if cache.version != version:
+            cache.clear()
+        cache.version = version
+    if not MINDMAP_CACHE_DISK:
+        return
+    _attach_disk(version)
+    if MINDMAP_CACHE_DIR.exists():
+        for stale in MINDMAP_CACHE_DIR.iterdir():
+            if stale.is_dir() and stale.name != version:
+                shutil.rmtree(stale, ignore_errors=True)
+
+
+def _attach_disk(version: str):
+    disk = doc_cache.DiskCache(MINDMAP_CACHE_DIR / version, MINDMAP_CACHE_MAX_BYTES, name="mindmap")
+    for cache in CACHES.values():
+        cache.disk = disk
+
+
+def invalidate():
+    """Drop every cached mindmap result, in memory and on disk."""
+    for cache in CACHES.values():
+        cache.clear()
+    if not MINDMAP_CACHE_DISK:
+        return
+    shutil.rmtree(MINDMAP_CACHE_DIR, ignore_errors=True)
+    # The old DiskCache's running size still counts the deleted files
+    version = CACHES["analyze"].version
+    if version is not None:
+        _attach_disk(version)
+
+
+def lookup(route: str, text: str, mode: str, model: str):
+    return CACHES[route].get(text, mode, model)
+
+
+def store(route: str, text: str, mode: str, model: str, value: dict):
+    CACHES[route].set(text, mode, model, value)
@@ -0,0 +1,133 @@
+"""
+Local visualization-mode classifier for /api/mindmap/classify.
+
+Picking between mindgraph, flowchart, summary and keywords used to cost a
+full model round trip with SYSTEM_MINDENGINE. The text is now embedded by
+the shared embedding service and classified by similarity-weighted kNN over
+a small labeled seed set. Confidence is the
+winning label's share of the neighbours' similarity, scaled down while the
+closest example is less similar than FULL_SIMILARITY; a text whose closest
+example is below MIN_SIMILARITY gets no mode at all, so a lone shared word
+("Hello world" vs. the World War seed) cannot win a unanimous vote. Only below
+MINDMAP_CLASSIFY_CONFIDENCE does the route escalate to the model, and the
+model's answers are then learned as extra examples, so similar texts stay
+local next time.
+
+Without the model, TF-IDF vectors over the seeds plus the text stand in
+(no learning then, since those vectors are not comparable across calls).
+A text sharing no vocabulary with the seeds has zero confidence and
+always escalates.
+"""
+
+import os
+import threading
+from collections import deque
+
+import embeddings
+import summarizer
+
+np = summarizer.np
+
+MODES = ("mindgraph", "flowchart", "summary", "keywords")
+CONFIDENCE = float(os.getenv("MINDMAP_CLASSIFY_CONFIDENCE", "0.6"))
+NEIGHBOURS = 5
+# Top-1 similarity below which nothing is predicted, and from which on the
+# vote share counts in full
+MIN_SIMILARITY = float(os.getenv("MINDMAP_CLASSIFY_MIN_SIMILARITY", "0.2"))
+FULL_SIMILARITY = float(os.getenv("MINDMAP_CLASSIFY_FULL_SIMILARITY", "0.5"))
+MAX_LEARNED = int(os.getenv("MINDMAP_CLASSIFY_LEARNED", "500"))
+# The opening of a text is enough to tell its shape
+CLASSIFY_CHARS = 2000
+
+SEEDS = {
+    "mindgraph": [
+        "Photosynthesis is how plants turn light into chemical energy. It involves chlorophyll, light reactions and the Calvin cycle, and it links to respiration and the carbon cycle.",
+        "Democracy is a system of government where power rests with the people. Key ideas include elections, separation of powers, civil rights and the rule of law.",
+        "Machine learning covers supervised learning, unsupervised learning and reinforcement learning. Each family has its own algorithms, data needs and typical applications.",
+        "The causes of World War I include militarism, alliances, imperialism and nationalism, with the assassination of Franz Ferdinand as the trigger.",
+        "An ecosystem is made of producers, consumers and decomposers. Energy flows through food chains while nutrients cycle between living things and the environment.",
+        "Marketing strategy: product, price, place and promotion. Each part connects to customer segments, brand positioning and competitor analysis.",
+    ],
+    "flowchart": [
+        "First, preheat the oven to 180 degrees. Then mix the flour and sugar. Next, add the eggs and stir. Finally, bake for 25 minutes.",
+        "To register for the course, log in to the portal, select the semester, choose your subjects and submit the form. If the class is full, join the waiting list.",
+        "Step 1: collect the samples. Step 2: label each tube. Step 3: centrifuge for ten minutes. Step 4: record the results in the lab book.",
+        "When a customer places an order, the system checks stock. If the item is available, payment is processed and the order ships; otherwise the customer is notified.",
+        "How to reset your password: open settings, click forgot password, enter your email, open the link we send you and choose a new password.",
+        "The request is validated, then routed to the service, which queries the database and returns the response to the client.",
+    ],
+    "summary": [
+        "The report reviews the company's performance over the last financial year. Revenue grew by twelve percent, driven mainly by new markets in Asia, while costs rose because of supply chain problems. The board expects slower growth next year and has approved a cost reduction plan alongside further investment in research.",
+        "In this chapter the author describes the early life of the scientist, her education in Warsaw and Paris, and the long years of research that led to the discovery of radium. The chapter ends with the recognition she received and the personal cost of her work.",
+        "The meeting discussed the results of the customer survey, the delays in the new product launch and the hiring plan for the next quarter. Several teams reported progress and the group agreed on the next deadlines.",
+        "This article explains the background of the climate agreement, the positions of the main countries during the negotiations, the commitments that were finally made and the criticism from environmental groups.",
+        "The lecture covered the history of the printing press, its spread across Europe, its effect on literacy and religion, and how historians still debate its long-term impact on society.",
+        "Minutes of the school council: the budget was approved, the sports day was moved to June, parents raised concerns about traffic near the gate, and the library will extend its opening hours.",
+    ],
+    "keywords": [
+        "Renewable energy, solar panels, wind turbines, batteries, grid.",
+        "python, javascript, databases, apis, cloud",
+        "Vocabulary: mitochondria, nucleus, ribosome, cytoplasm, membrane.",
+        "Tags: travel, budget, hostels, backpacking, Europe",
+        "Exam topics - algebra, geometry, probability, statistics",
+        "Ingredients: flour, butter, eggs, sugar, vanilla",
+    ],
+}
+
+
+class ModeClassifier:
+    def __init__(self, seeds=SEEDS, max_learned: int = MAX_LEARNED):
+        self.texts = [text for mode in MODES for text in seeds.get(mode, [])]
+        self.labels = [mode for mode in MODES for _ in seeds.get(mode, [])]
+        self._seed_vectors = None
+        self._learned = deque(maxlen=max_learned)  # (vector, mode) from escalated answers
+        self._lock = threading.Lock()
+
+    def _examples(self, text: str):
+        """Example vectors, their labels and the text's vector, all in one space."""
+        if not embeddings.available():
+            vectors = summarizer.embed(self.texts + [text])
+            return vectors[:-1], self.labels, vectors[-1]
+        with self._lock:
+            if self._seed_vectors is None:
+                self._seed_vectors = summarizer.embed(self.texts)
+            seed_vectors, learned = self._seed_vectors, list(self._learned)
+        vectors, labels = seed_vectors, self.labels
+        if learned:
+            vectors = np.vstack([vectors] + [vector for vector, _ in learned])
+            labels = labels + [mode for _, mode in learned]
+        return vectors, labels, summarizer.embed([text])[0]
+
+    def predict(self, text: str):
+        """(mode, confidence) by similarity-weighted kNN; (None, 0.0) without NumPy or a close enough match."""
+        text = (text or "").strip()[:CLASSIFY_CHARS]
+        if not text or not summarizer.available():
+            return None, 0.0
+        vectors, labels, query = self._examples(text)
+        similarity = np.clip(vectors @ query, 0.0, None)
+        nearest = np.argsort(-similarity, kind="stable")[:NEIGHBOURS]
+        top = float(similarity[nearest[0]])
+        if top <= 0 or top < MIN_SIMILARITY:
+            return None, 0.0
+        votes = {}
+        for i in nearest:
+            votes[labels[i]] = votes.get(labels[i], 0.0) + float(similarity[i])
+        mode = max(votes, key=votes.get)
+        return mode, votes[mode] / sum(votes.values()) * min(1.0, top / FULL_SIMILARITY)
+
+    def learn(self, text: str, mode: str):
+        """Keep a model-labeled text as an example; only embeddings are comparable across calls."""
+        if mode not in MODES or not embeddings.available():
+            return
+        vector = summarizer.embed([(text or "").strip()[:CLASSIFY_CHARS]])[0]
+        with self._lock:
+            self._learned.append((vector, mode))
+
+
+CLASSIFIER = ModeClassifier()
+
+
+def classify(text: str):
+    """(mode, confidence, confident) for `text`."""
+    mode, confidence = CLASSIFIER.predict(text)
+    return mode, confidence, mode is not None and confidence >= CONFIDENCE
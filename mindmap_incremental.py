@@ -0,0 +1,310 @@
+"""
+Incremental mindmap regeneration for long, edited documents.
+
+A request that carries a `document_id` is split into paragraphs (blank-line
+separated; short ones such as headings are joined to the next). Consecutive
+paragraphs are analyzed together as segments of up to MINDMAP_SEGMENT_CHARS,
+one model call per segment. The first generation of a document therefore
+costs about what one whole-text call costs. The server keeps, per document
+id and mode, the fragment of each segment of the last version, keyed by the
+content hashes of its paragraphs. On regeneration, runs of paragraphs that
+still form a stored segment are reused (also when moved). Only the
+remaining paragraphs, i.e. edited and added ones plus the unchanged
+neighbours that shared a segment with them, are regrouped and analyzed, so
+an edit costs a call or two whatever the document's length. A request keeps
+at most MINDMAP_REQUEST_FANOUT calls in flight on the shared pool, so one
+long document cannot hold up every other user's regenerations. The
+fragments are then merged into one graph:
+
+- mindgraph: fragment roots collapse into one central node, and nodes with
+  the same label are merged;
+- flowchart: fragments are chained in document order between one Start
+  and one End;
+- keywords: the keyword lists are unioned.
+
+Node ids are prefixed with the segment's hash, so nodes of untouched
+segments keep their ids across regenerations and the client can animate
+changes rather than redraw. The title comes from the first fragment, so
+merging costs nothing per character of the document. State lives in
+process memory, bounded to MINDMAP_DOCUMENTS documents (LRU).
+"""
+
+import contextvars
+import hashlib
+import os
+import re
+import threading
+from collections import OrderedDict
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+MINDMAP_DOCUMENTS = int(os.getenv("MINDMAP_DOCUMENTS", "256"))
+PARAGRAPH_WORKERS = int(os.getenv("MINDMAP_PARAGRAPH_WORKERS", "4"))
+# Calls one request may have in flight on the shared pool
+REQUEST_FANOUT = max(1, int(os.getenv("MINDMAP_REQUEST_FANOUT", "2")))
+SEGMENT_CHARS = int(os.getenv("MINDMAP_SEGMENT_CHARS", "6000"))
+MIN_PARAGRAPH_CHARS = 160
+
+_PARAGRAPH_RE = re.compile(r"\n\s*\n")
+_pool = ThreadPoolExecutor(max_workers=PARAGRAPH_WORKERS, thread_name_prefix="mindmap-paragraph")
+
+
+def split_paragraphs(text: str):
+    """Paragraphs in order; short ones (headings, one-liners) are joined to the following paragraph."""
+    paragraphs, pending = [], ""
+    for block in _PARAGRAPH_RE.split(text or ""):
+        block = block.strip()
+        if not block:
+            continue
+        pending = f"{pending}\n{block}" if pending else block
+        if len(pending) >= MIN_PARAGRAPH_CHARS:
+            paragraphs.append(pending)
+            pending = ""
+    if pending:
+        if paragraphs and len(pending) < MIN_PARAGRAPH_CHARS:
+            paragraphs[-1] = f"{paragraphs[-1]}\n{pending}"
+        else:
+            paragraphs.append(pending)
+    return paragraphs
+
+
+def _paragraph_hash(paragraph: str) -> str:
+    return hashlib.sha256(" ".join(paragraph.split()).encode("utf-8")).hexdigest()
+
+
+def _label_key(label) -> str:
+    return " ".join(str(label).lower().split())
+
+
+# --- merging ----------------------------------------------------------------------
+def _is_terminal(node, name: str) -> bool:
+    return node.get("id") == name or _label_key(node.get("label", "")) == name
+
+
+def _merge_mindgraph(fragments, title):
+    nodes = [{"id": "root", "label": title, "level": 0}]
+    edges, seen_edges = [], set()
+    label_ids = {_label_key(title): "root"}
+    for prefix, fragment in fragments:
+        in_nodes = fragment.get("nodes") or []
+        idmap, added = {}, []
+        for i, node in enumerate(in_nodes):
+            # The fragment's own central topic becomes the document's
+            if node.get("level") == 0 or (i == 0 and node.get("level") is None):
+                idmap[node["id"]] = "root"
+                continue
+            key = _label_key(node.get("label", ""))
+            if key in label_ids:
+                idmap[node["id"]] = label_ids[key]
+                continue
+            idmap[node["id"]] = label_ids[key] = f"{prefix}_{node['id']}"
+            added.append(node)
+        for node in added:
+            merged = dict(node, id=idmap[node["id"]])
+            if node.get("parent") is not None:
+                merged["parent"] = idmap.get(node["parent"], "root")
+            nodes.append(merged)
+        for edge in fragment.get("edges") or []:
+            source, target = idmap.get(edge.get("from")), idmap.get(edge.get("to"))
+            if source is None or target is None or source == target or (source, target) in seen_edges:
+                continue
+            seen_edges.add((source, target))
+            edges.append(dict(edge, **{"from": source, "to": target}))
+    return {"type": "mindgraph", "nodes": nodes, "edges": edges}
+
+
+def _merge_flowchart(fragments):
+    nodes = [{"id": "start", "label": "Start", "level": 0, "shape": "ellipse"}]
+    edges = []
+    tails = [("start", None)]
+    offset = 0
+    for prefix, fragment in fragments:
+        in_nodes = fragment.get("nodes") or []
+        starts = {n["id"] for n in in_nodes if _is_terminal(n, "start")}
+        ends = {n["id"] for n in in_nodes if _is_terminal(n, "end")}
+        steps = [n for n in in_nodes if n["id"] not in starts and n["id"] not in ends]
+        if not steps:
+            continue
+        idmap = {n["id"]: f"{prefix}_{n['id']}" for n in steps}
+        deepest = offset
+        for n in steps:
+            level = offset + int(n.get("level") or 1)
+            deepest = max(deepest, level)
+            nodes.append(dict(n, id=idmap[n["id"]], level=level))
+        entries, exits = [], []
+        for edge in fragment.get("edges") or []:
+            source, target = edge.get("from"), edge.get("to")
+            if source in starts and target in idmap:
+                entries.append(idmap[target])
+            elif target in ends and source in idmap:
+                exits.append((idmap[source], edge.get("label")))
+            elif source in idmap and target in idmap:
+                edges.append(dict(edge, **{"from": idmap[source], "to": idmap[target]}))
+        for target in entries or [idmap[steps[0]["id"]]]:
+            for source, label in tails:
+                edges.append({"from": source, "to": target, **({"label": label} if label else {})})
+        tails = exits or [(idmap[steps[-1]["id"]], None)]
+        offset = deepest
+    nodes.append({"id": "end", "label": "End", "level": offset + 1, "shape": "ellipse"})
+    for source, label in tails:
+        edges.append({"from": source, "to": "end", **({"label": label} if label else {})})
+    return {"type": "flowchart", "nodes": nodes, "edges": edges}
+
+
+def _merge_keywords(fragments, title):
+    keywords, seen = [], set()
+    for _, fragment in fragments:
+        labels = fragment.get("keywords") or [n.get("label") for n in (fragment.get("nodes") or [])[1:]]
+        for keyword in labels:
+            key = _label_key(keyword or "")
+            if key and key not in seen:
+                seen.add(key)
+                keywords.append(keyword)
+    nodes = [{"id": "root", "label": title, "level": 0}]
+    edges = []
+    for keyword in keywords:
+        node_id = "k_" + hashlib.sha256(_label_key(keyword).encode("utf-8")).hexdigest()[:10]
+        nodes.append({"id": node_id, "label": keyword, "level": 1, "parent": "root"})
+        edges.append({"from": "root", "to": node_id})
+    return {"type": "keywords", "nodes": nodes, "edges": edges, "keywords": keywords}
+
+
+def merge(fragments, mode: str):
+    """Combine (prefix, fragment graph) pairs, in document order, into one graph for `mode`."""
+    first = next((f for _, f in fragments if f.get("nodes")), {"nodes": [{"label": "Document"}]})
+    # The first fragment's central topic covers the document's opening (and its heading)
+    title = str(first["nodes"][0].get("label") or "Document")
+    if mode == "flowchart":
+        return _merge_flowchart(fragments)
+    if mode == "keywords":
+        return _merge_keywords(fragments, title)
+    graph = _merge_mindgraph(fragments, title)
+    graph["type"] = mode
+    return graph
+
+
+# --- per-document state --------------------------------------------------------
+def _segment_hash(key) -> str:
+    return hashlib.sha256("".join(key).encode("ascii")).hexdigest()
+
+
+def _group(indices, paragraphs):
+    """Consecutive runs of `indices` cut into segments of at most SEGMENT_CHARS (one paragraph at least)."""
+    segments, current, size = [], [], 0
+    for i in indices:
+        contiguous = not current or current[-1] == i - 1
+        if current and (not contiguous or size + len(paragraphs[i]) > SEGMENT_CHARS):
+            segments.append(current)
+            current, size = [], 0
+        current.append(i)
+        size += len(paragraphs[i])
+    if current:
+        segments.append(current)
+    return segments
+
+
+def _run_bounded(tasks, limit: int):
+    """Results of zero-argument `tasks`, in order, with at most `limit` on the shared pool at once."""
+    results = [None] * len(tasks)
+    queue = list(enumerate(tasks))
+    running = {}
+    while queue or running:
+        while queue and len(running) < limit:
+            index, task = queue.pop(0)
+            # A copy of the request context, so metrics and prompt budgets still see the route
+            running[_pool.submit(contextvars.copy_context().run, task)] = index
+        done, _ = wait(running, return_when=FIRST_COMPLETED)
+        for future in done:
+            results[running.pop(future)] = future.result()
+    return results
+
+
+class _Document:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.segments = {}  # tuple of paragraph hashes -> fragment graph
+
+
+class IncrementalGraphs:
+    def __init__(self, max_documents: int = MINDMAP_DOCUMENTS):
+        self.max_documents = max_documents
+        self._documents = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _document(self, document_id: str, mode: str) -> _Document:
+        key = (document_id, mode)
+        with self._lock:
+            document = self._documents.get(key)
+            if document is None:
+                document = self._documents[key] = _Document()
+            self._documents.move_to_end(key)
+            while len(self._documents) > self.max_documents:
+                self._documents.popitem(last=False)
+            return document
+
+    def forget(self, document_id: str):
+        with self._lock:
+            for key in [k for k in self._documents if k[0] == document_id]:
+                del self._documents[key]
+
+    def regenerate(self, document_id: str, text: str, mode: str, analyze):
+        """Graph for the whole text, analyzing only paragraphs not covered by a stored segment.
+
+        `analyze(segment_text)` returns a {type, nodes, edges} fragment.
+        """
+        paragraphs = split_paragraphs(text)
+        hashes = [_paragraph_hash(p) for p in paragraphs]
+        document = self._document(document_id, mode)
+
+        def safe_analyze(segment_text):
+            try:
+                fragment = analyze(segment_text) or {}
+                # Error replies carry no nodes and are not worth keeping
+                return fragment if fragment.get("nodes") else {}
+            except Exception as e:
+                print(f"[MINDMAP] segment analysis failed: {e}")
+                return {}
+
+        with document.lock:
+            by_start = {}
+            for key in sorted(document.segments, key=len, reverse=True):
+                by_start.setdefault(key[0], []).append(key)
+            planned, unmatched, i = [], [], 0
+            while i < len(hashes):
+                key = next((k for k in by_start.get(hashes[i], []) if tuple(hashes[i:i + len(k)]) == k), None)
+                if key is None:
+                    unmatched.append(i)
+                    i += 1
+                    continue
+                planned.append((i, key))
+                i += len(key)
+            new = _group(unmatched, paragraphs)
+            results = _run_bounded(
+                [lambda group=group: safe_analyze("\n\n".join(paragraphs[j] for j in group)) for group in new],
+                REQUEST_FANOUT,
+            )
+            fragments = {key: document.segments[key] for _, key in planned}
+            for group, fragment in zip(new, results):
+                key = tuple(hashes[j] for j in group)
+                planned.append((group[0], key))
+                fragments[key] = fragments.get(key) or fragment
+            planned.sort()
+            # Only the current version's segments are kept for the next diff; failures are retried
+            document.segments = {key: f for key, f in fragments.items() if f}
+
+        occurrences = {}
+        ordered = []
+        for _, key in planned:
+            h = _segment_hash(key)
+            n = occurrences[h] = occurrences.get(h, -1) + 1
+            ordered.append((f"p{h[:8]}" + (f"-{n}" if n else ""), fragments[key]))
+        graph = merge(ordered, mode)
+        graph["incremental"] = {
+            "paragraphs": len(paragraphs),
+            "reanalyzed": len(unmatched),
+            "reused": len(paragraphs) - len(unmatched),
+            "calls": len(new),
+        }
+        return graph
+
+
+documents = IncrementalGraphs()
@@ -0,0 +1,185 @@
+"""
+OCR pipeline: preprocessing, tiling and a bounded Tesseract process pool.
+
+Each frame of an uploaded image (multi-page TIFFs and animated formats
+included) is converted to grayscale, downscaled to the resolution Tesseract
+needs and deskewed, then cut into horizontal strips at blank rows so no text
+line is split. Strips are recognised in parallel in a small process pool and
+joined in reading order. A job-level deadline (OCR_TIMEOUT) is enforced both
+on the futures and on each tesseract subprocess, so one huge photo cannot
+occupy the pool indefinitely. A worker that dies (e.g. killed for memory)
+breaks the pool; the pool is then replaced and the job fails with OCRFailed
+rather than being reported as a timeout.
+"""
+
+import multiprocessing as mp
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeout
+from concurrent.futures.process import BrokenProcessPool
+
+try:
+    import pytesseract
+except Exception:
+    pytesseract = None
+
+try:
+    from PIL import Image, ImageOps, ImageSequence
+except Exception:
+    Image = None
+
+try:
+    import numpy as np
+except Exception:
+    np = None
+
+OCR_WORKERS = int(os.getenv("OCR_WORKERS", min(4, os.cpu_count() or 1)))
+OCR_TIMEOUT = float(os.getenv("OCR_TIMEOUT", "60"))
+OCR_LANG = os.getenv("OCR_LANG", "eng")
+# Longest side after downscaling; ~300 dpi for an A4 page
+OCR_MAX_SIDE = int(os.getenv("OCR_MAX_SIDE", "3500"))
+OCR_TILE_HEIGHT = int(os.getenv("OCR_TILE_HEIGHT", "1600"))
+MAX_FRAMES = int(os.getenv("OCR_MAX_FRAMES", "200"))
+MAX_SKEW_DEGREES = 5.0
+SKEW_STEP = 0.5
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+class OCRTimeout(Exception):
+    pass
+
+
+class OCRFailed(Exception):
+    """The OCR pool broke (a worker died); the job can be retried."""
+
+
+def _get_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(max_workers=OCR_WORKERS, mp_context=mp.get_context("spawn"))
+        return _pool
+
+
+def _discard_pool(broken):
+    """Drop `broken` so the next job starts a fresh pool (another job may have replaced it already)."""
+    global _pool
+    with _pool_lock:
+        if _pool is broken:
+            _pool = None
+    broken.shutdown(wait=False, cancel_futures=True)
+
+
+def shutdown_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(cancel_futures=True)
+            _pool = None
+
+
+def _ink_profile(gray):
+    """Per-row count of dark pixels."""
+    return (np.asarray(gray) < 128).sum(axis=1)
+
+
+def estimate_skew(gray) -> float:
+    """Angle (degrees) that makes text lines horizontal, by projection-profile variance."""
+    if np is None:
+        return 0.0
+    thumb = gray.copy()
+    thumb.thumbnail((800, 800))
+    if (np.asarray(thumb) < 128).mean() < 0.002:
+        return 0.0  # blank page
+    best_angle, best_score = 0.0, -1.0
+    steps = int(MAX_SKEW_DEGREES / SKEW_STEP)
+    for i in range(-steps, steps + 1):
+        angle = i * SKEW_STEP
+        rotated = thumb.rotate(angle, resample=Image.BILINEAR, fillcolor=255)
+        score = float(np.var(_ink_profile(rotated)))
+        if score > best_score:
+            best_angle, best_score = angle, score
+    return best_angle
+
+
+def preprocess(frame):
+    """Grayscale, downscale and deskew one frame."""
+    gray = ImageOps.exif_transpose(frame).convert("L")
+    longest = max(gray.size)
+    if longest > OCR_MAX_SIDE:
+        scale = OCR_MAX_SIDE / longest
+        gray = gray.resize((max(1, int(gray.width * scale)), max(1, int(gray.height * scale))), Image.LANCZOS)
+    angle = estimate_skew(gray)
+    if abs(angle) >= SKEW_STEP:
+        gray = gray.rotate(angle, resample=Image.BICUBIC, expand=True, fillcolor=255)
+    return gray
+
+
+def split_rows(gray, tile_height: int = OCR_TILE_HEIGHT):
+    """Cut a frame into horizontal strips, choosing cut rows with the least ink."""
+    height = gray.height
+    if height <= tile_height * 1.25:
+        return [gray]
+    profile = _ink_profile(gray) if np is not None else None
+    tiles = []
+    top = 0
+    while height - top > tile_height * 1.25:
+        target = top + tile_height
+        cut = target
+        if profile is not None:
+            window = profile[target - tile_height // 5:target]
+            cut = target - tile_height // 5 + int(window.argmin())
+        tiles.append(gray.crop((0, top, gray.width, cut)))
+        top = cut
+    tiles.append(gray.crop((0, top, gray.width, height)))
+    return tiles
+
+
+def ocr_tile(raw: bytes, size, lang: str, timeout: float) -> str:
+    """Recognise one grayscale strip. Runs in pool workers."""
+    tile = Image.frombytes("L", size, raw)
+    return pytesseract.image_to_string(tile, lang=lang, timeout=max(1, int(timeout)))
+
+
+def ocr_image(source, timeout: float = OCR_TIMEOUT, lang: str = OCR_LANG) -> str:
+    """OCR every frame of an image file or stream; frames are separated by a form feed line."""
+    if not pytesseract or not Image:
+        raise Exception("OCR libraries not available")
+    deadline = time.monotonic() + timeout
+    pool = _get_pool()
+    jobs = []  # (frame_index, future)
+    with Image.open(source) as image:
+        for index, frame in enumerate(ImageSequence.Iterator(image)):
+            if index >= MAX_FRAMES:
+                break
+            for tile in split_rows(preprocess(frame)):
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise OCRTimeout(f"OCR exceeded {timeout:.0f}s")
+                try:
+                    jobs.append((index, pool.submit(ocr_tile, tile.tobytes(), tile.size, lang, remaining)))
+                except BrokenProcessPool as e:
+                    _discard_pool(pool)
+                    raise OCRFailed("An OCR worker crashed; please retry") from e
+
+    pages = {}
+    try:
+        for index, future in jobs:
+            remaining = deadline - time.monotonic()
+            try:
+                text = future.result(timeout=max(0.0, remaining))
+            except BrokenProcessPool as e:
+                # Subclasses RuntimeError, so it must be caught before the timeout case
+                _discard_pool(pool)
+                raise OCRFailed("An OCR worker crashed; please retry") from e
+            except (FutureTimeout, RuntimeError) as e:
+                # RuntimeError: pytesseract's own subprocess timeout
+                raise OCRTimeout(f"OCR exceeded {timeout:.0f}s") from e
+            pages.setdefault(index, []).append(text.strip())
+    finally:
+        for _, future in jobs:
+            future.cancel()
+    return "\n\f\n".join("\n".join(parts) for _, parts in sorted(pages.items())) + "\n"
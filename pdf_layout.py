@@ -0,0 +1,253 @@
+"""
+Local layout analysis from PDF geometry.
+
+pdfplumber exposes every character with its position, font name and size.
+Characters are loaded into NumPy arrays and grouped into lines with a single
+sort, and per-line extents, sizes and boldness come from ufunc.reduceat, so
+the whole analysis is a handful of vectorized passes per page and is cheap
+enough to run on every upload. From the lines it infers:
+
+- alignment: body lines are compared against the page's text edges and voted
+  left/center/right (full-width justified lines count as left);
+- header and footer bands: text in the top/bottom band that repeats across
+  pages (page numbers normalized), or small text there on one-page documents;
+- heading levels: line sizes clearly above the body size, largest first,
+  with short bold body-size lines as the lowest level;
+- font class: the dominant body font mapped to formal/casual/academic.
+
+The result has the same title/layout/sections shape as the model's answer.
+"""
+
+import io
+import os
+import re
+from collections import Counter
+
+try:
+    import numpy as np
+except Exception:
+    np = None
+
+try:
+    import pdfplumber
+except Exception:
+    pdfplumber = None
+
+MAX_LAYOUT_PAGES = int(os.getenv("PDF_LAYOUT_MAX_PAGES", "30"))
+BAND = 0.08  # top/bottom fraction of the page treated as header/footer band
+HEADING_RATIO = 1.15
+MAX_HEADING_LEVELS = 3
+
+_SUBSET_PREFIX_RE = re.compile(r"^[A-Z]{6}\+")
+_DIGITS_RE = re.compile(r"\d+")
+_PAGE_NUMBER_RE = re.compile(r"^(page\s*)?#(\s*(of|/)\s*#)?$")
+_ACADEMIC_FONTS = ("times", "serif", "garamond", "georgia", "cambria", "palatino", "bookman", "cmr", "lmroman", "computer modern")
+_CASUAL_FONTS = ("comic", "script", "hand", "brush", "marker", "chalk", "casual")
+
+
+def available() -> bool:
+    return np is not None and pdfplumber is not None
+
+
+def _font_family(fontname: str) -> str:
+    return _SUBSET_PREFIX_RE.sub("", fontname or "")
+
+
+def _page_lines(page):
+    """Group a page's characters into lines; returns a list of line dicts in reading order."""
+    chars = page.chars
+    if not chars:
+        return []
+    top = np.fromiter((c["top"] for c in chars), float, len(chars))
+    bottom = np.fromiter((c["bottom"] for c in chars), float, len(chars))
+    x0 = np.fromiter((c["x0"] for c in chars), float, len(chars))
+    x1 = np.fromiter((c["x1"] for c in chars), float, len(chars))
+    size = np.fromiter((c.get("size") or 0.0 for c in chars), float, len(chars))
+    fonts = [_font_family(c.get("fontname", "")) for c in chars]
+    bold = np.fromiter(("bold" in f.lower() or "black" in f.lower() for f in fonts), bool, len(chars))
+    blank = np.fromiter((not c["text"].strip() for c in chars), bool, len(chars))
+
+    # A new line starts wherever the vertical position jumps by more than half a glyph
+    by_top = np.argsort(top, kind="stable")
+    tolerance = 0.5 * max(float(np.median(size)), 1.0)
+    line_id = np.empty(len(chars), dtype=np.int64)
+    line_id[by_top] = np.concatenate(([0], np.cumsum(np.diff(top[by_top]) > tolerance)))
+    order = np.lexsort((x0, line_id))
+    ids = line_id[order]
+    starts = np.flatnonzero(np.concatenate(([True], ids[1:] != ids[:-1])))
+
+    counts = np.diff(np.append(starts, len(order)))
+    ink = ~blank[order]
+    line_x0 = np.minimum.reduceat(np.where(ink, x0[order], np.inf), starts)
+    line_x1 = np.maximum.reduceat(np.where(ink, x1[order], -np.inf), starts)
+    line_top = np.minimum.reduceat(top[order], starts)
+    line_bottom = np.maximum.reduceat(bottom[order], starts)
+    ink_count = np.add.reduceat(ink.astype(np.int64), starts)
+    line_size = np.add.reduceat(np.where(ink, size[order], 0.0), starts) / np.maximum(ink_count, 1)
+    line_bold = np.add.reduceat((bold[order] & ink).astype(np.int64), starts) / np.maximum(ink_count, 1)
+
+    # Insert spaces where the PDF positions words apart without a space glyph
+    gaps = np.empty(len(order))
+    gaps[0] = 0.0
+    gaps[1:] = x0[order][1:] - x1[order][:-1]
+    needs_space = (gaps > 0.2 * size[order]) & ink & np.roll(ink, 1)
+    needs_space[starts] = False
+
+    lines = []
+    for n, start in enumerate(starts):
+        if ink_count[n] == 0:
+            continue
+        stop = start + counts[n]
+        parts = []
+        for i in range(start, stop):
+            if needs_space[i]:
+                parts.append(" ")
+            parts.append(chars[order[i]]["text"])
+        text = " ".join("".join(parts).split())
+        font = Counter(fonts[order[i]] for i in range(start, stop) if ink[i]).most_common(1)[0][0]
+        lines.append({
+            "text": text,
+            "x0": float(line_x0[n]), "x1": float(line_x1[n]),
+            "top": float(line_top[n]), "bottom": float(line_bottom[n]),
+            "size": round(float(line_size[n]) * 2) / 2,
+            "bold": float(line_bold[n]) > 0.8,
+            "font": font,
+            "chars": int(ink_count[n]),
+        })
+    return lines
+
+
+def _alignment(pages) -> str:
+    votes = Counter()
+    for width, lines in pages:
+        if not lines:
+            continue
+        x0 = np.array([l["x0"] for l in lines])
+        x1 = np.array([l["x1"] for l in lines])
+        left, right = np.percentile(x0, 10), np.percentile(x1, 90)
+        span = max(right - left, 1.0)
+        tol = 0.02 * width
+        mid = (left + right) / 2
+        # Lines that fill the text block say nothing about alignment
+        partial = (x1 - x0) < 0.9 * span
+        is_left = np.abs(x0 - left) < tol
+        is_right = ~is_left & (np.abs(x1 - right) < tol)
+        is_center = ~is_left & ~is_right & (np.abs((x0 + x1) / 2 - mid) < tol)
+        votes["left"] += int((partial & is_left).sum())
+        votes["right"] += int((partial & is_right).sum())
+        votes["center"] += int((partial & is_center).sum())
+    return votes.most_common(1)[0][0] if votes and max(votes.values()) else "left"
+
+
+def _repeated_band_lines(pages, in_band):
+    """Normalized texts that occur in a band on at least half the pages (and two or more)."""
+    seen = Counter()
+    for height, lines in pages:
+        seen.update({_DIGITS_RE.sub("#", l["text"].lower()) for l in lines if in_band(l, height)})
+    needed = max(2, len(pages) // 2)
+    return {text for text, count in seen.items() if count >= needed}
+
+
+def _font_style(font: str) -> str:
+    name = font.lower()
+    if any(k in name for k in _CASUAL_FONTS):
+        return "casual"
+    if any(k in name for k in _ACADEMIC_FONTS):
+        return "academic"
+    return "formal"
+
+
+def analyze_layout(source, max_pages: int = MAX_LAYOUT_PAGES):
+    """Return {title, layout, sections} for a PDF (path, bytes or seekable stream), or None when geometry is unavailable."""
+    if not available():
+        return None
+    if isinstance(source, (bytes, bytearray)):
+        source = io.BytesIO(source)
+    elif not isinstance(source, (str, os.PathLike)):
+        source.seek(0)
+    pages = []
+    with pdfplumber.open(source) as pdf:
+        for page in pdf.pages[:max_pages]:
+            pages.append((float(page.width), float(page.height), _page_lines(page)))
+            page.flush_cache()
+    all_lines = [l for _, _, lines in pages for l in lines]
+    if not all_lines:
+        return None
+
+    # Body size: the size most characters are set in
+    size_weights = Counter()
+    font_weights = Counter()
+    for l in all_lines:
+        size_weights[l["size"]] += l["chars"]
+        font_weights[l["font"]] += l["chars"]
+    body_size = size_weights.most_common(1)[0][0]
+
+    top_band = lambda l, h: l["bottom"] < BAND * h
+    bottom_band = lambda l, h: l["top"] > (1 - BAND) * h
+    banded = [(h, lines) for _, h, lines in pages]
+    if len(pages) > 1:
+        headers = _repeated_band_lines(banded, top_band)
+        footers = _repeated_band_lines(banded, bottom_band)
+    else:
+        _, h, lines = pages[0]
+        headers = {_DIGITS_RE.sub("#", l["text"].lower()) for l in lines if top_band(l, h) and l["size"] <= body_size}
+        footers = {_DIGITS_RE.sub("#", l["text"].lower()) for l in lines if bottom_band(l, h) and l["size"] <= body_size}
+        footers |= {t for t in (_DIGITS_RE.sub("#", l["text"].lower()) for l in lines if bottom_band(l, h)) if _PAGE_NUMBER_RE.match(t)}
+
+    def is_running(line, height):
+        key = _DIGITS_RE.sub("#", line["text"].lower())
+        return (top_band(line, height) and key in headers) or (bottom_band(line, height) and key in footers)
+
+    body_pages = [(w, h, [l for l in lines if not is_running(l, h)]) for w, h, lines in pages]
+
+    heading_sizes = sorted({l["size"] for _, _, lines in body_pages for l in lines
+                            if l["size"] >= body_size * HEADING_RATIO and len(l["text"]) <= 120}, reverse=True)
+    levels = {s: i + 1 for i, s in enumerate(heading_sizes[:MAX_HEADING_LEVELS])}
+    bold_level = len(levels) + 1
+
+    def heading_level(line):
+        if line["size"] in levels:
+            return levels[line["size"]]
+        if line["bold"] and line["size"] >= body_size and len(line["text"]) < 80 and not line["text"].endswith("."):
+            return bold_level
+        return 0
+
+    title = None
+    sections = []
+    previous_level = 0
+    for _, _, lines in body_pages:
+        for line in lines:
+            level = heading_level(line)
+            text = line["text"]
+            top_level = min(levels.values(), default=bold_level)
+            if title is None and level == top_level:
+                title = text
+                previous_level = -1
+                continue
+            if previous_level == -1 and level == top_level:
+                title += " " + text  # title wrapped onto a second line
+                continue
+            if level:
+                # Headings that wrap onto a second line stay one heading
+                if sections and previous_level == level and not sections[-1]["content"]:
+                    sections[-1]["heading"] += " " + text
+                else:
+                    sections.append({"heading": text, "content": "", "level": level})
+            else:
+                if not sections:
+                    sections.append({"heading": "Content", "content": "", "level": bold_level})
+                sections[-1]["content"] = (sections[-1]["content"] + " " + text).strip()
+            previous_level = level
+
+    return {
+        "title": title or (sections[0]["heading"] if sections else "Activity Report"),
+        "layout": {
+            "alignment": _alignment([(w, lines) for w, _, lines in body_pages]),
+            "hasHeader": bool(headers),
+            "hasFooter": bool(footers),
+            "fontStyle": _font_style(font_weights.most_common(1)[0][0]),
+            "bodyFontSize": body_size,
+            "headingLevels": [{"level": level, "size": size} for size, level in levels.items()],
+        },
+        "sections": sections,
+    }
@@ -0,0 +1,175 @@
+"""
+On-demand sampling profiler for single requests.
+
+When the server is started with PROFILE_TOKEN set, a request carrying
+`X-Profile: <token>` (or `?__profile=<token>`) is run under a wall-clock
+sampling profiler. A background thread snapshots the stack of the thread
+that runs the request's handler every few milliseconds, and keeps the
+samples that are inside the request's endpoint. Time spent in JSON
+building, force_json, the model client or socket reads therefore shows up
+as separate frames. The handler records its own thread id through a
+context variable set by the middleware, so unprofiled requests to the same
+endpoint on other threadpool threads are not merged in. Async endpoints
+all share the event loop thread, so concurrent requests to the same async
+endpoint can still be sampled together. The result is written in the
+collapsed-stack ("folded") format read by flamegraph.pl, speedscope and
+inferno. Without PROFILE_TOKEN nothing is installed, so ordinary requests
+pay nothing.
+"""
+
+import functools
+import inspect
+import os
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from contextvars import ContextVar
+from datetime import datetime
+from pathlib import Path
+
+DEFAULT_INTERVAL = 0.005
+
+_SAFE_NAME_RE = re.compile(r"[^A-Za-z0-9_.-]+")
+
+# The profiler of the request being handled in this context, if any
+_current = ContextVar("profiler", default=None)
+_instrument_lock = threading.Lock()
+
+
+def _frame_label(code, cache):
+    label = cache.get(code)
+    if label is None:
+        label = f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})".replace(";", ",")
+        cache[code] = label
+    return label
+
+
+class SamplingProfiler:
+    """Samples the stack of one thread while it is running a given code object.
+
+    `target` is called on every tick and returns the code object to look for
+    (or None while it is not known yet, e.g. before routing has happened).
+    `thread_id` is set by the handler once it runs (see instrument); until
+    then nothing is sampled.
+    """
+
+    def __init__(self, target, interval: float = DEFAULT_INTERVAL):
+        self.target = target
+        self.interval = interval
+        self.thread_id = None
+        self.samples: Counter = Counter()
+        self.ticks = 0
+        self._labels = {}
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="request-profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.ticks += 1
+            target = self.target()
+            if target is None or self.thread_id is None:
+                continue
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            hit = False
+            while frame is not None:
+                if frame.f_code is target:
+                    hit = True
+                stack.append(_frame_label(frame.f_code, self._labels))
+                frame = frame.f_back
+            if hit:
+                stack.reverse()
+                self.samples[";".join(stack)] += 1
+
+    def folded(self) -> str:
+        return "".join(f"{stack} {count}\n" for stack, count in self.samples.most_common())
+
+
+def _endpoint_code(scope):
+    endpoint = scope.get("endpoint")
+    return getattr(endpoint, "__code__", None)
+
+
+def _record_thread():
+    profiler = _current.get()
+    if profiler is not None and profiler.thread_id is None:
+        profiler.thread_id = threading.get_ident()
+
+
+def _recording(call):
+    """`call` wrapped to record the thread it runs on; sync stays sync, async stays async."""
+    if inspect.iscoroutinefunction(call):
+        @functools.wraps(call)
+        async def wrapper(*args, **kwargs):
+            _record_thread()
+            return await call(*args, **kwargs)
+    else:
+        @functools.wraps(call)
+        def wrapper(*args, **kwargs):
+            _record_thread()
+            return call(*args, **kwargs)
+    wrapper._records_thread = True
+    return wrapper
+
+
+def instrument(app):
+    """Wrap every route's endpoint call so it reports its thread to the request's profiler.
+
+    FastAPI decides sync vs. async when the route is built, so the wrapper
+    keeps the endpoint's kind. Mounted sub-applications are walked too.
+    Idempotent (wrapped calls are marked); routes added later are picked up
+    on the next call.
+    """
+    with _instrument_lock:
+        _instrument_routes(getattr(app, "routes", []))
+
+
+def _instrument_routes(routes):
+    for route in routes:
+        # Mount and Host expose their sub-application's routes
+        _instrument_routes(getattr(route, "routes", None) or [])
+        dependant = getattr(route, "dependant", None)
+        if dependant is None or dependant.call is None or getattr(dependant.call, "_records_thread", False):
+            continue
+        dependant.call = _recording(dependant.call)
+
+
+async def profile_request(request, call_next, output_dir: Path, interval: float = DEFAULT_INTERVAL):
+    """Run one request under the sampling profiler and store its folded stacks.
+
+    The response gets X-Profile-File (the stored file name), X-Profile-Samples
+    and X-Profile-Duration headers.
+    """
+    instrument(request.app)
+    profiler = SamplingProfiler(lambda: _endpoint_code(request.scope), interval)
+    token = _current.set(profiler)
+    started = time.perf_counter()
+    profiler.start()
+    try:
+        response = await call_next(request)
+    finally:
+        profiler.stop()
+        _current.reset(token)
+    duration = time.perf_counter() - started
+
+    output_dir.mkdir(parents=True, exist_ok=True)
+    route = _SAFE_NAME_RE.sub("_", request.url.path.strip("/")) or "root"
+    name = f"{datetime.now().strftime('%Y%m%d-%H%M%S-%f')}_{route}.folded"
+    (output_dir / name).write_text(profiler.folded(), encoding="utf-8")
+    print(f"[PROFILE] {request.url.path} {duration * 1000:.1f} ms, {sum(profiler.samples.values())} samples -> {name}")
+
+    response.headers["X-Profile-File"] = name
+    response.headers["X-Profile-Samples"] = str(sum(profiler.samples.values()))
+    response.headers["X-Profile-Duration"] = f"{duration:.6f}"
+    return response
@@ -0,0 +1,195 @@
+"""
+Token-accurate prompt budgeting.
+
+Prompts used to be bounded by character slicing or not at all, so a large
+event payload could overflow the model's context or leave no room for the
+answer, while short prompts were sent with no output cap. Tokens are counted
+with tiktoken (one cached encoder per model; a chars/4 estimate when tiktoken
+is missing or cannot load its encoding files, e.g. offline with no BPE cache). Each endpoint has a prompt budget and an output budget:
+call sites shrink bulky JSON inputs with fit_json(), and the chat completion
+wrappers pass every request through fit_messages() and output_tokens() as a
+safety net, so no request exceeds the context window and max_tokens is always set.
+"""
+
+import json
+import math
+import os
+from functools import lru_cache
+
+try:
+    import tiktoken
+except Exception:
+    tiktoken = None
+
+CHARS_PER_TOKEN = 4
+# Per-message framing tokens added by the chat format
+MESSAGE_OVERHEAD = 4
+REPLY_PRIMER = 3
+TRUNCATION_MARK = " …[truncated]"
+
+CONTEXT_WINDOWS = {
+    "gpt-4o-mini": 128000,
+    "gpt-4o": 128000,
+    "gpt-4.1": 1047576,
+    "gpt-4.1-mini": 1047576,
+    "gpt-4-turbo": 128000,
+    "gpt-4": 8192,
+    "gpt-3.5-turbo": 16385,
+}
+DEFAULT_CONTEXT_WINDOW = int(os.getenv("LLM_CONTEXT_WINDOW", "8192"))
+
+# (prompt tokens, output tokens) per route; routes not listed use DEFAULT_BUDGET
+ENDPOINT_BUDGETS = {
+    "/ai/report": (6000, 3000),
+    "/ai/tasks": (4000, 1500),
+    "/ai/schedule": (2500, 1500),
+    "/ai/plan": (2500, 1200),
+    "/ai/budget": (2500, 1200),
+    "/ai/vendors": (2500, 1200),
+    # "/api/ai/analyze_document" is set by doc_chunking from its chunk size
+    "/api/mindmap/analyze": (6000, 2000),
+    "/api/mindmap/summarize": (6000, 1200),
+    "/api/mindmap/classify": (2000, 300),
+    "/ai/certificate/analyze": (2500, 1000),
+    "/ai/certificate/autofill": (2000, 800),
+    "/api/magazine/generate": (3000, 2000),
+}
+# Routes whose call sites size their prompts exactly (e.g. analyze_document
+# chunks); overflowing one is a bug, so fit_messages raises instead of trimming
+STRICT_ENDPOINTS = set()
+DEFAULT_BUDGET = (
+    int(os.getenv("LLM_PROMPT_BUDGET", "6000")),
+    int(os.getenv("LLM_OUTPUT_BUDGET", "1500")),
+)
+
+
+class PromptTooLarge(ValueError):
+    """A prompt for a strict endpoint does not fit its budget."""
+
+
+# Set once tiktoken failed to load an encoding (usually a failed BPE download);
+# from then on every model uses the chars/4 estimate instead of retrying
+_encoding_failed = False
+
+
+@lru_cache(maxsize=16)
+def get_encoding(model: str):
+    """tiktoken encoder for `model`, or None for the estimate (cached; building one costs tens of milliseconds)."""
+    global _encoding_failed
+    if tiktoken is None or _encoding_failed:
+        return None
+    try:
+        try:
+            return tiktoken.encoding_for_model(model)
+        except KeyError:
+            return tiktoken.get_encoding("o200k_base")
+    except Exception as e:
+        _encoding_failed = True
+        print(f"[BUDGET] tiktoken encoding unavailable ({type(e).__name__}: {e}); estimating {CHARS_PER_TOKEN} chars per token")
+        return None
+
+
+def count_tokens(text: str, model: str = "gpt-4o-mini") -> int:
+    if not text:
+        return 0
+    encoding = get_encoding(model)
+    if encoding is None:
+        return math.ceil(len(text) / CHARS_PER_TOKEN)
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+def count_message_tokens(messages, model: str = "gpt-4o-mini") -> int:
+    total = REPLY_PRIMER
+    for message in messages:
+        total += MESSAGE_OVERHEAD + count_tokens(str(message.get("content") or ""), model)
+    return total
+
+
+def truncate_text(text: str, max_tokens: int, model: str = "gpt-4o-mini") -> str:
+    """Cut `text` to at most `max_tokens` tokens, marking the cut."""
+    if count_tokens(text, model) <= max_tokens:
+        return text
+    keep = max(0, max_tokens - count_tokens(TRUNCATION_MARK, model))
+    encoding = get_encoding(model)
+    if encoding is None:
+        return text[:keep * CHARS_PER_TOKEN] + TRUNCATION_MARK
+    return encoding.decode(encoding.encode(text, disallowed_special=())[:keep]) + TRUNCATION_MARK
+
+
+def _dumps(value) -> str:
+    return json.dumps(value, ensure_ascii=False)
+
+
+def _shrink(value, limit: int):
+    """Copy of `value` with strings cut to `limit` characters and lists to `limit // 20` items."""
+    if isinstance(value, str):
+        return value if len(value) <= limit else value[:limit] + "…"
+    if isinstance(value, dict):
+        return {k: _shrink(v, limit) for k, v in value.items()}
+    if isinstance(value, list):
+        keep = max(3, limit // 20)
+        items = [_shrink(v, limit) for v in value[:keep]]
+        if len(value) > keep:
+            items.append(f"... {len(value) - keep} more items omitted")
+        return items
+    return value
+
+
+def fit_json(value, max_tokens: int, model: str = "gpt-4o-mini") -> str:
+    """Serialize `value` as JSON within `max_tokens`.
+
+    Long strings and lists are shortened progressively (keeping the first
+    items and noting how many were dropped), so the result stays valid JSON
+    instead of being cut mid-structure.
+    """
+    text = _dumps(value)
+    if count_tokens(text, model) <= max_tokens:
+        return text
+    limit = 2000
+    while limit >= 20:
+        text = _dumps(_shrink(value, limit))
+        if count_tokens(text, model) <= max_tokens:
+            return text
+        limit //= 2
+    return truncate_text(text, max_tokens, model)
+
+
+def context_window(model: str) -> int:
+    # Longest matching prefix, so dated snapshots ("gpt-4o-2024-08-06") resolve
+    for name in sorted(CONTEXT_WINDOWS, key=len, reverse=True):
+        if model.startswith(name):
+            return CONTEXT_WINDOWS[name]
+    return DEFAULT_CONTEXT_WINDOW
+
+
+def endpoint_budget(endpoint: str) -> tuple[int, int]:
+    return ENDPOINT_BUDGETS.get(endpoint, DEFAULT_BUDGET)
+
+
+def fit_messages(messages, model: str, endpoint: str):
+    """Trim the longest non-system message until the prompt fits the endpoint budget.
+
+    Returns (messages, prompt_tokens). Call sites are expected to budget their
+    own inputs; this only catches what slips through. Endpoints in
+    STRICT_ENDPOINTS raise PromptTooLarge instead.
+    """
+    prompt_budget, output_budget = endpoint_budget(endpoint)
+    limit = min(prompt_budget, context_window(model) - output_budget)
+    used = count_message_tokens(messages, model)
+    if used <= limit:
+        return messages, used
+    if endpoint in STRICT_ENDPOINTS:
+        raise PromptTooLarge(f"{endpoint}: prompt is {used} tokens, the budget is {limit}")
+    messages = [dict(m) for m in messages]
+    candidates = [m for m in messages if m.get("role") != "system"] or messages
+    longest = max(candidates, key=lambda m: len(str(m.get("content") or "")))
+    content = str(longest.get("content") or "")
+    longest["content"] = truncate_text(content, max(0, count_tokens(content, model) - (used - limit)), model)
+    print(f"[BUDGET] {endpoint}: prompt trimmed from {used} to {limit} tokens")
+    return messages, count_message_tokens(messages, model)
+
+
+def output_tokens(prompt_tokens: int, model: str, endpoint: str, requested: int | None = None) -> int:
+    """max_tokens for a request: the caller's or the endpoint's, capped by what the context has left."""
+    wanted = requested or endpoint_budget(endpoint)[1]
+    return max(16, min(wanted, context_window(model) - prompt_tokens))
@@ -1,16 +1,42 @@
 #!/usr/bin/env python3
 """
 Unified Creative Studio Server Runner
-Runs the main FastAPI server that serves all applications
+Production launcher for the main FastAPI server that serves all applications.
+
+The parent process binds the listening socket once and supervises a pool of
+uvicorn worker processes that share it:
+
+  * --workers N            number of worker processes (default: $WEB_CONCURRENCY or CPU count)
+  * --preload              import server.py once in the parent before forking (POSIX only)
+  * SIGHUP                 graceful rolling restart, one worker at a time
+  * --max-requests N       a worker exits after N requests and is replaced
+  * --max-lifetime SECS    workers older than this (plus jitter) are replaced
+
+Readiness is reported per worker (PID and startup latency) and the server as a
+whole is polled on /health with exponential backoff instead of a fixed sleep.
+
+With --preload, workers are forked from the parent's already imported app, so
+a SIGHUP rolling restart only gives fresh processes (new connections, reset
+memory); it does not pick up code changes. Restart the launcher to deploy new
+code, or run without --preload, where every worker imports server.py itself.
 """
 
-import subprocess
+import argparse
+import multiprocessing as mp
+import os
+import random
+import signal
+import socket
 import sys
 import time
-import os
-import requests
+import urllib.error
+import urllib.request
 from pathlib import Path
 
+ROOT = Path(__file__).resolve().parent
+APP_IMPORT = "server:app"
+
+
 def check_dependencies():
     """Check if required dependencies are installed"""
     print("Checking dependencies...")
@@ -37,146 +63,332 @@ def check_dependencies():
 
     return True
 
-def start_main_server():
-    """Start the main FastAPI server"""
-    print("Starting Creative Studio Unified Server...")
 
-    current_dir = Path(__file__).resolve().parent
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Creative Studio production launcher")
+    parser.add_argument("--host", default=os.getenv("HOST", "0.0.0.0"))
+    parser.add_argument("--port", type=int, default=int(os.getenv("PORT", 8000)))
+    parser.add_argument("--workers", type=int, default=int(os.getenv("WEB_CONCURRENCY", os.cpu_count() or 1)),
+                        help="number of worker processes")
+    parser.add_argument("--preload", action="store_true", default=os.getenv("PRELOAD_APP") == "1",
+                        help="import the app in the parent before forking workers (POSIX only); "
+                             "SIGHUP then does not reload code")
+    parser.add_argument("--max-requests", type=int, default=int(os.getenv("MAX_REQUESTS", 0)),
+                        help="recycle a worker after this many requests (0 = unlimited)")
+    parser.add_argument("--max-requests-jitter", type=int, default=int(os.getenv("MAX_REQUESTS_JITTER", 0)),
+                        help="random extra requests per worker so they do not all recycle at once")
+    parser.add_argument("--max-lifetime", type=float, default=float(os.getenv("MAX_WORKER_LIFETIME", 0)),
+                        help="recycle a worker after this many seconds (0 = unlimited)")
+    parser.add_argument("--lifetime-jitter", type=float, default=float(os.getenv("MAX_WORKER_LIFETIME_JITTER", 60)),
+                        help="random extra seconds added to each worker's lifetime")
+    parser.add_argument("--graceful-timeout", type=float, default=float(os.getenv("GRACEFUL_TIMEOUT", 30)),
+                        help="seconds a worker gets to finish in-flight requests on shutdown")
+    parser.add_argument("--ready-timeout", type=float, default=float(os.getenv("READY_TIMEOUT", 120)),
+                        help="seconds to wait for a worker to become ready")
+    parser.add_argument("--backlog", type=int, default=2048)
+    parser.add_argument("--log-level", default=os.getenv("LOG_LEVEL", "info"))
+    return parser.parse_args(argv)
 
-    try:
-        # Start the main server
-        print("Starting Main Server on port 8000...")
-        server_process = subprocess.Popen(
-            [sys.executable, "server.py"],
-            cwd=current_dir,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-            text=True
+
+def bind_socket(host, port, backlog):
+    """Bind the shared listening socket in the parent so workers can inherit it"""
+    family = socket.AF_INET6 if ":" in host else socket.AF_INET
+    sock = socket.socket(family, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(backlog)
+    sock.set_inheritable(True)
+    return sock
+
+
+def run_worker(app, sock, ready, options):
+    """Worker entry point: serve the app on the inherited socket"""
+    import uvicorn
+
+    # The parent owns SIGHUP; a forked child must not run its handler
+    if hasattr(signal, "SIGHUP"):
+        signal.signal(signal.SIGHUP, signal.SIG_IGN)
+    os.chdir(ROOT)
+    if str(ROOT) not in sys.path:
+        sys.path.insert(0, str(ROOT))
+
+    class _ReadyServer(uvicorn.Server):
+        async def startup(self, sockets=None):
+            await super().startup(sockets=sockets)
+            if not self.should_exit:
+                ready.set()
+
+    max_requests = options["max_requests"]
+    if max_requests and options["max_requests_jitter"]:
+        max_requests += random.randint(0, options["max_requests_jitter"])
+
+    config = uvicorn.Config(
+        app,
+        log_level=options["log_level"],
+        limit_max_requests=max_requests or None,
+        timeout_graceful_shutdown=options["graceful_timeout"],
+    )
+    _ReadyServer(config).run(sockets=[sock])
+
+
+class Worker:
+    def __init__(self, process, ready, lifetime):
+        self.process = process
+        self.ready = ready
+        self.started_at = time.monotonic()
+        self.ready_latency = None
+        self.lifetime = lifetime
+
+    @property
+    def pid(self):
+        return self.process.pid
+
+    @property
+    def age(self):
+        return time.monotonic() - self.started_at
+
+
+class Supervisor:
+    """Keeps `workers` uvicorn processes alive on one shared socket"""
+
+    def __init__(self, args, sock, app):
+        self.args = args
+        self.sock = sock
+        self.app = app
+        self.workers: list[Worker] = []
+        self.context = mp.get_context("fork" if args.preload else "spawn")
+        self.options = {
+            "log_level": args.log_level,
+            "max_requests": args.max_requests,
+            "max_requests_jitter": args.max_requests_jitter,
+            "graceful_timeout": args.graceful_timeout,
+        }
+        self._reload_requested = False
+        self._stop_requested = False
+
+    # --- signal handling -------------------------------------------------
+    def install_signal_handlers(self):
+        signal.signal(signal.SIGINT, self._handle_stop)
+        signal.signal(signal.SIGTERM, self._handle_stop)
+        if hasattr(signal, "SIGHUP"):
+            signal.signal(signal.SIGHUP, self._handle_reload)
+
+    def _handle_stop(self, signum, frame):
+        self._stop_requested = True
+
+    def _handle_reload(self, signum, frame):
+        self._reload_requested = True
+
+    # --- worker lifecycle ------------------------------------------------
+    def spawn(self):
+        ready = self.context.Event()
+        process = self.context.Process(
+            target=run_worker,
+            args=(self.app, self.sock, ready, self.options),
+            name="creative-studio-worker",
         )
+        process.start()
+        lifetime = None
+        if self.args.max_lifetime:
+            lifetime = self.args.max_lifetime + random.uniform(0, self.args.lifetime_jitter)
+        return Worker(process, ready, lifetime)
 
-        # Wait for server to start
-        print("Waiting for server to initialize...")
-        time.sleep(3)
+    def wait_ready(self, worker):
+        deadline = time.monotonic() + self.args.ready_timeout
+        while time.monotonic() < deadline:
+            if worker.ready.wait(0.1):
+                worker.ready_latency = worker.age
+                return True
+            if not worker.process.is_alive():
+                break
+        return False
 
-        # Check if server is responding
-        try:
-            response = requests.get("http://localhost:8000/health", timeout=5)
-            if response.status_code == 200:
-                print("OK: Server health check passed!")
-            else:
-                print(f"WARNING: Server responded with status {response.status_code}")
-        except requests.exceptions.RequestException as e:
-            print(f"ERROR: Server health check failed: {e}")
-            print("Checking server process...")
-            if server_process.poll() is not None:
-                print("ERROR: Server process terminated unexpectedly")
-                stdout, stderr = server_process.communicate()
-                if stderr:
-                    print("Server error output:")
-                    print(stderr)
-                return None
-
-        print("\nSUCCESS: Creative Studio Server Started Successfully!")
-        print("=" * 60)
-        print("Main URL: http://localhost:8000")
-        print("\nAvailable Applications:")
-        print("   • Magazine Designer Pro: http://localhost:8000/Mag.html")
-        print("   • Certificate Generator: http://localhost:8000/certificate")
-        print("   • Activity Report Generator: http://localhost:8000/activity-report-generator/")
-        print("   • Event Planner: http://localhost:8000/event-planner/")
-        print("   • Mind Map AI: http://localhost:8000/mindmap-ai/")
-        print("   • Mood Sense: http://localhost:8000/mood-sense/")
-        print("   • Magazine Maker: http://localhost:8000/Mag.html")
-        print("   • Todo App: http://localhost:8000/todo.html")
-        print("\nAPI Endpoints:")
-        print("   • Health Check: http://localhost:8000/health")
-        print("   • AI Certificate API: http://localhost:8000/api/ai/*")
-        print("   • Mood Analysis: http://localhost:8000/mood/*")
-        print("   • Event Planner API: http://localhost:8000/api/event-planner/*")
-        print("\nInstructions:")
-        print("1. Open http://localhost:8000 in your browser")
-        print("2. Click on any application link above")
-        print("3. All apps share the same server and are fully connected")
-        print("\nPress Ctrl+C to stop the server")
-
-        return server_process
-
-    except Exception as e:
-        print(f"❌ Failed to start server: {e}")
-        return None
-
-def check_server_connectivity():
-    """Check connectivity between different parts of the application"""
-    print("\nChecking Server Connectivity...")
-
-    endpoints_to_check = [
-        ("Main Health", "http://localhost:8000/health"),
-        ("Magazine Page", "http://localhost:8000/Mag.html"),
-        ("Certificate API", "http://localhost:8000/api/ai/suggest"),
-        ("Mood API", "http://localhost:8000/mood/analyze"),
-    ]
-
-    all_connected = True
-
-    for name, url in endpoints_to_check:
+    def stop_worker(self, worker):
+        if worker.process.is_alive():
+            worker.process.terminate()  # SIGTERM -> uvicorn graceful shutdown
+        worker.process.join(self.args.graceful_timeout)
+        if worker.process.is_alive():
+            print(f"WARNING: Worker {worker.pid} did not exit in {self.args.graceful_timeout:.0f}s, killing")
+            worker.process.kill()
+            worker.process.join()
+
+    def replace(self, old, reason):
+        """Start a replacement first so capacity never drops below `workers`"""
+        new = self.spawn()
+        if not self.wait_ready(new):
+            print(f"ERROR: Replacement for worker {old.pid} failed to start; keeping the old worker")
+            self.stop_worker(new)
+            return False
+        self.workers[self.workers.index(old)] = new
+        self.stop_worker(old)
+        print(f"OK: Worker {old.pid} -> {new.pid} ({reason}), ready in {new.ready_latency:.2f}s")
+        return True
+
+    def start(self):
+        started = time.monotonic()
+        self.workers = [self.spawn() for _ in range(self.args.workers)]
+        failed = [w for w in self.workers if not self.wait_ready(w)]
+        if failed:
+            print(f"ERROR: {len(failed)} worker(s) failed to become ready")
+            return False
+        print(f"OK: {len(self.workers)} worker(s) ready in {time.monotonic() - started:.2f}s")
+        self.report()
+        return True
+
+    def report(self):
+        print("   PID       startup   age")
+        for w in self.workers:
+            latency = f"{w.ready_latency:.2f}s" if w.ready_latency is not None else "-"
+            print(f"   {w.pid:<9} {latency:<9} {w.age:.0f}s")
+
+    def rolling_restart(self):
+        print("\nSIGHUP received: rolling restart...")
+        if self.args.preload:
+            print("NOTE: --preload workers are forked from the already loaded app; restart the launcher to load new code")
+        for worker in list(self.workers):
+            if self._stop_requested:
+                return
+            self.replace(worker, "reload")
+        self.report()
+
+    def reap(self):
+        for worker in list(self.workers):
+            if worker.process.is_alive():
+                continue
+            code = worker.process.exitcode
+            print(f"Worker {worker.pid} exited (code {code}); respawning")
+            new = self.spawn()
+            self.workers[self.workers.index(worker)] = new
+            if self.wait_ready(new):
+                print(f"OK: Worker {new.pid} ready in {new.ready_latency:.2f}s")
+
+    def recycle_expired(self):
+        # One at a time: the next expired worker is picked up on a later tick
+        for worker in self.workers:
+            if worker.lifetime is not None and worker.age > worker.lifetime:
+                self.replace(worker, f"lifetime {worker.age:.0f}s")
+                return
+
+    def run_forever(self):
+        while not self._stop_requested:
+            if self._reload_requested:
+                self._reload_requested = False
+                self.rolling_restart()
+            self.reap()
+            self.recycle_expired()
+            time.sleep(0.5)
+        self.shutdown()
+
+    def shutdown(self):
+        print("\n\nStopping servers...")
+        for w in self.workers:
+            if w.process.is_alive():
+                w.process.terminate()
+        for w in self.workers:
+            self.stop_worker(w)
+        self.sock.close()
+        print("OK: Servers stopped. Goodbye!")
+
+
+def connect_host(host):
+    """Address a local client can reach a server bound to `host` on, bracketed for URLs if IPv6"""
+    if host in ("", "0.0.0.0"):
+        return "127.0.0.1"
+    if host == "::":
+        return "[::1]"
+    return f"[{host}]" if ":" in host else host
+
+
+def wait_for_http_ready(url, timeout, initial_delay=0.05, max_delay=2.0):
+    """Poll `url` with exponential backoff until it answers 200 or `timeout` elapses"""
+    started = time.monotonic()
+    delay = initial_delay
+    attempts = 0
+    while True:
+        attempts += 1
         try:
-            if url.endswith('/suggest') or url.endswith('/analyze'):
-                # POST request for API endpoints
-                response = requests.post(url, json={}, timeout=5)
-            else:
-                # GET request for pages/health
-                response = requests.get(url, timeout=5)
-
-            if response.status_code in [200, 405]:  # 405 is OK for POST to GET endpoint
-                print(f"OK: {name}: Connected")
-            else:
-                print(f"WARNING: {name}: HTTP {response.status_code}")
-                all_connected = False
-        except requests.exceptions.RequestException as e:
-            print(f"ERROR: {name}: Failed to connect - {e}")
-            all_connected = False
-
-    return all_connected
-
-def main():
+            with urllib.request.urlopen(url, timeout=5) as resp:
+                if resp.status == 200:
+                    return time.monotonic() - started, attempts
+        except (urllib.error.URLError, OSError):
+            pass
+        if time.monotonic() - started + delay > timeout:
+            return None, attempts
+        time.sleep(delay)
+        delay = min(delay * 2, max_delay)
+
+
+def print_banner(host, port):
+    base = f"http://{'localhost' if host in ('', '0.0.0.0', '::') else connect_host(host)}:{port}"
+    print("\nSUCCESS: Creative Studio Server Started Successfully!")
+    print("=" * 60)
+    print(f"Main URL: {base}")
+    print("\nAvailable Applications:")
+    print(f"   • Magazine Designer Pro: {base}/Mag.html")
+    print(f"   • Certificate Generator: {base}/certificate")
+    print(f"   • Activity Report Generator: {base}/activity-report-generator/")
+    print(f"   • Event Planner: {base}/event-planner/")
+    print(f"   • Mind Map AI: {base}/mindmap-ai/")
+    print(f"   • Mood Sense: {base}/mood-sense/")
+    print(f"   • Todo App: {base}/todo.html")
+    print("\nAPI Endpoints:")
+    print(f"   • Health Check: {base}/health")
+    print(f"   • AI Certificate API: {base}/api/ai/*")
+    print(f"   • Mood Analysis: {base}/mood/*")
+    print(f"   • Event Planner API: {base}/api/event-planner/*")
+    print("\nPress Ctrl+C to stop the server" + ("; send SIGHUP for a rolling restart" if hasattr(signal, "SIGHUP") else ""))
+
+
+def main(argv=None):
     """Main function to run the unified server"""
     print("Creative Studio - Unified Server Launcher")
     print("=" * 50)
 
+    args = parse_args(argv)
+
     # Check dependencies
     if not check_dependencies():
         print("\nERROR: Dependency check failed. Please install required packages.")
         sys.exit(1)
 
-    # Start the main server
-    server_process = start_main_server()
-    if not server_process:
-        print("\nERROR: Failed to start server. Exiting.")
+    os.chdir(ROOT)
+    if str(ROOT) not in sys.path:
+        sys.path.insert(0, str(ROOT))
+
+    app = APP_IMPORT
+    if args.preload:
+        if "fork" not in mp.get_all_start_methods():
+            print("WARNING: --preload needs fork(); workers will import the app themselves")
+            args.preload = False
+        else:
+            started = time.monotonic()
+            import server
+            app = server.app
+            print(f"OK: Preloaded app in {time.monotonic() - started:.2f}s")
+
+    try:
+        sock = bind_socket(args.host, args.port, args.backlog)
+    except OSError as e:
+        print(f"ERROR: Could not bind {args.host}:{args.port}: {e}")
         sys.exit(1)
 
-    # Check connectivity
-    time.sleep(2)  # Give server more time to fully start
-    connectivity_ok = check_server_connectivity()
+    print(f"Starting {args.workers} worker(s) on {args.host}:{args.port}...")
+    supervisor = Supervisor(args, sock, app)
+    supervisor.install_signal_handlers()
+    if not supervisor.start():
+        supervisor.shutdown()
+        print("\nERROR: Failed to start server. Exiting.")
+        sys.exit(1)
 
-    if connectivity_ok:
-        print("\nSUCCESS: All systems connected and operational!")
-        print("Ready to create amazing content!")
+    elapsed, attempts = wait_for_http_ready(f"http://{connect_host(args.host)}:{args.port}/health", args.ready_timeout)
+    if elapsed is None:
+        print(f"WARNING: /health did not answer after {attempts} attempts")
     else:
-        print("\nWARNING: Some connections may not be working properly.")
-        print("Check the server logs above for details.")
+        print(f"OK: Server health check passed in {elapsed:.2f}s ({attempts} attempt(s))")
 
-    print("\n" + "=" * 60)
-    print("Server is running in the background...")
-    print("Press Ctrl+C to stop all servers")
+    print_banner(args.host, args.port)
+    supervisor.run_forever()
 
-    try:
-        # Keep the script running
-        server_process.wait()
-    except KeyboardInterrupt:
-        print("\n\nStopping servers...")
-        server_process.terminate()
-        server_process.wait()
-        print("OK: Servers stopped. Goodbye!")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -3,7 +3,7 @@ echo Starting Creative Studio Servers...
 echo.
 
 echo Starting Main Server on port 8000...
-start "Main Server" cmd /c "cd /d %~dp0 && python server.py"
+start "Main Server" cmd /c "cd /d %~dp0 && python run_both_servers.py"
 
 timeout /t 2 /nobreak > nul
 
@@ -0,0 +1,195 @@
+"""
+Opt-in semantic (near-duplicate) cache tier for model replies.
+
+The exact caches miss the common resubmission with a typo fixed or a
+sentence reworded. This tier embeds the request's user text with the shared
+embedding service and searches a per-route vector index, one collection
+per route and scope. The scope (e.g. model, prompt version, tone) keeps
+answers from crossing prompts. A prior reply is reused when the cosine
+similarity reaches the route's threshold and the entry is younger than the
+route's TTL.
+
+Each route runs in one of three modes:
+
+- off (the default): no lookups and nothing stored;
+- shadow: entries are stored, and lookups log would-be hits (score, both
+  texts) and count them in metrics, but are never served, so quality can be
+  checked before turning a route on;
+- on: hits are served.
+
+SEMANTIC_CACHE sets the default mode for every route. SEMANTIC_CACHE_ROUTES
+(JSON) overrides per route, for example
+{"/api/mindmap/summarize": {"mode": "on", "threshold": 0.98, "ttl": 3600}}.
+Without the embedding model the tier stays inactive; TF-IDF vectors are not
+comparable across requests.
+
+The model only reads the first ~256 word pieces of a text. Long texts are
+therefore embedded as the average of up to DIGEST_WINDOWS windows spread
+across the whole text, so two documents with the same opening but different
+bodies do not look identical. Before a match is served, its length must be
+within LENGTH_SLACK of the request's. Routes with `exact_names` also require
+the same capitalized words and numbers, so a certificate for one recipient
+is never reused for another.
+"""
+
+import hashlib
+import json
+import math
+import os
+import re
+import threading
+import time
+from collections import deque
+
+import embeddings
+import metrics
+
+MODES = ("off", "shadow", "on")
+SEMANTIC_CACHE = os.getenv("SEMANTIC_CACHE", "off").lower()
+SEMANTIC_CACHE_ENTRIES = int(os.getenv("SEMANTIC_CACHE_ENTRIES", "2000"))
+# Candidates checked per lookup, so an expired or rejected best match does not hide a good one
+CANDIDATES = 3
+# all-MiniLM-L6-v2 truncates at 256 word pieces, roughly 1000 characters
+WINDOW_CHARS = 800
+DIGEST_WINDOWS = 8
+# Allowed length difference between a request and a served match
+LENGTH_SLACK = 0.1
+LENGTH_SLACK_CHARS = 16
+
+DAY = 24 * 3600
+ROUTES = {
+    "/api/mindmap/summarize": {"threshold": 0.97, "ttl": 7 * DAY},
+    "/ai/certificate/suggest": {"threshold": 0.98, "ttl": DAY, "exact_names": True},
+    "/todo/analyze:rewrite": {"threshold": 0.97, "ttl": DAY},
+}
+
+
+def _load_overrides():
+    try:
+        return json.loads(os.getenv("SEMANTIC_CACHE_ROUTES", "") or "{}")
+    except ValueError as e:
+        print(f"[SEMANTIC] ignoring invalid SEMANTIC_CACHE_ROUTES: {e}")
+        return {}
+
+
+OVERRIDES = _load_overrides()
+
+
+def route_config(route: str):
+    """{mode, threshold, ttl} for `route`; unknown routes are off."""
+    config = {"mode": SEMANTIC_CACHE, "threshold": 0.97, "ttl": DAY}
+    if route not in ROUTES and route not in OVERRIDES:
+        return dict(config, mode="off")
+    config.update(ROUTES.get(route, {}))
+    config.update(OVERRIDES.get(route, {}))
+    if config["mode"] not in MODES:
+        config["mode"] = "off"
+    return config
+
+
+_NAME_RE = re.compile(r"\b(?:[^\W\d_][\w'-]*|\d[\d.,/:-]*)", re.UNICODE)
+
+
+def _windows(text: str):
+    """The text, or up to DIGEST_WINDOWS evenly spaced windows of a long one."""
+    if len(text) <= WINDOW_CHARS:
+        return [text]
+    count = min(DIGEST_WINDOWS, math.ceil(len(text) / WINDOW_CHARS))
+    step = (len(text) - WINDOW_CHARS) / (count - 1)
+    return [text[round(i * step):round(i * step) + WINDOW_CHARS] for i in range(count)]
+
+
+def digest_vector(text: str):
+    """Unit vector for `text`: the normalized mean of its windows' embeddings; None without a model."""
+    vectors = embeddings.encode(_windows(text))
+    if vectors is None:
+        return None
+    mean = vectors.mean(axis=0)
+    return mean / max(float(embeddings.np.linalg.norm(mean)), 1e-12)
+
+
+def name_tokens(text: str):
+    """Capitalized words and numbers (names, dates, scores) in `text`."""
+    return sorted({t for t in _NAME_RE.findall(text) if t[0].isupper() or t[0].isdigit()})
+
+
+def acceptable(config, text: str, cached_text: str) -> bool:
+    """Whether a similar cached entry may be served for `text`."""
+    if abs(len(text) - len(cached_text)) > max(LENGTH_SLACK * len(text), LENGTH_SLACK_CHARS):
+        return False
+    if config.get("exact_names") and name_tokens(text) != name_tokens(cached_text):
+        return False
+    return True
+
+
+class SemanticCache:
+    def __init__(self, max_entries: int = SEMANTIC_CACHE_ENTRIES):
+        self.max_entries = max_entries
+        self._order = {}  # collection name -> deque of entry ids, oldest first
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _collection_name(route: str, scope: str) -> str:
+        return f"semantic:{route}:{hashlib.sha256(scope.encode('utf-8')).hexdigest()[:12]}"
+
+    def _active(self, route: str):
+        config = route_config(route)
+        if config["mode"] == "off" or not embeddings.available():
+            return None
+        return config
+
+    def lookup(self, route: str, text: str, scope: str = ""):
+        """A stored reply for a near-duplicate of `text`, or None (always None in shadow mode)."""
+        config = self._active(route)
+        if config is None or not (text or "").strip():
+            return None
+        vector = digest_vector(text)
+        if vector is None:
+            return None
+        name = self._collection_name(route, scope)
+        now = time.time()
+        match = None
+        for entry_id, score, payload in embeddings.collection(name).search(vector, CANDIDATES, config["threshold"]):
+            if now - payload["created"] <= config["ttl"] and acceptable(config, text, payload["text"]):
+                match = (score, payload)
+                break
+        if config["mode"] == "shadow":
+            metrics.record_cache(f"semantic_shadow:{route}", match is not None)
+            if match is not None:
+                score, payload = match
+                print(f"[SEMANTIC] shadow hit {route} score={score:.3f} "
+                      f"request={text[:80]!r} cached={payload['text'][:80]!r}")
+            return None
+        metrics.record_cache(f"semantic:{route}", match is not None)
+        return match[1]["reply"] if match else None
+
+    def store(self, route: str, text: str, reply, scope: str = ""):
+        """Index `reply` under `text`; a no-op while the route is off."""
+        if self._active(route) is None or not (text or "").strip():
+            return
+        vector = digest_vector(text)
+        if vector is None:
+            return
+        name = self._collection_name(route, scope)
+        collection = embeddings.collection(name)
+        entry_id = embeddings.text_hash(text).hex()
+        collection.add([entry_id], vector[None, :], [{"reply": reply, "created": time.time(), "text": text}])
+        with self._lock:
+            order = self._order.setdefault(name, deque())
+            if entry_id in order:
+                order.remove(entry_id)
+            order.append(entry_id)
+            evicted = [order.popleft() for _ in range(max(len(order) - self.max_entries, 0))]
+        for old in evicted:
+            collection.remove(old)
+
+
+CACHE = SemanticCache()
+
+
+def lookup(route: str, text: str, scope: str = ""):
+    return CACHE.lookup(route, text, scope)
+
+
+def store(route: str, text: str, reply, scope: str = ""):
+    CACHE.store(route, text, reply, scope)
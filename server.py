@@ -2,37 +2,62 @@ import os
 import json
 import re
 import io
+import asyncio
+import threading
+import hmac
 import time
 import random
 import importlib.util
+from contextlib import asynccontextmanager
 from pathlib import Path
+from typing import Optional
 from datetime import datetime, timedelta
 
-from fastapi import FastAPI, HTTPException, UploadFile, File, Request, Response
+from fastapi import FastAPI, HTTPException, UploadFile, File, Form, Request, Response
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import HTMLResponse, RedirectResponse
+from fastapi.responses import HTMLResponse, JSONResponse, PlainTextResponse, RedirectResponse, StreamingResponse
 from pydantic import BaseModel
 
+import batch_jobs
+import certificate_render
+import doc_cache
+import doc_chunking
+import graph_layout
+import json_extract
+import keywords
+import llm_schemas
+import metrics
+import mindgraph
+import mindmap_cache
+import mindmap_classifier
+import mindmap_incremental
+import ocr
+import pdf_extract
+import pdf_layout
+import profiling
+import prompt_budget
+import semantic_cache
+import summarizer
+import uploads
+from static_assets import AssetManifest, FingerprintedStaticFiles
+
 try:
     from openai import OpenAI
 except Exception:
     OpenAI = None
 
-try:
-    import PyPDF2
-except Exception:
-    PyPDF2 = None
-
-try:
-    import pytesseract
-    from PIL import Image
-except Exception:
-    pytesseract = None
-    Image = None
-
 ROOT = Path(__file__).resolve().parent
-app = FastAPI(title="Creative Studio API", version="1.0.0")
+@asynccontextmanager
+async def lifespan(app):
+    yield
+    # The PDF, OCR and certificate pools start lazily; stop their worker
+    # processes so a shutdown or reload does not leave them behind
+    for module in (pdf_extract, ocr, certificate_render):
+        module.shutdown_pool()
+
+app = FastAPI(title="Creative Studio API", version="1.0.0", lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -42,9 +67,20 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Uploads: spool to disk past UPLOAD_SPOOL_KB, reject bodies over MAX_UPLOAD_MB
+# while they stream in rather than after they are fully buffered
+uploads.configure_spooling()
+UPLOAD_ROUTES = ["/api/ai/analyze_document"]
+app.add_middleware(uploads.UploadLimitMiddleware, paths=UPLOAD_ROUTES, max_bytes=uploads.MAX_UPLOAD_BYTES)
+app.add_middleware(uploads.UploadLimitMiddleware, paths=["/api/ai/analyze_batch"], max_bytes=batch_jobs.BATCH_MAX_BYTES)
+
 mounted_projects: list[tuple[str, str]] = []
 client = None  # Will initialise after loading environment variables
 
+# Content hashes of static assets, filled in as folders are mounted below.
+# Drives fingerprinted URLs, /asset-manifest.json and the generated sw.js.
+asset_manifest = AssetManifest()
+
 
 # Mount core static asset folders (css/js/assets) so dashboard requests resolve
 STATIC_FOLDERS: list[tuple[str, Path]] = [
@@ -55,7 +91,8 @@ STATIC_FOLDERS: list[tuple[str, Path]] = [
 
 for mount_path, directory in STATIC_FOLDERS:
     if directory.exists():
-        app.mount(mount_path, StaticFiles(directory=str(directory)), name=mount_path.strip("/"))
+        asset_manifest.register(mount_path, directory)
+        app.mount(mount_path, FingerprintedStaticFiles(directory=str(directory), manifest=asset_manifest, url_prefix=mount_path), name=mount_path.strip("/"))
 
 
 
@@ -126,7 +163,7 @@ async def root_index(request: Request):
         if index_path.exists():
             with open(index_path, 'r', encoding='utf-8') as f:
                 content = f.read()
-            return HTMLResponse(content=content)
+            return HTMLResponse(content=asset_manifest.rewrite_html(content))
         else:
             return HTMLResponse(content="<h1>Dashboard not found</h1>")
     else:
@@ -143,13 +180,21 @@ async def serve_index_html(request: Request):
         if index_path.exists():
             with open(index_path, 'r', encoding='utf-8') as f:
                 content = f.read()
-            return HTMLResponse(content=content)
+            return HTMLResponse(content=asset_manifest.rewrite_html(content))
         else:
             return HTMLResponse(content="<h1>Dashboard not found</h1>")
     else:
         # Redirect to login page for unauthenticated users
         return RedirectResponse(url="/auth/login.html", status_code=302)
 
+# /metrics needs a session like any other page; with METRICS_TOKEN set, a
+# scraper can send `Authorization: Bearer <token>` instead
+METRICS_TOKEN = os.getenv("METRICS_TOKEN")
+
+def _has_metrics_token(request) -> bool:
+    supplied = request.headers.get("authorization", "").removeprefix("Bearer ").strip()
+    return bool(METRICS_TOKEN) and bool(supplied) and hmac.compare_digest(supplied, METRICS_TOKEN)
+
 # Middleware to check authentication for protected routes
 @app.middleware("http")
 async def auth_middleware(request, call_next):
@@ -158,8 +203,9 @@ async def auth_middleware(request, call_next):
         request.url.path.startswith("/css") or
         request.url.path.startswith("/js") or
         request.url.path.startswith("/assets") or
-        request.url.path in ["/", "/index.html", "/docs", "/openapi.json", "/sw.js", "/favicon.ico"] or
-        request.url.path.startswith("/.well-known")):
+        request.url.path in ["/", "/index.html", "/health", "/docs", "/openapi.json", "/sw.js", "/asset-manifest.json", "/favicon.ico"] or
+        request.url.path.startswith("/.well-known") or
+        (request.url.path == "/metrics" and _has_metrics_token(request))):
         response = await call_next(request)
         return response
 
@@ -173,16 +219,82 @@ async def auth_middleware(request, call_next):
     response = await call_next(request)
     return response
 
-# Serve service worker from root
+# Per-route request counts and latency for /metrics. Registered after the auth
+# middleware so it wraps it and also sees redirected requests.
+@app.middleware("http")
+async def metrics_middleware(request, call_next):
+    token = metrics.current_scope.set(request.scope)
+    metrics.HTTP_IN_FLIGHT.inc()
+    started = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        metrics.HTTP_IN_FLIGHT.dec()
+        metrics.current_scope.reset(token)
+        # Label by route template, never by raw path, to keep cardinality bounded
+        label = metrics.route_label(request.scope)
+        metrics.HTTP_REQUESTS.labels(label, request.method, status).inc()
+        metrics.HTTP_LATENCY.labels(label, request.method).observe(time.perf_counter() - started)
+
+metrics.install_threadpool_gauges()
+
+@app.get("/metrics")
+async def serve_metrics():
+    return PlainTextResponse(metrics.REGISTRY.render(), media_type=metrics.CONTENT_TYPE)
+
+# Opt-in per-request sampling profiler. Only installed when PROFILE_TOKEN is
+# set; send `X-Profile: <token>` (or `?__profile=<token>`) on the request to
+# profile. Folded stacks are stored in PROFILE_DIR and can be fetched from
+# /debug/profiles/<name> with the same token.
+PROFILE_TOKEN = os.getenv("PROFILE_TOKEN")
+PROFILE_DIR = Path(os.getenv("PROFILE_DIR") or (ROOT / "data" / "profiles"))
+
+def _has_profile_token(request) -> bool:
+    supplied = request.headers.get("x-profile") or request.query_params.get("__profile")
+    return bool(supplied) and hmac.compare_digest(supplied, PROFILE_TOKEN)
+
+if PROFILE_TOKEN:
+    @app.middleware("http")
+    async def profiling_middleware(request, call_next):
+        if not _has_profile_token(request) or request.url.path.startswith("/debug/profiles"):
+            return await call_next(request)
+        interval = float(os.getenv("PROFILE_INTERVAL_MS", "5")) / 1000
+        return await profiling.profile_request(request, call_next, PROFILE_DIR, interval)
+
+    @app.get("/debug/profiles/{name}")
+    async def serve_profile(name: str, request: Request):
+        if not _has_profile_token(request):
+            raise HTTPException(status_code=403, detail="Profile token required")
+        path = PROFILE_DIR / Path(name).name
+        if not path.is_file():
+            raise HTTPException(status_code=404, detail="Profile not found")
+        return PlainTextResponse(path.read_text(encoding="utf-8"))
+
+    print(f"Request profiling enabled; profiles are written to {PROFILE_DIR}")
+
+# Serve service worker from root, filled in with the current asset manifest.
+# The worker script itself must always be revalidated so new versions install.
 @app.get("/sw.js")
 async def serve_service_worker():
     sw_path = ROOT / "sw.js"
     if sw_path.exists():
         with open(sw_path, 'r', encoding='utf-8') as f:
             content = f.read()
-        return HTMLResponse(content=content, media_type="application/javascript")
+        return HTMLResponse(
+            content=asset_manifest.render_service_worker(content),
+            media_type="application/javascript",
+            headers={"Cache-Control": "no-cache"},
+        )
     raise HTTPException(status_code=404, detail="Service worker not found")
 
+# Plain URL -> fingerprinted URL map for every hashed static asset
+@app.get("/asset-manifest.json")
+async def serve_asset_manifest():
+    return JSONResponse(asset_manifest.to_dict(), headers={"Cache-Control": "no-cache"})
+
 # Serve favicon (prevent 404)
 @app.get("/favicon.ico")
 async def serve_favicon():
@@ -201,7 +313,8 @@ for child in ROOT.iterdir():
         index_file = child / 'index.html'
         if index_file.exists():
             mount_path = f"/{child.name}"
-            app.mount(mount_path, StaticFiles(directory=str(child), html=True), name=f"static_{child.name}")
+            asset_manifest.register(mount_path, child)
+            app.mount(mount_path, FingerprintedStaticFiles(directory=str(child), html=True, manifest=asset_manifest, url_prefix=mount_path), name=f"static_{child.name}")
             mounted_projects.append((child.name, mount_path + '/'))
             print(f"Mounted {child.name} at {mount_path}/")
 
@@ -211,7 +324,8 @@ for child in ROOT.iterdir():
                 sub_index = sub / 'index.html'
                 if sub_index.exists():
                     sub_mount_path = f"/{child.name}/{sub.name}"
-                    app.mount(sub_mount_path, StaticFiles(directory=str(sub), html=True), name=f"static_{child.name}_{sub.name}")
+                    asset_manifest.register(sub_mount_path, sub)
+                    app.mount(sub_mount_path, FingerprintedStaticFiles(directory=str(sub), html=True, manifest=asset_manifest, url_prefix=sub_mount_path), name=f"static_{child.name}_{sub.name}")
                     mounted_projects.append((f"{child.name}/{sub.name}", sub_mount_path + '/'))
                     print(f"Mounted {child.name}/{sub.name} at {sub_mount_path}/")
 
@@ -235,8 +349,9 @@ if CERT_DIR:
     try:
         # Encoded space path (kept for backward compatibility)
         app.mount("/certificate%20generator", StaticFiles(directory=str(CERT_DIR), html=True), name="certificate_generator_encoded")
-        # Hyphen alias
-        app.mount("/certificate-generator", StaticFiles(directory=str(CERT_DIR), html=True), name="certificate_generator_alias")
+        # Hyphen alias (the fingerprinted one; the encoded path stays plain)
+        asset_manifest.register("/certificate-generator", CERT_DIR)
+        app.mount("/certificate-generator", FingerprintedStaticFiles(directory=str(CERT_DIR), html=True, manifest=asset_manifest, url_prefix="/certificate-generator"), name="certificate_generator_alias")
         print(f"Mounted Certificate Generator from {CERT_DIR} at /certificate%20generator/ and /certificate-generator/")
     except Exception as e:
         print("Failed to mount Certificate Generator folder:", e)
@@ -274,8 +389,12 @@ try:
         app.mount("/api/event-planner", event_planner_app, name="event_planner_api")
         print("Mounted Event Planner Backend at /api/event-planner/")
 
-        # Include mindmap API directly in main app at /api/mindmap
-        app.include_router(mindmap_api, prefix="/api/mindmap", tags=["mindmap"])
+        # Include mindmap API directly in main app at /api/mindmap. Its topic /classify stays
+        # on the sub-app; here /classify is the mode classifier the mindmap frontend calls.
+        from fastapi import APIRouter
+        main_mindmap_api = APIRouter()
+        main_mindmap_api.routes.extend(r for r in mindmap_api.routes if getattr(r, "path", None) != "/classify")
+        app.include_router(main_mindmap_api, prefix="/api/mindmap", tags=["mindmap"])
         print("Mounted Mindmap API at /api/mindmap/")
     else:
         print("Event Planner Backend not found at expected location")
@@ -284,30 +403,13 @@ except Exception as e:
     # Fallback: try to define basic mindmap endpoints
     try:
         from fastapi import APIRouter
-        from pydantic import BaseModel
-        from typing import Dict
 
         fallback_mindmap_api = APIRouter()
 
-        class MindmapClassifyRequest(BaseModel):
-            text: str
-
         @fallback_mindmap_api.get('/health')
         async def fallback_mindmap_health():
             return {"status": "fallback mode", "message": "Event planner backend not available"}
 
-        @fallback_mindmap_api.post('/classify')
-        async def fallback_mindmap_classify(req: MindmapClassifyRequest):
-            if not req.text or not req.text.strip():
-                raise HTTPException(status_code=400, detail='text is required')
-            # Simple fallback implementation
-            tokens = [t.strip('.,;:!?').lower() for t in req.text.split() if len(t) > 4]
-            freq: Dict[str, int] = {}
-            for t in tokens:
-                freq[t] = freq.get(t, 0) + 1
-            topics = sorted(freq.keys(), key=lambda k: freq[k], reverse=True)[:5]
-            return {"success": True, "data": {"topics": topics}}
-
         app.include_router(fallback_mindmap_api, prefix="/api/mindmap", tags=["mindmap"])
         print("Using fallback Mindmap API implementation")
     except Exception as fallback_e:
@@ -597,19 +699,12 @@ Respond in JSON format:
                 temperature=0.2
             )
             result_text = response.choices[0].message.content.strip()
-            # Clean the response: remove markdown code blocks if present
-            if result_text.startswith('```json'):
-                result_text = result_text[7:]
-            if result_text.endswith('```'):
-                result_text = result_text[:-3]
-            result_text = result_text.strip()
-            # Try to parse as JSON
-            try:
-                result = json.loads(result_text)
+            # Code fences, prose and small syntax slips are handled by the extractor
+            result = json_extract.extract_json(result_text, dict)
+            if result is not None:
                 return result
-            except json.JSONDecodeError as je:
-                print(f"OpenAI response not valid JSON: {result_text} Error: {je}")
-                # Fall back to simple parsing
+            print(f"OpenAI response not valid JSON: {result_text}")
+            # Fall back to simple parsing
         except Exception as e:
             print(f"OpenAI analysis failed: {e}")
             # Fall back to simple parsing
@@ -646,81 +741,47 @@ Respond in JSON format:
         "sections": sections
     }
 
-@app.post("/api/ai/analyze_document")
-async def api_ai_analyze_document(file: UploadFile = File(...)):
-    if not file:
-        raise HTTPException(status_code=400, detail="No file uploaded")
-
-    # Extract text from file
-    content = await file.read()
-    filename = file.filename.lower()
+# Bump when the analysis prompt or the text extractors change, so cached entries are not reused
+ANALYZE_PROMPT_VERSION = "analyze-document-v2"
+EXTRACTOR_VERSION = "v2"
+LAYOUT_VERSION = "pdf-layout-v1"
+# With geometry-based layout available, the model call is optional enrichment
+ANALYZE_WITH_LLM = os.getenv("ANALYZE_DOCUMENT_LLM", "1").lower() not in ("0", "false", "no")
 
-    extracted_text = ""
+def _local_pdf_layout(source):
     try:
-        if filename.endswith('.pdf'):
-            extracted_text = extract_text_from_pdf(content)
-        elif filename.endswith(('.jpg', '.jpeg', '.png')):
-            extracted_text = extract_text_from_image(content)
-        else:
-            # Assume text file or try as text
-            try:
-                extracted_text = content.decode('utf-8')
-            except:
-                raise HTTPException(status_code=400, detail="Unsupported file type")
+        # Read straight from the upload (or its memory map); no temporary copy
+        return pdf_layout.analyze_layout(source)
     except Exception as e:
-        print(f"Text extraction failed: {e}")
-        raise HTTPException(status_code=400, detail="Failed to extract text from file")
-
-    if not extracted_text.strip():
-        raise HTTPException(status_code=400, detail="No text found in file")
-
-    # Now analyze the extracted text with AI
-    if client:
-        try:
-            prompt = f"""
-Analyze the following activity report document text. Extract the main title, detect the layout structure (alignment, formatting), and break it down into logical sections with headings and content.
-
-Document Text:
-{extracted_text[:4000]}  # Limit to avoid token limits
+        print(f"Local layout analysis failed: {e}")
+        return None
 
-Respond in JSON format:
-{{
-  "title": "Main Title",
-  "layout": {{
-    "alignment": "left|center|right",
-    "hasHeader": true|false,
-    "hasFooter": true|false,
-    "fontStyle": "formal|casual|academic"
-  }},
-  "sections": [
-    {{"heading": "Section Heading", "content": "Section content here."}},
-    ...
-  ]
-}}
-"""
-            response = _chat_completion_with_retry(
-                model=os.getenv("OPENAI_MODEL", "gpt-4o-mini"),
-                messages=[{"role": "user", "content": prompt}],
-                max_tokens=1200,
-                temperature=0.2
-            )
-            result_text = response.choices[0].message.content.strip()
-            # Clean the response
-            if result_text.startswith('```json'):
-                result_text = result_text[7:]
-            if result_text.endswith('```'):
-                result_text = result_text[:-3]
-            result_text = result_text.strip()
-            try:
-                result = json.loads(result_text)
-                return result
-            except json.JSONDecodeError as je:
-                print(f"OpenAI response not valid JSON: {result_text} Error: {je}")
-        except Exception as e:
-            print(f"OpenAI document analysis failed: {e}")
+def _analyze_chunk(text, model, index, total):
+    """Ask the model for {title, layout, sections} of one chunk; None on failure."""
+    prompt = doc_chunking.analyze_prompt(text, index, total)
+    try:
+        response = _chat_completion_with_retry(
+            model=model,
+            messages=[{"role": "user", "content": prompt}],
+            max_tokens=doc_chunking.ANALYZE_OUTPUT_TOKENS,
+            temperature=0.2,
+            schema="document_analysis"
+        )
+        result_text = response.choices[0].message.content.strip()
+        result = llm_schemas.parse("document_analysis", result_text)
+        if result is not None:
+            return result
+        print(f"OpenAI response not valid JSON: {result_text}")
+    except prompt_budget.PromptTooLarge:
+        # Chunks are sized to the budget; silently trimming one would drop text
+        raise
+    except Exception as e:
+        print(f"OpenAI document analysis failed: {e}")
+    return None
 
-    # Fallback parsing
-    lines = extracted_text.split('\n')
+def _fallback_analysis(text):
+    """Local heading heuristic used when the model is unavailable."""
+    lines = text.split('\n')
     sections = []
     current_heading = None
     current_content = []
@@ -741,7 +802,7 @@ Respond in JSON format:
         sections.append({"heading": current_heading, "content": ' '.join(current_content)})
 
     if not sections:
-        sections = [{"heading": "Content", "content": extracted_text}]
+        sections = [{"heading": "Content", "content": text}]
 
     title = sections[0]["heading"] if sections else "Activity Report"
 
@@ -756,21 +817,159 @@ Respond in JSON format:
         "sections": sections
     }
 
+@app.post("/api/ai/analyze_document")
+async def api_ai_analyze_document(file: UploadFile = File(...)):
+    if not file:
+        raise HTTPException(status_code=400, detail="No file uploaded")
+
+    # Multipart bodies can arrive without Content-Length; re-check the spooled size
+    if uploads.upload_size(file) > uploads.MAX_UPLOAD_BYTES:
+        raise HTTPException(status_code=413, detail=f"Upload exceeds the {uploads.MAX_UPLOAD_BYTES // (1024 * 1024)} MB limit")
+
+    # Extract text straight from the spooled upload (memory-mapped once on disk)
+    with uploads.upload_source(file) as source:
+        return await analyze_document_source(source, file.filename)
+
+async def analyze_document_source(source, filename):
+    """Extract, cache and analyze one document; shared by single uploads and batch jobs.
+
+    Raises HTTPException when the document is unusable (unsupported, empty, OCR timeout).
+    """
+    filename = (filename or "").lower()
+    if filename.endswith('.pdf'):
+        kind = "pdf"
+    elif filename.endswith(('.jpg', '.jpeg', '.png', '.tif', '.tiff')):
+        kind = "image"
+    else:
+        kind = "text"
+    model = os.getenv("OPENAI_MODEL", "gpt-4o-mini")
+
+    extracted_text = ""
+    try:
+        # Re-uploads of the same bytes skip extraction and the model call
+        digest = await run_in_threadpool(doc_cache.content_hash, source)
+        if client and ANALYZE_WITH_LLM:
+            cached = await run_in_threadpool(doc_cache.get_analysis, digest, ANALYZE_PROMPT_VERSION, model)
+            if cached is not None:
+                metrics.record_ai_response("/api/ai/analyze_document", "cache")
+                return cached
+        cached_text = await run_in_threadpool(doc_cache.get_text, digest, f"{kind}-{EXTRACTOR_VERSION}")
+        if cached_text is not None:
+            extracted_text = cached_text
+        elif kind == "pdf":
+            # Page fan-out blocks until the pool is done; keep it off the event loop
+            extracted_text = await run_in_threadpool(extract_text_from_pdf, source)
+        elif kind == "image":
+            extracted_text = await run_in_threadpool(extract_text_from_image, source)
+        else:
+            # Assume text file or try as text
+            try:
+                extracted_text = source.read().decode('utf-8')
+            except:
+                raise HTTPException(status_code=400, detail="Unsupported file type")
+        if cached_text is None and extracted_text.strip():
+            await run_in_threadpool(doc_cache.set_text, digest, f"{kind}-{EXTRACTOR_VERSION}", extracted_text)
+        local_layout = None
+        if kind == "pdf":
+            local_layout = await run_in_threadpool(doc_cache.get_analysis, digest, LAYOUT_VERSION, "local")
+            if local_layout is None:
+                local_layout = await run_in_threadpool(_local_pdf_layout, source)
+                if local_layout is not None:
+                    await run_in_threadpool(doc_cache.set_analysis, digest, LAYOUT_VERSION, "local", local_layout)
+    except HTTPException:
+        raise
+    except ocr.OCRTimeout as e:
+        print(f"Text extraction failed: {e}")
+        raise HTTPException(status_code=504, detail="Text recognition timed out")
+    except ocr.OCRFailed as e:
+        print(f"Text extraction failed: {e}")
+        raise HTTPException(status_code=503, detail="Text recognition failed; please retry")
+    except Exception as e:
+        print(f"Text extraction failed: {e}")
+        raise HTTPException(status_code=400, detail="Failed to extract text from file")
+
+    if not extracted_text.strip():
+        raise HTTPException(status_code=400, detail="No text found in file")
+
+    # Now analyze the extracted text with AI, one chunk per page/heading group
+    if client and ANALYZE_WITH_LLM:
+        try:
+            chunks = doc_chunking.split_document(extracted_text)
+        except doc_chunking.DocumentTooLarge as e:
+            raise HTTPException(status_code=413, detail=f"Document is too long to analyze: {e}")
+        results = await asyncio.gather(*(
+            run_in_threadpool(_analyze_chunk, chunk, model, index, len(chunks))
+            for index, chunk in enumerate(chunks)
+        ))
+        if any(r is not None for r in results):
+            # Chunks the model could not answer fall back to the local parser so nothing is dropped
+            results = [r if r is not None else _fallback_analysis(chunk) for r, chunk in zip(results, chunks)]
+            result = results[0] if len(results) == 1 else doc_chunking.merge_analyses(results)
+            if local_layout is not None:
+                # Measured geometry beats the model's guess for these fields
+                result["layout"] = {**(result.get("layout") or {}), **{
+                    k: v for k, v in local_layout["layout"].items() if k != "fontStyle"}}
+            metrics.record_ai_response("/api/ai/analyze_document", "llm")
+            await run_in_threadpool(doc_cache.set_analysis, digest, ANALYZE_PROMPT_VERSION, model, result)
+            return result
+
+    if local_layout is not None and local_layout["sections"]:
+        metrics.record_ai_response("/api/ai/analyze_document", "local")
+        return local_layout
+    metrics.record_ai_response("/api/ai/analyze_document", "fallback")
+    return _fallback_analysis(extracted_text)
+
+batch_jobs_store = batch_jobs.BatchJobs()
+
+@app.post("/api/ai/analyze_batch", status_code=202)
+async def api_ai_analyze_batch(files: list[UploadFile] = File(...)):
+    """Queue a batch (many files and/or zip archives) for background analysis."""
+    if not files:
+        raise HTTPException(status_code=400, detail="No files uploaded")
+    try:
+        record = await run_in_threadpool(batch_jobs_store.create, [(f.filename or "document", f.file) for f in files])
+    except batch_jobs.BatchError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    batch_jobs_store.start(record["job_id"], analyze_document_source)
+    job_id = record["job_id"]
+    return {
+        "job_id": job_id,
+        "status": record["status"],
+        "total": record["total"],
+        "status_url": f"/api/ai/analyze_batch/{job_id}",
+        "results_url": f"/api/ai/analyze_batch/{job_id}/results",
+    }
+
+@app.get("/api/ai/analyze_batch/{job_id}")
+def api_ai_analyze_batch_status(job_id: str):
+    try:
+        return batch_jobs_store.get(job_id)
+    except KeyError:
+        raise HTTPException(status_code=404, detail="Job not found")
+
+@app.get("/api/ai/analyze_batch/{job_id}/results")
+def api_ai_analyze_batch_results(job_id: str, follow: bool = False):
+    """Results as NDJSON, one document per line; follow=true streams until the job finishes."""
+    try:
+        batch_jobs_store.get(job_id)
+    except KeyError:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return StreamingResponse(batch_jobs_store.stream_results(job_id, follow), media_type="application/x-ndjson")
+
+def _as_stream(content):
+    """Accept raw bytes or an already-seekable file/mmap source."""
+    if isinstance(content, (bytes, bytearray)):
+        return io.BytesIO(content)
+    content.seek(0)
+    return content
+
 def extract_text_from_pdf(content):
-    if not PyPDF2:
-        raise Exception("PyPDF2 not available")
-    pdf_reader = PyPDF2.PdfReader(io.BytesIO(content))
-    text = ""
-    for page in pdf_reader.pages:
-        text += page.extract_text() + "\n"
-    return text
+    # Engine choice (PyPDF2/pdfplumber) and page-parallel extraction live in pdf_extract
+    return pdf_extract.extract_text(content)
 
 def extract_text_from_image(content):
-    if not pytesseract or not Image:
-        raise Exception("OCR libraries not available")
-    image = Image.open(io.BytesIO(content))
-    text = pytesseract.image_to_string(image)
-    return text
+    # Preprocessing, tiling, multi-page TIFFs and the OCR process pool live in ocr
+    return ocr.ocr_image(_as_stream(content))
 
 # OpenAI client for mindmap (use environment variable; do not hardcode keys)
 api_key = os.getenv("OPENAI_API_KEY")
@@ -788,33 +987,61 @@ else:
         print('OpenAI client import/initialization failed:', e)
         client = None
 
+# Process-wide cap on in-flight chat completions, shared by every route (and by
+# the concurrent chunks of one document analysis)
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "8"))
+_llm_slots = threading.BoundedSemaphore(LLM_MAX_CONCURRENCY)
+
 # Simple retry wrapper for OpenAI rate limits / transient errors
-def _chat_completion_with_retry(model, messages, max_tokens=None, temperature=0, retries=3):
+def _chat_completion_with_retry(model, messages, max_tokens=None, temperature=0, retries=3, schema=None):
+    """Chat completion with retries; `schema` names an llm_schemas reply shape to constrain the output to."""
     if client is None:
         raise RuntimeError("openai_client_missing")
+    endpoint = metrics.current_route()
+    # Keep the prompt inside the endpoint's budget and always cap the output
+    messages, prompt_tokens = prompt_budget.fit_messages(messages, model, endpoint)
+    max_tokens = prompt_budget.output_tokens(prompt_tokens, model, endpoint, max_tokens)
+    started = time.perf_counter()
     delay = 1.0
     last_exc = None
-    for _ in range(retries):
-        try:
-            return client.chat.completions.create(
-                model=model,
-                messages=messages,
-                max_tokens=max_tokens,
-                temperature=temperature
-            )
-        except Exception as e:
-            s = str(e).lower()
-            # Retry on common transient issues including 429
-            if ('rate limit' in s) or ('429' in s) or ('temporarily unavailable' in s) or ('timeout' in s) or ('overloaded' in s):
-                last_exc = e
-                time.sleep(delay + random.random() * 0.5)
-                delay = min(delay * 2, 8.0)
-                continue
-            raise
-    # Exhausted retries
-    if last_exc:
-        raise last_exc
-    raise RuntimeError('openai_retry_failed')
+    try:
+        for attempt in range(retries):
+            if attempt:
+                metrics.LLM_RETRIES.labels(endpoint, model).inc()
+            try:
+                with _llm_slots:
+                    response = client.chat.completions.create(
+                        model=model,
+                        messages=messages,
+                        max_tokens=max_tokens,
+                        temperature=temperature,
+                        **llm_schemas.request_options(schema, model)
+                    )
+            except Exception as e:
+                if schema and llm_schemas.rejected(e, model):
+                    # The retry goes out without response_format
+                    last_exc = e
+                    continue
+                s = str(e).lower()
+                # Retry on common transient issues including 429
+                if ('rate limit' in s) or ('429' in s) or ('temporarily unavailable' in s) or ('timeout' in s) or ('overloaded' in s):
+                    last_exc = e
+                    time.sleep(delay + random.random() * 0.5)
+                    delay = min(delay * 2, 8.0)
+                    continue
+                raise
+            metrics.LLM_REQUESTS.labels(endpoint, model, "ok").inc()
+            metrics.record_llm_usage(endpoint, model, response, prompt_tokens)
+            return response
+        # Exhausted retries
+        if last_exc:
+            raise last_exc
+        raise RuntimeError('openai_retry_failed')
+    except Exception:
+        metrics.LLM_REQUESTS.labels(endpoint, model, "error").inc()
+        raise
+    finally:
+        metrics.LLM_LATENCY.labels(endpoint, model).observe(time.perf_counter() - started)
 
 # ============================================================
 # AI Study Summarizer Routes (/api/ai-study)
@@ -835,7 +1062,8 @@ def get_songs(request: dict):
         # Try local rewriter/recommender first (lazy)
         rw = get_rewriter_module()
         if rw and hasattr(rw, 'recommend_songs'):
-            songs = rw.recommend_songs(mood_profile, language)
+            with metrics.MODEL_INFERENCE.labels("recommend_songs").time():
+                songs = rw.recommend_songs(mood_profile, language)
             return {"songs": songs}
         # Fallback: return mock songs
         return {"songs": ["Mock Song 1", "Mock Song 2", "Mock Song 3"]}
@@ -856,10 +1084,12 @@ def rewrite(request: dict):
         rw = get_rewriter_module()
         if rw:
             try:
-                mood_profile = rw.detect_emotion(text) if hasattr(rw, 'detect_emotion') else {"primary_emotion": "neutral", "emotions": []}
+                with metrics.MODEL_INFERENCE.labels("detect_emotion").time():
+                    mood_profile = rw.detect_emotion(text) if hasattr(rw, 'detect_emotion') else {"primary_emotion": "neutral", "emotions": []}
                 primary_emotion = mood_profile.get('primary_emotion', 'neutral')
                 emotion_used = target_emotion if target_emotion else primary_emotion
-                rewritten = rw.rewrite_text(text, target_emotion=emotion_used) if hasattr(rw, 'rewrite_text') else text
+                with metrics.MODEL_INFERENCE.labels("rewrite_text").time():
+                    rewritten = rw.rewrite_text(text, target_emotion=emotion_used) if hasattr(rw, 'rewrite_text') else text
                 return {
                     "original_text": text,
                     "mood_profile": mood_profile,
@@ -898,12 +1128,17 @@ class AnalyzeRequest(BaseModel):
     text: str
     mode: str = "flowchart"
     enable_web: bool = False
+    fast: bool = False  # skip the model and use the local graph builder
+    document_id: Optional[str] = None  # set to regenerate incrementally from the last version
+    layout: bool = False  # add server-computed x/y and level-of-detail hints
+    max_visible: Optional[int] = None  # nodes drawn before the rest collapse (default MINDMAP_VISIBLE_NODES)
 
 class ClassifyRequest(BaseModel):
     text: str
 
 class SummarizeRequest(BaseModel):
     text: str
+    fast: bool = False  # skip the model and use the local extractive summarizer
 
 SYSTEM_MINDENGINE = """
 You are MindGraph-AI, an NLP engine that generates flowcharts, mind maps, summaries, and keywords using STRICT logic.
@@ -977,8 +1212,20 @@ GENERAL RULES
 • No broken English.
 """
 
-def use_llm(system_prompt: str, user_prompt: str):
-    """Call OpenAI; fallback to deterministic JSON on failure."""
+# Bump when a mindmap route prompt changes; SYSTEM_MINDENGINE edits are fingerprinted automatically
+MINDMAP_PROMPT_VERSION = "mindmap-v1"
+MINDMAP_MODEL = os.getenv("OPENAI_MODEL", "gpt-4o-mini")
+mindmap_cache.configure(mindmap_cache.prompt_version(SYSTEM_MINDENGINE, MINDMAP_PROMPT_VERSION))
+# Semantic cache entries are only reused under the same model and prompts
+MINDMAP_SEMANTIC_SCOPE = f"{MINDMAP_MODEL}:{mindmap_cache.prompt_version(SYSTEM_MINDENGINE, MINDMAP_PROMPT_VERSION)}"
+
+def use_llm(system_prompt: str, user_prompt: str, schema=None, fallback=None):
+    """Call OpenAI; fallback to deterministic JSON on failure.
+
+    `schema` names an llm_schemas reply shape; the reply is then constrained
+    to it and should be read back with llm_schemas.parse. `fallback`, if
+    given, builds the reply text instead of the snippet-based default.
+    """
     try:
         if client is None:
             raise RuntimeError("openai_client_missing")
@@ -988,10 +1235,16 @@ def use_llm(system_prompt: str, user_prompt: str):
                 {"role": "system", "content": system_prompt},
                 {"role": "user", "content": user_prompt}
             ],
-            temperature=0
+            temperature=0,
+            schema=schema
         )
         return completion.choices[0].message.content
     except Exception:
+        metrics.LLM_FALLBACKS.labels(metrics.current_route()).inc()
+        if fallback is not None:
+            reply = fallback()
+            if reply:
+                return reply
         snippet = (user_prompt or "").strip()
         snippet = snippet.splitlines()
         snippet = " ".join([s.strip() for s in snippet if s.strip()])[:400]
@@ -1006,30 +1259,23 @@ def use_llm(system_prompt: str, user_prompt: str):
             '}'
         )
 
-def force_json(text: str):
-    """Extract a JSON object from a string, or return None."""
-    import json, re
-    if not text:
-        return None
-    text = text.replace("```json", "").replace("```", "").strip()
-    try:
-        return json.loads(text)
-    except Exception:
-        pass
-    match = re.search(r"\{[\s\S]*\}", text)
-    if not match:
-        return None
-    json_text = match.group(0)
-    json_text = re.sub(r",\s*}", "}", json_text)
-    json_text = re.sub(r",\s*]", "]", json_text)
-    try:
-        return json.loads(json_text)
-    except Exception:
-        return None
+def force_json(text: str, expect=None):
+    """Extract the first JSON object or array from a string, or return None."""
+    return json_extract.extract_json(text, expect)
 
 @app.post("/api/mindmap/classify")
 def classify(req: dict):
     text = req.get('text', '')
+    # Local kNN first; the model is only asked when it is unsure (or always unavailable)
+    mode, confidence, confident = mindmap_classifier.classify(text)
+    if mode and (confident or req.get('fast') or client is None):
+        metrics.record_ai_response("/api/mindmap/classify", "local")
+        return {"mode": mode, "confidence": round(confidence, 3)}
+
+    cached = mindmap_cache.lookup("classify", text, "mode", MINDMAP_MODEL)
+    if cached:
+        metrics.record_ai_response("/api/mindmap/classify", "cache")
+        return cached
     prompt = f"""
 Classify the best visualization type for this text:
 
@@ -1052,8 +1298,20 @@ Return ONLY:
 {{"mode": "<one>"}}
 """
 
-    raw = use_llm(SYSTEM_MINDENGINE, prompt)
-    parsed = force_json(raw)
+    fell_back = []
+
+    def local_reply():
+        fell_back.append(True)
+        # Nothing matched the seeds either: the general-purpose view
+        return json.dumps({"mode": mode or "mindgraph"})
+
+    raw = use_llm(SYSTEM_MINDENGINE, prompt, schema="mindmap_mode", fallback=local_reply)
+    parsed = llm_schemas.parse("mindmap_mode", raw)
+    if parsed:
+        metrics.record_ai_response("/api/mindmap/classify", "local" if fell_back else "llm")
+        if not fell_back:
+            mindmap_cache.store("classify", text, "mode", MINDMAP_MODEL, parsed)
+            mindmap_classifier.learn(text, parsed.get("mode"))
 
     return parsed if parsed else {"error": "Invalid JSON", "raw": raw}
 
@@ -1086,7 +1344,9 @@ def ai_plan(payload: dict):
     rw = get_rewriter_module()
     if rw and hasattr(rw, 'plan_event'):
         try:
-            result = rw.plan_event(text)
+            with metrics.MODEL_INFERENCE.labels("plan_event").time():
+                result = rw.plan_event(text)
+            metrics.record_ai_response("/ai/plan", "local")
             return {"status": "ok", "data": result if isinstance(result, list) else [{"title": "Plan", "text": str(result)}]}
         except Exception as e:
             print('local plan_event failed:', e)
@@ -1094,15 +1354,17 @@ def ai_plan(payload: dict):
     # Fallback: use OpenAI to generate a simple plan snippet
     try:
         prompt = f"Generate a concise event plan for the following event description. Return a JSON array of objects with keys 'title' and 'text'.\n\nDescription:\n{text}"
-        raw = use_llm('EventPlanner', prompt)
-        parsed = force_json(raw)
+        raw = use_llm('EventPlanner', prompt, schema="plan")
+        parsed = llm_schemas.parse("plan", raw)
         if parsed and isinstance(parsed, list):
+            metrics.record_ai_response("/ai/plan", "llm")
             return {"status": "ok", "data": parsed}
     except Exception as e:
         print('openai plan fallback failed:', e)
 
     # Final fallback: simple echo
     resp = {"status": "ok", "data": [{"title": "Basic Plan", "text": text}]}
+    metrics.record_ai_response("/ai/plan", "fallback")
     print(f"[AI RESPONSE] /ai/plan fallback used, returning {len(resp['data'])} items")
     return resp
 
@@ -1118,7 +1380,9 @@ def ai_budget(payload: dict):
     rw = get_rewriter_module()
     if rw and hasattr(rw, 'estimate_budget'):
         try:
-            items = rw.estimate_budget(text)
+            with metrics.MODEL_INFERENCE.labels("estimate_budget").time():
+                items = rw.estimate_budget(text)
+            metrics.record_ai_response("/ai/budget", "local")
             return {"status": "ok", "data": items}
         except Exception as e:
             print('local estimate_budget failed:', e)
@@ -1126,9 +1390,10 @@ def ai_budget(payload: dict):
     # Try OpenAI to produce JSON list
     try:
         prompt = f"Estimate a simple event budget for the description below. Return ONLY a JSON array of objects like [{'{'}\"category\":\"...\",\"estimate\":123{'}'}].\n\n{text}"
-        raw = use_llm('EventBudget', prompt)
-        parsed = force_json(raw)
+        raw = use_llm('EventBudget', prompt, schema="budget_estimate")
+        parsed = llm_schemas.parse("budget_estimate", raw)
         if parsed and isinstance(parsed, list):
+            metrics.record_ai_response("/ai/budget", "llm")
             return {"status": "ok", "data": parsed}
     except Exception as e:
         print('openai budget fallback failed:', e)
@@ -1139,6 +1404,7 @@ def ai_budget(payload: dict):
         {"category": "food", "estimate": 30000},
         {"category": "decor", "estimate": 8000}
     ]}
+    metrics.record_ai_response("/ai/budget", "fallback")
     print(f"[AI RESPONSE] /ai/budget fallback used, returning {len(resp['data'])} items")
     return resp
 
@@ -1153,7 +1419,9 @@ def ai_vendors(payload: dict):
     rw = get_rewriter_module()
     if rw and hasattr(rw, 'suggest_vendors'):
         try:
-            vendors = rw.suggest_vendors(text)
+            with metrics.MODEL_INFERENCE.labels("suggest_vendors").time():
+                vendors = rw.suggest_vendors(text)
+            metrics.record_ai_response("/ai/vendors", "local")
             return {"status": "ok", "data": vendors}
         except Exception as e:
             print('local suggest_vendors failed:', e)
@@ -1163,6 +1431,7 @@ def ai_vendors(payload: dict):
         {"name": "Prime Catering", "category": "Catering", "rating": 4.6, "contact": "123-456"},
         {"name": "StageCraft Decor", "category": "Decoration", "rating": 4.4, "contact": "234-567"}
     ]}
+    metrics.record_ai_response("/ai/vendors", "fallback")
     print(f"[AI RESPONSE] /ai/vendors fallback used, returning {len(resp['data'])} items")
     return resp
 
@@ -1178,7 +1447,7 @@ def ai_schedule(payload: dict):
     if client:
         try:
             system = 'You are an expert event planner. Return ONLY valid JSON for the requested component. Do not include any extra text, explanations, or markdown.'
-            user = f"""Generate a schedule for the following event basics: {json.dumps(basics, ensure_ascii=False)}.
+            user = f"""Generate a schedule for the following event basics: {prompt_budget.fit_json(basics, 1000)}.
 
 CRITICAL INSTRUCTIONS FOR SCHEDULE GENERATION:
 - You are an expert event planner AI. Read and analyze EVERY SINGLE DETAIL in the event basics provided above.
@@ -1200,9 +1469,10 @@ CRITICAL INSTRUCTIONS FOR SCHEDULE GENERATION:
 - Make the schedule comprehensive and tailored to this exact event.
 
 Return JSON with schedule_items (array of objects with title, start_time, end_time, description)."""
-            raw = use_llm(system, user)
-            parsed = force_json(raw)
+            raw = use_llm(system, user, schema="schedule")
+            parsed = llm_schemas.parse("schedule", raw)
             if parsed and 'schedule_items' in parsed:
+                metrics.record_ai_response("/ai/schedule", "llm")
                 print(f"[AI RESPONSE] /ai/schedule OpenAI succeeded, items: {len(parsed['schedule_items'])}")
                 return {"status": "ok", "data": parsed}
         except Exception as e:
@@ -1212,7 +1482,9 @@ Return JSON with schedule_items (array of objects with title, start_time, end_ti
     rw = get_rewriter_module()
     if rw and hasattr(rw, 'generate_schedule'):
         try:
-            sched = rw.generate_schedule(json.dumps(basics))
+            with metrics.MODEL_INFERENCE.labels("generate_schedule").time():
+                sched = rw.generate_schedule(json.dumps(basics))
+            metrics.record_ai_response("/ai/schedule", "local")
             return {"status": "ok", "data": {"schedule_items": sched}}
         except Exception as e:
             print('local generate_schedule failed:', e)
@@ -1225,6 +1497,7 @@ Return JSON with schedule_items (array of objects with title, start_time, end_ti
         {"title": "Break", "start_time": "16:00", "end_time": "17:00", "description": "Refreshments"},
         {"title": "Closing", "start_time": "17:00", "end_time": "18:00", "description": "Wrap-up"}
     ]}}
+    metrics.record_ai_response("/ai/schedule", "fallback")
     print(f"[AI RESPONSE] /ai/schedule fallback used, returning {len(resp['data']['schedule_items'])} items")
     return resp
 
@@ -1240,11 +1513,11 @@ def generate_tasks(req: dict):
             system = 'You are an expert event planner. Return ONLY valid JSON for the requested component. Do not include any extra text, explanations, or markdown.'
             user = f"""Generate a checklist of tasks for the following event.
 
-Event Basics: {json.dumps(basics, ensure_ascii=False)}
+Event Basics: {prompt_budget.fit_json(basics, 800)}
 
-Scheduled Activities: {json.dumps(schedule, ensure_ascii=False)}
+Scheduled Activities: {prompt_budget.fit_json(schedule, 1500)}
 
-Budgeted Items: {json.dumps(budget, ensure_ascii=False)}
+Budgeted Items: {prompt_budget.fit_json(budget, 1000)}
 
 CRITICAL INSTRUCTIONS FOR TASKS GENERATION:
 - You are an expert event planner AI. Read and analyze EVERY SINGLE DETAIL in the event basics, scheduled activities, and budgeted items provided above.
@@ -1263,9 +1536,10 @@ CRITICAL INSTRUCTIONS FOR TASKS GENERATION:
 - Generate tasks that are realistic and directly tied to the event's components.
 
 Return JSON with tasks (array of objects with title, category, priority)."""
-            raw = use_llm(system, user)
-            parsed = force_json(raw)
+            raw = use_llm(system, user, schema="tasks")
+            parsed = llm_schemas.parse("tasks", raw)
             if parsed and 'tasks' in parsed:
+                metrics.record_ai_response("/ai/tasks", "llm")
                 print(f"[AI RESPONSE] /ai/tasks OpenAI succeeded, items: {len(parsed['tasks'])}")
                 return {"status": "ok", "data": parsed}
         except Exception as e:
@@ -1282,6 +1556,7 @@ Return JSON with tasks (array of objects with title, category, priority)."""
         {"title": "Take photos", "category": "Execution", "priority": "low"},
         {"title": "Clean up", "category": "Cleanup", "priority": "low"}
     ]}}
+    metrics.record_ai_response("/ai/tasks", "fallback")
     print(f"[AI RESPONSE] /ai/tasks fallback used, returning {len(resp['data']['tasks'])} items")
     return resp
 
@@ -1301,9 +1576,9 @@ def generate_ai_report(req: dict):
             system = 'You are an expert event planning consultant and report writer. Generate comprehensive, professional event analysis reports. Return ONLY valid JSON as specified.'
             user = f"""Generate a comprehensive AI-powered event planning report based on the following data:
 
-Event Data: {json.dumps(eventData, ensure_ascii=False)}
+Event Data: {prompt_budget.fit_json(eventData, 4500)}
 
-Report Options: {json.dumps(options, ensure_ascii=False)}
+Report Options: {prompt_budget.fit_json(options, 300)}
 
 CRITICAL INSTRUCTIONS FOR REPORT GENERATION:
 - You are an expert event planning consultant. Analyze EVERY SINGLE DETAIL in the event data provided above.
@@ -1327,9 +1602,10 @@ Return JSON with:
 - sections: Array of section objects with title and content for PDF generation
 - summary: Brief summary of the report findings"""
 
-            raw = use_llm(system, user)
-            parsed = force_json(raw)
+            raw = use_llm(system, user, schema="report")
+            parsed = llm_schemas.parse("report", raw)
             if parsed and 'html' in parsed:
+                metrics.record_ai_response("/ai/report", "llm")
                 print(f"[AI RESPONSE] /ai/report OpenAI succeeded, HTML length: {len(parsed['html'])}")
                 return {"status": "ok", "data": parsed}
         except Exception as e:
@@ -1509,119 +1785,177 @@ Return JSON with:
             "summary": f"Comprehensive analysis of {basics.get('name', 'event')} planning progress. Budget: ${total_budget:,.0f}, Tasks: {completed_tasks}/{total_tasks} complete, Vendors: {booked_vendors}/{len(vendors)} booked."
         }
     }
+    metrics.record_ai_response("/ai/report", "fallback")
     print(f"[AI RESPONSE] /ai/report fallback used, HTML length: {len(resp['data']['html'])}")
     return resp
 
-@app.post("/api/mindmap/analyze")
-def analyze(req: AnalyzeRequest):
+# Normalize a model reply to the strict graph schema expected by frontend
+def _normalize_graph(obj, mode: str, text: str):
+    nodes = []
+    edges = []
+
+    # If already in schema, trust but verify
+    if isinstance(obj, dict):
+        in_nodes = obj.get("nodes")
+        in_edges = obj.get("edges")
+        if isinstance(in_nodes, list) and isinstance(in_edges, list):
+            # Ensure each node has id+label; coerce minimal
+            for i, n in enumerate(in_nodes):
+                nid = str(n.get("id", i))
+                lbl = n.get("label") or n.get("text") or n.get("name") or f"Node {i}"
+                node = {"id": nid, "label": str(lbl)}
+                # Keep the renderer's layout hints when the model provides them
+                node.update({k: n[k] for k in ("level", "parent", "shape") if n.get(k) is not None})
+                nodes.append(node)
+            for e in in_edges:
+                frm = str(e.get("from", e.get("source", "")))
+                to = str(e.get("to", e.get("target", "")))
+                if frm and to:
+                    edge = {"from": frm, "to": to}
+                    if e.get("label"):
+                        edge["label"] = str(e["label"])
+                    edges.append(edge)
+            if nodes:
+                return {"type": mode, "nodes": nodes, "edges": edges}
+
+    # Derive from summary/key_points/keywords
+    title = "MindGraph"
+    kp = []
+    kw = []
+    if isinstance(obj, dict):
+        title = obj.get("title") or obj.get("topic") or title
+        kp = obj.get("key_points") or []
+        kw = obj.get("keywords") or []
+        if not kw:
+            kw = keywords.extract_keywords(obj.get("summary_detailed") or obj.get("summary_medium") or obj.get("summary_short") or "")
+
+    # Build simple star graph: title -> each key point; then keywords
+    nodes.append({"id": "title", "label": str(title)})
+    seen = set()
+    for i, k in enumerate(kp):
+        nid = f"kp_{i}"
+        lbl = str(k).strip()
+        if not lbl or lbl in seen:
+            continue
+        seen.add(lbl)
+        nodes.append({"id": nid, "label": lbl})
+        edges.append({"from": "title", "to": nid})
+    for j, k in enumerate(kw):
+        nid = f"kw_{j}"
+        lbl = str(k).strip()
+        if not lbl or lbl in seen:
+            continue
+        seen.add(lbl)
+        nodes.append({"id": nid, "label": lbl})
+        edges.append({"from": "title", "to": nid})
+
+    # If nothing found, create a minimal two-node graph from text snippet
+    if len(nodes) == 1:
+        snippet = (text or "").strip().split()
+        second = "Snippet" if not snippet else " ".join(snippet[:5])
+        nodes.append({"id": "n1", "label": second})
+        edges.append({"from": "title", "to": "n1"})
+
+    # Readability is handled by the layout stage's level of detail; this only bounds its cost
+    return graph_layout.truncate({"type": mode, "nodes": nodes, "edges": edges}, graph_layout.MAX_NODES)
+
+# "local" always answers /api/mindmap/analyze with the deterministic graph builder
+MINDMAP_ANALYZER = os.getenv("MINDMAP_ANALYZER", "llm").lower()
+
+def _mindmap_graph(text: str, mode: str, fast: bool = False):
+    """Graph for one text: local builder, cache, then the model with the local builder as fallback."""
+    if fast or client is None or MINDMAP_ANALYZER == "local":
+        local = mindgraph.build(text, mode)
+        if local:
+            metrics.record_ai_response("/api/mindmap/analyze", "local")
+            return local
+
+    cached = mindmap_cache.lookup("analyze", text, mode, MINDMAP_MODEL)
+    if cached:
+        metrics.record_ai_response("/api/mindmap/analyze", "cache")
+        return cached
+
     prompt = f"""
-Generate a {req.mode} graph strictly.
+Generate a {mode} graph strictly.
 Text:
-{req.text}
+{text}
 
 Return EXACT JSON with keys:
 {{
- "type": "{req.mode}",
+ "type": "{mode}",
  "nodes": [{{"id":"n0","label":"Root"}}],
  "edges": [{{"from":"n0","to":"n1"}}]
 }}
 Only include JSON. No explanations.
 """
 
-    raw = use_llm(SYSTEM_MINDENGINE, prompt)
-    parsed = force_json(raw)
-
-    # Helper: basic keyword extractor for fallback
-    def _extract_keywords(text):
-        import re
-        if not text:
-            return []
-        tokens = re.findall(r"[A-Za-z][A-Za-z0-9\-]+", text.lower())
-        stop = {
-            'the','and','of','to','in','for','on','with','a','an','is','are','this','that','it','at','as','by','from','or','be','into','your','you','we','our'
-        }
-        freq = {}
-        for t in tokens:
-            if t in stop or len(t) < 3:
-                continue
-            freq[t] = freq.get(t, 0) + 1
-        kws = sorted(freq.items(), key=lambda x: (-x[1], x[0]))
-        return [k for k,_ in kws[:12]]
-
-    # Normalize to strict graph schema expected by frontend
-    def _normalize_graph(obj):
-        nodes = []
-        edges = []
-
-        # If already in schema, trust but verify
-        if isinstance(obj, dict):
-            in_nodes = obj.get("nodes")
-            in_edges = obj.get("edges")
-            if isinstance(in_nodes, list) and isinstance(in_edges, list):
-                # Ensure each node has id+label; coerce minimal
-                for i, n in enumerate(in_nodes):
-                    nid = str(n.get("id", i))
-                    lbl = n.get("label") or n.get("text") or n.get("name") or f"Node {i}"
-                    nodes.append({"id": nid, "label": str(lbl)})
-                for e in in_edges:
-                    frm = str(e.get("from", e.get("source", "")))
-                    to = str(e.get("to", e.get("target", "")))
-                    if frm and to:
-                        edges.append({"from": frm, "to": to})
-                if nodes:
-                    return {"type": req.mode, "nodes": nodes, "edges": edges}
-
-        # Derive from summary/key_points/keywords
-        title = "MindGraph"
-        kp = []
-        kw = []
-        if isinstance(obj, dict):
-            title = obj.get("title") or obj.get("topic") or title
-            kp = obj.get("key_points") or []
-            kw = obj.get("keywords") or []
-            if not kw:
-                kw = _extract_keywords((obj.get("summary_detailed") or obj.get("summary_medium") or obj.get("summary_short") or ""))
-
-        # Build simple star graph: title -> each key point; then keywords
-        nodes.append({"id": "title", "label": str(title)})
-        seen = set()
-        for i, k in enumerate(kp):
-            nid = f"kp_{i}"
-            lbl = str(k).strip()
-            if not lbl or lbl in seen:
-                continue
-            seen.add(lbl)
-            nodes.append({"id": nid, "label": lbl})
-            edges.append({"from": "title", "to": nid})
-        for j, k in enumerate(kw):
-            nid = f"kw_{j}"
-            lbl = str(k).strip()
-            if not lbl or lbl in seen:
-                continue
-            seen.add(lbl)
-            nodes.append({"id": nid, "label": lbl})
-            edges.append({"from": "title", "to": nid})
-
-        # If nothing found, create a minimal two-node graph from text snippet
-        if len(nodes) == 1:
-            snippet = (req.text or "").strip().split()
-            second = "Snippet" if not snippet else " ".join(snippet[:5])
-            nodes.append({"id": "n1", "label": second})
-            edges.append({"from": "title", "to": "n1"})
-
-        # Limit size to keep graph readable
-        if len(nodes) > 24:
-            nodes = nodes[:24]
-            valid = {n["id"] for n in nodes}
-            edges = [e for e in edges if e["from"] in valid and e["to"] in valid]
-
-        return {"type": req.mode, "nodes": nodes, "edges": edges}
-
-    normalized = _normalize_graph(parsed)
+    local_graph = {}
+
+    def local_reply():
+        local_graph.update(mindgraph.build(text, mode) or {})
+        return json.dumps(local_graph) if local_graph else None
+
+    raw = use_llm(SYSTEM_MINDENGINE, prompt, schema="mindmap_graph", fallback=local_reply)
+    if local_graph:
+        metrics.record_ai_response("/api/mindmap/analyze", "local")
+        return local_graph
+    parsed = llm_schemas.parse("mindmap_graph", raw)
+    if parsed:
+        normalized = _normalize_graph(parsed, mode, text)
+        metrics.record_ai_response("/api/mindmap/analyze", "llm")
+        mindmap_cache.store("analyze", text, mode, MINDMAP_MODEL, normalized)
+        return normalized
+    # Without a local graph the fallback reply is summary-shaped; _normalize_graph derives a graph from it
+    normalized = _normalize_graph(force_json(raw, dict), mode, text)
     return normalized if normalized else {"error": "Invalid JSON", "raw": raw}
 
+def _laid_out(graph, max_visible: int):
+    """Graph with server-side positions, cached per graph structure and level of detail."""
+    algorithm = graph_layout.algorithm_for(graph)
+    key, detail = graph_layout.graph_key(graph), f"{algorithm}:{max_visible}"
+    laid = mindmap_cache.lookup("layout", key, detail, graph_layout.LAYOUT_VERSION)
+    if laid is None:
+        laid = graph_layout.layout(graph, max_visible, algorithm)
+        mindmap_cache.store("layout", key, detail, graph_layout.LAYOUT_VERSION, laid)
+    # Per-request fields (e.g. incremental counts) come from this graph, not the cached one
+    return dict(laid, **{k: v for k, v in graph.items() if k not in ("nodes", "edges")})
+
+@app.post("/api/mindmap/analyze")
+def analyze(req: AnalyzeRequest):
+    if req.document_id:
+        # Tracked documents: only segments with new paragraphs go through _mindmap_graph
+        graph = mindmap_incremental.documents.regenerate(
+            req.document_id, req.text, req.mode, lambda segment: _mindmap_graph(segment, req.mode, req.fast)
+        )
+    else:
+        graph = _mindmap_graph(req.text, req.mode, req.fast)
+    if not graph.get("nodes"):
+        return graph
+    if not req.layout:
+        return graph_layout.truncate(graph, graph_layout.UNLAID_NODES)
+    max_visible = min(max(req.max_visible or graph_layout.DEFAULT_VISIBLE, 1), graph_layout.MAX_NODES)
+    return _laid_out(graph, max_visible)
+
+# "local" always answers /api/mindmap/summarize with the extractive summarizer
+MINDMAP_SUMMARIZER = os.getenv("MINDMAP_SUMMARIZER", "llm").lower()
+
 @app.post("/api/mindmap/summarize")
 def summarize(req: SummarizeRequest):
+    if req.fast or client is None or MINDMAP_SUMMARIZER == "local":
+        local = summarizer.summarize(req.text)
+        if local:
+            metrics.record_ai_response("/api/mindmap/summarize", "local")
+            return local
+
+    cached = mindmap_cache.lookup("summarize", req.text, "summary", MINDMAP_MODEL)
+    if cached:
+        metrics.record_ai_response("/api/mindmap/summarize", "cache")
+        return cached
+    similar = semantic_cache.lookup("/api/mindmap/summarize", req.text, MINDMAP_SEMANTIC_SCOPE)
+    if similar:
+        metrics.record_ai_response("/api/mindmap/summarize", "semantic_cache")
+        return similar
+
     prompt = f"""
 Summarize this text using STRICT summary format:
 
@@ -1639,8 +1973,20 @@ Return EXACT JSON:
 }}
 """
 
-    raw = use_llm(SYSTEM_MINDENGINE, prompt)
-    parsed = force_json(raw)
+    fell_back = []
+
+    def local_reply():
+        fell_back.append(True)
+        local = summarizer.summarize(req.text)
+        return json.dumps(local) if local else None
+
+    raw = use_llm(SYSTEM_MINDENGINE, prompt, schema="summary", fallback=local_reply)
+    parsed = llm_schemas.parse("summary", raw)
+    if parsed:
+        metrics.record_ai_response("/api/mindmap/summarize", "local" if fell_back else "llm")
+        if not fell_back:
+            mindmap_cache.store("summarize", req.text, "summary", MINDMAP_MODEL, parsed)
+            semantic_cache.store("/api/mindmap/summarize", req.text, parsed, MINDMAP_SEMANTIC_SCOPE)
 
     return parsed if parsed else {"error": "Invalid JSON", "raw": raw}
 
@@ -1677,9 +2023,10 @@ Return JSON with:
 - suggested_elements: Array of certificate elements (title, recipient, date, signature, etc.)
 - description: Brief description of the template style"""
 
-            raw = use_llm(system, user)
-            parsed = force_json(raw)
+            raw = use_llm(system, user, schema=llm_schemas.JSON_MODE)
+            parsed = force_json(raw, dict)
             if parsed:
+                metrics.record_ai_response("/ai/certificate/generate", "llm")
                 print(f"[AI RESPONSE] /ai/certificate/generate OpenAI succeeded")
                 return {"status": "ok", "data": parsed}
         except Exception as e:
@@ -1727,9 +2074,37 @@ Return JSON with:
 
     fallback_template = templates.get(event_type.lower(), templates['academic'])
     resp = {"status": "ok", "data": fallback_template}
+    metrics.record_ai_response("/ai/certificate/generate", "fallback")
     print(f"[AI RESPONSE] /ai/certificate/generate fallback used: {fallback_template['template_name']}")
     return resp
 
+@app.post("/ai/certificate/render_batch")
+async def ai_certificate_render_batch(
+    recipients: UploadFile = File(...),
+    template: str = Form(...),
+    format: str = Form("png"),
+):
+    """Render one certificate per recipient (CSV or JSON) from a generate template; streams a ZIP."""
+    if not certificate_render.available():
+        raise HTTPException(status_code=503, detail="Pillow is not installed on the server")
+    fmt = (format or "png").lower()
+    if fmt not in certificate_render.FORMATS:
+        raise HTTPException(status_code=400, detail=f"format must be one of {', '.join(certificate_render.FORMATS)}")
+    data = await recipients.read()
+    try:
+        parsed_template = certificate_render.parse_template(template)
+        rows = await run_in_threadpool(certificate_render.parse_recipients, data, recipients.filename or "")
+        print(f"[AI REQUEST] /ai/certificate/render_batch recipients: {len(rows)} format: {fmt}")
+        # Renders the first chunk, so a broken template is a 400 rather than a cut-off ZIP
+        stream = await run_in_threadpool(certificate_render.stream_zip, parsed_template, rows, fmt)
+    except certificate_render.RenderError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return StreamingResponse(
+        stream,
+        media_type="application/zip",
+        headers={"Content-Disposition": f'attachment; filename="certificates-{fmt}.zip"'},
+    )
+
 @app.post("/ai/certificate/analyze")
 def ai_certificate_analyze(payload: dict):
     """Analyze existing certificate content and provide improvement suggestions"""
@@ -1748,9 +2123,9 @@ def ai_certificate_analyze(payload: dict):
             user = f"""Analyze this certificate content and design:
 
 Certificate Text:
-{certificate_text}
+{prompt_budget.truncate_text(certificate_text, 1200)}
 
-Current Design: {json.dumps(current_design, ensure_ascii=False)}
+Current Design: {prompt_budget.fit_json(current_design, 600)}
 
 Provide analysis covering:
 - Content clarity and completeness
@@ -1761,9 +2136,10 @@ Provide analysis covering:
 
 Return JSON with analysis sections."""
 
-            raw = use_llm(system, user)
-            parsed = force_json(raw)
+            raw = use_llm(system, user, schema=llm_schemas.JSON_MODE)
+            parsed = force_json(raw, dict)
             if parsed:
+                metrics.record_ai_response("/ai/certificate/analyze", "llm")
                 print(f"[AI RESPONSE] /ai/certificate/analyze OpenAI succeeded")
                 return {"status": "ok", "data": parsed}
         except Exception as e:
@@ -1793,6 +2169,7 @@ Return JSON with analysis sections."""
     }
 
     resp = {"status": "ok", "data": analysis}
+    metrics.record_ai_response("/ai/certificate/analyze", "fallback")
     print(f"[AI RESPONSE] /ai/certificate/analyze fallback used")
     return resp
 
@@ -1810,6 +2187,11 @@ def ai_certificate_suggest(payload: dict):
 
     # Try OpenAI for intelligent suggestions
     if client:
+        scope = f"{os.getenv('OPENAI_MODEL', 'gpt-4o-mini')}:{certificate_type}:{tone}"
+        similar = semantic_cache.lookup("/ai/certificate/suggest", current_text, scope)
+        if similar:
+            metrics.record_ai_response("/ai/certificate/suggest", "semantic_cache")
+            return {"status": "ok", "data": similar}
         try:
             system = f'You are an expert certificate writer. Suggest professional, {tone} wording for certificates.'
             user = f"""Improve the wording for this {certificate_type} certificate:
@@ -1824,11 +2206,17 @@ Provide:
 - Improved full text
 - Specific wording suggestions
 - Alternative phrasings
-- Tone adjustments"""
+- Tone adjustments
 
-            raw = use_llm(system, user)
-            parsed = force_json(raw)
+Return a JSON object."""
+
+            fell_back = []
+            raw = use_llm(system, user, schema=llm_schemas.JSON_MODE, fallback=lambda: fell_back.append(True))
+            # use_llm's snippet fallback is summary-shaped; the type suggestions below fit better
+            parsed = None if fell_back else force_json(raw, dict)
             if parsed:
+                metrics.record_ai_response("/ai/certificate/suggest", "llm")
+                semantic_cache.store("/ai/certificate/suggest", current_text, parsed, scope)
                 print(f"[AI RESPONSE] /ai/certificate/suggest OpenAI succeeded")
                 return {"status": "ok", "data": parsed}
         except Exception as e:
@@ -1876,6 +2264,7 @@ Provide:
 
     fallback_suggestion = suggestions.get(certificate_type.lower(), suggestions['achievement'])
     resp = {"status": "ok", "data": fallback_suggestion}
+    metrics.record_ai_response("/ai/certificate/suggest", "fallback")
     print(f"[AI RESPONSE] /ai/certificate/suggest fallback used for type: {certificate_type}")
     return resp
 
@@ -1897,15 +2286,16 @@ def ai_certificate_autofill(payload: dict):
             system = 'You are an expert at filling certificate templates with appropriate information based on context.'
             user = f"""Auto-fill this certificate template:
 
-Recipient Info: {json.dumps(recipient_info, ensure_ascii=False)}
-Event Context: {json.dumps(event_context, ensure_ascii=False)}
-Template Fields: {json.dumps(template_fields, ensure_ascii=False)}
+Recipient Info: {prompt_budget.fit_json(recipient_info, 400)}
+Event Context: {prompt_budget.fit_json(event_context, 800)}
+Template Fields: {prompt_budget.fit_json(template_fields, 400)}
 
-Provide appropriate values for each field based on the context and recipient information."""
+Provide appropriate values for each field based on the context and recipient information. Return a JSON object mapping each field to its value."""
 
-            raw = use_llm(system, user)
-            parsed = force_json(raw)
+            raw = use_llm(system, user, schema=llm_schemas.JSON_MODE)
+            parsed = force_json(raw, dict)
             if parsed:
+                metrics.record_ai_response("/ai/certificate/autofill", "llm")
                 print(f"[AI RESPONSE] /ai/certificate/autofill OpenAI succeeded")
                 return {"status": "ok", "data": parsed}
         except Exception as e:
@@ -1942,6 +2332,7 @@ Provide appropriate values for each field based on the context and recipient inf
     autofill_data['presented_by'] = event_context.get('presented_by', event_context.get('organization', 'Organization'))
 
     resp = {"status": "ok", "data": autofill_data}
+    metrics.record_ai_response("/ai/certificate/autofill", "fallback")
     print(f"[AI RESPONSE] /ai/certificate/autofill fallback used, filled {len(autofill_data)} fields")
     return resp
 
@@ -1969,8 +2360,9 @@ Format your output in JSON with keys: summary_thick, summary_thin, main_body, pu
 """
 
     # Send the full compiled prompt as the user message so fallback uses all fields
-    raw = use_llm("MagazineWriter", prompt)
-    parsed = force_json(raw)
+    raw = use_llm("MagazineWriter", prompt, schema="magazine")
+    # Anything else (e.g. the summary-shaped fallback) is reshaped below
+    parsed = llm_schemas.parse("magazine", raw) or force_json(raw, dict)
 
     if not parsed:
         return {"error": "Invalid JSON", "raw": raw}
@@ -2030,7 +2422,8 @@ def mood_analyze(req: MoodAnalyzeRequest):
     try:
         rw = get_rewriter_module()
         if rw and hasattr(rw, 'generate_mood_profile'):
-            mood_profile = rw.generate_mood_profile(req.text)
+            with metrics.MODEL_INFERENCE.labels("generate_mood_profile").time():
+                mood_profile = rw.generate_mood_profile(req.text)
         else:
             # Fallback
             mood_profile = {
@@ -2077,7 +2470,8 @@ def mood_songs(req: MoodSongsRequest):
     try:
         rw = get_rewriter_module()
         if rw and hasattr(rw, 'recommend_songs'):
-            songs = rw.recommend_songs(req.mood_profile, req.language, 5)
+            with metrics.MODEL_INFERENCE.labels("recommend_songs").time():
+                songs = rw.recommend_songs(req.mood_profile, req.language, 5)
         else:
             songs = [{"title": "Mock Song", "artist": "Artist", "spotify": "#", "youtube": "#"}]
         return {"songs": songs}
@@ -2104,8 +2498,15 @@ def todo_analyze(req: TodoAnalyzeRequest):
         tasks = req.tasks or []
         
         if action == "rewrite":
+            scope = os.getenv("OPENAI_MODEL", "gpt-4o-mini")
+            similar = semantic_cache.lookup("/todo/analyze:rewrite", text, scope)
+            if similar:
+                return {"rewrite": similar}
             prompt = f"Rewrite this task into an actionable, professional format:\n'{text}'\nProvide only the rewritten task."
-            rewritten = use_llm(prompt, "Task rewrite")
+            fell_back = []
+            rewritten = use_llm(prompt, "Task rewrite", fallback=lambda: fell_back.append(True))
+            if not fell_back:
+                semantic_cache.store("/todo/analyze:rewrite", text, rewritten, scope)
             return {"rewrite": rewritten}
         
         elif action == "priority":
@@ -2183,6 +2584,15 @@ def test_post():
     return {"message": "POST works"}
 
 if __name__ == "__main__":
-    import uvicorn
-    port = int(os.getenv("PORT", 8000))
-    uvicorn.run("server:app", host="0.0.0.0", port=port, reload=True)
+    import sys
+    if os.getenv("SERVER_RELOAD") == "1":
+        # Development only: a single auto-reloading process, no supervisor
+        import uvicorn
+        uvicorn.run("server:app", host="0.0.0.0", port=int(os.getenv("PORT", 8000)), reload=True)
+    else:
+        # Run under the supervised launcher (worker pool, recycling, rolling restarts)
+        launcher = [sys.executable, str(ROOT / "run_both_servers.py"), *sys.argv[1:]]
+        if os.name == "posix":
+            os.execv(sys.executable, launcher)
+        import subprocess
+        sys.exit(subprocess.call(launcher))
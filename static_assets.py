@@ -0,0 +1,217 @@
+"""
+Content-hash fingerprinting for the unified server's static files.
+
+The server registers every static mount with an AssetManifest at startup.
+Each cacheable file is hashed and gets a fingerprinted URL such as
+/css/style.3f2a1b9c0d.css. Fingerprinted URLs are served with an immutable
+Cache-Control header because their content can never change; the plain URLs
+keep the default revalidation behaviour. A file edited while the server runs
+is re-hashed when its mtime or size changes, and its old fingerprinted URL is
+then served without the immutable header. The manifest also drives the
+generated service worker (versioned cache name + precache list).
+"""
+
+import hashlib
+import json
+import os
+import re
+from pathlib import Path
+
+from fastapi.staticfiles import StaticFiles
+
+# Only hash file types that are safe to cache forever once fingerprinted.
+# JSON is deliberately excluded: several project folders keep mutable data
+# files (e.g. event-planner/data/events.json) next to their assets.
+FINGERPRINT_EXTENSIONS = {
+    '.css', '.js', '.woff', '.woff2', '.ttf', '.svg',
+    '.png', '.jpg', '.jpeg', '.gif', '.webp', '.ico',
+}
+
+# Files precached by the service worker on install. Everything else in the
+# manifest is cached lazily the first time it is fetched.
+PRECACHE_PREFIXES = ('/css/', '/js/', '/assets/css/', '/assets/js/', '/assets/webfonts/')
+PRECACHE_EXTENSIONS = {'.css', '.js', '.woff2'}
+PRECACHE_PAGES = ['/', '/index.html']
+
+DIGEST_LENGTH = 10
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+STALE_CACHE_CONTROL = 'no-cache'
+
+_FINGERPRINT_RE = re.compile(r'^(?P<stem>.+)\.(?P<digest>[0-9a-f]{%d})(?P<ext>\.[^./]+)$' % DIGEST_LENGTH)
+_ASSET_ATTR_RE = re.compile(r'(?P<attr>\b(?:href|src))=(?P<quote>["\'])(?P<url>[^"\'#?]+)(?P=quote)')
+_SW_CACHE_NAME_RE = re.compile(r"const CACHE_NAME = '[^']*';")
+_SW_URLS_RE = re.compile(r"const urlsToCache = \[[\s\S]*?\];")
+_SW_MANIFEST_RE = re.compile(r"const ASSET_MANIFEST = \{[\s\S]*?\};")
+
+
+def file_digest(path: Path) -> str:
+    """Return the truncated SHA-256 hex digest of a file's contents."""
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(65536), b''):
+            h.update(block)
+    return h.hexdigest()[:DIGEST_LENGTH]
+
+
+def fingerprint_url(url: str, digest: str) -> str:
+    """Insert a digest before the extension: /css/a.css -> /css/a.<digest>.css"""
+    head, _, name = url.rpartition('/')
+    stem, dot, ext = name.rpartition('.')
+    if not dot or not stem:
+        return f"{url}.{digest}"
+    return f"{head}/{stem}.{digest}.{ext}"
+
+
+def split_fingerprint(path: str):
+    """Split 'dir/a.<digest>.css' into ('dir/a.css', digest), or (path, None)."""
+    head, sep, name = path.rpartition('/')
+    match = _FINGERPRINT_RE.match(name)
+    if not match:
+        return path, None
+    logical = f"{match.group('stem')}{match.group('ext')}"
+    return (f"{head}{sep}{logical}", match.group('digest'))
+
+
+class AssetManifest:
+    """Maps plain static URLs to their content-hashed counterparts."""
+
+    def __init__(self):
+        self.assets: dict[str, str] = {}
+        self.digests: dict[str, str] = {}
+        self._files: dict[str, tuple[Path, int, int]] = {}  # url -> (path, mtime_ns, size) when hashed
+        self._version = None
+        self._rendered_sw = None
+
+    def register(self, url_prefix: str, directory: Path):
+        """Hash every cacheable file below `directory`, served at `url_prefix`."""
+        url_prefix = url_prefix.rstrip('/')
+        directory = Path(directory)
+        for dirpath, dirnames, filenames in os.walk(directory):
+            # Skip hidden and backend folders; they are never served as assets
+            dirnames[:] = [d for d in dirnames if not d.startswith('.') and d not in ('backend', '__pycache__')]
+            for filename in filenames:
+                if Path(filename).suffix.lower() not in FINGERPRINT_EXTENSIONS:
+                    continue
+                full_path = Path(dirpath) / filename
+                rel = full_path.relative_to(directory).as_posix()
+                self._hash(f"{url_prefix}/{rel}", full_path)
+        self._version = None
+        self._rendered_sw = None
+
+    def _hash(self, url: str, path: Path) -> bool:
+        try:
+            st = path.stat()
+            digest = file_digest(path)
+        except OSError as e:
+            print(f"Failed to hash static asset {path}: {e}")
+            return False
+        self.digests[url] = digest
+        self.assets[url] = fingerprint_url(url, digest)
+        self._files[url] = (path, st.st_mtime_ns, st.st_size)
+        return True
+
+    def refresh(self, url: str):
+        """Re-hash `url` if its file changed since it was hashed; a deleted file leaves the manifest."""
+        entry = self._files.get(url)
+        if entry is None:
+            return
+        path, mtime_ns, size = entry
+        try:
+            st = path.stat()
+        except OSError:
+            st = None
+        if st is not None and (st.st_mtime_ns, st.st_size) == (mtime_ns, size):
+            return
+        if st is None or not self._hash(url, path):
+            self.assets.pop(url, None)
+            self.digests.pop(url, None)
+            self._files.pop(url, None)
+        self._version = None
+        self._rendered_sw = None
+
+    @property
+    def version(self) -> str:
+        """A short hash over the whole manifest; changes whenever any asset does."""
+        if self._version is None:
+            h = hashlib.sha256()
+            for url in sorted(self.assets):
+                h.update(f"{url}={self.digests[url]}\n".encode('utf-8'))
+            self._version = h.hexdigest()[:DIGEST_LENGTH]
+        return self._version
+
+    def is_current(self, url: str, digest: str) -> bool:
+        self.refresh(url)
+        return self.digests.get(url) == digest
+
+    def precache_urls(self) -> list[str]:
+        urls = list(PRECACHE_PAGES)
+        for url in sorted(self.assets):
+            if url.startswith(PRECACHE_PREFIXES) and Path(url).suffix.lower() in PRECACHE_EXTENSIONS:
+                urls.append(self.assets[url])
+        return urls
+
+    def to_dict(self) -> dict:
+        return {"version": self.version, "assets": dict(sorted(self.assets.items()))}
+
+    def rewrite_html(self, html: str, base_url: str = '/') -> str:
+        """Point href/src attributes of a served page at fingerprinted URLs."""
+        base = base_url if base_url.endswith('/') else base_url.rsplit('/', 1)[0] + '/'
+
+        def _replace(match):
+            url = match.group('url')
+            if '://' in url or url.startswith('//'):
+                return match.group(0)
+            absolute = url if url.startswith('/') else base + url
+            self.refresh(absolute)
+            hashed = self.assets.get(absolute)
+            if not hashed:
+                return match.group(0)
+            return f"{match.group('attr')}={match.group('quote')}{hashed}{match.group('quote')}"
+
+        return _ASSET_ATTR_RE.sub(_replace, html)
+
+    def render_service_worker(self, template: str) -> str:
+        """Fill the service worker template with the versioned cache name and precache list."""
+        if self._rendered_sw is not None and self._rendered_sw[0] == template:
+            return self._rendered_sw[1]
+        urls = json.dumps(self.precache_urls(), indent=2)
+        rendered = _SW_CACHE_NAME_RE.sub(
+            lambda _m: f"const CACHE_NAME = 'creative-studio-{self.version}';", template, count=1)
+        rendered = _SW_URLS_RE.sub(lambda _m: f"const urlsToCache = {urls};", rendered, count=1)
+        rendered = _SW_MANIFEST_RE.sub(
+            lambda _m: f"const ASSET_MANIFEST = {json.dumps(dict(sorted(self.assets.items())))};", rendered, count=1)
+        self._rendered_sw = (template, rendered)
+        return rendered
+
+
+class FingerprintedStaticFiles(StaticFiles):
+    """StaticFiles that also answers fingerprinted URLs with immutable caching.
+
+    A request for `style.<digest>.css` is served from `style.css` when the
+    digest matches the manifest. A stale digest of a known asset (the file was
+    edited after the page was rendered) gets the current content with no-cache,
+    never immutable. Unknown digests fall through to a normal lookup, so a real
+    file that happens to look fingerprinted still works.
+    """
+
+    def __init__(self, *, manifest: AssetManifest, url_prefix: str, **kwargs):
+        super().__init__(**kwargs)
+        self.manifest = manifest
+        self.url_prefix = url_prefix.rstrip('/')
+
+    async def get_response(self, path: str, scope):
+        logical, digest = split_fingerprint(path.replace(os.sep, '/'))
+        if digest is not None:
+            url = f"{self.url_prefix}/{logical}"
+            if self.manifest.is_current(url, digest):
+                cache_control = IMMUTABLE_CACHE_CONTROL
+            elif url in self.manifest.digests:
+                cache_control = STALE_CACHE_CONTROL
+            else:
+                cache_control = None
+            if cache_control:
+                response = await super().get_response(logical.replace('/', os.sep), scope)
+                if response.status_code in (200, 304):
+                    response.headers['Cache-Control'] = cache_control
+                return response
+        return await super().get_response(path, scope)
@@ -0,0 +1,146 @@
+"""
+Local extractive summarizer for the mindmap routes.
+
+The text is split into sentences, which are embedded by the shared
+embedding service (TF-IDF vectors when the model is unavailable).
+TextRank over the cosine-similarity graph then ranks the sentences by
+centrality. One ranking fills every field of the summary shape the model
+would return: the top sentences, put back in document order and cut to
+length budgets, become summary_short/medium/detailed; the best sentences
+become key_points; and the shared keyword engine, with terms weighted by
+the rank of the sentences they occur in, supplies keywords. It runs in
+milliseconds once the model is loaded.
+"""
+
+import os
+import re
+
+import embeddings
+import keywords
+
+try:
+    import numpy as np
+except Exception:
+    np = None
+
+MAX_SENTENCES = int(os.getenv("SUMMARY_MAX_SENTENCES", "400"))
+DAMPING = 0.85
+# Character budgets for the three summary lengths
+SHORT_CHARS, MEDIUM_CHARS, DETAILED_CHARS = 200, 600, 1500
+KEY_POINTS = 5
+KEYWORDS = 10
+
+_SENTENCE_END_RE = re.compile(r"(?<=[.!?])[\"')\]]*\s+(?=[\"'(\[]?[A-Z0-9])")
+_BULLET_RE = re.compile(r"^\s*(?:[-*•>]+|\d+[.)]|[a-z][.)])\s+")
+
+
+def available() -> bool:
+    return np is not None
+
+
+def split_sentences(text: str):
+    """Sentences in document order; lines (headings, bullets) are never joined together."""
+    sentences = []
+    for line in (text or "").splitlines():
+        line = _BULLET_RE.sub("", line).strip()
+        if not line:
+            continue
+        sentences.extend(s.strip() for s in _SENTENCE_END_RE.split(line) if s.strip())
+    return sentences
+
+
+def _words(sentence: str):
+    return [w.lower() for w in keywords.TOKEN_RE.findall(sentence)]
+
+
+def _tfidf_vectors(sentences):
+    vocab = {}
+    rows, cols = [], []
+    for i, sentence in enumerate(sentences):
+        for word in _words(sentence):
+            if word not in keywords.STOPWORDS:
+                rows.append(i)
+                cols.append(vocab.setdefault(word, len(vocab)))
+    matrix = np.zeros((len(sentences), max(len(vocab), 1)))
+    np.add.at(matrix, (rows, cols), 1.0)
+    df = np.count_nonzero(matrix, axis=0)
+    matrix *= np.log((1 + len(sentences)) / (1 + df)) + 1.0
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    return matrix / np.maximum(norms, 1e-12)
+
+
+def embed(sentences):
+    """Unit-length sentence vectors from the embedding service, else TF-IDF vectors of these sentences."""
+    vectors = embeddings.encode(sentences)
+    return vectors if vectors is not None else _tfidf_vectors(sentences)
+
+
+def textrank(vectors, iterations: int = 50, tol: float = 1e-6):
+    """PageRank scores over the cosine-similarity graph of unit vectors."""
+    n = len(vectors)
+    if n == 1:
+        return np.ones(1)
+    sim = np.clip(vectors @ vectors.T, 0.0, None)
+    np.fill_diagonal(sim, 0.0)
+    out = sim.sum(axis=1, keepdims=True)
+    # Sentences similar to nothing spread their weight evenly
+    transition = np.where(out > 0, sim / np.where(out > 0, out, 1.0), 1.0 / n)
+    scores = np.full(n, 1.0 / n)
+    for _ in range(iterations):
+        updated = (1 - DAMPING) / n + DAMPING * (transition.T @ scores)
+        if np.abs(updated - scores).sum() < tol:
+            return updated
+        scores = updated
+    return scores
+
+
+def _pick(sentences, ranked, budget: int):
+    """Best-ranked sentences that fit in `budget` characters, in document order."""
+    chosen, used = [], 0
+    for i in ranked:
+        length = len(sentences[i]) + 1
+        if chosen and used + length > budget:
+            continue
+        chosen.append(i)
+        used += length
+        if used >= budget:
+            break
+    return " ".join(sentences[i] for i in sorted(chosen))
+
+
+def keyphrases(sentences, scores, limit: int = KEYWORDS):
+    """Keyphrases of the text, with each sentence's terms weighted by its rank score."""
+    return keywords.ENGINE.extract_weighted(sentences, scores, limit)
+
+
+def title(text: str, phrases):
+    """The text's heading line if it has one, else its strongest keyphrase."""
+    first = (text or "").strip().splitlines()[0].strip() if (text or "").strip() else ""
+    if first and len(first) <= 80 and not first.endswith((".", "!", "?")):
+        return _BULLET_RE.sub("", first).strip("#: ").strip()
+    if phrases:
+        return phrases[0].title()
+    return "Summary"
+
+
+def summarize(text: str):
+    """Return the summary shape {title, summary_short, summary_medium, summary_detailed, key_points, keywords}, or None."""
+    if not available():
+        return None
+    sentences = split_sentences(text)[:MAX_SENTENCES]
+    if not sentences:
+        return None
+    # Fragments (headings, labels) are kept out of the ranking when there is real prose
+    prose = [i for i, s in enumerate(sentences) if len(_words(s)) >= 4] or list(range(len(sentences)))
+    candidates = [sentences[i] for i in prose]
+    scores = textrank(embed(candidates))
+    ranked = [int(i) for i in np.argsort(-scores, kind="stable")]
+    phrases = keyphrases(candidates, scores)
+    return {
+        "title": title(text, phrases),
+        "summary_short": _pick(candidates, ranked, SHORT_CHARS),
+        "summary_medium": _pick(candidates, ranked, MEDIUM_CHARS),
+        "summary_detailed": _pick(candidates, ranked, DETAILED_CHARS),
+        "key_points": [candidates[i] for i in ranked[:KEY_POINTS]],
+        "keywords": phrases,
+    }
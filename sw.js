@@ -1,5 +1,9 @@
 // Service Worker for Creative Studio
 // Provides basic offline support and caching
+//
+// When served by the unified server (/sw.js), CACHE_NAME, urlsToCache and
+// ASSET_MANIFEST below are replaced with values derived from the content-hash
+// asset manifest, so every deploy gets a new cache and fingerprinted URLs.
 
 const CACHE_NAME = 'creative-studio-v1';
 const urlsToCache = [
@@ -8,6 +12,8 @@ const urlsToCache = [
   '/js/main.js',
   '/index.html'
 ];
+// Plain URL -> fingerprinted URL (empty when served without the unified server)
+const ASSET_MANIFEST = {};
 
 // Install event - cache resources
 self.addEventListener('install', (event) => {
@@ -24,8 +30,37 @@ self.addEventListener('install', (event) => {
   self.skipWaiting();
 });
 
+// Fingerprinted assets never change, so serve them cache-first and store
+// them on first use; pages requesting plain URLs are mapped onto them.
+function serveFingerprinted(hashedUrl) {
+  return caches.open(CACHE_NAME).then((cache) =>
+    cache.match(hashedUrl).then((cached) => {
+      if (cached) {
+        return cached;
+      }
+      return fetch(hashedUrl).then((response) => {
+        if (response.ok) {
+          cache.put(hashedUrl, response.clone());
+        }
+        return response;
+      });
+    })
+  );
+}
+
 // Fetch event - serve from cache when available
 self.addEventListener('fetch', (event) => {
+  if (event.request.method === 'GET') {
+    const url = new URL(event.request.url);
+    if (url.origin === self.location.origin) {
+      const hashedUrl = ASSET_MANIFEST[url.pathname];
+      if (hashedUrl) {
+        event.respondWith(serveFingerprinted(hashedUrl));
+        return;
+      }
+    }
+  }
+
   event.respondWith(
     caches.match(event.request)
       .then((response) => {
@@ -0,0 +1,141 @@
+"""
+Size-bounded, disk-spooled handling for file uploads.
+
+Starlette already parses multipart files into a SpooledTemporaryFile; this
+module makes its in-memory threshold configurable, rejects request bodies
+larger than MAX_UPLOAD_BYTES while they are still streaming in (before the
+multipart parser has buffered them), and hands extractors a seekable source
+backed by the spooled file or a read-only memory map instead of a bytes copy.
+"""
+
+import io
+import json
+import mmap
+import os
+from contextlib import contextmanager
+
+MAX_UPLOAD_BYTES = int(float(os.getenv("MAX_UPLOAD_MB", "50")) * 1024 * 1024)
+SPOOL_THRESHOLD_BYTES = int(float(os.getenv("UPLOAD_SPOOL_KB", "1024")) * 1024)
+
+
+class UploadTooLarge(Exception):
+    pass
+
+
+def configure_spooling(threshold: int = SPOOL_THRESHOLD_BYTES):
+    """Set how much of each uploaded file Starlette keeps in memory before spooling to disk."""
+    try:
+        from starlette.formparsers import MultiPartParser
+    except ImportError:
+        return
+    # The attribute was renamed across Starlette releases
+    for attr in ("spool_max_size", "max_file_size"):
+        if hasattr(MultiPartParser, attr):
+            setattr(MultiPartParser, attr, threshold)
+            return
+
+
+def _limit_text(max_bytes: int) -> str:
+    if max_bytes >= 1024 * 1024:
+        return f"{max_bytes // (1024 * 1024)} MB"
+    return f"{max(1, max_bytes // 1024)} KB"
+
+
+async def _send_too_large(send, max_bytes: int):
+    body = json.dumps({"detail": f"Upload exceeds the {_limit_text(max_bytes)} limit"}).encode("utf-8")
+    await send({
+        "type": "http.response.start",
+        "status": 413,
+        "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())],
+    })
+    await send({"type": "http.response.body", "body": body})
+
+
+class UploadLimitMiddleware:
+    """Reject oversized request bodies on upload routes with 413.
+
+    A declared Content-Length over the limit is refused before any body is
+    read; chunked bodies are counted as they stream in and cut off as soon
+    as they cross the limit.
+    """
+
+    def __init__(self, app, paths=(), max_bytes: int = MAX_UPLOAD_BYTES):
+        self.app = app
+        self.paths = tuple(paths)
+        self.max_bytes = max_bytes
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not scope["path"].startswith(self.paths):
+            await self.app(scope, receive, send)
+            return
+
+        declared = dict(scope.get("headers") or []).get(b"content-length")
+        if declared is not None and declared.isdigit() and int(declared) > self.max_bytes:
+            await _send_too_large(send, self.max_bytes)
+            return
+
+        received = 0
+        exceeded = False
+        response_started = False
+
+        async def limited_receive():
+            nonlocal received, exceeded
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > self.max_bytes:
+                    exceeded = True
+                    raise UploadTooLarge()
+            return message
+
+        async def guarded_send(message):
+            nonlocal response_started
+            # Once the limit is hit, drop whatever error the app produced; the 413 goes out below
+            if exceeded:
+                return
+            if message["type"] == "http.response.start":
+                response_started = True
+            await send(message)
+
+        try:
+            await self.app(scope, limited_receive, guarded_send)
+        except UploadTooLarge:
+            pass
+        if exceeded and not response_started:
+            await _send_too_large(send, self.max_bytes)
+
+
+def upload_size(upload) -> int:
+    f = upload.file
+    f.seek(0, io.SEEK_END)
+    size = f.tell()
+    f.seek(0)
+    return size
+
+
+@contextmanager
+def upload_source(upload):
+    """Yield a seekable binary source for an UploadFile without copying it.
+
+    Small uploads still held in memory are yielded as-is; uploads that were
+    spooled to disk are exposed through a read-only memory map so PDF and
+    image readers page data in on demand.
+    """
+    f = upload.file
+    f.seek(0)
+    # SpooledTemporaryFile.fileno() forces a rollover, so only map files already on disk
+    if not getattr(f, "_rolled", True):
+        yield f
+        return
+    try:
+        fileno = f.fileno()
+        mapped = mmap.mmap(fileno, 0, access=mmap.ACCESS_READ)
+    except (AttributeError, OSError, ValueError, io.UnsupportedOperation):
+        # Empty files cannot be mapped; unusual file objects have no fileno
+        f.seek(0)
+        yield f
+        return
+    try:
+        yield mapped
+    finally:
+        mapped.close()